@@ -1,15 +1,15 @@
 import os
-from dotenv import load_dotenv
 from flask import Flask
 from flask_cors import CORS
 from .config import config
 from .extensions import init_extensions
+from .commands import register_commands
+from .utils.json_utils import FastJSONProvider
+from .utils.compression import init_compression
 from .routes.auth_routes import auth_bp
 from .routes.incident_routes import incident_bp
 from .routes.admin_routes import admin_bp
-
-# Load environment variables from .env file
-load_dotenv()
+from .routes.subscription_routes import subscription_bp
 
 def create_app(config_name=None):
     """Application factory function."""
@@ -17,6 +17,7 @@ def create_app(config_name=None):
         config_name = os.environ.get('FLASK_ENV', 'default')
 
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
     # Disable automatic trailing slash behavior
     app.url_map.strict_slashes = False
     app.config.from_object(config[config_name])
@@ -34,11 +35,17 @@ def create_app(config_name=None):
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(incident_bp, url_prefix='/api/incidents')
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    app.register_blueprint(subscription_bp, url_prefix='/api/subscriptions')
+
+    register_commands(app)
 
     @app.route('/')
     def index():
         return "Ajali! API is running"
 
+    # Compress responses for clients on metered mobile data
+    init_compression(app)
+
     return app
 
 if __name__ == '__main__':
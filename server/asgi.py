@@ -0,0 +1,17 @@
+"""ASGI entry point.
+
+Run with an ASGI server, e.g.::
+
+    uvicorn server.asgi:app --workers 4
+
+Request bodies are read on the event loop, so slow mobile uploads only
+occupy a coroutine while they trickle in. Once a request is complete the
+Flask app handles it in a bounded thread pool, and the response is
+streamed back through the loop, so CPU-bound views never block it.
+"""
+from .app import create_app
+from .utils.asgi_utils import AsgiAdapter
+
+flask_app = create_app()
+app = AsgiAdapter(flask_app, max_threads=flask_app.config.get('ASGI_THREADS'),
+                  max_body_size=flask_app.config.get('MAX_CONTENT_LENGTH'))
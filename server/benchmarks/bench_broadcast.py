@@ -0,0 +1,97 @@
+"""Time an emergency broadcast to a large user table.
+
+Fills a scratch SQLite database with ``--users`` users (a tenth opted out
+of each channel, two thirds with a phone number), creates a broadcast to
+everyone and runs it with ``run_pending``. Providers are simulated: an
+email batch takes ``--email-latency-ms`` and each SMS ``--sms-latency-ms``,
+so the run is bound by the configured provider rates, the SMS concurrency
+and the recipient queries. Reports throughput and the Python heap peak,
+which stays flat as ``--users`` grows.
+
+Usage (from the repository root)::
+
+    python -m server.benchmarks.bench_broadcast --users 100000 --email-rate "2000 per second"
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+
+def populate(db, count):
+    from server.models import User
+
+    for start in range(1, count + 1, 50000):
+        db.session.execute(User.__table__.insert(), [
+            {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com',
+             'phone_number': f'+2547{i:08d}' if i % 3 else None, 'is_active': True,
+             'email_notifications': i % 10 != 1, 'sms_notifications': i % 10 != 2}
+            for i in range(start, min(count, start + 49999) + 1)])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--email-rate', default='2000 per second')
+    parser.add_argument('--sms-rate', default='500 per second')
+    parser.add_argument('--email-latency-ms', type=float, default=20)
+    parser.add_argument('--sms-latency-ms', type=float, default=50)
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--sms-concurrency', type=int, default=32)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'broadcast-bench.db')
+    from server import create_app
+    from server.config import config
+    # The config classes read DATABASE_URL when the package is imported
+    config['development'].SQLALCHEMY_DATABASE_URI = f'sqlite:///{path}'
+    from server.models import db
+    from server.utils import broadcast as broadcast_utils
+    from server.utils.broadcast import create_broadcast, recipients_query, run_pending
+
+    class SimulatedSMS:
+        def send(self, to, body):
+            time.sleep(args.sms_latency_ms / 1000)
+            return True
+
+    def simulated_email_batch(emails):
+        time.sleep(args.email_latency_ms / 1000)
+        return [True] * len(emails)
+
+    broadcast_utils.send_email_batch = simulated_email_batch
+    broadcast_utils.get_sms_client = SimulatedSMS
+
+    app = create_app('development')
+    app.config.update(BROADCAST_EMAIL_RATE=args.email_rate, BROADCAST_SMS_RATE=args.sms_rate,
+                      BROADCAST_CHUNK_SIZE=args.chunk_size,
+                      BROADCAST_SMS_CONCURRENCY=args.sms_concurrency,
+                      RATELIMIT_STORAGE_URL='memory://')
+    with app.app_context():
+        db.engine.echo = False
+        db.create_all()
+        started = time.perf_counter()
+        populate(db, args.users)
+        print(f'populated {args.users} users in {time.perf_counter() - started:.0f}s')
+
+        broadcast = create_broadcast(None, 'Flood warning', 'Move to higher ground now.')
+        db.session.commit()
+        query = recipients_query(broadcast, 'email').where(db.text('users.id > 0')).limit(1)
+        plan = db.session.execute(db.text('EXPLAIN QUERY PLAN ' + str(query.compile(
+            db.engine, compile_kwargs={'literal_binds': True})))).all()
+        print('recipient query plan:', '; '.join(row[-1] for row in plan))
+
+        for channel in ('email', 'sms'):
+            tracemalloc.start()
+            started = time.perf_counter()
+            jobs, sent, failed = run_pending(app, channel)
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f'{channel:<5} {sent:>7} sent {failed} failed in {elapsed:6.1f}s '
+                  f'({sent / elapsed:7.0f}/s), heap peak {peak / 2**20:.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
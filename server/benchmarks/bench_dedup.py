@@ -0,0 +1,100 @@
+"""Time the near-duplicate lookup against a large synthetic incident table.
+
+Fills a scratch SQLite database with ``--rows`` incidents spread over
+Nairobi and the past ``--days`` days (with their LSH band rows), then times
+``find_duplicates`` for fresh reports.
+
+Usage (from the repository root)::
+
+    python -m server.benchmarks.bench_dedup --rows 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+WORDS = ('accident crash matatu lorry boda fire flood road highway bridge market '
+         'junction roundabout injured blocked burst pipe smoke traffic police '
+         'ambulance overturned collapsed building power outage protest').split()
+PLACES = ('thika waiyaki mombasa ngong jogoo langata kiambu outer ring '
+          'uhuru haile selassie moi kenyatta limuru kangundo').split()
+
+
+def fake_text(rng):
+    title = ' '.join(rng.sample(WORDS, 3) + rng.sample(PLACES, 2))
+    description = ' '.join(rng.choices(WORDS + PLACES, k=12))
+    return title, description
+
+
+def populate(db, rows, days, rng):
+    from server.models import User, IncidentReport, IncidentLSHBand
+    from server.utils.dedup import incident_shingles, minhash, band_hashes
+
+    db.session.add(User(username='bench', email='bench@example.com'))
+    db.session.commit()
+    now = datetime.utcnow()
+    incidents, bands = [], []
+    for incident_id in range(1, rows + 1):
+        title, description = fake_text(rng)
+        lat, lon = -1.28 + rng.uniform(-0.15, 0.15), 36.82 + rng.uniform(-0.15, 0.15)
+        created_at = now - timedelta(seconds=rng.uniform(0, days * 86400))
+        incidents.append({'id': incident_id, 'title': title, 'description': description,
+                          'latitude': lat, 'longitude': lon, 'created_at': created_at,
+                          'status': 'reported', 'user_id': 1})
+        for band_hash in band_hashes(minhash(incident_shingles(title, description))):
+            bands.append({'band_hash': band_hash, 'incident_id': incident_id,
+                          'created_at': created_at, 'latitude': lat, 'longitude': lon})
+        if len(incidents) >= 5000:
+            db.session.execute(IncidentReport.__table__.insert(), incidents)
+            db.session.execute(IncidentLSHBand.__table__.insert(), bands)
+            db.session.commit()
+            incidents, bands = [], []
+    if incidents:
+        db.session.execute(IncidentReport.__table__.insert(), incidents)
+        db.session.execute(IncidentLSHBand.__table__.insert(), bands)
+        db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--lookups', type=int, default=500)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'dedup-bench.db')
+    from server import create_app
+    from server.config import config
+    # The config classes read DATABASE_URL when the package is imported
+    config['development'].SQLALCHEMY_DATABASE_URI = f'sqlite:///{path}'
+    from server.models import db
+    from server.utils.dedup import find_duplicates
+
+    app = create_app('development')
+    app.config['SQLALCHEMY_ECHO'] = False
+    rng = random.Random(42)
+    with app.app_context():
+        db.engine.echo = False
+        db.create_all()
+        started = time.perf_counter()
+        populate(db, args.rows, args.days, rng)
+        print(f'populated {args.rows} incidents in {time.perf_counter() - started:.0f}s')
+
+        timings, found = [], 0
+        for _ in range(args.lookups):
+            title, description = fake_text(rng)
+            lat, lon = -1.28 + rng.uniform(-0.15, 0.15), 36.82 + rng.uniform(-0.15, 0.15)
+            started = time.perf_counter()
+            found += bool(find_duplicates(title, description, lat, lon))
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        print(f'find_duplicates: p50 {statistics.median(timings):.2f}ms, '
+              f'p99 {timings[int(len(timings) * 0.99) - 1]:.2f}ms '
+              f'({found}/{args.lookups} lookups found candidates)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Time matching incidents against a large table of area subscriptions.
+
+Fills a scratch SQLite database with ``--subscriptions`` circle and polygon
+subscriptions (most around Nairobi, the rest across Kenya, radii from
+300m to 5km) and their grid cells, then times ``match_subscriptions`` for
+random incidents with affected radii of 0 to 2km.
+
+Usage (from the repository root)::
+
+    python -m server.benchmarks.bench_geofence --subscriptions 1000000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+
+def random_position(rng):
+    if rng.random() < 0.7:
+        return -1.28 + rng.uniform(-0.25, 0.25), 36.82 + rng.uniform(-0.25, 0.25)
+    return rng.uniform(-4.7, 5.0), rng.uniform(33.9, 41.9)
+
+
+def populate(db, count, cell_deg, rng):
+    from server.models import User, AlertSubscription, SubscriptionCell
+    from server.utils.geofence import bounding_box, cells_for_bbox
+
+    users = [{'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com'}
+             for i in range(1, count // 2 + 1)]
+    for start in range(0, len(users), 50000):
+        db.session.execute(User.__table__.insert(), users[start:start + 50000])
+    subscriptions, cells = [], []
+    for subscription_id in range(1, count + 1):
+        lat, lon = random_position(rng)
+        row = {'id': subscription_id, 'user_id': rng.randint(1, len(users)), 'name': 'area',
+               'is_active': True, 'polygon': None, 'center_latitude': None,
+               'center_longitude': None, 'radius_m': None}
+        if rng.random() < 0.9:
+            radius = rng.uniform(300, 5000)
+            min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius)
+            row.update(kind='circle', center_latitude=lat, center_longitude=lon, radius_m=radius)
+        else:
+            half = rng.uniform(0.005, 0.03)
+            points = [[lat - half, lon - half], [lat - half, lon + half],
+                      [lat + half, lon + half], [lat + half, lon - half]]
+            min_lat, max_lat, min_lon, max_lon = lat - half, lat + half, lon - half, lon + half
+            row.update(kind='polygon', polygon=json.dumps(points))
+        row.update(min_latitude=min_lat, max_latitude=max_lat,
+                   min_longitude=min_lon, max_longitude=max_lon)
+        subscriptions.append(row)
+        cells.extend({'cell': cell, 'subscription_id': subscription_id}
+                     for cell in cells_for_bbox(min_lat, max_lat, min_lon, max_lon, cell_deg))
+        if len(subscriptions) >= 20000:
+            db.session.execute(AlertSubscription.__table__.insert(), subscriptions)
+            db.session.execute(SubscriptionCell.__table__.insert(), cells)
+            db.session.commit()
+            subscriptions, cells = [], []
+    if subscriptions:
+        db.session.execute(AlertSubscription.__table__.insert(), subscriptions)
+        db.session.execute(SubscriptionCell.__table__.insert(), cells)
+    db.session.commit()
+    return db.session.query(SubscriptionCell).count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subscriptions', type=int, default=200000)
+    parser.add_argument('--lookups', type=int, default=200)
+    parser.add_argument('--cell-deg', type=float, default=0.02)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'geofence-bench.db')
+    from server import create_app
+    from server.config import config
+    # The config classes read DATABASE_URL when the package is imported
+    config['development'].SQLALCHEMY_DATABASE_URI = f'sqlite:///{path}'
+    from server.models import db
+    from server.utils.geofence import match_subscriptions
+
+    app = create_app('development')
+    app.config['SQLALCHEMY_ECHO'] = False
+    rng = random.Random(42)
+    with app.app_context():
+        db.engine.echo = False
+        db.create_all()
+        started = time.perf_counter()
+        cells = populate(db, args.subscriptions, args.cell_deg, rng)
+        print(f'populated {args.subscriptions} subscriptions ({cells} cells) '
+              f'in {time.perf_counter() - started:.0f}s')
+
+        timings, matched = [], []
+        for _ in range(args.lookups):
+            lat, lon = random_position(rng)
+            radius = rng.choice((0, 0, 200, 500, 2000))
+            started = time.perf_counter()
+            matched.append(len(match_subscriptions(lat, lon, radius, args.cell_deg)))
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        print(f'match_subscriptions: p50 {statistics.median(timings):.1f}ms, '
+              f'p99 {timings[int(len(timings) * 0.99) - 1]:.1f}ms, '
+              f'max {timings[-1]:.1f}ms (median {statistics.median(matched):.0f} matches, '
+              f'max {max(matched)})')
+
+
+if __name__ == '__main__':
+    main()
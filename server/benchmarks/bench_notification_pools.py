@@ -0,0 +1,144 @@
+"""Compare per-message provider connections with the notification pools.
+
+A local SMTP stand-in and a fake SMS HTTP endpoint accept messages with an
+optional handshake delay, standing in for the TCP/TLS/AUTH round trips to a
+real provider. The "fresh" runs open a new SMTP session (as Flask-Mail's
+``mail.send`` does) or a new HTTP connection per message; the "pooled"
+runs go through ``SMTPConnectionPool.send_many`` and ``SMSClient``.
+
+Usage (from the repository root)::
+
+    python -m server.benchmarks.bench_notification_pools --messages 500 --handshake-ms 20
+"""
+import argparse
+import smtplib
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from server.utils.notification_pools import SMTPConnectionPool, SMSClient
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        time.sleep(self.server.handshake)
+        self.reply('220 stand-in ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command == 'DATA':
+                self.reply('354 go ahead')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                self.reply('250 queued')
+            elif command == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 ok')
+
+
+class _SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def _sms_handler(handshake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body are separate writes; don't let Nagle hold the body
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            time.sleep(handshake)  # Once per connection
+            super().setup()
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            body = b'{"sid": "SM1"}'
+            self.send_response(201)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+    return Handler
+
+
+def _report(name, count, elapsed):
+    print(f'{name:<14} {count:>6} msgs  {elapsed:7.2f}s  {count / elapsed:9.1f} msg/s')
+
+
+def bench_smtp(port, count):
+    message = 'Subject: Ajali!\r\n\r\nAn incident was reported near you.'
+    envelope = ('alerts@example.com', ['resident@example.com'], message)
+
+    start = time.perf_counter()
+    for _ in range(count):
+        with smtplib.SMTP('127.0.0.1', port, timeout=10) as smtp:
+            smtp.ehlo()
+            smtp.sendmail(*envelope)
+    _report('smtp fresh', count, time.perf_counter() - start)
+
+    pool = SMTPConnectionPool('127.0.0.1', port, timeout=10)
+    start = time.perf_counter()
+    for offset in range(0, count, 100):
+        results = pool.send_many([envelope] * min(100, count - offset))
+        assert all(ok for ok, _ in results)
+    _report('smtp pooled', count, time.perf_counter() - start)
+    print(f'{"":<14} pooled sessions opened: {pool.connects}')
+    pool.close()
+
+
+def bench_sms(port, count):
+    url = f'http://127.0.0.1:{port}'
+    data = {'To': '+254700000001', 'From': '+15550000000', 'Body': 'Ajali!'}
+
+    start = time.perf_counter()
+    for _ in range(count):
+        # New session per message, as a new twilio Client per send did
+        with requests.Session() as session:
+            session.post(f'{url}/2010-04-01/Accounts/AC1/Messages.json', data=data, timeout=10)
+    _report('sms fresh', count, time.perf_counter() - start)
+
+    client = SMSClient('AC1', 'token', '+15550000000', base_url=url)
+    start = time.perf_counter()
+    for _ in range(count):
+        assert client.send('+254700000001', 'Ajali!')
+    _report('sms pooled', count, time.perf_counter() - start)
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--handshake-ms', type=float, default=20,
+                        help='delay the stand-ins add to every new connection')
+    args = parser.parse_args()
+    handshake = args.handshake_ms / 1000
+
+    smtp_server = _SMTPServer(('127.0.0.1', 0), _SMTPHandler)
+    smtp_server.handshake = handshake
+    sms_server = ThreadingHTTPServer(('127.0.0.1', 0), _sms_handler(handshake))
+    for server in (smtp_server, sms_server):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        bench_smtp(smtp_server.server_address[1], args.messages)
+        bench_sms(sms_server.server_address[1], args.messages)
+    finally:
+        for server in (smtp_server, sms_server):
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    main()
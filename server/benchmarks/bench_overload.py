@@ -0,0 +1,126 @@
+"""Overload test: does incident creation survive a flood of listing reads?
+
+Starts the app under uvicorn (one worker, a small thread pool) with a slow
+listing endpoint and a critical report endpoint, then floods it with reads
+while a few clients keep reporting incidents. Runs once with admission
+control off and once with it on and prints, for each, how many reports
+succeeded and their latency, and how many reads were served or shed.
+
+Usage (from the repository root)::
+
+    python -m server.benchmarks.bench_overload --readers 64 --threads 8
+
+Requires uvicorn.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+from server.benchmarks.bench_slow_clients import _free_port, _wait_for_port, _read_response
+
+
+def create_bench_asgi_app():
+    from server import create_app
+    from server.utils.admission import criticality
+    from server.utils.asgi_utils import AsgiAdapter
+
+    app = create_app('testing')
+    delay = float(os.environ.get('BENCH_LIST_DELAY', 0.04))
+
+    @app.route('/bench/list')
+    def bench_list():
+        time.sleep(delay)  # stands in for a heavy listing query
+        return {'incidents': []}
+
+    @app.route('/bench/report', methods=['POST'])
+    @criticality('critical')
+    def bench_report():
+        time.sleep(0.005)
+        return {'id': 1}, 201
+
+    return AsgiAdapter(app, max_threads=app.config['ASGI_THREADS'])
+
+
+async def _request(port, method, path, timeout):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(f'{method} {path} HTTP/1.1\r\nHost: localhost\r\n'
+                     f'Content-Length: 0\r\nConnection: close\r\n\r\n'.encode())
+        return await asyncio.wait_for(_read_response(reader), timeout)
+    except asyncio.TimeoutError:
+        return None
+    finally:
+        writer.close()
+
+
+async def reader_client(port, stop_at, statuses):
+    while time.monotonic() < stop_at:
+        status = await _request(port, 'GET', '/bench/list', timeout=5)
+        statuses.append(status)
+        if status == 503:
+            await asyncio.sleep(0.01)
+
+
+async def reporter_client(port, stop_at, timeout, results):
+    while time.monotonic() < stop_at:
+        started = time.monotonic()
+        status = await _request(port, 'POST', '/bench/report', timeout)
+        results.append((status, time.monotonic() - started))
+        await asyncio.sleep(0.05)
+
+
+async def run_scenario(port, args):
+    stop_at = time.monotonic() + args.duration
+    reads, reports = [], []
+    await asyncio.gather(
+        *[reader_client(port, stop_at, reads) for _ in range(args.readers)],
+        *[reporter_client(port, stop_at, args.timeout, reports) for _ in range(args.reporters)]
+    )
+    ok = [latency for status, latency in reports if status == 201]
+    return {
+        'reports': len(reports),
+        'reports_ok': len(ok),
+        'report_p50_ms': statistics.median(ok) * 1000 if ok else None,
+        'report_p99_ms': sorted(ok)[max(0, int(len(ok) * 0.99) - 1)] * 1000 if ok else None,
+        'reads_ok': sum(1 for status in reads if status == 200),
+        'reads_shed': sum(1 for status in reads if status == 503),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=64, help='concurrent listing clients')
+    parser.add_argument('--reporters', type=int, default=4, help='concurrent reporting clients')
+    parser.add_argument('--timeout', type=float, default=1.0, help='report timeout in seconds')
+    parser.add_argument('--duration', type=float, default=5.0)
+    args = parser.parse_args()
+
+    for enabled in ('0', '1'):
+        port = _free_port()
+        env = dict(os.environ, ASGI_THREADS=str(args.threads), ADMISSION_ENABLED=enabled)
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', '--factory', '--port', str(port),
+             '--log-level', 'warning', 'server.benchmarks.bench_overload:create_bench_asgi_app'],
+            env=env
+        )
+        try:
+            asyncio.run(_wait_for_port(port))
+            result = asyncio.run(run_scenario(port, args))
+        finally:
+            server.terminate()
+            server.wait()
+
+        p50 = f"{result['report_p50_ms']:.0f}" if result['report_p50_ms'] is not None else '-'
+        p99 = f"{result['report_p99_ms']:.0f}" if result['report_p99_ms'] is not None else '-'
+        label = 'admission on ' if enabled == '1' else 'admission off'
+        print(f"{label}: reports {result['reports_ok']}/{result['reports']} ok "
+              f"(p50 {p50}ms, p99 {p99}ms), reads {result['reads_ok']} served, "
+              f"{result['reads_shed']} shed")
+
+
+if __name__ == '__main__':
+    main()
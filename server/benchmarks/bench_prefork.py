@@ -0,0 +1,183 @@
+"""Memory and boot cost of many gunicorn workers, with and without preloading.
+
+Starts gunicorn three ways with the same number of workers:
+
+* ``plain`` - ``server.app:create_app()`` without preloading: every worker
+  imports and builds the app itself
+* ``preload`` - the same with ``--preload``
+* ``tuned`` - ``server/gunicorn.conf.py`` and ``server.wsgi:app``: preloaded,
+  warmed, and forked from a frozen heap
+
+For each it waits until the server answers, sends authenticated cluster
+requests (ORM plus NumPy) from as many clients as there are workers, then
+reports the time to the first response, the CPU time spent by all
+processes, and memory: the workers' private memory (USS) and the
+proportional total (PSS) of master and workers together.
+
+Usage (from the repository root)::
+
+    python -m server.benchmarks.bench_prefork --workers 16 --requests 4000
+
+Linux only (reads /proc).
+"""
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from server.benchmarks.bench_slow_clients import _free_port
+
+MODES = ('plain', 'preload', 'tuned')
+
+
+def _command(mode, port, workers):
+    if mode == 'tuned':
+        return [sys.executable, '-m', 'gunicorn', '-c', 'server/gunicorn.conf.py',
+                '--bind', f'127.0.0.1:{port}', '--workers', str(workers), 'server.wsgi:app']
+    cmd = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+           '--workers', str(workers)]
+    if mode == 'preload':
+        cmd.append('--preload')
+    return cmd + ['server.app:create_app()']
+
+
+def _children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        return [int(child) for child in f.read().split()]
+
+
+def _memory(pid):
+    """(USS, PSS) in bytes."""
+    uss = pss = 0
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                uss += int(line.split()[1]) * 1024
+            elif line.startswith('Pss:'):
+                pss += int(line.split()[1]) * 1024
+    return uss, pss
+
+
+def _cpu_seconds(pid):
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def _get(port, path, headers=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        conn.request('GET', path, headers=headers or {})
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def _wait_until_settled(pids, quiet=0.5, timeout=60.0):
+    """Wait until the processes stop using CPU (workers done booting)."""
+    deadline = time.monotonic() + timeout
+    last = None
+    while time.monotonic() < deadline:
+        total = sum(_cpu_seconds(pid) for pid in pids)
+        if last is not None and total - last < 0.02:
+            return
+        last = total
+        time.sleep(quiet)
+
+
+def run(mode, workers, requests, db_path, token, secret):
+    port = _free_port()
+    env = dict(os.environ, FLASK_ENV='development', DATABASE_URL=f'sqlite:///{db_path}',
+               WEB_CONCURRENCY=str(workers), GUNICORN_ACCESS_LOG='/dev/null',
+               RATELIMIT_ENABLED='false', JWT_SECRET_KEY=secret, PYTHONPATH=os.getcwd())
+    started = time.perf_counter()
+    proc = subprocess.Popen(_command(mode, port, workers), env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                _get(port, '/')
+                break
+            except OSError:
+                if proc.poll() is not None:
+                    raise RuntimeError(f'gunicorn exited with {proc.returncode}')
+                time.sleep(0.02)
+        first_response = time.perf_counter() - started
+        while len(_children(proc.pid)) < workers:
+            time.sleep(0.05)
+        pids = _children(proc.pid)
+        _wait_until_settled([proc.pid] + pids)
+        boot_cpu = sum(_cpu_seconds(pid) for pid in [proc.pid] + pids)
+        idle = [_memory(pid) for pid in pids]
+
+        headers = {'Authorization': f'Bearer {token}'}
+        with ThreadPoolExecutor(workers) as pool:
+            statuses = list(pool.map(
+                lambda i: _get(port, f'/api/incidents/clusters?zoom={i % 12}', headers),
+                range(requests)))
+        busy = [_memory(pid) for pid in pids]
+        master_pss = _memory(proc.pid)[1]
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+    mib = 1024 * 1024
+    return {
+        'ok': statuses.count(200),
+        'first_response_s': first_response,
+        'boot_cpu_s': boot_cpu,
+        'idle_uss_mib': sum(uss for uss, _ in idle) / len(idle) / mib,
+        'busy_uss_mib': sum(uss for uss, _ in busy) / len(busy) / mib,
+        'total_pss_mib': (master_pss + sum(pss for _, pss in busy)) / mib,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=4000)
+    parser.add_argument('--incidents', type=int, default=5000)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        import random
+        from flask_jwt_extended import create_access_token
+        from server import create_app
+        from server.models import db, User, IncidentReport
+        os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+        from server.config import config
+        config['development'].SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}'
+        config['development'].SQLALCHEMY_ECHO = False
+        app = create_app('development')
+        with app.app_context():
+            db.create_all()
+            user = User(username='bench', email='bench@example.com', role='admin')
+            db.session.add(user)
+            db.session.flush()
+            rng = random.Random(7)
+            db.session.add_all(IncidentReport(
+                title=f'Incident {i}', description='Benchmark incident', user_id=user.id,
+                latitude=rng.uniform(-4.5, 4.5), longitude=rng.uniform(34.0, 41.5))
+                for i in range(args.incidents))
+            db.session.commit()
+            token = create_access_token(identity=user.id)
+        secret = app.config['JWT_SECRET_KEY']
+
+        print(f'{args.workers} workers, {args.requests} requests, {args.incidents} incidents')
+        print(f'{"mode":>8} {"1st resp s":>10} {"boot cpu s":>10} {"idle USS":>9} '
+              f'{"busy USS":>9} {"total PSS":>10} {"ok":>6}  (MiB per worker / MiB total)')
+        for mode in args.modes:
+            r = run(mode, args.workers, args.requests, db_path, token, secret)
+            print(f'{mode:>8} {r["first_response_s"]:10.2f} {r["boot_cpu_s"]:10.2f} '
+                  f'{r["idle_uss_mib"]:9.1f} {r["busy_uss_mib"]:9.1f} {r["total_pss_mib"]:10.1f} {r["ok"]:6}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Measure the per-request cost of the rate limiter.
+
+Times ``RateLimiter.check`` against the in-process and shared-memory stores
+(and Redis when ``--redis`` is given), then the end-to-end difference of a
+Flask request with and without the default limit applied. The limiter's own
+overhead should stay under 50µs per request.
+
+Usage (from the repository root)::
+
+    python -m server.benchmarks.bench_rate_limit --iterations 20000
+"""
+import argparse
+import os
+import tempfile
+import time
+from flask import Flask
+from server.utils.rate_limit import (
+    MemoryStore, SharedMemoryStore, RedisStore, RateLimiter, parse_limits, init_rate_limiting
+)
+
+BUDGET_US = 50.0
+
+
+def time_check(limiter, iterations, keys=1000):
+    limits = parse_limits('1000000 per second; 100000000 per day')
+    start = time.perf_counter()
+    for i in range(iterations):
+        limiter.check(limits, 'bench', f'ip10.0.{i % keys}')
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def time_requests(app, iterations, rounds=5):
+    # Best of several rounds; the test client itself is noisy
+    client = app.test_client()
+    client.get('/ping')
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(iterations // rounds):
+            client.get('/ping')
+        best = min(best, (time.perf_counter() - start) / (iterations // rounds) * 1e6)
+    return best
+
+
+def make_app(enabled, storage_url):
+    app = Flask(__name__)
+    app.config.update(RATELIMIT_ENABLED=enabled, RATELIMIT_STORAGE_URL=storage_url,
+                      RATELIMIT_DEFAULT='100000000 per minute')
+
+    @app.route('/ping')
+    def ping():
+        return 'ok'
+
+    init_rate_limiting(app)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--redis', help='redis:// URL to include the Redis store')
+    args = parser.parse_args()
+
+    shm_path = os.path.join(tempfile.mkdtemp(), 'bench-ratelimit')
+    stores = {'memory': MemoryStore(), 'shm': SharedMemoryStore(shm_path)}
+    if args.redis:
+        stores['redis'] = RedisStore(args.redis)
+
+    print('RateLimiter.check with two limits:')
+    results = {}
+    for name, store in stores.items():
+        results[name] = time_check(RateLimiter(store), args.iterations)
+        print(f'  {name:<8} {results[name]:8.2f} µs/check')
+
+    print('Flask request overhead of the default limit:')
+    baseline = time_requests(make_app(False, 'memory://'), args.iterations)
+    for url in ('memory://', f'shm://{shm_path}-app'):
+        overhead = time_requests(make_app(True, url), args.iterations) - baseline
+        results[url] = overhead
+        print(f'  {url.split(":")[0]:<8} {overhead:8.2f} µs/request (baseline {baseline:.1f} µs)')
+
+    local = [value for name, value in results.items() if name != 'redis']
+    verdict = 'OK' if max(local) < BUDGET_US else 'OVER BUDGET'
+    print(f'{verdict}: worst local overhead {max(local):.2f} µs (budget {BUDGET_US:.0f} µs)')
+
+
+if __name__ == '__main__':
+    main()
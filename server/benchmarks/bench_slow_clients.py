@@ -0,0 +1,172 @@
+"""Compare slow-client handling of sync gunicorn workers and the ASGI entry point.
+
+A set of "mobile" clients upload a body in small chunks with pauses between
+them while "fast" clients hammer a cheap endpoint. With sync workers every
+slow upload pins a whole worker until its last byte arrives, so the fast
+clients queue behind them. Under ``server.asgi`` the uploads are buffered on
+the event loop and only the finished request reaches a worker thread.
+
+Usage (from the repository root)::
+
+    python -m server.benchmarks.bench_slow_clients --workers 2 --slow 32
+
+Requires gunicorn and uvicorn.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+
+def create_bench_app():
+    """App factory used by the server processes this script launches."""
+    from flask import request
+    from server import create_app
+
+    app = create_app('testing')
+
+    @app.route('/bench/upload', methods=['POST'])
+    def bench_upload():
+        data = request.get_data()
+        return {'received': len(data)}
+
+    @app.route('/bench/ping')
+    def bench_ping():
+        return {'ok': True}
+
+    return app
+
+
+def create_bench_asgi_app():
+    from server.utils.asgi_utils import AsgiAdapter
+    return AsgiAdapter(create_bench_app())
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(mode, port, workers, threads):
+    if mode == 'sync':
+        cmd = [sys.executable, '-m', 'gunicorn', '--workers', str(workers),
+               '--worker-class', 'sync', '--bind', f'127.0.0.1:{port}',
+               '--log-level', 'warning',
+               'server.benchmarks.bench_slow_clients:create_bench_app()']
+    else:
+        cmd = [sys.executable, '-m', 'uvicorn', '--factory', '--workers', str(workers),
+               '--port', str(port), '--log-level', 'warning',
+               'server.benchmarks.bench_slow_clients:create_bench_asgi_app']
+    env = dict(os.environ, ASGI_THREADS=str(threads))
+    return subprocess.Popen(cmd, env=env)
+
+
+async def _wait_for_port(port, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+async def _read_response(reader):
+    status = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode().partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return int(status.split()[1])
+
+
+async def slow_upload(port, size, chunks, delay):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write((f'POST /bench/upload HTTP/1.1\r\nHost: localhost\r\n'
+                  f'Content-Type: application/octet-stream\r\n'
+                  f'Content-Length: {size}\r\nConnection: close\r\n\r\n').encode())
+    chunk = b'x' * (size // chunks)
+    for _ in range(chunks):
+        writer.write(chunk)
+        await writer.drain()
+        await asyncio.sleep(delay)
+    writer.write(b'x' * (size - len(chunk) * chunks))
+    status = await _read_response(reader)
+    writer.close()
+    return status
+
+
+async def fast_client(port, stop_at, latencies):
+    while time.monotonic() < stop_at:
+        start = time.monotonic()
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'GET /bench/ping HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n')
+        await _read_response(reader)
+        writer.close()
+        latencies.append(time.monotonic() - start)
+
+
+async def run_scenario(port, args):
+    latencies = []
+    started = time.monotonic()
+    stop_at = started + args.duration
+    uploads = [slow_upload(port, args.size, args.chunks, args.delay) for _ in range(args.slow)]
+    fast = [fast_client(port, stop_at, latencies) for _ in range(args.fast)]
+    results = await asyncio.gather(*uploads, *fast)
+    elapsed = time.monotonic() - started
+    statuses = results[:args.slow]
+    return {
+        'uploads_ok': sum(1 for status in statuses if status == 200),
+        'fast_requests': len(latencies),
+        'fast_rps': len(latencies) / args.duration,
+        'fast_p50_ms': statistics.median(latencies) * 1000 if latencies else None,
+        'fast_p99_ms': (sorted(latencies)[int(len(latencies) * 0.99) - 1] * 1000
+                        if latencies else None),
+        'elapsed_s': elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=32, help='ASGI worker threads')
+    parser.add_argument('--slow', type=int, default=32, help='concurrent slow uploads')
+    parser.add_argument('--fast', type=int, default=8, help='concurrent fast clients')
+    parser.add_argument('--size', type=int, default=256 * 1024, help='upload size in bytes')
+    parser.add_argument('--chunks', type=int, default=20)
+    parser.add_argument('--delay', type=float, default=0.1, help='pause between chunks')
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--modes', default='sync,asgi')
+    args = parser.parse_args()
+
+    for mode in args.modes.split(','):
+        port = _free_port()
+        server = _start_server(mode, port, args.workers, args.threads)
+        try:
+            asyncio.run(_wait_for_port(port))
+            result = asyncio.run(run_scenario(port, args))
+        finally:
+            server.terminate()
+            server.wait()
+
+        p50 = f"{result['fast_p50_ms']:.1f}" if result['fast_p50_ms'] is not None else '-'
+        p99 = f"{result['fast_p99_ms']:.1f}" if result['fast_p99_ms'] is not None else '-'
+        print(f"{mode:>5}: uploads {result['uploads_ok']}/{args.slow} "
+              f"in {result['elapsed_s']:.1f}s, fast {result['fast_rps']:.0f} req/s "
+              f"(p50 {p50}ms, p99 {p99}ms)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""Maintenance commands registered on the ``flask`` CLI."""
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+dedup_cli = AppGroup('dedup', help='Maintain the near-duplicate incident index.')
+
+
+@dedup_cli.command('rebuild')
+@click.option('--hours', type=int, default=None,
+              help='Re-index incidents from the last N hours (default: the retention period).')
+def dedup_rebuild(hours):
+    """Recompute band hashes for recent incidents."""
+    from .utils.dedup import rebuild_index
+    hours = hours or current_app.config.get('DEDUP_INDEX_RETENTION_HOURS', 168)
+    count = rebuild_index(datetime.utcnow() - timedelta(hours=hours))
+    click.echo(f'Indexed {count} incidents from the last {hours} hours.')
+
+
+@dedup_cli.command('prune')
+def dedup_prune():
+    """Drop index rows older than DEDUP_INDEX_RETENTION_HOURS."""
+    from .extensions import db
+    from .utils.dedup import prune_index
+    hours = current_app.config.get('DEDUP_INDEX_RETENTION_HOURS', 168)
+    removed = prune_index(datetime.utcnow() - timedelta(hours=hours))
+    db.session.commit()
+    click.echo(f'Removed {removed} index rows older than {hours} hours.')
+
+
+heatmap_cli = AppGroup('heatmap', help='Maintain the precomputed incident heatmap grids.')
+
+
+@heatmap_cli.command('rebuild')
+@click.option('--days', type=int, default=None,
+              help='Only rebuild the last N days (default: everything).')
+def heatmap_rebuild(days):
+    """Recompute day/category grids from the incidents table."""
+    from .extensions import db
+    from .utils.heatmap import grid_spec, rebuild
+    since = datetime.utcnow().date() - timedelta(days=days - 1) if days else None
+    written = rebuild(grid_spec(current_app.config), since)
+    db.session.commit()
+    click.echo(f'Wrote {written} heatmap grids' + (f' for the last {days} days.' if days else '.'))
+
+
+subscriptions_cli = AppGroup('subscriptions', help='Maintain the area subscription index.')
+
+
+@subscriptions_cli.command('reindex')
+def subscriptions_reindex():
+    """Recompute every subscription's grid cells (after changing SUBSCRIPTION_CELL_DEG)."""
+    from .extensions import db
+    from .utils.geofence import reindex_all
+    count = reindex_all(current_app.config.get('SUBSCRIPTION_CELL_DEG', 0.02))
+    db.session.commit()
+    click.echo(f'Re-indexed {count} subscriptions.')
+
+
+notifications_cli = AppGroup('notifications', help='Deliver queued notifications.')
+
+
+@notifications_cli.command('deliver')
+@click.option('--batch-size', type=int, default=100, show_default=True)
+@click.option('--loop', is_flag=True, help='Keep polling the outbox instead of exiting when empty.')
+@click.option('--interval', type=float, default=5.0, show_default=True,
+              help='Seconds to wait between polls with --loop.')
+def notifications_deliver(batch_size, loop, interval):
+    """Send due outbox messages, one digest per user and channel."""
+    import time
+    from .utils.outbox import deliver_pending
+    config = current_app.config
+    total_sent = total_failed = 0
+    while True:
+        sent, failed = deliver_pending(batch_size, config.get('NOTIFICATION_MAX_ATTEMPTS', 5),
+                                       config.get('NOTIFICATION_SMS_MAX_LENGTH', 480))
+        total_sent += sent
+        total_failed += failed
+        if not sent and not failed:
+            if not loop:
+                break
+            time.sleep(interval)
+    click.echo(f'Sent {total_sent} messages ({total_failed} failed attempts).')
+
+
+broadcasts_cli = AppGroup('broadcasts', help='Send emergency broadcasts.')
+
+
+@broadcasts_cli.command('run')
+@click.option('--channel', type=click.Choice(['email', 'sms']), default=None,
+              help='Only send this channel (run one worker per channel to send both at once).')
+@click.option('--loop', is_flag=True, help='Keep waiting for new broadcasts instead of exiting.')
+@click.option('--interval', type=float, default=5.0, show_default=True,
+              help='Seconds to wait between polls with --loop.')
+def broadcasts_run(channel, loop, interval):
+    """Send pending broadcasts and resume ones whose worker died."""
+    import time
+    from .utils.broadcast import run_pending
+    total_jobs = total_sent = total_failed = 0
+    while True:
+        jobs, sent, failed = run_pending(current_app._get_current_object(), channel)
+        total_jobs += jobs
+        total_sent += sent
+        total_failed += failed
+        if not loop:
+            break
+        if not jobs:
+            time.sleep(interval)
+    click.echo(f'Ran {total_jobs} broadcast jobs: {total_sent} sent, {total_failed} failed.')
+
+
+activities_cli = AppGroup('activities', help='Maintain the monthly activity log partitions.')
+
+
+@activities_cli.command('maintain')
+@click.option('--retention-months', type=int, default=None,
+              help='Keep this many whole months (default: ACTIVITY_RETENTION_MONTHS, 0 keeps all).')
+@click.option('--archive/--drop', default=None,
+              help='Rename expired partitions instead of dropping them (default: ACTIVITY_ARCHIVE).')
+def activities_maintain(retention_months, archive):
+    """Partition the activity log, add due partitions and apply retention."""
+    from .extensions import db
+    from .utils.activity_partitions import apply_retention, maintain_partitions
+    config = current_app.config
+    if retention_months is None:
+        retention_months = config.get('ACTIVITY_RETENTION_MONTHS', 12)
+    if archive is None:
+        archive = config.get('ACTIVITY_ARCHIVE', False)
+    with db.engine.begin() as connection:
+        created = maintain_partitions(
+            connection, premake=config.get('ACTIVITY_PARTITION_PREMAKE_MONTHS', 2))
+        expired = apply_retention(connection, retention_months, archive)
+    for name in created:
+        click.echo(f'Created {name}')
+    for name in expired:
+        click.echo(f'{"Archived" if archive else "Dropped"} {name}')
+    click.echo(f'Created {len(created)} partitions, {"archived" if archive else "dropped"} '
+               f'{len(expired)} older than {retention_months} months.')
+
+
+incidents_cli = AppGroup('incidents', help='Maintain the incident tables.')
+
+
+@incidents_cli.command('archive')
+@click.option('--days', type=int, default=None,
+              help='Archive incidents resolved more than N days ago '
+                   '(default: INCIDENT_ARCHIVE_AFTER_DAYS).')
+def incidents_archive(days):
+    """Move old resolved incidents into compressed archive segments."""
+    from .utils.incident_archive import archive_resolved
+    config = current_app.config
+    days = days if days is not None else config.get('INCIDENT_ARCHIVE_AFTER_DAYS', 90)
+    archived, segments = archive_resolved(datetime.utcnow() - timedelta(days=days),
+                                          config.get('INCIDENT_ARCHIVE_SEGMENT_SIZE', 500))
+    click.echo(f'Archived {archived} incidents resolved more than {days} days ago '
+               f'in {segments} segments.')
+
+
+@incidents_cli.command('repair-comment-counts')
+@click.option('--batch-size', type=int, default=1000, show_default=True,
+              help='Incident ids checked per transaction.')
+def incidents_repair_comment_counts(batch_size):
+    """Recount comments where the stored counters drifted."""
+    from .utils.comment_counts import repair_comment_counts
+    repaired = repair_comment_counts(batch_size)
+    click.echo(f'Repaired comment counters on {repaired} incidents.')
+
+
+@incidents_cli.command('rebuild-status-rollups')
+@click.option('--days', type=int, default=None,
+              help='Only rebuild the last N days (default: everything).')
+def incidents_rebuild_status_rollups(days):
+    """Recompute the daily status-time histograms from the status history."""
+    from .extensions import db
+    from .utils.status_history import rebuild_rollups
+    since = datetime.utcnow().date() - timedelta(days=days - 1) if days else None
+    written = rebuild_rollups(since)
+    db.session.commit()
+    click.echo(f'Wrote {written} status rollups' + (f' for the last {days} days.' if days else '.'))
+
+
+@click.command('import-time')
+@click.option('--config', 'config_name', default=None,
+              help='Configuration to boot (default: FLASK_ENV, as create_app does).')
+@click.option('--top', type=int, default=20, show_default=True,
+              help='Number of modules to list, slowest first.')
+@click.option('--budget', type=float, default=None,
+              help='Fail if create_app() takes longer than this many seconds.')
+def import_time(config_name, top, budget):
+    """Profile the app's boot in a fresh interpreter."""
+    import os
+    from .utils.import_profile import profile_startup
+    profile = profile_startup(config_name or os.environ.get('FLASK_ENV', 'default'))
+    click.echo(f'{"cumulative ms":>14} {"self ms":>9}  module')
+    for row in sorted(profile.modules, key=lambda row: row.cumulative_us, reverse=True)[:top]:
+        click.echo(f'{row.cumulative_us / 1000:14.1f} {row.self_us / 1000:9.1f}  '
+                   f'{"  " * row.depth}{row.name}')
+    click.echo(f'Imports took {profile.import_us / 1e6:.3f}s; '
+               f'create_app() returned after {profile.boot_seconds:.3f}s.')
+    if budget is not None and profile.boot_seconds > budget:
+        raise click.ClickException(f'Boot took longer than the {budget:.3f}s budget.')
+
+
+def register_commands(app):
+    """Attach the maintenance commands to the app."""
+    app.cli.add_command(dedup_cli)
+    app.cli.add_command(heatmap_cli)
+    app.cli.add_command(subscriptions_cli)
+    app.cli.add_command(notifications_cli)
+    app.cli.add_command(broadcasts_cli)
+    app.cli.add_command(activities_cli)
+    app.cli.add_command(incidents_cli)
+    app.cli.add_command(import_time)
@@ -4,13 +4,62 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+def _env_bool(name, default=False):
+    """Read a boolean flag from the environment."""
+    return str(os.environ.get(name, default)).lower() in ('1', 'true', 'yes', 'on')
+
+def _pool_options(prefix='DB'):
+    """Build SQLAlchemy connection pool options from ``<prefix>_*`` env vars."""
+    return {
+        'pool_size': int(os.environ.get(f'{prefix}_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get(f'{prefix}_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.environ.get(f'{prefix}_POOL_TIMEOUT', 10)),
+        'pool_recycle': int(os.environ.get(f'{prefix}_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': _env_bool(f'{prefix}_POOL_PRE_PING', True),
+    }
+
+def _replica_binds():
+    """Return the read-replica bind if DATABASE_REPLICA_URL is set."""
+    replica_url = os.environ.get('DATABASE_REPLICA_URL')
+    if not replica_url:
+        return {}
+    return {'replica': {'url': replica_url, **_pool_options('DB_REPLICA')}}
+
 class Config:
     """Base configuration."""
     # Basic Flask config
     SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-here')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///app.db')
+    SQLALCHEMY_ENGINE_OPTIONS = {'pool_pre_ping': True}
+    SQLALCHEMY_BINDS = _replica_binds()
+    DB_REPLICA_HEALTH_INTERVAL = int(os.environ.get('DB_REPLICA_HEALTH_INTERVAL', 5))
+    DB_REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 5))
+
+    # SQLite engine profile (ignored for other databases)
+    SQLITE_PRAGMAS_ENABLED = _env_bool('SQLITE_PRAGMAS_ENABLED', True)
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 20000))
+    SQLITE_WRITE_LOCK = _env_bool('SQLITE_WRITE_LOCK', True)
+    SQLITE_WRITE_LOCK_TIMEOUT = float(os.environ.get('SQLITE_WRITE_LOCK_TIMEOUT', 30))
+
+    # Connection pool instrumentation
+    DB_POOL_INSTRUMENTATION = _env_bool('DB_POOL_INSTRUMENTATION', False)
+    DB_POOL_WAIT_WARN_MS = float(os.environ.get('DB_POOL_WAIT_WARN_MS', 100))
     
+    # Threads that run Flask views when served through server.asgi
+    ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 32))
+
+    # Load shedding: reads go first, incident creation is never shed
+    ADMISSION_ENABLED = _env_bool('ADMISSION_ENABLED', True)
+    ADMISSION_MAX_INFLIGHT = int(os.environ.get('ADMISSION_MAX_INFLIGHT', ASGI_THREADS))
+    ADMISSION_LOW_DELAY_MS = float(os.environ.get('ADMISSION_LOW_DELAY_MS', 100))
+    ADMISSION_NORMAL_DELAY_MS = float(os.environ.get('ADMISSION_NORMAL_DELAY_MS', 500))
+    ADMISSION_DEFER_MS = float(os.environ.get('ADMISSION_DEFER_MS', 50))
+
     # Cloudinary settings
     CLOUDINARY_CLOUD_NAME = os.environ.get('CLOUDINARY_CLOUD_NAME', 'dpx7kstwf')
     CLOUDINARY_API_KEY = os.environ.get('CLOUDINARY_API_KEY', '826333217155912')
@@ -20,6 +69,16 @@ class Config:
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your-jwt-secret-key')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(days=1)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+    # Revoked token ids: memory://, shm://[/path] or redis://... (see utils/revocation.py)
+    JWT_REVOCATION_STORAGE_URL = os.environ.get('JWT_REVOCATION_STORAGE_URL', 'memory://')
+    JWT_REVOCATION_SLOTS = int(os.environ.get('JWT_REVOCATION_SLOTS', 65536))
+    JWT_REVOCATION_BLOOM_CAPACITY = int(os.environ.get('JWT_REVOCATION_BLOOM_CAPACITY', 100000))
+    JWT_REVOCATION_SYNC_SECONDS = float(os.environ.get('JWT_REVOCATION_SYNC_SECONDS', 2))
+    # Failed logins, counted per username and IP over a sliding window
+    LOGIN_MAX_FAILURES = int(os.environ.get('LOGIN_MAX_FAILURES', 5))
+    LOGIN_IP_MAX_FAILURES = int(os.environ.get('LOGIN_IP_MAX_FAILURES', 50))
+    LOGIN_FAILURE_WINDOW = int(os.environ.get('LOGIN_FAILURE_WINDOW', 900))
+    LOGIN_LOCKOUT_MINUTES = int(os.environ.get('LOGIN_LOCKOUT_MINUTES', 15))
     
     # AWS S3 settings for file uploads
     AWS_ACCESS_KEY = os.environ.get('AWS_ACCESS_KEY')
@@ -30,15 +89,23 @@ class Config:
     # Email settings
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
     MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
-    MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', True)
+    MAIL_USE_TLS = _env_bool('MAIL_USE_TLS', True)
+    MAIL_USE_SSL = _env_bool('MAIL_USE_SSL', False)
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', 'noreply@kenyaalertnow.com')
+    # Pooled SMTP sessions (per worker process)
+    MAIL_POOL_SIZE = int(os.environ.get('MAIL_POOL_SIZE', 4))
+    MAIL_POOL_IDLE_TIMEOUT = int(os.environ.get('MAIL_POOL_IDLE_TIMEOUT', 60))
+    MAIL_POOL_MAX_MESSAGES = int(os.environ.get('MAIL_POOL_MAX_MESSAGES', 500))
     
     # SMS settings (Twilio)
     TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID')
     TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN')
     TWILIO_PHONE_NUMBER = os.environ.get('TWILIO_PHONE_NUMBER')
+    TWILIO_API_BASE = os.environ.get('TWILIO_API_BASE', 'https://api.twilio.com')
+    SMS_POOL_SIZE = int(os.environ.get('SMS_POOL_SIZE', 10))
+    NOTIFICATION_TIMEOUT = float(os.environ.get('NOTIFICATION_TIMEOUT', 10))
     
     # Security settings
     SECURITY_PASSWORD_SALT = os.environ.get('SECURITY_PASSWORD_SALT', 'your-salt-here')
@@ -50,9 +117,48 @@ class Config:
     SECURITY_RECOVERABLE = True
     SECURITY_CHANGEABLE = True
     
-    # Rate limiting
-    RATELIMIT_DEFAULT = "100 per day"
-    RATELIMIT_STORAGE_URL = "memory://"
+    # Rate limiting (storage: memory://, shm://[/path] or redis://...)
+    RATELIMIT_ENABLED = _env_bool('RATELIMIT_ENABLED', True)
+    RATELIMIT_DEFAULT = os.environ.get('RATELIMIT_DEFAULT', "300 per minute")
+    RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL', "memory://")
+    RATELIMIT_SHM_SLOTS = int(os.environ.get('RATELIMIT_SHM_SLOTS', 65536))
+    RATELIMIT_PROXY_HOPS = int(os.environ.get('RATELIMIT_PROXY_HOPS', 0))
+    
+    # Near-duplicate detection when incidents are reported
+    DEDUP_ENABLED = _env_bool('DEDUP_ENABLED', True)
+    DEDUP_RADIUS_M = float(os.environ.get('DEDUP_RADIUS_M', 500))
+    DEDUP_WINDOW_MINUTES = int(os.environ.get('DEDUP_WINDOW_MINUTES', 60))
+    DEDUP_MIN_SIMILARITY = float(os.environ.get('DEDUP_MIN_SIMILARITY', 0.5))
+    DEDUP_AUTO_LINK = _env_bool('DEDUP_AUTO_LINK', False)
+    DEDUP_AUTO_LINK_SIMILARITY = float(os.environ.get('DEDUP_AUTO_LINK_SIMILARITY', 0.8))
+    DEDUP_INDEX_RETENTION_HOURS = int(os.environ.get('DEDUP_INDEX_RETENTION_HOURS', 168))
+    
+    # Map clustering
+    CLUSTER_MAX_ZOOM = int(os.environ.get('CLUSTER_MAX_ZOOM', 16))
+    CLUSTER_CELL_PX = int(os.environ.get('CLUSTER_CELL_PX', 64))
+    CLUSTER_CACHE_SIZE = int(os.environ.get('CLUSTER_CACHE_SIZE', 32))
+    CLUSTER_CACHE_TTL = int(os.environ.get('CLUSTER_CACHE_TTL', 30))
+    
+    # Vector tiles (clusters up to MVT_CLUSTER_MAX_ZOOM, points beyond)
+    MVT_CLUSTER_MAX_ZOOM = int(os.environ.get('MVT_CLUSTER_MAX_ZOOM', 11))
+    MVT_CACHE_SIZE = int(os.environ.get('MVT_CACHE_SIZE', 2048))
+    MVT_CACHE_TTL = int(os.environ.get('MVT_CACHE_TTL', 60))
+    
+    # Density heatmaps (bbox is west,south,east,north; Kenya by default)
+    HEATMAP_ENABLED = _env_bool('HEATMAP_ENABLED', True)
+    HEATMAP_BBOX = os.environ.get('HEATMAP_BBOX', "33.9,-4.7,41.9,5.0")
+    HEATMAP_CELL_DEG = float(os.environ.get('HEATMAP_CELL_DEG', 0.02))
+    HEATMAP_MAX_DAYS = int(os.environ.get('HEATMAP_MAX_DAYS', 366))
+    
+    # Area alert subscriptions (indexed on a grid of SUBSCRIPTION_CELL_DEG cells;
+    # run `flask subscriptions reindex` after changing it)
+    SUBSCRIPTIONS_ENABLED = _env_bool('SUBSCRIPTIONS_ENABLED', True)
+    SUBSCRIPTION_CELL_DEG = float(os.environ.get('SUBSCRIPTION_CELL_DEG', 0.02))
+    SUBSCRIPTION_MAX_CELLS = int(os.environ.get('SUBSCRIPTION_MAX_CELLS', 2500))
+    SUBSCRIPTION_MAX_PER_USER = int(os.environ.get('SUBSCRIPTION_MAX_PER_USER', 10))
+    SUBSCRIPTION_MAX_POLYGON_POINTS = int(os.environ.get('SUBSCRIPTION_MAX_POLYGON_POINTS', 200))
+    # Largest affected_area_radius a report may claim, in metres
+    INCIDENT_MAX_AFFECTED_RADIUS_M = float(os.environ.get('INCIDENT_MAX_AFFECTED_RADIUS_M', 50000))
     
     # File upload settings
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
@@ -61,6 +167,40 @@ class Config:
     # Notification settings
     NOTIFICATION_ENABLED = True
     NOTIFICATION_ASYNC = True
+    NOTIFICATION_MAX_ATTEMPTS = int(os.environ.get('NOTIFICATION_MAX_ATTEMPTS', 5))
+    # Status changes wait this long in the outbox to be merged into one digest
+    NOTIFICATION_COALESCE_SECONDS = int(os.environ.get('NOTIFICATION_COALESCE_SECONDS', 300))
+    NOTIFICATION_SMS_MAX_LENGTH = int(os.environ.get('NOTIFICATION_SMS_MAX_LENGTH', 480))
+    FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:5173')
+    
+    # Emergency broadcasts: provider send rates (RATELIMIT_DEFAULT syntax),
+    # shared through RATELIMIT_STORAGE_URL by every broadcast worker
+    BROADCAST_EMAIL_RATE = os.environ.get('BROADCAST_EMAIL_RATE', '100 per second')
+    BROADCAST_SMS_RATE = os.environ.get('BROADCAST_SMS_RATE', '100 per second')
+    BROADCAST_CHUNK_SIZE = int(os.environ.get('BROADCAST_CHUNK_SIZE', 500))
+    BROADCAST_SMS_CONCURRENCY = int(os.environ.get('BROADCAST_SMS_CONCURRENCY', 16))
+    BROADCAST_LEASE_SECONDS = int(os.environ.get('BROADCAST_LEASE_SECONDS', 120))
+    
+    # User activity log: monthly partitions kept for ACTIVITY_RETENTION_MONTHS
+    # (0 keeps everything); expired months are dropped, or renamed to
+    # user_activities_archive_YYYYMM with ACTIVITY_ARCHIVE
+    ACTIVITY_RETENTION_MONTHS = int(os.environ.get('ACTIVITY_RETENTION_MONTHS', 12))
+    ACTIVITY_ARCHIVE = _env_bool('ACTIVITY_ARCHIVE', False)
+    ACTIVITY_PARTITION_PREMAKE_MONTHS = int(os.environ.get('ACTIVITY_PARTITION_PREMAKE_MONTHS', 2))
+    ACTIVITY_PARTITION_CACHE_SECONDS = int(os.environ.get('ACTIVITY_PARTITION_CACHE_SECONDS', 60))
+    
+    # Incidents resolved more than INCIDENT_ARCHIVE_AFTER_DAYS ago are moved
+    # into compressed archive segments of INCIDENT_ARCHIVE_SEGMENT_SIZE by
+    # `flask incidents archive`; each process keeps the most recently read
+    # INCIDENT_ARCHIVE_CACHED_SEGMENTS decoded
+    INCIDENT_ARCHIVE_AFTER_DAYS = int(os.environ.get('INCIDENT_ARCHIVE_AFTER_DAYS', 90))
+    INCIDENT_ARCHIVE_SEGMENT_SIZE = int(os.environ.get('INCIDENT_ARCHIVE_SEGMENT_SIZE', 500))
+    INCIDENT_ARCHIVE_CACHED_SEGMENTS = int(os.environ.get('INCIDENT_ARCHIVE_CACHED_SEGMENTS', 32))
+    
+    # Status changes are kept in incident_status_events and summed into daily
+    # time-in-status/time-to-resolve histograms for the SLA analytics
+    STATUS_ROLLUPS_ENABLED = _env_bool('STATUS_ROLLUPS_ENABLED', True)
+    STATUS_ANALYTICS_MAX_DAYS = int(os.environ.get('STATUS_ANALYTICS_MAX_DAYS', 366))
     
     # Logging
     LOG_TO_STDOUT = os.environ.get('LOG_TO_STDOUT', False)
@@ -68,6 +208,13 @@ class Config:
     LOG_FILE = 'logs/app.log'
     LOG_LEVEL = 'INFO'
     
+    # Response compression
+    COMPRESS_ENABLED = _env_bool('COMPRESS_ENABLED', True)
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 500))
+    COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))
+    COMPRESS_CACHE_MAX_BYTES = int(os.environ.get('COMPRESS_CACHE_MAX_BYTES', 8 * 1024 * 1024))
+    
     # Cache settings
     CACHE_TYPE = 'simple'
     CACHE_DEFAULT_TIMEOUT = 300
@@ -95,11 +242,14 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///test.db'
     WTF_CSRF_ENABLED = False
+    RATELIMIT_ENABLED = False
 
 class ProductionConfig(Config):
     """Production configuration."""
     DEBUG = False
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
+    SQLALCHEMY_ENGINE_OPTIONS = _pool_options('DB')
+    DB_POOL_INSTRUMENTATION = _env_bool('DB_POOL_INSTRUMENTATION', True)
     SECURITY_PASSWORD_SALT = os.environ.get('SECURITY_PASSWORD_SALT')
     
     # Production-specific settings
@@ -109,8 +259,10 @@ class ProductionConfig(Config):
     SESSION_COOKIE_HTTPONLY = True
     REMEMBER_COOKIE_HTTPONLY = True
     
-    # Stricter rate limiting
-    RATELIMIT_DEFAULT = "50 per day"
+    # Stricter rate limiting, shared by all workers on the host
+    RATELIMIT_DEFAULT = os.environ.get('RATELIMIT_DEFAULT', "120 per minute")
+    RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL', "shm://")
+    JWT_REVOCATION_STORAGE_URL = os.environ.get('JWT_REVOCATION_STORAGE_URL', 'shm://')
     
     # Production logging
     LOG_TO_STDOUT = True
@@ -4,10 +4,15 @@ from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from flask_mail import Mail
 from flask_migrate import Migrate
-import cloudinary
+from .utils.db_utils import configure_engine_options
+from .utils.db_routing import RoutingSession, init_db_routing
+from .utils.sqlite_utils import init_sqlite
+from .utils.rate_limit import init_rate_limiting
+from .utils.admission import init_admission_control
+from .utils.revocation import init_token_revocation, is_jti_revoked
 
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 bcrypt = Bcrypt()
 jwt = JWTManager()
 cors = CORS()
@@ -16,19 +21,19 @@ migrate = Migrate()
 
 def init_extensions(app):
     """Initialize Flask extensions."""
+    # First, so shed requests skip every other hook
+    init_admission_control(app)
+    configure_engine_options(app)
     db.init_app(app)
+    init_db_routing(app)
+    init_sqlite(app, db)
     bcrypt.init_app(app)
     jwt.init_app(app)
     cors.init_app(app, resources={r"/api/*": {"origins": app.config.get("CORS_ORIGINS", ["http://localhost:5173"])}} , supports_credentials=True)
     mail.init_app(app)
     migrate.init_app(app, db)
-
-    # Initialize Cloudinary
-    cloudinary.config(
-        cloud_name=app.config['CLOUDINARY_CLOUD_NAME'],
-        api_key=app.config['CLOUDINARY_API_KEY'],
-        api_secret=app.config['CLOUDINARY_API_SECRET']
-    )
+    init_rate_limiting(app)
+    init_token_revocation(app)
 
     # JWT configuration
     @jwt.user_identity_loader
@@ -43,4 +48,9 @@ def init_extensions(app):
         identity = jwt_data["sub"]
         return User.query.filter_by(id=identity).one_or_none()
 
+    @jwt.token_in_blocklist_loader
+    def check_if_token_revoked(_jwt_header, jwt_data):
+        jti = jwt_data.get('jti')
+        return jti is not None and is_jti_revoked(jti)
+
     return app
@@ -0,0 +1,65 @@
+"""gunicorn settings for ``server.wsgi:app``.
+
+Every setting can be overridden from the environment:
+
+* ``WEB_CONCURRENCY`` - worker processes (default: 2 per CPU + 1)
+* ``GUNICORN_THREADS`` - threads per worker (default 1, sync workers)
+* ``PORT`` / ``GUNICORN_BIND`` - listen address (default ``0.0.0.0:5000``)
+* ``GUNICORN_TIMEOUT`` - seconds before a silent worker is killed
+* ``GUNICORN_MAX_REQUESTS`` / ``GUNICORN_MAX_REQUESTS_JITTER`` - recycle a
+  worker after this many requests, plus up to the jitter
+* ``WORKER_MAX_MEMORY_MB`` - recycle a worker whose private memory (pages
+  no longer shared with the master) passes this, ``0`` to disable;
+  ``WORKER_MEMORY_JITTER`` spreads the limit per worker and
+  ``WORKER_MEMORY_CHECK_EVERY`` sets how many requests apart it is read
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10))
+
+# Build the app once in the master; workers inherit it copy-on-write
+preload_app = True
+# Heartbeat files on tmpfs, so a slow disk cannot get workers killed
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+_max_memory_mb = float(os.environ.get('WORKER_MAX_MEMORY_MB', 512))
+_memory_jitter = float(os.environ.get('WORKER_MEMORY_JITTER', 0.1))
+_memory_check_every = int(os.environ.get('WORKER_MEMORY_CHECK_EVERY', 100))
+
+
+def when_ready(server):
+    server.log.info('App preloaded; forking %s workers', server.num_workers)
+
+
+def pre_fork(server, worker):
+    from server.utils.prefork import freeze_heap
+    freeze_heap()
+
+
+def post_fork(server, worker):
+    from server.wsgi import app
+    from server.utils.prefork import MemoryRecycler, after_fork
+    after_fork(app)
+    worker.memory_recycler = MemoryRecycler(
+        _max_memory_mb * 1024 * 1024, jitter=_memory_jitter, check_every=_memory_check_every)
+
+
+def post_request(worker, req, environ, resp):
+    recycler = getattr(worker, 'memory_recycler', None)
+    if recycler is not None and recycler.should_recycle():
+        worker.log.info('Worker %s passed %d MiB of private memory; restarting',
+                        worker.pid, recycler.limit // (1024 * 1024))
+        # Finish this request, then exit; the master starts a replacement
+        worker.alive = False
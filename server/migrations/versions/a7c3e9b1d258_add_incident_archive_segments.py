@@ -0,0 +1,41 @@
+"""Add incident archive segments
+
+Revision ID: a7c3e9b1d258
+Revises: f2b9d6a4c813
+Create Date: 2026-10-19 16:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e9b1d258'
+down_revision = 'f2b9d6a4c813'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('incident_archive_segments',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('first_id', sa.Integer(), nullable=False),
+    sa.Column('last_id', sa.Integer(), nullable=False),
+    sa.Column('first_created_at', sa.DateTime(), nullable=True),
+    sa.Column('last_created_at', sa.DateTime(), nullable=True),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('incident_archive_segments', schema=None) as batch_op:
+        batch_op.create_index('ix_incident_archive_segments_ids', ['first_id', 'last_id'], unique=False)
+        batch_op.create_index('ix_incident_archive_segments_created', ['first_created_at', 'last_created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('incident_archive_segments', schema=None) as batch_op:
+        batch_op.drop_index('ix_incident_archive_segments_created')
+        batch_op.drop_index('ix_incident_archive_segments_ids')
+
+    op.drop_table('incident_archive_segments')
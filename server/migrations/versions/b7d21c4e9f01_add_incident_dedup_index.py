@@ -0,0 +1,50 @@
+"""Add near-duplicate index and duplicate_of link
+
+Revision ID: b7d21c4e9f01
+Revises: 63a0670e0b5a
+Create Date: 2026-10-19 09:12:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d21c4e9f01'
+down_revision = '63a0670e0b5a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('incident_lsh_bands',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('band_hash', sa.BigInteger(), nullable=False),
+    sa.Column('incident_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('latitude', sa.Float(), nullable=False),
+    sa.Column('longitude', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['incident_id'], ['incident_reports.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('incident_lsh_bands', schema=None) as batch_op:
+        batch_op.create_index('ix_incident_lsh_bands_hash_created', ['band_hash', 'created_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_incident_lsh_bands_incident_id'), ['incident_id'], unique=False)
+
+    with op.batch_alter_table('incident_reports', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('duplicate_of', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_incident_reports_duplicate_of'), ['duplicate_of'], unique=False)
+        batch_op.create_foreign_key('fk_incident_reports_duplicate_of', 'incident_reports', ['duplicate_of'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('incident_reports', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_incident_reports_duplicate_of', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_incident_reports_duplicate_of'))
+        batch_op.drop_column('duplicate_of')
+
+    with op.batch_alter_table('incident_lsh_bands', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_incident_lsh_bands_incident_id'))
+        batch_op.drop_index('ix_incident_lsh_bands_hash_created')
+
+    op.drop_table('incident_lsh_bands')
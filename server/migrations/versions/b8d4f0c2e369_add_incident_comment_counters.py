@@ -0,0 +1,54 @@
+"""Add comment counters to incidents
+
+Revision ID: b8d4f0c2e369
+Revises: a7c3e9b1d258
+Create Date: 2026-10-19 17:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d4f0c2e369'
+down_revision = 'a7c3e9b1d258'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('incident_reports', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('last_comment_at', sa.DateTime(), nullable=True))
+
+    # Backfill from the existing comments
+    op.execute(
+        'UPDATE incident_reports SET '
+        'comment_count = (SELECT count(*) FROM incident_comments c '
+        'WHERE c.incident_id = incident_reports.id), '
+        'last_comment_at = (SELECT max(c.created_at) FROM incident_comments c '
+        'WHERE c.incident_id = incident_reports.id) '
+        'WHERE EXISTS (SELECT 1 FROM incident_comments c WHERE c.incident_id = incident_reports.id)'
+    )
+
+    with op.batch_alter_table('incident_reports', schema=None) as batch_op:
+        batch_op.create_index('ix_incident_reports_comment_count', ['comment_count', 'id'], unique=False)
+    if op.get_bind().dialect.name == 'postgresql':
+        op.create_index('ix_incident_reports_last_comment_at_desc', 'incident_reports',
+                        [sa.text('last_comment_at DESC NULLS LAST'), sa.text('id DESC')], unique=False)
+    else:
+        with op.batch_alter_table('incident_reports', schema=None) as batch_op:
+            batch_op.create_index('ix_incident_reports_last_comment_at', ['last_comment_at', 'id'], unique=False)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_incident_reports_last_comment_at_desc', table_name='incident_reports')
+    else:
+        with op.batch_alter_table('incident_reports', schema=None) as batch_op:
+            batch_op.drop_index('ix_incident_reports_last_comment_at')
+
+    with op.batch_alter_table('incident_reports', schema=None) as batch_op:
+        batch_op.drop_index('ix_incident_reports_comment_count')
+        batch_op.drop_column('last_comment_at')
+        batch_op.drop_column('comment_count')
@@ -0,0 +1,36 @@
+"""Add heatmap grids
+
+Revision ID: c3e8a5d0b412
+Revises: b7d21c4e9f01
+Create Date: 2026-10-19 10:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e8a5d0b412'
+down_revision = 'b7d21c4e9f01'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('heatmap_grids',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('category_key', sa.Integer(), nullable=False),
+    sa.Column('rows', sa.Integer(), nullable=False),
+    sa.Column('cols', sa.Integer(), nullable=False),
+    sa.Column('counts', sa.LargeBinary(), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('day', 'category_key', name='uq_heatmap_grids_day_category')
+    )
+
+
+def downgrade():
+    op.drop_table('heatmap_grids')
@@ -0,0 +1,60 @@
+"""Add incident status history and rollups
+
+Revision ID: c9e5a1d3f470
+Revises: b8d4f0c2e369
+Create Date: 2026-10-19 19:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9e5a1d3f470'
+down_revision = 'b8d4f0c2e369'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('incident_status_events',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('incident_id', sa.Integer(), nullable=False),
+    sa.Column('from_status', sa.String(length=20), nullable=True),
+    sa.Column('to_status', sa.String(length=20), nullable=False),
+    sa.Column('changed_by', sa.Integer(), nullable=True),
+    sa.Column('category_key', sa.Integer(), nullable=False),
+    sa.Column('seconds_in_state', sa.Float(), nullable=True),
+    sa.Column('resolve_seconds', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['changed_by'], ['users.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['incident_id'], ['incident_reports.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('incident_status_events', schema=None) as batch_op:
+        batch_op.create_index('ix_incident_status_events_incident', ['incident_id', 'id'], unique=False)
+        batch_op.create_index('ix_incident_status_events_created', ['created_at'], unique=False)
+
+    op.create_table('incident_status_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('category_key', sa.Integer(), nullable=False),
+    sa.Column('metric', sa.String(length=32), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('total_seconds', sa.Float(), nullable=False),
+    sa.Column('histogram', sa.LargeBinary(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('day', 'category_key', 'metric',
+                        name='uq_incident_status_rollups_day_category_metric')
+    )
+
+
+def downgrade():
+    op.drop_table('incident_status_rollups')
+    with op.batch_alter_table('incident_status_events', schema=None) as batch_op:
+        batch_op.drop_index('ix_incident_status_events_created')
+        batch_op.drop_index('ix_incident_status_events_incident')
+
+    op.drop_table('incident_status_events')
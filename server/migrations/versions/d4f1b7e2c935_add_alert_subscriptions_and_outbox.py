@@ -0,0 +1,86 @@
+"""Add area alert subscriptions and the notification outbox
+
+Revision ID: d4f1b7e2c935
+Revises: c3e8a5d0b412
+Create Date: 2026-10-19 11:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f1b7e2c935'
+down_revision = 'c3e8a5d0b412'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('alert_subscriptions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('kind', sa.String(length=10), nullable=False),
+    sa.Column('center_latitude', sa.Float(), nullable=True),
+    sa.Column('center_longitude', sa.Float(), nullable=True),
+    sa.Column('radius_m', sa.Float(), nullable=True),
+    sa.Column('polygon', sa.Text(), nullable=True),
+    sa.Column('min_latitude', sa.Float(), nullable=False),
+    sa.Column('max_latitude', sa.Float(), nullable=False),
+    sa.Column('min_longitude', sa.Float(), nullable=False),
+    sa.Column('max_longitude', sa.Float(), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('alert_subscriptions', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_alert_subscriptions_user_id'), ['user_id'], unique=False)
+
+    op.create_table('subscription_cells',
+    sa.Column('cell', sa.BigInteger(), nullable=False),
+    sa.Column('subscription_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['subscription_id'], ['alert_subscriptions.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('cell', 'subscription_id')
+    )
+    with op.batch_alter_table('subscription_cells', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_subscription_cells_subscription_id'), ['subscription_id'], unique=False)
+
+    op.create_table('notification_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('channel', sa.String(length=10), nullable=False),
+    sa.Column('event', sa.String(length=50), nullable=False),
+    sa.Column('incident_id', sa.Integer(), nullable=True),
+    sa.Column('subject', sa.String(length=200), nullable=True),
+    sa.Column('body', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(length=10), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['incident_id'], ['incident_reports.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('notification_outbox', schema=None) as batch_op:
+        batch_op.create_index('ix_notification_outbox_status_created', ['status', 'created_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_notification_outbox_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('notification_outbox', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_notification_outbox_user_id'))
+        batch_op.drop_index('ix_notification_outbox_status_created')
+
+    op.drop_table('notification_outbox')
+    with op.batch_alter_table('subscription_cells', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_subscription_cells_subscription_id'))
+
+    op.drop_table('subscription_cells')
+    with op.batch_alter_table('alert_subscriptions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_alert_subscriptions_user_id'))
+
+    op.drop_table('alert_subscriptions')
@@ -0,0 +1,47 @@
+"""Add notification coalescing and quiet hours
+
+Revision ID: e6a2c8f3d147
+Revises: d4f1b7e2c935
+Create Date: 2026-10-19 12:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6a2c8f3d147'
+down_revision = 'd4f1b7e2c935'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('quiet_hours_start', sa.String(length=5), nullable=True))
+        batch_op.add_column(sa.Column('quiet_hours_end', sa.String(length=5), nullable=True))
+
+    with op.batch_alter_table('notification_outbox', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('summary', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('urgent', sa.Boolean(), nullable=False, server_default=sa.false()))
+        batch_op.add_column(sa.Column('deliver_after', sa.DateTime(), nullable=True))
+
+    op.execute('UPDATE notification_outbox SET deliver_after = created_at')
+
+    with op.batch_alter_table('notification_outbox', schema=None) as batch_op:
+        batch_op.alter_column('deliver_after', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_index('ix_notification_outbox_status_due', ['status', 'deliver_after'], unique=False)
+        batch_op.create_index('ix_notification_outbox_recipient', ['user_id', 'channel', 'status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('notification_outbox', schema=None) as batch_op:
+        batch_op.drop_index('ix_notification_outbox_recipient')
+        batch_op.drop_index('ix_notification_outbox_status_due')
+        batch_op.drop_column('deliver_after')
+        batch_op.drop_column('urgent')
+        batch_op.drop_column('summary')
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('quiet_hours_end')
+        batch_op.drop_column('quiet_hours_start')
@@ -0,0 +1,69 @@
+"""Add emergency broadcasts
+
+Revision ID: f2b9d6a4c813
+Revises: e6a2c8f3d147
+Create Date: 2026-10-19 14:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b9d6a4c813'
+down_revision = 'e6a2c8f3d147'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('broadcasts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_by', sa.Integer(), nullable=True),
+    sa.Column('title', sa.String(length=200), nullable=False),
+    sa.Column('message', sa.Text(), nullable=False),
+    sa.Column('sms_message', sa.String(length=480), nullable=True),
+    sa.Column('region_name', sa.String(length=100), nullable=True),
+    sa.Column('min_latitude', sa.Float(), nullable=True),
+    sa.Column('max_latitude', sa.Float(), nullable=True),
+    sa.Column('min_longitude', sa.Float(), nullable=True),
+    sa.Column('max_longitude', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('cancelled_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['created_by'], ['users.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    op.create_table('broadcast_jobs',
+    sa.Column('broadcast_id', sa.Integer(), nullable=False),
+    sa.Column('channel', sa.String(length=10), nullable=False),
+    sa.Column('status', sa.String(length=10), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('cursor', sa.Integer(), nullable=False),
+    sa.Column('sent', sa.Integer(), nullable=False),
+    sa.Column('failed', sa.Integer(), nullable=False),
+    sa.Column('claimed_by', sa.String(length=36), nullable=True),
+    sa.Column('lease_until', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['broadcast_id'], ['broadcasts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('broadcast_id', 'channel')
+    )
+    with op.batch_alter_table('broadcast_jobs', schema=None) as batch_op:
+        batch_op.create_index('ix_broadcast_jobs_status_lease', ['status', 'lease_until'], unique=False)
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.create_index('ix_users_email_broadcast', ['email_notifications', 'is_active', 'id'], unique=False)
+        batch_op.create_index('ix_users_sms_broadcast', ['sms_notifications', 'is_active', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index('ix_users_sms_broadcast')
+        batch_op.drop_index('ix_users_email_broadcast')
+
+    with op.batch_alter_table('broadcast_jobs', schema=None) as batch_op:
+        batch_op.drop_index('ix_broadcast_jobs_status_lease')
+
+    op.drop_table('broadcast_jobs')
+    op.drop_table('broadcasts')
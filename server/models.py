@@ -48,9 +48,17 @@ class User(db.Model):
     dark_mode = db.Column(db.Boolean, default=False)
     language = db.Column(db.String(10), default='en')
     timezone = db.Column(db.String(50), default='UTC')
+    quiet_hours_start = db.Column(db.String(5))  # 'HH:MM' in the user's timezone
+    quiet_hours_end = db.Column(db.String(5))
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # Broadcast recipient scans: keyset pagination by id per channel
+        db.Index('ix_users_email_broadcast', 'email_notifications', 'is_active', 'id'),
+        db.Index('ix_users_sms_broadcast', 'sms_notifications', 'is_active', 'id'),
+    )
     
     # Relationships
     incidents = db.relationship(
@@ -103,6 +111,8 @@ class User(db.Model):
             'dark_mode': self.dark_mode,
             'language': self.language,
             'timezone': self.timezone,
+            'quiet_hours_start': self.quiet_hours_start,
+            'quiet_hours_end': self.quiet_hours_end,
             'preferences': self.get_preferences(),
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
@@ -174,6 +184,20 @@ class IncidentReport(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     resolved_at = db.Column(db.DateTime)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    duplicate_of = db.Column(db.Integer, db.ForeignKey('incident_reports.id'), index=True)
+    # Kept up to date by add_comment; `flask incidents repair-comment-counts` fixes drift
+    comment_count = db.Column(db.Integer, default=0, nullable=False)
+    last_comment_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_incident_reports_comment_count', 'comment_count', 'id'),
+        # Recently active first, uncommented last: SQLite already sorts NULLs
+        # last when descending, PostgreSQL needs that order in the index
+        db.Index('ix_incident_reports_last_comment_at', 'last_comment_at', 'id')
+        .ddl_if(dialect='sqlite'),
+        db.Index('ix_incident_reports_last_comment_at_desc',
+                 db.desc('last_comment_at').nulls_last(), db.desc('id')).ddl_if(dialect='postgresql'),
+    )
 
     # Relationships
     comments = db.relationship('IncidentComment', backref='incident', lazy=True)
@@ -221,5 +245,319 @@ class IncidentReport(db.Model):
             'reporter_email': self.reporter.email if self.reporter else None,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
-            'resolved_at': self.resolved_at.isoformat() if self.resolved_at else None
+            'resolved_at': self.resolved_at.isoformat() if self.resolved_at else None,
+            'duplicate_of': self.duplicate_of,
+            'comment_count': self.comment_count,
+            'last_comment_at': self.last_comment_at.isoformat() if self.last_comment_at else None
+        }
+
+class IncidentLSHBand(db.Model):
+    """MinHash band hashes of an incident's text, for near-duplicate lookup."""
+    __tablename__ = 'incident_lsh_bands'
+
+    id = db.Column(db.Integer, primary_key=True)
+    band_hash = db.Column(db.BigInteger, nullable=False)
+    incident_id = db.Column(db.Integer, db.ForeignKey('incident_reports.id', ondelete='CASCADE'),
+                            nullable=False, index=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_incident_lsh_bands_hash_created', 'band_hash', 'created_at'),
+    )
+
+class IncidentArchiveSegment(db.Model):
+    """A batch of resolved incidents moved out of ``incident_reports``.
+
+    ``data`` holds zlib-compressed JSON lines, one per incident in id
+    order, each with the incident's ``to_dict()``, comments and status
+    events. Segments are written once and never changed; their id and
+    creation time ranges are the sparse index used to find an archived
+    incident.
+    """
+    __tablename__ = 'incident_archive_segments'
+
+    id = db.Column(db.Integer, primary_key=True)
+    first_id = db.Column(db.Integer, nullable=False)
+    last_id = db.Column(db.Integer, nullable=False)
+    first_created_at = db.Column(db.DateTime)
+    last_created_at = db.Column(db.DateTime)
+    count = db.Column(db.Integer, nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_incident_archive_segments_ids', 'first_id', 'last_id'),
+        db.Index('ix_incident_archive_segments_created', 'first_created_at', 'last_created_at'),
+    )
+
+class IncidentStatusEvent(db.Model):
+    """One status transition of an incident; rows are only ever appended.
+
+    ``from_status`` is NULL for the event written when the incident is
+    reported. ``seconds_in_state`` is how long it spent in ``from_status``
+    (NULL when that is unknown, for incidents older than the history) and
+    ``resolve_seconds`` is set on an incident's first move to resolved.
+    """
+    __tablename__ = 'incident_status_events'
+
+    id = db.Column(db.Integer, primary_key=True)
+    incident_id = db.Column(db.Integer, db.ForeignKey('incident_reports.id', ondelete='CASCADE'),
+                            nullable=False)
+    from_status = db.Column(db.String(20))
+    to_status = db.Column(db.String(20), nullable=False)
+    changed_by = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'))
+    category_key = db.Column(db.Integer, nullable=False, default=0)
+    seconds_in_state = db.Column(db.Float)
+    resolve_seconds = db.Column(db.Float)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    incident = db.relationship('IncidentReport')
+
+    __table_args__ = (
+        db.Index('ix_incident_status_events_incident', 'incident_id', 'id'),
+        db.Index('ix_incident_status_events_created', 'created_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'incident_id': self.incident_id,
+            'from_status': self.from_status,
+            'to_status': self.to_status,
+            'changed_by': self.changed_by,
+            'seconds_in_state': self.seconds_in_state,
+            'resolve_seconds': self.resolve_seconds,
+            'created_at': self.created_at.isoformat()
+        }
+
+class IncidentStatusRollup(db.Model):
+    """Durations summed over one day and category, for SLA percentiles.
+
+    ``metric`` is ``in:<status>`` for time spent in a status (counted on
+    the day it was left) or ``resolve`` for time from report to first
+    resolution. ``histogram`` holds a zlib-compressed little-endian uint32
+    array of log-spaced duration buckets; ``version`` guards concurrent
+    read-modify-write updates, as on ``HeatmapGrid``.
+    """
+    __tablename__ = 'incident_status_rollups'
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    category_key = db.Column(db.Integer, nullable=False, default=0)
+    metric = db.Column(db.String(32), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total_seconds = db.Column(db.Float, nullable=False, default=0)
+    histogram = db.Column(db.LargeBinary, nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('day', 'category_key', 'metric',
+                            name='uq_incident_status_rollups_day_category_metric'),
+    )
+
+class HeatmapGrid(db.Model):
+    """Incident counts per grid cell for one day and category.
+
+    ``counts`` holds a zlib-compressed little-endian uint32 array of
+    ``rows`` x ``cols`` cells; ``category_key`` is 0 for uncategorized
+    incidents. ``version`` guards concurrent read-modify-write updates.
+    """
+    __tablename__ = 'heatmap_grids'
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    category_key = db.Column(db.Integer, nullable=False, default=0)
+    rows = db.Column(db.Integer, nullable=False)
+    cols = db.Column(db.Integer, nullable=False)
+    counts = db.Column(db.LargeBinary, nullable=False)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('day', 'category_key', name='uq_heatmap_grids_day_category'),
+    )
+
+class AlertSubscription(db.Model):
+    """An area a user wants to hear about incidents in.
+
+    Either a circle (``center_latitude``/``center_longitude`` and
+    ``radius_m``) or a polygon (``polygon``, a JSON list of [lat, lon]
+    vertices). The bounding box is kept for indexing; ``SubscriptionCell``
+    rows list the grid cells it covers.
+    """
+    __tablename__ = 'alert_subscriptions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'),
+                        nullable=False, index=True)
+    name = db.Column(db.String(100), nullable=False)
+    kind = db.Column(db.String(10), nullable=False)  # 'circle' or 'polygon'
+    center_latitude = db.Column(db.Float)
+    center_longitude = db.Column(db.Float)
+    radius_m = db.Column(db.Float)
+    polygon = db.Column(db.Text)
+    min_latitude = db.Column(db.Float, nullable=False)
+    max_latitude = db.Column(db.Float, nullable=False)
+    min_longitude = db.Column(db.Float, nullable=False)
+    max_longitude = db.Column(db.Float, nullable=False)
+    is_active = db.Column(db.Boolean, default=True, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    user = db.relationship('User', backref=db.backref('alert_subscriptions', lazy=True,
+                                                      passive_deletes=True))
+
+    def get_polygon(self):
+        return json.loads(self.polygon) if self.polygon else None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'kind': self.kind,
+            'latitude': self.center_latitude,
+            'longitude': self.center_longitude,
+            'radius_m': self.radius_m,
+            'polygon': self.get_polygon(),
+            'is_active': self.is_active,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class SubscriptionCell(db.Model):
+    """Grid cells covered by a subscription, for point-in-area lookup."""
+    __tablename__ = 'subscription_cells'
+
+    cell = db.Column(db.BigInteger, primary_key=True)
+    subscription_id = db.Column(db.Integer,
+                                db.ForeignKey('alert_subscriptions.id', ondelete='CASCADE'),
+                                primary_key=True, index=True)
+
+class NotificationOutbox(db.Model):
+    """A message waiting to be (or already) delivered to a user.
+
+    Pending messages for the same user and channel are sent together as
+    one digest once the oldest is due (``deliver_after``); ``summary`` is
+    the message's line in such a digest.
+    """
+    __tablename__ = 'notification_outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'),
+                        nullable=False, index=True)
+    channel = db.Column(db.String(10), nullable=False)  # 'email' or 'sms'
+    event = db.Column(db.String(50), nullable=False)
+    incident_id = db.Column(db.Integer, db.ForeignKey('incident_reports.id', ondelete='SET NULL'))
+    subject = db.Column(db.String(200))
+    body = db.Column(db.Text, nullable=False)
+    summary = db.Column(db.String(255))
+    urgent = db.Column(db.Boolean, default=False, nullable=False)  # ignores quiet hours
+    status = db.Column(db.String(10), default='pending', nullable=False)  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    deliver_after = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_notification_outbox_status_created', 'status', 'created_at'),
+        db.Index('ix_notification_outbox_status_due', 'status', 'deliver_after'),
+        db.Index('ix_notification_outbox_recipient', 'user_id', 'channel', 'status'),
+    )
+
+class Broadcast(db.Model):
+    """An emergency message sent to every user who takes notifications.
+
+    With a region (its bounding box), only users with an active
+    subscription overlapping it are reached. Each channel is sent by a
+    ``BroadcastJob``.
+    """
+    __tablename__ = 'broadcasts'
+
+    id = db.Column(db.Integer, primary_key=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'))
+    title = db.Column(db.String(200), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    sms_message = db.Column(db.String(480))
+    region_name = db.Column(db.String(100))
+    min_latitude = db.Column(db.Float)
+    max_latitude = db.Column(db.Float)
+    min_longitude = db.Column(db.Float)
+    max_longitude = db.Column(db.Float)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    cancelled_at = db.Column(db.DateTime)
+
+    jobs = db.relationship('BroadcastJob', backref='broadcast', lazy=True,
+                           order_by='BroadcastJob.channel', passive_deletes=True)
+
+    @property
+    def has_region(self):
+        return self.min_latitude is not None
+
+    @property
+    def status(self):
+        statuses = {job.status for job in self.jobs}
+        if not statuses or statuses == {'done'}:
+            return 'completed'
+        if 'cancelled' in statuses:
+            return 'cancelled'
+        if statuses == {'pending'}:
+            return 'pending'
+        return 'sending'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'created_by': self.created_by,
+            'title': self.title,
+            'message': self.message,
+            'sms_message': self.sms_message,
+            'region_name': self.region_name,
+            'region': [self.min_latitude, self.min_longitude,
+                       self.max_latitude, self.max_longitude] if self.has_region else None,
+            'status': self.status,
+            'jobs': [job.to_dict() for job in self.jobs],
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'cancelled_at': self.cancelled_at.isoformat() if self.cancelled_at else None
+        }
+
+class BroadcastJob(db.Model):
+    """Progress of one channel of a broadcast.
+
+    Recipients are walked in user id order and ``cursor`` is the last id
+    handled, so a worker that dies is resumed from there once its lease
+    (``lease_until``) runs out.
+    """
+    __tablename__ = 'broadcast_jobs'
+
+    broadcast_id = db.Column(db.Integer, db.ForeignKey('broadcasts.id', ondelete='CASCADE'),
+                             primary_key=True)
+    channel = db.Column(db.String(10), primary_key=True)  # 'email' or 'sms'
+    status = db.Column(db.String(10), default='pending', nullable=False)  # pending, running, done, cancelled
+    total = db.Column(db.Integer, default=0, nullable=False)  # recipients when created
+    cursor = db.Column(db.Integer, default=0, nullable=False)
+    sent = db.Column(db.Integer, default=0, nullable=False)
+    failed = db.Column(db.Integer, default=0, nullable=False)
+    claimed_by = db.Column(db.String(36))
+    lease_until = db.Column(db.DateTime)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_broadcast_jobs_status_lease', 'status', 'lease_until'),
+    )
+
+    def to_dict(self):
+        return {
+            'channel': self.channel,
+            'status': self.status,
+            'total': self.total,
+            'sent': self.sent,
+            'failed': self.failed,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
         }
@@ -1,6 +1,19 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from ..models import User, IncidentReport, db
+from ..models import User, IncidentReport, Broadcast, db
+from ..utils.db_utils import get_pool_stats
+from ..utils.db_routing import read_only
+from ..utils.admission import criticality, get_admission_stats
+from ..utils.serializers import incident_select, serialize_incident_rows
+from ..utils.notification_utils import notify_status_change
+from ..utils.broadcast import CHANNELS, cancel_broadcast, create_broadcast
+from ..utils.geofence import parse_area
+from ..utils.incident_archive import iter_archived_incidents
+from ..utils.heatmap import default_range
+from ..utils.status_history import (
+    RESOLVE_METRIC, merged_rollups, set_incident_status, summarize
+)
+from datetime import datetime
 from functools import wraps
 
 admin_bp = Blueprint('admin', __name__)
@@ -34,13 +47,53 @@ def update_incident_status(incident_id):
         return jsonify({'error': f'Invalid status. Must be one of: {", ".join(valid_statuses)}'}), 400
 
     try:
-        incident.status = data['status']
+        status_changed = set_incident_status(incident, data['status'], get_jwt_identity()) is not None
         db.session.commit()
+        if status_changed:
+            notify_status_change(incident.id, data['status'])
         return jsonify(incident.to_dict()), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@admin_bp.route('/incidents/export', methods=['GET'])
+@jwt_required()
+@admin_required
+@read_only
+def export_incidents():
+    """Stream incidents as JSON lines, archived ones included (admin only).
+
+    ``since`` and ``until`` (ISO dates) limit it to incidents created in
+    that range. Live incidents come first in id order, then archived ones.
+    """
+    try:
+        since = datetime.fromisoformat(request.args['since']) if request.args.get('since') else None
+        until = datetime.fromisoformat(request.args['until']) if request.args.get('until') else None
+    except ValueError:
+        return jsonify({'error': 'since and until must be ISO dates'}), 400
+
+    chunk_size = current_app.config.get('INCIDENT_ARCHIVE_SEGMENT_SIZE', 500)
+    dumps = current_app.json.dumps
+
+    def generate():
+        stmt = incident_select().order_by(IncidentReport.id).limit(chunk_size)
+        if since is not None:
+            stmt = stmt.where(IncidentReport.created_at >= since)
+        if until is not None:
+            stmt = stmt.where(IncidentReport.created_at < until)
+        last_id = 0
+        while True:
+            rows = db.session.execute(stmt.where(IncidentReport.id > last_id)).all()
+            if not rows:
+                break
+            for incident in serialize_incident_rows(rows):
+                yield dumps(incident) + '\n'
+            last_id = rows[-1].id
+        for incident in iter_archived_incidents(since, until):
+            yield dumps(incident) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @admin_bp.route('/users', methods=['GET'])
 @jwt_required()
 @admin_required
@@ -88,6 +141,7 @@ def update_user_role(user_id):
 @admin_bp.route('/dashboard/stats', methods=['GET'])
 @jwt_required()
 @admin_required
+@read_only
 def get_dashboard_stats():
     """Get dashboard statistics (admin only)."""
     try:
@@ -103,15 +157,148 @@ def get_dashboard_stats():
         status_stats = {status: count for status, count in status_counts}
         
         # Get recent incidents
-        recent_incidents = IncidentReport.query.order_by(
-            IncidentReport.created_at.desc()
-        ).limit(5).all()
+        recent_incidents = db.session.execute(
+            incident_select().order_by(IncidentReport.created_at.desc()).limit(5)
+        ).all()
 
         return jsonify({
             'total_incidents': total_incidents,
             'total_users': total_users,
             'status_stats': status_stats,
-            'recent_incidents': [incident.to_dict() for incident in recent_incidents]
+            'recent_incidents': serialize_incident_rows(recent_incidents)
         }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/analytics/status-times', methods=['GET'])
+@jwt_required()
+@admin_required
+@read_only
+def get_status_times():
+    """Time-to-resolve and time-in-status percentiles (admin only).
+
+    ``start_date``/``end_date`` (YYYY-MM-DD, default the last 30 days),
+    ``category_id`` (comma-separated; ``0`` for uncategorized) and
+    ``percentiles`` (default ``50,90,99``) select what to merge from the
+    daily rollups. Durations are in seconds; time in a status is counted
+    on the day the incident left it.
+    """
+    config = current_app.config
+    try:
+        start, end = default_range()
+        if request.args.get('end_date'):
+            end = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date()
+            start = default_range(end)[0]
+        if request.args.get('start_date'):
+            start = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date()
+        category_keys = None
+        if request.args.get('category_id'):
+            category_keys = sorted({int(c) for c in request.args['category_id'].split(',')})
+        quantiles = sorted({float(q) for q in request.args.get('percentiles', '50,90,99').split(',')})
+    except ValueError as e:
+        return jsonify({'error': f'Invalid analytics parameters: {e}'}), 400
+    if start > end:
+        return jsonify({'error': 'start_date must not be after end_date'}), 400
+    if (end - start).days + 1 > config.get('STATUS_ANALYTICS_MAX_DAYS', 366):
+        return jsonify({'error': f"Date range is limited to {config.get('STATUS_ANALYTICS_MAX_DAYS', 366)} days"}), 400
+    if not all(0 < q <= 100 for q in quantiles):
+        return jsonify({'error': 'percentiles must be between 0 and 100'}), 400
+
+    summary = summarize(merged_rollups(start, end, category_keys), quantiles)
+    return jsonify({
+        'start_date': start.isoformat(),
+        'end_date': end.isoformat(),
+        'resolve': summary.pop(RESOLVE_METRIC, None),
+        'time_in_status': {metric.partition(':')[2]: stats for metric, stats in summary.items()}
+    }), 200
+
+@admin_bp.route('/system/db-pool', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_db_pool_stats():
+    """Get connection pool usage and checkout wait times (admin only)."""
+    return jsonify(get_pool_stats(db)), 200
+
+@admin_bp.route('/system/admission', methods=['GET'])
+@jwt_required()
+@admin_required
+@criticality('critical')
+def get_admission_control_stats():
+    """Get this worker's in-flight load, queue latency and shed counts (admin only)."""
+    stats = get_admission_stats(current_app)
+    if stats is None:
+        return jsonify({'error': 'Admission control is disabled'}), 404
+    return jsonify(stats), 200
+
+@admin_bp.route('/broadcasts', methods=['POST'])
+@jwt_required()
+@admin_required
+@criticality('critical')
+def create_emergency_broadcast():
+    """Queue an emergency broadcast to every user who takes notifications (admin only).
+
+    Send ``title`` and ``message``, optionally ``sms_message``, ``channels``
+    and a ``region`` (``name`` plus a circle or polygon as for area
+    subscriptions) to reach only users subscribed to areas overlapping it.
+    ``flask broadcasts run`` does the sending.
+    """
+    data = request.get_json() or {}
+    if not data.get('title') or not data.get('message'):
+        return jsonify({'error': 'title and message are required'}), 400
+
+    channels = data.get('channels') or list(CHANNELS)
+    if not isinstance(channels, list) or not set(channels) <= set(CHANNELS):
+        return jsonify({'error': f'channels must be a list of: {", ".join(CHANNELS)}'}), 400
+
+    sms_message = data.get('sms_message')
+    max_length = current_app.config.get('NOTIFICATION_SMS_MAX_LENGTH', 480)
+    if sms_message and len(sms_message) > max_length:
+        return jsonify({'error': f'sms_message must be at most {max_length} characters'}), 400
+
+    area = region = None
+    if data.get('region'):
+        region = data['region']
+        try:
+            area = parse_area(region, current_app.config.get('SUBSCRIPTION_MAX_POLYGON_POINTS', 200))
+        except (AttributeError, ValueError) as e:
+            return jsonify({'error': f'Invalid region: {e}'}), 400
+
+    try:
+        broadcast = create_broadcast(
+            get_jwt_identity(), data['title'][:200], data['message'],
+            channels=sorted(set(channels)), sms_message=sms_message, area=area,
+            region_name=(region or {}).get('name'))
+        db.session.commit()
+        return jsonify(broadcast.to_dict()), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/broadcasts', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_broadcasts():
+    """Get the most recent broadcasts and their progress (admin only)."""
+    broadcasts = Broadcast.query.order_by(Broadcast.id.desc()).limit(50).all()
+    return jsonify([broadcast.to_dict() for broadcast in broadcasts]), 200
+
+@admin_bp.route('/broadcasts/<int:broadcast_id>', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_broadcast(broadcast_id):
+    """Get one broadcast's progress (admin only)."""
+    return jsonify(Broadcast.query.get_or_404(broadcast_id).to_dict()), 200
+
+@admin_bp.route('/broadcasts/<int:broadcast_id>/cancel', methods=['POST'])
+@jwt_required()
+@admin_required
+def cancel_emergency_broadcast(broadcast_id):
+    """Stop sending a broadcast (admin only)."""
+    broadcast = Broadcast.query.get_or_404(broadcast_id)
+    try:
+        cancel_broadcast(broadcast)
+        db.session.commit()
+        return jsonify(broadcast.to_dict()), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
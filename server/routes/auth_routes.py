@@ -1,30 +1,47 @@
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt, get_jwt_identity
 from ..models import User, UserActivity, db
+from ..utils.db_routing import read_only
+from ..utils.rate_limit import client_ip, rate_limit, too_many_requests
+from ..utils.login_throttle import get_login_throttle
+from ..utils.outbox import parse_clock
+from ..utils.revocation import revoke_jti
+from ..utils.activity_partitions import activity_page, get_partition_cache
 from datetime import timedelta, datetime
 import pyotp
-import requests
+import pytz
+import math
 from functools import wraps
 import re
+import time
 
 auth_bp = Blueprint('auth', __name__)
 
+# Compiled at import, so a preloading server compiles them once before forking
+_USERNAME_RE = re.compile(r'^[a-zA-Z0-9_]{3,20}$')
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+_PHONE_RE = re.compile(r'^\+?1?\d{9,15}$')
+_UPPERCASE_RE = re.compile(r"[A-Z]")
+_LOWERCASE_RE = re.compile(r"[a-z]")
+_DIGIT_RE = re.compile(r"\d")
+_SPECIAL_RE = re.compile(r"[!@#$%^&*(),.?\":{}|<>]")
+
 def validate_password(password):
     """Validate password strength."""
     if len(password) < 8:
         return False, "Password must be at least 8 characters long"
-    if not re.search(r"[A-Z]", password):
+    if not _UPPERCASE_RE.search(password):
         return False, "Password must contain at least one uppercase letter"
-    if not re.search(r"[a-z]", password):
+    if not _LOWERCASE_RE.search(password):
         return False, "Password must contain at least one lowercase letter"
-    if not re.search(r"\d", password):
+    if not _DIGIT_RE.search(password):
         return False, "Password must contain at least one number"
-    if not re.search(r"[!@#$%^&*(),.?\":{}|<>]", password):
+    if not _SPECIAL_RE.search(password):
         return False, "Password must contain at least one special character"
     return True, "Password is strong"
 
-def log_activity(user_id, activity_type, description, ip_address=None):
-    """Log user activity."""
+def log_activity(user_id, activity_type, description, ip_address=None, commit=True):
+    """Log user activity; with ``commit=False`` it joins the caller's transaction."""
     activity = UserActivity(
         user_id=user_id,
         activity_type=activity_type,
@@ -32,7 +49,8 @@ def log_activity(user_id, activity_type, description, ip_address=None):
         ip_address=ip_address
     )
     db.session.add(activity)
-    db.session.commit()
+    if commit:
+        db.session.commit()
 
 def admin_required(f):
     """Decorator to check if user is admin."""
@@ -46,6 +64,7 @@ def admin_required(f):
     return decorated_function
 
 @auth_bp.route('/register', methods=['POST'])
+@rate_limit('5 per minute; 20 per hour')
 def register():
     """Register a new user."""
     data = request.get_json()
@@ -57,11 +76,11 @@ def register():
             return jsonify({'error': f'{field} is required'}), 400
 
     # Validate username format
-    if not re.match(r'^[a-zA-Z0-9_]{3,20}$', data['username']):
+    if not _USERNAME_RE.match(data['username']):
         return jsonify({'error': 'Username must be 3-20 characters long and contain only letters, numbers, and underscores'}), 400
 
     # Validate email format
-    if not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', data['email']):
+    if not _EMAIL_RE.match(data['email']):
         return jsonify({'error': 'Invalid email format'}), 400
 
     # Check if username or email already exists
@@ -110,12 +129,27 @@ def register():
         return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/login', methods=['POST'])
+@rate_limit('10 per minute')
 def login():
-    """Login user and return token."""
-    data = request.get_json()
-    user = User.query.filter_by(username=data.get('username')).first()
+    """Login user and return token.
+
+    Failed attempts are counted by the login throttle, not in the users
+    table; the account row is only written when it gets locked or on a
+    successful login.
+    """
+    data = request.get_json() or {}
+    username = data.get('username')
+    throttle = get_login_throttle()
+    # Failures are counted per client, not per reverse proxy
+    ip = client_ip()
+    retry_after = throttle.ip_retry_after(ip)
+    if retry_after is not None:
+        return too_many_requests(retry_after)
+
+    user = User.query.filter_by(username=username).first()
 
     if not user:
+        throttle.record_failure(username, ip)
         return jsonify({'error': 'Invalid credentials'}), 401
 
     # Check if account is locked
@@ -126,19 +160,8 @@ def login():
         }), 403
 
     if not user.check_password(data.get('password')):
-        # Increment failed login attempts
-        user.failed_login_attempts = (user.failed_login_attempts or 0) + 1
-        
-        # Lock account after 5 failed attempts
-        if user.failed_login_attempts >= 5:
-            user.account_locked_until = datetime.utcnow() + timedelta(minutes=15)
-            db.session.commit()
-            return jsonify({
-                'error': 'Account locked due to too many failed attempts',
-                'locked_until': user.account_locked_until.isoformat()
-            }), 403
-        
-        db.session.commit()
+        if throttle.record_failure(username, ip):
+            return _lock_account(user, throttle)
         return jsonify({'error': 'Invalid credentials'}), 401
 
     # Check 2FA if enabled
@@ -151,11 +174,17 @@ def login():
         
         totp = pyotp.TOTP(user.two_factor_secret)
         if not totp.verify(data['two_factor_code']):
+            if throttle.record_failure(username, ip):
+                return _lock_account(user, throttle)
             return jsonify({'error': 'Invalid 2FA code'}), 401
 
-    # Reset failed login attempts and update last login
+    throttle.reset(username)
+
+    # Reset failed login attempts, update last login and log it in one transaction
     user.failed_login_attempts = 0
     user.last_login = datetime.utcnow()
+    log_activity(user.id, 'LOGIN', f'User logged in from IP {ip}',
+                ip, commit=False)
     db.session.commit()
 
     # Create access token
@@ -164,15 +193,35 @@ def login():
         expires_delta=timedelta(days=1)
     )
 
-    # Log activity
-    log_activity(user.id, 'LOGIN', f'User logged in from IP {request.remote_addr}',
-                request.remote_addr)
-
     return jsonify({
         'token': access_token,
         'user': user.to_dict()
     }), 200
 
+def _lock_account(user, throttle):
+    """Persist a lockout once the failure threshold trips."""
+    user.failed_login_attempts = throttle.max_failures
+    user.account_locked_until = datetime.utcnow() + timedelta(
+        minutes=current_app.config.get('LOGIN_LOCKOUT_MINUTES', 15))
+    db.session.commit()
+    throttle.reset(user.username)
+    return jsonify({
+        'error': 'Account locked due to too many failed attempts',
+        'locked_until': user.account_locked_until.isoformat()
+    }), 403
+
+@auth_bp.route('/logout', methods=['POST'])
+@jwt_required()
+def logout():
+    """Revoke the current token."""
+    claims = get_jwt()
+    # Tokens without an expiry are kept revoked as long as the longest-lived token
+    expires_at = claims.get('exp') or (
+        time.time() + current_app.config['JWT_REFRESH_TOKEN_EXPIRES'].total_seconds())
+    revoke_jti(claims['jti'], expires_at)
+    log_activity(get_jwt_identity(), 'LOGOUT', 'User logged out', request.remote_addr)
+    return jsonify({'message': 'Logged out'}), 200
+
 @auth_bp.route('/2fa/enable', methods=['POST'])
 @jwt_required()
 def enable_2fa():
@@ -238,9 +287,18 @@ def update_notification_preferences():
             user.sms_notifications = data['sms_notifications']
         if 'phone_number' in data:
             # Validate phone number format
-            if not re.match(r'^\+?1?\d{9,15}$', data['phone_number']):
+            if not _PHONE_RE.match(data['phone_number']):
                 return jsonify({'error': 'Invalid phone number format'}), 400
             user.phone_number = data['phone_number']
+        for field in ('quiet_hours_start', 'quiet_hours_end'):
+            if field in data:
+                # 'HH:MM' in the user's timezone, or empty to turn quiet hours off
+                if data[field]:
+                    try:
+                        parse_clock(data[field])
+                    except (TypeError, ValueError):
+                        return jsonify({'error': f'{field} must be HH:MM'}), 400
+                setattr(user, field, data[field] or None)
 
         db.session.commit()
         log_activity(user.id, 'UPDATE_PREFERENCES', 'Updated notification preferences',
@@ -260,14 +318,14 @@ def update_profile():
 
     try:
         if 'username' in data and data['username'] != user.username:
-            if not re.match(r'^[a-zA-Z0-9_]{3,20}$', data['username']):
+            if not _USERNAME_RE.match(data['username']):
                 return jsonify({'error': 'Invalid username format'}), 400
             if User.query.filter_by(username=data['username']).first():
                 return jsonify({'error': 'Username already exists'}), 400
             user.username = data['username']
             
         if 'email' in data and data['email'] != user.email:
-            if not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', data['email']):
+            if not _EMAIL_RE.match(data['email']):
                 return jsonify({'error': 'Invalid email format'}), 400
             if User.query.filter_by(email=data['email']).first():
                 return jsonify({'error': 'Email already exists'}), 400
@@ -283,6 +341,8 @@ def update_profile():
             user.language = data['language']
 
         if 'timezone' in data:
+            if data['timezone'] not in pytz.all_timezones_set:
+                return jsonify({'error': 'Invalid timezone'}), 400
             user.timezone = data['timezone']
 
         if 'dark_mode' in data:
@@ -366,26 +426,28 @@ def update_user(user_id):
 
 @auth_bp.route('/activities', methods=['GET'])
 @jwt_required()
+@read_only
 def get_activities():
     """Get user activities."""
     current_user_id = get_jwt_identity()
     user = User.query.get_or_404(current_user_id)
     
-    # Admin can see all activities, regular users only see their own
-    query = UserActivity.query
-    if user.role != 'admin':
-        query = query.filter_by(user_id=current_user_id)
-
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
-    
-    pagination = query.order_by(UserActivity.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    if page < 1:
+        page = 1
+    if per_page < 1:
+        per_page = 20
+
+    # Admin can see all activities, regular users only see their own.
+    # Read newest partition first, so recent pages skip older months.
+    activities, total = activity_page(
+        db.session, get_partition_cache(), page, per_page,
+        user_id=None if user.role == 'admin' else current_user_id)
 
     return jsonify({
-        'activities': [activity.to_dict() for activity in pagination.items],
-        'total': pagination.total,
-        'pages': pagination.pages,
+        'activities': activities,
+        'total': total,
+        'pages': math.ceil(total / per_page),
         'current_page': page
     }), 200
@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, abort
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..models import (
     User, IncidentReport, IncidentCategory, IncidentComment,
@@ -9,10 +9,29 @@ from ..utils.notification_utils import notify_status_change
 from datetime import datetime
 from sqlalchemy import or_, and_
 import json
+import math
 from werkzeug.utils import secure_filename
 import os
-import boto3
-from botocore.exceptions import ClientError
+from ..utils.db_routing import read_only
+from ..utils.rate_limit import rate_limit
+from ..utils.admission import criticality
+from ..utils.dedup import check_new_incident, index_incident, visible_duplicates
+from ..utils.clustering import ClusterIndexCache, build_cluster_index, parse_bbox
+from ..utils.vector_tiles import (
+    MAX_ZOOM, TileCache, cluster_layer, encode_tile, incident_layer, tile_etag
+)
+from ..utils.geofence import enqueue_incident_alerts, parse_affected_radius
+from ..utils.incident_archive import find_archived_incident
+from ..utils.comment_counts import record_comment
+from ..utils.status_history import record_reported, set_incident_status, status_history
+from ..utils.heatmap import (
+    add_incident_to_heatmap, default_range, density, encode_png,
+    grid_spec, render_rgba, sparse_payload
+)
+from ..utils.serializers import (
+    incident_select, serialize_incident_rows, comment_select,
+    serialize_comment_rows, paginate_select, count_of, resolve_incident_fields
+)
 from .auth_routes import admin_required, log_activity
 
 incident_bp = Blueprint('incident', __name__)
@@ -56,10 +75,10 @@ def create_category():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-from ..utils.cloudinary_utils import upload_file
-
 @incident_bp.route('/', methods=['POST'])
+@criticality('critical')
 @jwt_required()
+@rate_limit('10 per minute; 100 per day', key='user')
 def create_incident():
     """Create a new incident report."""
     current_user_id = get_jwt_identity()
@@ -73,6 +92,13 @@ def create_incident():
         if not data.get(field):
             return jsonify({'error': f'{field} is required'}), 400
 
+    try:
+        affected_area_radius = parse_affected_radius(
+            data.get('affected_area_radius'),
+            current_app.config.get('INCIDENT_MAX_AFFECTED_RADIUS_M', 50000))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     try:
         incident = IncidentReport(
             title=data['title'],
@@ -83,10 +109,17 @@ def create_incident():
             priority=data.get('priority', 'medium'),
             category_id=data.get('category_id'),
             address=data.get('address'),
-            affected_area_radius=float(data.get('affected_area_radius', 0)),
-            user_id=current_user_id
+            affected_area_radius=affected_area_radius,
+            user_id=current_user_id,
+            created_at=datetime.utcnow()
         )
 
+        # Look for reports of the same event before this one is saved
+        possible_duplicates, shingle_set = [], None
+        if current_app.config.get('DEDUP_ENABLED', True):
+            possible_duplicates, shingle_set = check_new_incident(
+                incident, current_app.config, current_app.logger)
+
         # Handle file uploads using Cloudinary
         if files:
             media_urls = []
@@ -100,36 +133,54 @@ def create_incident():
                 incident.media_urls = json.dumps(media_urls)
 
         db.session.add(incident)
+        record_reported(incident, current_user_id)
+        db.session.flush()
+        if shingle_set is not None:
+            index_incident(incident, shingle_set)
+        # Subscriber alerts commit with the report, or not at all
+        if current_app.config.get('SUBSCRIPTIONS_ENABLED', True):
+            enqueue_incident_alerts(incident, current_app.config, current_app.logger)
         db.session.commit()
 
+        if current_app.config.get('HEATMAP_ENABLED', True):
+            add_incident_to_heatmap(incident, current_app.config, current_app.logger)
+
         # Log activity
         log_activity(current_user_id, 'CREATE_INCIDENT',
                     f'Created incident report: {incident.title}',
                     request.remote_addr)
 
-        return jsonify(incident.to_dict()), 201
+        result = incident.to_dict()
+        # Other users' incidents only count towards the total for non-admins
+        result['possible_duplicate_count'] = len(possible_duplicates)
+        result['possible_duplicates'] = visible_duplicates(
+            possible_duplicates, db.session.get(User, current_user_id)) if possible_duplicates else []
+        return jsonify(result), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-@incident_bp.route('/', methods=['GET'])
-@jwt_required()
-def get_incidents():
-    """Get all incidents with filtering and pagination."""
-    current_user_id = get_jwt_identity()
-    user = User.query.get_or_404(current_user_id)
+FILTER_PARAMS = ('status', 'priority', 'category_id', 'search', 'start_date', 'end_date')
 
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
-    status = request.args.get('status')
-    priority = request.args.get('priority')
-    category_id = request.args.get('category_id')
-    search = request.args.get('search', '')
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
+def incident_filter_key(args, user, current_user_id):
+    """A hashable key for the filters ``build_incident_filters`` would build."""
+    scope = 'all' if user.role == 'admin' else f'user:{current_user_id}'
+    return (scope,) + tuple((name, args.get(name)) for name in FILTER_PARAMS if args.get(name))
+
+def build_incident_filters(args, user, current_user_id):
+    """Translate listing query parameters into SQL filter clauses.
+
+    Returns ``(filters, None)`` or ``(None, error_response)`` when the
+    parameters are invalid.
+    """
+    status = args.get('status')
+    priority = args.get('priority')
+    category_id = args.get('category_id')
+    search = args.get('search', '')
+    start_date = args.get('start_date')
+    end_date = args.get('end_date')
 
     # Validate and parse start_date and end_date
-    from datetime import datetime
     def parse_date(date_str):
         try:
             return datetime.strptime(date_str, '%Y-%m-%d')
@@ -141,65 +192,256 @@ def get_incidents():
 
     if start_date and not start_date_parsed:
         current_app.logger.warning(f"Invalid start_date format: {start_date} from user {current_user_id}")
-        return jsonify({'error': 'Invalid start_date format. Use YYYY-MM-DD.'}), 400
+        return None, (jsonify({'error': 'Invalid start_date format. Use YYYY-MM-DD.'}), 400)
     if end_date and not end_date_parsed:
         current_app.logger.warning(f"Invalid end_date format: {end_date} from user {current_user_id}")
-        return jsonify({'error': 'Invalid end_date format. Use YYYY-MM-DD.'}), 400
-    
-    # Base query
-    query = IncidentReport.query
+        return None, (jsonify({'error': 'Invalid end_date format. Use YYYY-MM-DD.'}), 400)
 
-    # Apply filters
+    filters = []
     if status:
-        query = query.filter(IncidentReport.status == status)
+        filters.append(IncidentReport.status == status)
     if priority:
-        query = query.filter(IncidentReport.priority == priority)
+        filters.append(IncidentReport.priority == priority)
     if category_id:
-        query = query.filter(IncidentReport.category_id == category_id)
+        filters.append(IncidentReport.category_id == category_id)
     if search:
-        query = query.filter(
+        filters.append(
             or_(
                 IncidentReport.title.ilike(f'%{search}%'),
                 IncidentReport.description.ilike(f'%{search}%')
             )
         )
     if start_date_parsed:
-        query = query.filter(IncidentReport.created_at >= start_date_parsed)
+        filters.append(IncidentReport.created_at >= start_date_parsed)
     if end_date_parsed:
-        query = query.filter(IncidentReport.created_at <= end_date_parsed)
+        filters.append(IncidentReport.created_at <= end_date_parsed)
 
     # Regular users can only see their own incidents
     if user.role != 'admin':
-        query = query.filter(IncidentReport.user_id == current_user_id)
+        filters.append(IncidentReport.user_id == current_user_id)
+
+    return filters, None
+
+# Listing orders; the comment ones are served by the comment counter indexes
+INCIDENT_SORTS = {
+    'newest': (IncidentReport.created_at.desc(),),
+    'most_discussed': (IncidentReport.comment_count.desc(), IncidentReport.id.desc()),
+    'recently_active': (IncidentReport.last_comment_at.desc().nulls_last(), IncidentReport.id.desc()),
+}
+
+@incident_bp.route('/', methods=['GET'])
+@jwt_required()
+@read_only
+def get_incidents():
+    """Get all incidents with filtering and pagination.
+
+    ``view=pin|card|full`` or ``fields=id,title,...`` limit the returned
+    fields; only the columns and joins those fields need are queried.
+    ``sort=newest|most_discussed|recently_active`` picks the order.
+    """
+    current_user_id = get_jwt_identity()
+    user = User.query.get_or_404(current_user_id)
 
-    # Order by created_at descending
-    query = query.order_by(IncidentReport.created_at.desc())
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 10, type=int)
+
+    try:
+        fields = resolve_incident_fields(request.args.get('fields'), request.args.get('view'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    sort = request.args.get('sort', 'newest')
+    if sort not in INCIDENT_SORTS:
+        return jsonify({'error': f"Invalid sort. Must be one of: {', '.join(INCIDENT_SORTS)}"}), 400
 
-    # Paginate results
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    filters, error = build_incident_filters(request.args, user, current_user_id)
+    if error:
+        return error
+
+    # Select only the requested columns instead of hydrating ORM objects
+    stmt = incident_select(fields).where(*filters).order_by(*INCIDENT_SORTS[sort])
+    rows, total, pages = paginate_select(
+        db.session, stmt, count_of(IncidentReport.id).where(*filters), page, per_page)
 
     return jsonify({
-        'incidents': [incident.to_dict() for incident in pagination.items],
-        'total': pagination.total,
-        'pages': pagination.pages,
+        'incidents': serialize_incident_rows(rows, fields),
+        'total': total,
+        'pages': pages,
         'current_page': page
     }), 200
 
+def get_cluster_index(filters, filter_key):
+    """The cached ClusterIndex for a filter combination, built on demand."""
+    config = current_app.config
+    cache = current_app.extensions.get('cluster_cache')
+    if cache is None:
+        cache = current_app.extensions['cluster_cache'] = ClusterIndexCache(
+            max_entries=config.get('CLUSTER_CACHE_SIZE', 32),
+            ttl=config.get('CLUSTER_CACHE_TTL', 30))
+    return cache.get_or_build(
+        filter_key,
+        lambda: build_cluster_index(filters, max_zoom=config.get('CLUSTER_MAX_ZOOM', 16),
+                                    cell_px=config.get('CLUSTER_CELL_PX', 64)))
+
+@incident_bp.route('/clusters', methods=['GET'])
+@jwt_required()
+@read_only
+def get_incident_clusters():
+    """Get incidents aggregated into map clusters.
+
+    ``bbox=west,south,east,north`` and ``zoom`` select the clusters; the
+    same filters as the incident listing apply. Clusters of one incident
+    carry its ``id``.
+    """
+    current_user_id = get_jwt_identity()
+    user = User.query.get_or_404(current_user_id)
+
+    try:
+        bbox = parse_bbox(request.args.get('bbox', '-180,-85,180,85'))
+        zoom = int(request.args.get('zoom', 0))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid bbox or zoom: {e}'}), 400
+
+    filters, error = build_incident_filters(request.args, user, current_user_id)
+    if error:
+        return error
+
+    index = get_cluster_index(filters, incident_filter_key(request.args, user, current_user_id))
+    clusters = index.clusters(bbox, zoom)
+    return jsonify({
+        'zoom': min(max(zoom, 0), index.max_zoom),
+        'total': sum(cluster['count'] for cluster in clusters),
+        'clusters': clusters
+    }), 200
+
+@incident_bp.route('/tiles/<int:z>/<int:x>/<int:y>.mvt', methods=['GET'])
+@jwt_required()
+@read_only
+def get_incident_tile(z, x, y):
+    """Get incidents as a Mapbox Vector Tile.
+
+    Tiles up to ``MVT_CLUSTER_MAX_ZOOM`` hold a ``clusters`` layer; deeper
+    tiles hold one feature per incident in an ``incidents`` layer. The
+    listing filters apply.
+    """
+    if not (0 <= z <= MAX_ZOOM and 0 <= x < (1 << z) and 0 <= y < (1 << z)):
+        return jsonify({'error': 'Invalid tile coordinates'}), 400
+
+    current_user_id = get_jwt_identity()
+    user = User.query.get_or_404(current_user_id)
+    filters, error = build_incident_filters(request.args, user, current_user_id)
+    if error:
+        return error
+
+    config = current_app.config
+    cache = current_app.extensions.get('tile_cache')
+    if cache is None:
+        cache = current_app.extensions['tile_cache'] = TileCache(
+            max_entries=config.get('MVT_CACHE_SIZE', 2048), ttl=config.get('MVT_CACHE_TTL', 60),
+            cluster_max_zoom=config.get('MVT_CLUSTER_MAX_ZOOM', 11),
+            cluster_index_max_zoom=config.get('CLUSTER_MAX_ZOOM', 16),
+            cluster_cell_px=config.get('CLUSTER_CELL_PX', 64))
+
+    filter_key = incident_filter_key(request.args, user, current_user_id)
+    cached = cache.get((z, x, y, filter_key))
+    if cached:
+        body, etag = cached
+    else:
+        if z <= config.get('MVT_CLUSTER_MAX_ZOOM', 11):
+            layer = cluster_layer(z, x, y, get_cluster_index(filters, filter_key))
+        else:
+            layer = incident_layer(z, x, y, filters)
+        body = encode_tile([layer])
+        etag = tile_etag(body)
+        cache.put((z, x, y, filter_key), body, etag)
+
+    response = current_app.response_class(body, mimetype='application/vnd.mapbox-vector-tile')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f"private, max-age={config.get('MVT_CACHE_TTL', 60)}"
+    return response.make_conditional(request)
+
+@incident_bp.route('/heatmap', methods=['GET'])
+@jwt_required()
+@admin_required
+@read_only
+def get_incident_heatmap():
+    """Get incident density over the heatmap grid (admin only).
+
+    ``start_date``/``end_date`` (YYYY-MM-DD, default the last 30 days) and
+    ``category_id`` (comma-separated; ``0`` for uncategorized) select the
+    day grids to sum. ``format=png`` (default) returns a transparent
+    overlay for the grid's bbox; ``format=array`` returns the non-zero
+    cells as row-major flat indices and counts.
+    """
+    config = current_app.config
+    output = request.args.get('format', 'png')
+    if output not in ('png', 'array'):
+        return jsonify({'error': 'format must be png or array'}), 400
+
+    try:
+        start, end = default_range()
+        if request.args.get('end_date'):
+            end = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date()
+            start = default_range(end)[0]
+        if request.args.get('start_date'):
+            start = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date()
+        category_keys = None
+        if request.args.get('category_id'):
+            category_keys = sorted({int(c) for c in request.args['category_id'].split(',')})
+    except ValueError as e:
+        return jsonify({'error': f'Invalid heatmap parameters: {e}'}), 400
+    if start > end:
+        return jsonify({'error': 'start_date must not be after end_date'}), 400
+    if (end - start).days + 1 > config.get('HEATMAP_MAX_DAYS', 366):
+        return jsonify({'error': f"Date range is limited to {config.get('HEATMAP_MAX_DAYS', 366)} days"}), 400
+
+    spec = grid_spec(config)
+    counts, skipped = density(spec, start, end, category_keys)
+    if skipped:
+        current_app.logger.warning(f'Skipped {skipped} heatmap grids built with other settings; '
+                                   'run `flask heatmap rebuild`')
+
+    if output == 'png':
+        response = current_app.response_class(encode_png(render_rgba(counts)), mimetype='image/png')
+        response.headers['X-Heatmap-Bbox'] = f'{spec.west},{spec.south},{spec.east},{spec.north}'
+        response.headers['X-Heatmap-Max'] = str(int(counts.max()))
+    else:
+        response = jsonify({
+            'start_date': start.isoformat(),
+            'end_date': end.isoformat(),
+            'bbox': [spec.west, spec.south, spec.east, spec.north],
+            'cell_deg': spec.cell_deg,
+            'rows': spec.rows,
+            'cols': spec.cols,
+            'total': int(counts.sum()),
+            'max': int(counts.max()),
+            **sparse_payload(counts)
+        })
+    response.add_etag()
+    response.headers['Cache-Control'] = 'private, max-age=60'
+    return response.make_conditional(request)
+
 @incident_bp.route('/<int:incident_id>', methods=['GET'])
 @jwt_required()
 def get_incident(incident_id):
     """Get a specific incident."""
     current_user_id = get_jwt_identity()
     user = User.query.get_or_404(current_user_id)
-    incident = IncidentReport.query.get_or_404(incident_id)
+    incident = IncidentReport.query.get(incident_id)
+    if incident is not None:
+        data = incident.to_dict()
+    else:
+        # Resolved long ago and moved to the archive
+        record = find_archived_incident(incident_id)
+        if record is None:
+            abort(404)
+        data = record['incident']
 
     # Check if user has access to this incident
-    if user.role != 'admin' and incident.user_id != current_user_id:
+    if user.role != 'admin' and data['user_id'] != current_user_id:
         return jsonify({'error': 'Access denied'}), 403
 
-    return jsonify(incident.to_dict()), 200
-
-from ..utils.cloudinary_utils import upload_file
+    return jsonify(data), 200
 
 @incident_bp.route('/<int:incident_id>', methods=['PATCH'])
 @jwt_required()
@@ -224,6 +466,14 @@ def update_incident(incident_id):
                 if field not in allowed_fields:
                     return jsonify({'error': f'Cannot update {field}'}), 403
 
+        if 'affected_area_radius' in data:
+            try:
+                data['affected_area_radius'] = parse_affected_radius(
+                    data['affected_area_radius'],
+                    current_app.config.get('INCIDENT_MAX_AFFECTED_RADIUS_M', 50000))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+
         # Update allowed fields
         for field in ['title', 'description', 'priority', 'category_id',
                      'address', 'affected_area_radius']:
@@ -231,11 +481,10 @@ def update_incident(incident_id):
                 setattr(incident, field, data[field])
 
         # Admin-only fields
+        status_changed = False
         if user.role == 'admin':
             if 'status' in data:
-                incident.status = data['status']
-                if data['status'] == 'resolved':
-                    incident.resolved_at = datetime.utcnow()
+                status_changed = set_incident_status(incident, data['status'], current_user_id) is not None
             if 'assigned_to' in data:
                 incident.assigned_to = data['assigned_to']
             if 'resolution_notes' in data:
@@ -252,6 +501,8 @@ def update_incident(incident_id):
             incident.media_urls = json.dumps(media_urls)
 
         db.session.commit()
+        if status_changed:
+            notify_status_change(incident.id, data['status'])
 
         # Log activity
         log_activity(current_user_id, 'UPDATE_INCIDENT',
@@ -275,17 +526,17 @@ def update_incident_status(incident_id):
         return jsonify({'error': 'Status is required'}), 400
 
     try:
-        incident.status = data['status']
-        if data['status'] == 'resolved':
-            incident.resolved_at = datetime.utcnow()
-        
+        current_user_id = get_jwt_identity()
+        status_changed = set_incident_status(incident, data['status'], current_user_id) is not None
+
         if 'resolution_notes' in data:
             incident.resolution_notes = data['resolution_notes']
 
         db.session.commit()
+        if status_changed:
+            notify_status_change(incident.id, data['status'])
 
         # Log activity
-        current_user_id = get_jwt_identity()
         log_activity(current_user_id, 'UPDATE_INCIDENT_STATUS',
                     f'Updated incident status to {data["status"]}: {incident.title}',
                     request.remote_addr)
@@ -307,12 +558,16 @@ def add_comment(incident_id):
         return jsonify({'error': 'Comment content is required'}), 400
 
     try:
+        now = datetime.utcnow()
         comment = IncidentComment(
             incident_id=incident_id,
             user_id=current_user_id,
-            content=data['content']
+            content=data['content'],
+            created_at=now,
+            updated_at=now
         )
         db.session.add(comment)
+        record_comment(db.session, incident_id, now)
         db.session.commit()
 
         # Log activity
@@ -327,32 +582,81 @@ def add_comment(incident_id):
 
 @incident_bp.route('/<int:incident_id>/comments', methods=['GET'])
 @jwt_required()
+@read_only
 def get_comments(incident_id):
     """Get all comments for an incident."""
     current_user_id = get_jwt_identity()
     user = User.query.get_or_404(current_user_id)
-    incident = IncidentReport.query.get_or_404(incident_id)
+    incident = IncidentReport.query.get(incident_id)
+    record = find_archived_incident(incident_id) if incident is None else None
+    if incident is None and record is None:
+        abort(404)
+    owner_id = incident.user_id if incident is not None else record['incident']['user_id']
 
     # Check if user has access to this incident
-    if user.role != 'admin' and incident.user_id != current_user_id:
+    if user.role != 'admin' and owner_id != current_user_id:
         return jsonify({'error': 'Access denied'}), 403
 
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
 
-    pagination = IncidentComment.query.filter_by(incident_id=incident_id)\
-        .order_by(IncidentComment.created_at.desc())\
-        .paginate(page=page, per_page=per_page, error_out=False)
+    if record is not None:
+        return jsonify(_archived_comments_page(record['comments'], page, per_page)), 200
+
+    stmt = comment_select().where(IncidentComment.incident_id == incident_id)\
+        .order_by(IncidentComment.created_at.desc())
+    # The stored counter instead of a COUNT over the comments
+    rows, total, pages = paginate_select(db.session, stmt, None, page, per_page,
+                                         total=incident.comment_count)
 
     return jsonify({
-        'comments': [comment.to_dict() for comment in pagination.items],
-        'total': pagination.total,
-        'pages': pagination.pages,
+        'comments': serialize_comment_rows(rows),
+        'total': total,
+        'pages': pages,
         'current_page': page
     }), 200
 
+def _archived_comments_page(comments, page, per_page):
+    """Page an archived incident's comments like ``paginate_select`` does."""
+    if page < 1:
+        page = 1
+    if per_page < 1:
+        per_page = 20
+    newest_first = sorted(comments, key=lambda comment: comment['created_at'] or '', reverse=True)
+    total = len(newest_first)
+    return {
+        'comments': newest_first[(page - 1) * per_page:page * per_page],
+        'total': total,
+        'pages': math.ceil(total / per_page),
+        'current_page': page
+    }
+
+@incident_bp.route('/<int:incident_id>/history', methods=['GET'])
+@jwt_required()
+@read_only
+def get_status_history(incident_id):
+    """Get an incident's status changes, oldest first."""
+    current_user_id = get_jwt_identity()
+    user = User.query.get_or_404(current_user_id)
+    incident = IncidentReport.query.get(incident_id)
+    record = find_archived_incident(incident_id) if incident is None else None
+    if incident is None and record is None:
+        abort(404)
+    owner_id = incident.user_id if incident is not None else record['incident']['user_id']
+
+    # Check if user has access to this incident
+    if user.role != 'admin' and owner_id != current_user_id:
+        return jsonify({'error': 'Access denied'}), 403
+
+    if record is not None:
+        events = record.get('status_events', [])
+    else:
+        events = status_history(incident_id)
+    return jsonify({'incident_id': incident_id, 'events': events}), 200
+
 @incident_bp.route('/stats', methods=['GET'])
 @jwt_required()
+@read_only
 def get_stats():
     """Get incident statistics."""
     current_user_id = get_jwt_identity()
@@ -396,16 +700,17 @@ def get_stats():
     ).group_by(IncidentCategory.name).all()
 
     # Recent incidents
-    recent_incidents = query.order_by(
-        IncidentReport.created_at.desc()
-    ).limit(5).all()
+    recent_stmt = incident_select().order_by(IncidentReport.created_at.desc()).limit(5)
+    if user.role != 'admin':
+        recent_stmt = recent_stmt.where(IncidentReport.user_id == current_user_id)
+    recent_incidents = db.session.execute(recent_stmt).all()
 
     return jsonify({
         'total_incidents': total_incidents,
         'status_counts': dict(status_counts),
         'priority_counts': dict(priority_counts),
         'category_counts': dict(category_counts),
-        'recent_incidents': [incident.to_dict() for incident in recent_incidents]
+        'recent_incidents': serialize_incident_rows(recent_incidents)
     }), 200
 
 @incident_bp.route('/batch/status', methods=['PATCH'])
@@ -423,17 +728,22 @@ def batch_update_status():
             IncidentReport.id.in_(data['incident_ids'])
         ).all()
 
+        current_user_id = get_jwt_identity()
+        now = datetime.utcnow()
+        changed = [incident.id for incident in incidents
+                   if set_incident_status(incident, data['status'], current_user_id, now) is not None]
         for incident in incidents:
-            incident.status = data['status']
-            if data['status'] == 'resolved':
-                incident.resolved_at = datetime.utcnow()
             if data.get('resolution_notes'):
                 incident.resolution_notes = data['resolution_notes']
 
         db.session.commit()
 
+        # Queued together; a reporter with many of these incidents gets one digest
+        for incident_id in changed:
+            notify_status_change(incident_id, data['status'], commit=False)
+        db.session.commit()
+
         # Log activity
-        current_user_id = get_jwt_identity()
         log_activity(current_user_id, 'BATCH_UPDATE_STATUS',
                     f'Batch updated {len(incidents)} incidents to status: {data["status"]}',
                     request.remote_addr)
@@ -0,0 +1,108 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import delete
+from ..models import AlertSubscription, SubscriptionCell, db
+from ..utils.geofence import count_cells, index_subscription, parse_area
+
+subscription_bp = Blueprint('subscriptions', __name__)
+
+def _area_from_request(data):
+    """Validate the area in a payload; returns (values, error response)."""
+    config = current_app.config
+    try:
+        area = parse_area(data, config.get('SUBSCRIPTION_MAX_POLYGON_POINTS', 200))
+    except ValueError as e:
+        return None, (jsonify({'error': str(e)}), 400)
+    cells = count_cells(area['min_latitude'], area['max_latitude'], area['min_longitude'],
+                        area['max_longitude'], config.get('SUBSCRIPTION_CELL_DEG', 0.02))
+    if cells > config.get('SUBSCRIPTION_MAX_CELLS', 2500):
+        return None, (jsonify({'error': 'Subscription area is too large'}), 400)
+    return area, None
+
+def _own_subscription(subscription_id):
+    return AlertSubscription.query.filter_by(
+        id=subscription_id, user_id=get_jwt_identity()).first_or_404()
+
+@subscription_bp.route('/', methods=['GET'])
+@jwt_required()
+def get_subscriptions():
+    """Get the current user's area subscriptions."""
+    subscriptions = AlertSubscription.query.filter_by(
+        user_id=get_jwt_identity()).order_by(AlertSubscription.created_at).all()
+    return jsonify([subscription.to_dict() for subscription in subscriptions]), 200
+
+@subscription_bp.route('/', methods=['POST'])
+@jwt_required()
+def create_subscription():
+    """Subscribe to incidents in an area.
+
+    Send ``name`` plus ``latitude``, ``longitude`` and ``radius_m`` for a
+    circle, or ``polygon`` as a list of [lat, lon] points.
+    """
+    current_user_id = get_jwt_identity()
+    data = request.get_json() or {}
+    if not data.get('name'):
+        return jsonify({'error': 'name is required'}), 400
+
+    area, error = _area_from_request(data)
+    if error:
+        return error
+
+    limit = current_app.config.get('SUBSCRIPTION_MAX_PER_USER', 10)
+    if AlertSubscription.query.filter_by(user_id=current_user_id).count() >= limit:
+        return jsonify({'error': f'You can have at most {limit} subscriptions'}), 400
+
+    try:
+        subscription = AlertSubscription(user_id=current_user_id, name=data['name'][:100],
+                                         is_active=bool(data.get('is_active', True)), **area)
+        db.session.add(subscription)
+        db.session.flush()
+        index_subscription(subscription, current_app.config.get('SUBSCRIPTION_CELL_DEG', 0.02))
+        db.session.commit()
+        return jsonify(subscription.to_dict()), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@subscription_bp.route('/<int:subscription_id>', methods=['PATCH'])
+@jwt_required()
+def update_subscription(subscription_id):
+    """Rename, pause/resume or move a subscription."""
+    subscription = _own_subscription(subscription_id)
+    data = request.get_json() or {}
+
+    try:
+        if 'name' in data:
+            if not data['name']:
+                return jsonify({'error': 'name is required'}), 400
+            subscription.name = data['name'][:100]
+        if 'is_active' in data:
+            subscription.is_active = bool(data['is_active'])
+        if any(key in data for key in ('polygon', 'latitude', 'longitude', 'radius_m')):
+            area, error = _area_from_request(data)
+            if error:
+                return error
+            for key, value in area.items():
+                setattr(subscription, key, value)
+            index_subscription(subscription, current_app.config.get('SUBSCRIPTION_CELL_DEG', 0.02))
+        db.session.commit()
+        return jsonify(subscription.to_dict()), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@subscription_bp.route('/<int:subscription_id>', methods=['DELETE'])
+@jwt_required()
+def delete_subscription(subscription_id):
+    """Delete a subscription."""
+    subscription = _own_subscription(subscription_id)
+    try:
+        # Not left to ON DELETE CASCADE, which SQLite only honours when enabled
+        db.session.execute(delete(SubscriptionCell).where(
+            SubscriptionCell.subscription_id == subscription.id))
+        db.session.delete(subscription)
+        db.session.commit()
+        return jsonify({'message': 'Subscription deleted'}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,161 @@
+import pytest
+from datetime import datetime
+from flask_jwt_extended import create_access_token
+from sqlalchemy import text
+from server import create_app
+from server.models import db, User, UserActivity
+from server.utils.activity_partitions import (
+    PartitionCache, activity_page, apply_retention, list_partitions, maintain_partitions
+)
+
+NOW = datetime(2024, 3, 15, 12)
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def users(app):
+    admin = User(username='admin', email='admin@example.com', role='admin')
+    resident = User(username='resident', email='resident@example.com', role='user')
+    db.session.add_all([admin, resident])
+    db.session.commit()
+    return admin, resident
+
+def log(user, *months):
+    """One activity per (month, day) pair, at noon."""
+    for month, day in months:
+        db.session.add(UserActivity(user_id=user.id, activity_type='LOGIN',
+                                    description=f'Login on {month}/{day}',
+                                    created_at=datetime(2024, month, day, 12)))
+    db.session.commit()
+
+def maintain(now=NOW):
+    with db.engine.begin() as connection:
+        return maintain_partitions(connection, now)
+
+def table_names():
+    return set(db.session.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'table'")).scalars())
+
+def test_rotation_moves_closed_months_into_partitions(users):
+    admin, resident = users
+    log(resident, (1, 10), (1, 20), (2, 5), (3, 1), (3, 14))
+
+    assert maintain() == ['user_activities_p202401', 'user_activities_p202402']
+    assert {'user_activities_p202401', 'user_activities_p202402'} <= table_names()
+    # The current month stays in the model's table
+    assert [a.created_at.day for a in UserActivity.query.order_by(UserActivity.id)] == [1, 14]
+    assert db.session.execute(text('SELECT count(*) FROM user_activities_all')).scalar() == 5
+    assert [p.name for p in list_partitions(db.session, NOW)] == [
+        'user_activities', 'user_activities_p202402', 'user_activities_p202401']
+    assert maintain() == []
+
+    # Ids keep counting past the rows moved out
+    log(resident, (3, 15))
+    ids = db.session.execute(text('SELECT id FROM user_activities_all')).scalars().all()
+    assert len(ids) == len(set(ids)) == 6
+
+def test_late_rotation_keeps_rows_of_the_new_month(users):
+    admin, resident = users
+    log(resident, (2, 27))
+    maintain(datetime(2024, 2, 28))
+    log(resident, (2, 29), (3, 1))
+
+    assert maintain() == ['user_activities_p202402']
+    assert UserActivity.query.count() == 1
+    assert db.session.execute(text('SELECT count(*) FROM user_activities_p202402')).scalar() == 2
+
+def test_page_reads_partitions_newest_first(users):
+    admin, resident = users
+    log(resident, (1, 10), (2, 5), (2, 6), (3, 1))
+    log(admin, (2, 7), (3, 2))
+    maintain()
+    cache = PartitionCache()
+
+    activities, total = activity_page(db.session, cache, 1, 3)
+    assert total == 6
+    assert [a['description'] for a in activities] == ['Login on 3/2', 'Login on 3/1', 'Login on 2/7']
+    activities, _ = activity_page(db.session, cache, 2, 3)
+    assert [a['description'] for a in activities] == ['Login on 2/6', 'Login on 2/5', 'Login on 1/10']
+
+    activities, total = activity_page(db.session, cache, 2, 2, user_id=resident.id)
+    assert total == 4
+    assert [a['description'] for a in activities] == ['Login on 2/5', 'Login on 1/10']
+    assert activities[0]['user_id'] == resident.id
+
+def test_page_recovers_from_a_stale_partition_list(users):
+    admin, resident = users
+    log(resident, (1, 10), (3, 1))
+    cache = PartitionCache(ttl=3600)
+    maintain()
+    cache.partitions(db.session, NOW)
+    with db.engine.begin() as connection:
+        apply_retention(connection, 1, now=NOW)
+
+    activities, total = activity_page(db.session, cache, 1, 10)
+    assert total == 1
+    assert activities[0]['description'] == 'Login on 3/1'
+
+def test_retention_drops_or_archives_whole_partitions(users):
+    admin, resident = users
+    log(resident, (1, 10), (2, 5), (3, 1))
+    maintain()
+
+    with db.engine.begin() as connection:
+        assert apply_retention(connection, 1, archive=True, now=NOW) == ['user_activities_p202401']
+    assert 'user_activities_archive_202401' in table_names()
+    assert 'user_activities_p202401' not in table_names()
+    assert db.session.execute(text('SELECT count(*) FROM user_activities_all')).scalar() == 2
+
+    with db.engine.begin() as connection:
+        assert apply_retention(connection, 0, now=NOW) == []
+        assert apply_retention(connection, 1, now=datetime(2024, 4, 1)) == [
+            'user_activities_p202402']
+    assert 'user_activities_p202402' not in table_names()
+    assert db.session.execute(text('SELECT count(*) FROM user_activities_all')).scalar() == 1
+
+    # A month archived again is added to its archive
+    log(resident, (1, 11))
+    maintain()
+    with db.engine.begin() as connection:
+        apply_retention(connection, 1, archive=True, now=NOW)
+        assert connection.execute(text(
+            'SELECT count(*) FROM user_activities_archive_202401')).scalar() == 2
+        # Archives outlive drop_all
+        connection.execute(text('DROP TABLE user_activities_archive_202401'))
+
+def test_maintain_command(app, users):
+    admin, resident = users
+    log(resident, (1, 10))
+    app.config['ACTIVITY_RETENTION_MONTHS'] = 0
+
+    result = app.test_cli_runner().invoke(args=['activities', 'maintain'])
+    assert result.exit_code == 0
+    assert 'Created user_activities_p202401' in result.output
+    assert db.session.execute(text('SELECT count(*) FROM user_activities_all')).scalar() == 1
+
+def test_activities_route_pages_across_partitions(app, users):
+    admin, resident = users
+    log(resident, (1, 10), (2, 5), (3, 1))
+    log(admin, (3, 2))
+    maintain()
+    client = app.test_client()
+
+    response = client.get('/api/auth/activities?per_page=2&page=2', headers={
+        'Authorization': f'Bearer {create_access_token(identity=admin.id)}'})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert (data['total'], data['pages'], data['current_page']) == (4, 2, 2)
+    assert [a['description'] for a in data['activities']] == ['Login on 2/5', 'Login on 1/10']
+
+    response = client.get('/api/auth/activities', headers={
+        'Authorization': f'Bearer {create_access_token(identity=resident.id)}'})
+    data = response.get_json()
+    assert data['total'] == 3
+    assert {a['user_id'] for a in data['activities']} == {resident.id}
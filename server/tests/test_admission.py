@@ -0,0 +1,93 @@
+import threading
+import time
+import pytest
+from flask import Flask
+from server.utils.admission import (
+    AdmissionController, CRITICAL, NORMAL, LOW, criticality, init_admission_control,
+    parse_request_start
+)
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(ADMISSION_MAX_INFLIGHT=2, ADMISSION_DEFER_MS=0)
+    app.gate = threading.Event()
+
+    @app.route('/slow')
+    def slow():
+        app.gate.wait(5)
+        return 'done'
+
+    @app.route('/list')
+    def listing():
+        return 'rows'
+
+    @app.route('/report', methods=['POST'])
+    @criticality('critical')
+    def report():
+        return 'created', 201
+
+    init_admission_control(app)
+    return app
+
+def test_parse_request_start():
+    now = 1700000000.5
+    assert parse_request_start('t=1700000000.4', now) == pytest.approx(0.1)
+    assert parse_request_start('1700000000400', now) == pytest.approx(0.1)
+    assert parse_request_start('1700000000400000', now) == pytest.approx(0.1)
+    assert parse_request_start('garbage', now) is None
+    assert parse_request_start('t=1800000000', now) is None
+
+def test_sheds_low_before_normal_and_never_critical():
+    controller = AdmissionController(max_inflight=4, defer_timeout=0)
+    assert controller.try_admit(LOW)
+    assert controller.try_admit(LOW)
+    # Half the capacity is in use: reads are shed, writes still go through
+    assert not controller.try_admit(LOW)
+    assert controller.try_admit(NORMAL)
+    assert not controller.try_admit(NORMAL)
+    for _ in range(10):
+        assert controller.try_admit(CRITICAL)
+    assert controller.rejected == {LOW: 1, NORMAL: 1}
+
+    for _ in range(13):
+        controller.release()
+    assert controller.inflight == 0
+    assert controller.try_admit(LOW)
+
+def test_queue_latency_sheds_low_reads():
+    controller = AdmissionController(max_inflight=100, low_delay=0.1, normal_delay=0.5)
+    for _ in range(20):
+        controller.try_admit(CRITICAL, delay=0.3)
+    assert not controller.try_admit(LOW)
+    assert controller.try_admit(NORMAL)
+    assert controller.retry_after() >= 1
+
+def test_low_request_is_deferred_until_a_slot_frees():
+    controller = AdmissionController(max_inflight=2, defer_timeout=1.0)
+    assert controller.try_admit(LOW)
+    threading.Timer(0.05, controller.release).start()
+    started = time.monotonic()
+    assert controller.try_admit(LOW)
+    assert time.monotonic() - started < 0.9
+
+def test_overloaded_worker_returns_503_for_reads_only(app):
+    client = app.test_client()
+    worker = threading.Thread(target=client.get, args=('/slow',))
+    worker.start()
+    try:
+        deadline = time.monotonic() + 2
+        while app.extensions['admission_controller'].inflight < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        response = client.get('/list')
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+        assert client.post('/report').status_code == 201
+        assert client.options('/list').status_code == 200
+    finally:
+        app.gate.set()
+        worker.join()
+
+    assert client.get('/list').status_code == 200
+    assert app.extensions['admission_controller'].inflight == 0
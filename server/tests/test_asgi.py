@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import pytest
+from flask import Flask, request, Response
+from server.utils.asgi_utils import AsgiAdapter
+
+@pytest.fixture
+def adapter():
+    app = Flask(__name__)
+
+    @app.route('/upload', methods=['POST'])
+    def upload():
+        return {'received': len(request.get_data()), 'thread': threading.current_thread().name}
+
+    @app.route('/stream')
+    def stream():
+        return Response((f'chunk-{i}\n' for i in range(3)), mimetype='text/plain')
+
+    @app.route('/cookie')
+    def cookie():
+        return dict(request.cookies)
+
+    adapter = AsgiAdapter(app, max_threads=2)
+    yield adapter
+    if adapter.executor is not None:
+        adapter.executor.shutdown()
+
+def call(adapter, method, path, body_chunks=(b'',), headers=()):
+    scope = {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': b'',
+        'headers': list(headers),
+        'http_version': '1.1',
+        'client': ('127.0.0.1', 5000),
+        'server': ('testserver', 80),
+    }
+    incoming = [{'type': 'http.request', 'body': chunk, 'more_body': i < len(body_chunks) - 1}
+                for i, chunk in enumerate(body_chunks)]
+    sent = []
+
+    async def receive():
+        return incoming.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(adapter(scope, receive, send))
+    body = b''.join(message.get('body', b'') for message in sent[1:])
+    return sent[0]['status'], body, sent
+
+def test_chunked_upload_is_buffered_before_the_view_runs(adapter):
+    status, body, _ = call(adapter, 'POST', '/upload', [b'a' * 10, b'b' * 10, b'c' * 5])
+    assert status == 200
+    assert b'"received":25' in body.replace(b' ', b'')
+    assert b'asgi-wsgi' in body
+
+def test_oversized_chunked_upload_is_rejected_while_streaming(adapter):
+    adapter.max_body_size = 20
+    chunks = [b'a' * 10, b'b' * 10, b'c' * 5, b'd' * 10]
+    status, body, _ = call(adapter, 'POST', '/upload', chunks)
+    assert status == 413
+    assert b'too large' in body
+    # Stopped reading at the chunk that crossed the limit
+    assert adapter.executor is None
+
+def test_oversized_declared_length_is_rejected_before_reading(adapter):
+    adapter.max_body_size = 20
+    status, _, _ = call(adapter, 'POST', '/upload', [b'a' * 5],
+                        headers=[(b'content-length', b'1000')])
+    assert status == 413
+
+def test_streaming_response_is_sent_in_chunks(adapter):
+    status, body, sent = call(adapter, 'GET', '/stream')
+    assert status == 200
+    assert body == b'chunk-0\nchunk-1\nchunk-2\n'
+    assert sent[-1] == {'type': 'http.response.body', 'body': b'', 'more_body': False}
+
+def test_repeated_cookie_headers_are_joined(adapter):
+    _, body, _ = call(adapter, 'GET', '/cookie',
+                      headers=[(b'cookie', b'a=1'), (b'cookie', b'b=2')])
+    assert b'"a":"1"' in body.replace(b' ', b'')
+    assert b'"b":"2"' in body.replace(b' ', b'')
+
+def test_lifespan_manages_thread_pool(adapter):
+    messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message['type'])
+
+    asyncio.run(adapter({'type': 'lifespan'}, receive, send))
+    assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+    assert adapter.executor is None
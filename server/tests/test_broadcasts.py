@@ -0,0 +1,152 @@
+import pytest
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from server import create_app
+from server.models import db, User, AlertSubscription, Broadcast, BroadcastJob
+from server.utils import broadcast as broadcast_utils
+from server.utils.broadcast import ProviderThrottle, claim_job, create_broadcast, run_pending
+from server.utils.rate_limit import MemoryStore, parse_limits
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    app.config['BROADCAST_CHUNK_SIZE'] = 3
+    app.config['BROADCAST_EMAIL_RATE'] = '1000 per second'
+    app.config['BROADCAST_SMS_RATE'] = '1000 per second'
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def admin_headers(app):
+    admin = User(username='admin', email='admin@example.com', role='admin',
+                 email_notifications=False, sms_notifications=False)
+    db.session.add(admin)
+    db.session.commit()
+    return {'Authorization': f'Bearer {create_access_token(identity=admin.id)}'}
+
+@pytest.fixture
+def residents(app):
+    users = [User(username=f'resident{i}', email=f'resident{i}@example.com',
+                  phone_number=f'+2547000000{i:02d}' if i % 2 else None)
+             for i in range(8)]
+    users[7].email_notifications = False
+    users[6].is_active = False
+    db.session.add_all(users)
+    db.session.commit()
+    return users
+
+@pytest.fixture
+def outbox(monkeypatch):
+    sent = []
+
+    class FakeSMSClient:
+        def send(self, to, body):
+            sent.append(('sms', to, body))
+            return True
+
+    monkeypatch.setattr(broadcast_utils, 'send_email_batch', lambda emails: [
+        sent.append(('email', to, subject)) or True for to, subject, _ in emails])
+    monkeypatch.setattr(broadcast_utils, 'get_sms_client', lambda: FakeSMSClient())
+    return sent
+
+def test_broadcast_requires_admin(client, residents):
+    token = create_access_token(identity=residents[0].id)
+    response = client.post('/api/admin/broadcasts', json={'title': 'Flood', 'message': 'Move'},
+                           headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 403
+
+def test_create_broadcast_counts_recipients(client, admin_headers, residents):
+    response = client.post('/api/admin/broadcasts', headers=admin_headers, json={
+        'title': 'Flood warning', 'message': 'Move to higher ground.'})
+    assert response.status_code == 201
+    jobs = {job['channel']: job for job in response.get_json()['jobs']}
+    assert jobs['email']['total'] == 6  # Not the inactive or opted-out residents
+    assert jobs['sms']['total'] == 4  # resident7 only opted out of email
+    assert response.get_json()['status'] == 'pending'
+
+    response = client.post('/api/admin/broadcasts', headers=admin_headers, json={
+        'title': 'Flood', 'message': 'Move', 'channels': ['fax']})
+    assert response.status_code == 400
+
+def test_region_limits_recipients(client, admin_headers, residents):
+    for user, latitude in ((residents[0], -1.28), (residents[1], -1.29), (residents[2], 2.5)):
+        db.session.add(AlertSubscription(
+            user_id=user.id, name='Home', kind='circle', center_latitude=latitude,
+            center_longitude=36.82, radius_m=500, min_latitude=latitude - 0.005,
+            max_latitude=latitude + 0.005, min_longitude=36.815, max_longitude=36.825))
+    db.session.commit()
+
+    response = client.post('/api/admin/broadcasts', headers=admin_headers, json={
+        'title': 'Road closure', 'message': 'Avoid Uhuru Highway.', 'channels': ['email'],
+        'region': {'name': 'Nairobi', 'latitude': -1.286, 'longitude': 36.817, 'radius_m': 20000}})
+    assert response.status_code == 201
+    assert response.get_json()['region_name'] == 'Nairobi'
+    assert response.get_json()['jobs'][0]['total'] == 2
+
+def test_run_sends_every_recipient_in_chunks(app, admin_headers, residents, outbox):
+    broadcast = create_broadcast(None, 'Flood warning', 'Move to higher ground.')
+    db.session.commit()
+
+    jobs, sent, failed = run_pending(app, sleep=lambda seconds: None)
+    assert (jobs, sent, failed) == (2, 10, 0)
+    emails = sorted(to for channel, to, _ in outbox if channel == 'email')
+    assert emails == sorted(f'resident{i}@example.com' for i in range(6))
+    assert sorted(to for channel, to, _ in outbox if channel == 'sms') == [
+        '+254700000001', '+254700000003', '+254700000005', '+254700000007']
+
+    db.session.expire_all()
+    broadcast = db.session.get(Broadcast, broadcast.id)
+    assert broadcast.status == 'completed'
+    assert {job.channel: job.sent for job in broadcast.jobs} == {'email': 6, 'sms': 4}
+    assert run_pending(app) == (0, 0, 0)
+
+def test_resumes_after_worker_dies(app, residents, outbox):
+    create_broadcast(None, 'Flood warning', 'Move to higher ground.', channels=['email'])
+    db.session.commit()
+
+    job, token = claim_job(lease_seconds=60)
+    # The worker handled the first three recipients, then died
+    job.cursor = residents[2].id
+    job.sent = 3
+    db.session.commit()
+    assert claim_job(lease_seconds=60) is None  # Still leased
+
+    job.lease_until = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    assert run_pending(app) == (1, 3, 0)
+    assert sorted(to for _, to, _ in outbox) == [f'resident{i}@example.com' for i in (3, 4, 5)]
+    assert db.session.get(BroadcastJob, (job.broadcast_id, 'email')).sent == 6
+
+def test_cancelled_broadcast_stops(client, admin_headers, residents, outbox):
+    broadcast_id = client.post('/api/admin/broadcasts', headers=admin_headers, json={
+        'title': 'Flood', 'message': 'Move'}).get_json()['id']
+    response = client.post(f'/api/admin/broadcasts/{broadcast_id}/cancel', headers=admin_headers)
+    assert response.get_json()['status'] == 'cancelled'
+    assert run_pending(client.application) == (0, 0, 0)
+    assert outbox == []
+
+def test_provider_throttle_waits_for_tokens():
+    now = [1000.0]
+    store = MemoryStore()
+    store_consume = store.consume
+    store.consume = lambda *args: store_consume(*args, now=now[0])
+
+    def sleep(seconds):
+        now[0] += seconds
+
+    throttle = ProviderThrottle(store, 'provider:sms', parse_limits('10 per second; 25 per minute'),
+                                sleep=sleep)
+    assert throttle.burst == 10
+    for _ in range(2):
+        throttle.acquire(10)
+    assert throttle.waited == pytest.approx(1.0)
+    throttle.acquire(5)  # The minute bucket runs dry at 25
+    throttle.acquire(5)
+    assert throttle.waited > 10
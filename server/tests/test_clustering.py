@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+from flask_jwt_extended import create_access_token
+from server import create_app
+from server.models import db, User, IncidentReport
+from server.utils.clustering import ClusterIndex, parse_bbox
+
+KENYA = '33.9,-4.7,41.9,5.0'
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def users(app):
+    reporter = User(username='reporter', email='reporter@example.com', role='user')
+    admin = User(username='admin', email='admin@example.com', role='admin')
+    db.session.add_all([reporter, admin])
+    db.session.commit()
+
+    incidents = [
+        # Three in central Nairobi, one in Mombasa
+        IncidentReport(title='a', description='a', latitude=-1.2860, longitude=36.8170,
+                       user_id=reporter.id, priority='high'),
+        IncidentReport(title='b', description='b', latitude=-1.2862, longitude=36.8172,
+                       user_id=admin.id, priority='critical'),
+        IncidentReport(title='c', description='c', latitude=-1.2865, longitude=36.8175,
+                       user_id=admin.id, priority='low', status='resolved'),
+        IncidentReport(title='d', description='d', latitude=-4.0435, longitude=39.6682,
+                       user_id=admin.id),
+    ]
+    db.session.add_all(incidents)
+    db.session.commit()
+    return reporter, admin
+
+def auth(user):
+    return {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+def test_levels_are_built_from_children():
+    rng = np.random.default_rng(1)
+    lats = rng.uniform(-1.4, -1.1, 5000)
+    lons = rng.uniform(36.6, 37.0, 5000)
+    index = ClusterIndex(np.arange(1, 5001), lats, lons, rng.integers(0, 4, 5000), max_zoom=14)
+
+    for level in index.levels:
+        assert level.count.sum() == 5000
+        assert level.priorities.sum() == 5000
+    assert len(index.levels[0].count) == 1
+    assert len(index.levels[14].count) > len(index.levels[8].count)
+
+    nairobi = index.clusters((36.6, -1.4, 37.0, -1.1), 8)
+    assert sum(c['count'] for c in nairobi) == 5000
+    assert index.clusters((10.0, 10.0, 11.0, 11.0), 8) == []
+
+def test_clusters_endpoint(client, users):
+    reporter, admin = users
+    response = client.get(f'/api/incidents/clusters?bbox={KENYA}&zoom=5', headers=auth(admin))
+    assert response.status_code == 200
+    assert response.json['total'] == 4
+    clusters = sorted(response.json['clusters'], key=lambda c: -c['count'])
+    assert clusters[0]['count'] == 3
+    assert clusters[0]['priorities'] == {'low': 1, 'medium': 0, 'high': 1, 'critical': 1}
+    assert clusters[0]['latitude'] == pytest.approx(-1.2862, abs=1e-3)
+    assert clusters[1]['count'] == 1 and 'id' in clusters[1]
+
+    # Zoomed into Mombasa only
+    response = client.get('/api/incidents/clusters?bbox=39.5,-4.2,39.8,-3.9&zoom=12',
+                          headers=auth(admin))
+    assert response.json['total'] == 1
+
+def test_clusters_apply_listing_filters(client, users):
+    reporter, admin = users
+    response = client.get(f'/api/incidents/clusters?bbox={KENYA}&zoom=5&status=resolved',
+                          headers=auth(admin))
+    assert response.json['total'] == 1
+
+    # Regular users only see their own incidents
+    response = client.get(f'/api/incidents/clusters?bbox={KENYA}&zoom=5', headers=auth(reporter))
+    assert response.json['total'] == 1
+
+def test_cache_sees_new_incidents(client, users):
+    reporter, admin = users
+    url = f'/api/incidents/clusters?bbox={KENYA}&zoom=3'
+    assert client.get(url, headers=auth(admin)).json['total'] == 4
+    db.session.add(IncidentReport(title='e', description='e', latitude=0.5, longitude=35.3,
+                                  user_id=admin.id))
+    db.session.commit()
+    assert client.get(url, headers=auth(admin)).json['total'] == 5
+
+def test_rejects_bad_bbox(client, users):
+    response = client.get('/api/incidents/clusters?bbox=1,2,3&zoom=5', headers=auth(users[1]))
+    assert response.status_code == 400
+    with pytest.raises(ValueError):
+        parse_bbox('0,10,1,5')
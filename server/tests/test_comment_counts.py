@@ -0,0 +1,94 @@
+import pytest
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from server import create_app
+from server.models import db, User, IncidentComment, IncidentReport
+from server.utils.comment_counts import repair_comment_counts
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def admin(app):
+    user = User(username='admin', email='admin@example.com', role='admin')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+@pytest.fixture
+def headers(admin):
+    return {'Authorization': f'Bearer {create_access_token(identity=admin.id)}'}
+
+@pytest.fixture
+def incidents(admin):
+    reports = [IncidentReport(title=f'Incident {i}', description='Road blocked', latitude=-1.28,
+                              longitude=36.82, user_id=admin.id,
+                              created_at=datetime(2024, 5, 1) + timedelta(days=i))
+               for i in range(3)]
+    db.session.add_all(reports)
+    db.session.commit()
+    return [report.id for report in reports]
+
+def comment(client, headers, incident_id, content='Still blocked'):
+    return client.post(f'/api/incidents/{incident_id}/comments', json={'content': content},
+                       headers=headers)
+
+def test_add_comment_updates_counters(client, headers, incidents):
+    updated_at = db.session.get(IncidentReport, incidents[0]).updated_at
+    assert comment(client, headers, incidents[0]).status_code == 201
+    second = comment(client, headers, incidents[0]).get_json()
+
+    db.session.expire_all()
+    incident = db.session.get(IncidentReport, incidents[0])
+    assert incident.comment_count == 2
+    assert incident.last_comment_at.isoformat() == second['created_at']
+    assert incident.updated_at == updated_at
+
+    data = client.get(f'/api/incidents/{incidents[0]}', headers=headers).get_json()
+    assert data['comment_count'] == 2
+    page = client.get(f'/api/incidents/{incidents[0]}/comments?per_page=1', headers=headers).get_json()
+    assert (page['total'], page['pages'], len(page['comments'])) == (2, 2, 1)
+
+def test_listing_sorts_by_comment_activity(client, headers, incidents):
+    comment(client, headers, incidents[1])
+    comment(client, headers, incidents[1])
+    comment(client, headers, incidents[0])
+
+    def order(sort):
+        response = client.get(f'/api/incidents/?sort={sort}&view=card', headers=headers)
+        return [(item['id'], item['comment_count']) for item in response.get_json()['incidents']]
+
+    assert order('most_discussed') == [(incidents[1], 2), (incidents[0], 1), (incidents[2], 0)]
+    assert order('recently_active') == [(incidents[0], 1), (incidents[1], 2), (incidents[2], 0)]
+    assert order('newest')[0] == (incidents[2], 0)
+    assert client.get('/api/incidents/?sort=loudest', headers=headers).status_code == 400
+
+def test_repair_fixes_drifted_counters(app, admin, incidents):
+    db.session.add_all([
+        IncidentComment(incident_id=incidents[0], user_id=admin.id, content='Added out of band',
+                        created_at=datetime(2024, 6, 1)),
+        IncidentComment(incident_id=incidents[0], user_id=admin.id, content='Another',
+                        created_at=datetime(2024, 6, 2)),
+    ])
+    db.session.get(IncidentReport, incidents[2]).comment_count = 5
+    db.session.commit()
+
+    assert repair_comment_counts(batch_size=2) == 2
+    counters = {report.id: (report.comment_count, report.last_comment_at)
+                for report in IncidentReport.query}
+    assert counters == {incidents[0]: (2, datetime(2024, 6, 2)),
+                        incidents[1]: (0, None),
+                        incidents[2]: (0, None)}
+
+    result = app.test_cli_runner().invoke(args=['incidents', 'repair-comment-counts'])
+    assert 'Repaired comment counters on 0 incidents.' in result.output
@@ -0,0 +1,107 @@
+import gzip
+import zlib
+import pytest
+from flask import Flask, Response, request
+from server.utils import compression
+from server.utils.compression import init_compression, parse_accept_encoding
+
+@pytest.fixture
+def app(monkeypatch):
+    # Keep results deterministic whether or not brotli is installed
+    monkeypatch.setattr(compression, 'brotli', None)
+
+    app = Flask(__name__)
+    app.config['COMPRESS_MIN_SIZE'] = 100
+
+    @app.route('/big')
+    def big():
+        return {'incidents': [{'id': i, 'title': 'Crash on Mombasa Road'} for i in range(50)]}
+
+    @app.route('/small')
+    def small():
+        return {'ok': True}
+
+    @app.route('/image')
+    def image():
+        return Response(b'\x89PNG' * 500, mimetype='image/png')
+
+    @app.route('/stream')
+    def stream():
+        def generate():
+            for i in range(5):
+                yield f'row-{i},' * 50 + '\n'
+        return Response(generate(), mimetype='text/csv')
+
+    @app.route('/cached')
+    def cached():
+        response = Response('x' * 1000, mimetype='text/plain')
+        response.set_etag('v1')
+        return response
+
+    @app.route('/conditional')
+    def conditional():
+        response = Response('x' * 1000, mimetype='text/plain')
+        response.set_etag('v2')
+        return response.make_conditional(request)
+
+    init_compression(app)
+    return app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding('gzip;q=0.5, br, identity;q=0') == {
+        'gzip': 0.5, 'br': 1.0, 'identity': 0.0
+    }
+
+def test_compresses_when_accepted(client):
+    response = client.get('/big', headers={'Accept-Encoding': 'gzip, deflate'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert int(response.headers['Content-Length']) == len(response.data)
+    assert b'Crash on Mombasa Road' in gzip.decompress(response.data)
+
+def test_skips_without_accept_encoding(client):
+    response = client.get('/big')
+    assert 'Content-Encoding' not in response.headers
+
+def test_skips_refused_encoding(client):
+    response = client.get('/big', headers={'Accept-Encoding': 'gzip;q=0'})
+    assert 'Content-Encoding' not in response.headers
+
+def test_skips_small_and_binary_responses(client):
+    assert 'Content-Encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+    assert 'Content-Encoding' not in client.get('/image', headers={'Accept-Encoding': 'gzip'}).headers
+
+def test_streaming_response_is_compressed_incrementally(client):
+    response = client.get('/stream', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+
+    chunks = [chunk for chunk in response.response if chunk]
+    assert len(chunks) > 1
+    # Each flushed chunk is decodable on its own, so clients can render early
+    decompressor = zlib.decompressobj(31)
+    assert decompressor.decompress(chunks[0]).startswith(b'row-0,')
+    response.close()
+
+def test_precompressed_cache_keyed_by_etag(app, client):
+    first = client.get('/cached', headers={'Accept-Encoding': 'gzip'})
+    second = client.get('/cached', headers={'Accept-Encoding': 'gzip'})
+    assert first.headers['ETag'] == '"v1-gzip"'
+    assert first.data == second.data
+    assert len(app.wsgi_app.cache._entries) == 1
+
+def test_revalidating_with_compressed_etag_returns_304(client):
+    first = client.get('/conditional', headers={'Accept-Encoding': 'gzip'})
+    assert first.headers['ETag'] == '"v2-gzip"'
+    second = client.get('/conditional', headers={'Accept-Encoding': 'gzip',
+                                                 'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 304
+    assert second.headers['ETag'] == '"v2-gzip"'
+    assert second.data == b''
+    # Uncompressed clients keep revalidating with the plain tag
+    plain = client.get('/conditional', headers={'If-None-Match': '"v2"'})
+    assert plain.status_code == 304
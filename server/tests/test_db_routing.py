@@ -0,0 +1,74 @@
+import pytest
+from server import create_app
+from server.config import config, TestingConfig
+from server.models import db, IncidentCategory
+from server.utils.db_routing import read_only
+
+@pytest.fixture
+def app(tmp_path):
+    class ReplicaTestingConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'primary.db'}"
+        SQLALCHEMY_BINDS = {'replica': f"sqlite:///{tmp_path / 'replica.db'}"}
+
+    config['replica-testing'] = ReplicaTestingConfig
+    app = create_app('replica-testing')
+
+    @app.route('/test/categories')
+    @read_only
+    def count_categories():
+        return {'count': IncidentCategory.query.count()}
+
+    @app.route('/test/categories', methods=['POST'])
+    def add_category():
+        db.session.add(IncidentCategory(name='Fire'))
+        db.session.commit()
+        return {'count': IncidentCategory.query.count()}, 201
+
+    # Each request gets its own app context, as it would in production
+    with app.app_context():
+        db.create_all()
+        db.metadata.create_all(db.engines['replica'])
+    yield app
+    with app.app_context():
+        db.drop_all()
+        db.metadata.drop_all(db.engines['replica'])
+    config.pop('replica-testing')
+    # Flask-SQLAlchemy keeps a metadata per bind key on the shared extension
+    db.metadatas.pop('replica', None)
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def test_read_only_view_uses_replica(client):
+    response = client.post('/test/categories')
+    assert response.json['count'] == 1
+
+    # The write only reached the primary, so the replica still reports nothing
+    client.delete_cookie('db_primary')
+    response = client.get('/test/categories')
+    assert response.json['count'] == 0
+
+def test_write_sets_sticky_cookie(client):
+    response = client.post('/test/categories')
+    assert 'db_primary=1' in response.headers['Set-Cookie']
+
+    response = client.get('/test/categories')
+    assert response.json['count'] == 1
+
+def test_unmarked_view_uses_primary(app):
+    with app.app_context():
+        db.session.add(IncidentCategory(name='Flood'))
+        db.session.commit()
+
+    with app.test_request_context('/'):
+        assert IncidentCategory.query.count() == 1
+
+def test_falls_back_to_primary_when_replica_is_down(app, client, monkeypatch):
+    client.post('/test/categories')
+    client.delete_cookie('db_primary')
+
+    monkeypatch.setattr('server.utils.db_routing._replica_is_healthy',
+                        lambda engine, interval: False)
+    response = client.get('/test/categories')
+    assert response.json['count'] == 1
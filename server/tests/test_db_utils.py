@@ -0,0 +1,63 @@
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from server.utils.db_utils import InstrumentedQueuePool, configure_engine_options
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.2
+    )
+    yield engine
+    engine.dispose()
+
+def test_checkout_is_recorded(engine):
+    with engine.connect() as conn:
+        conn.execute(text('SELECT 1'))
+
+    stats = engine.pool.wait_stats.to_dict()
+    assert stats['checkouts'] == 1
+    assert stats['timeouts'] == 0
+
+def test_checkout_timeout_is_recorded(engine):
+    with engine.connect():
+        with pytest.raises(PoolTimeoutError):
+            engine.connect()
+
+    stats = engine.pool.wait_stats.to_dict()
+    assert stats['timeouts'] == 1
+    assert stats['slow'] == 1
+    assert stats['max_wait_ms'] >= 200
+
+def test_configure_engine_options_instruments_queue_pools():
+    app = Flask(__name__)
+    app.config.update(
+        DB_POOL_INSTRUMENTATION=True,
+        DB_POOL_WAIT_WARN_MS=50,
+        SQLALCHEMY_ENGINE_OPTIONS={'pool_size': 5, 'pool_pre_ping': True},
+        SQLALCHEMY_BINDS={
+            'replica': {'url': 'postgresql://replica/db', 'pool_size': 3},
+            'legacy': 'sqlite:///legacy.db'
+        }
+    )
+    configure_engine_options(app)
+
+    primary_pool = app.config['SQLALCHEMY_ENGINE_OPTIONS']['poolclass']
+    assert issubclass(primary_pool, InstrumentedQueuePool)
+    assert primary_pool.slow_checkout_threshold == 0.05
+    assert issubclass(app.config['SQLALCHEMY_BINDS']['replica']['poolclass'], InstrumentedQueuePool)
+    assert app.config['SQLALCHEMY_BINDS']['legacy'] == 'sqlite:///legacy.db'
+
+def test_configure_engine_options_leaves_sqlite_defaults():
+    app = Flask(__name__)
+    app.config.update(
+        DB_POOL_INSTRUMENTATION=True,
+        SQLALCHEMY_ENGINE_OPTIONS={'pool_pre_ping': True}
+    )
+    configure_engine_options(app)
+    assert 'poolclass' not in app.config['SQLALCHEMY_ENGINE_OPTIONS']
@@ -0,0 +1,124 @@
+import pytest
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from server import create_app
+from server.models import db, User, IncidentReport, IncidentLSHBand
+from server.utils.dedup import (
+    NUM_PERM, incident_shingles, jaccard, minhash, band_hashes, find_duplicates
+)
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def headers(app):
+    user = User(username='reporter', email='reporter@example.com', role='user')
+    db.session.add(user)
+    db.session.commit()
+    return {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+CRASH = {
+    'title': 'Matatu crash on Thika Road',
+    'description': 'A matatu overturned near Garden City mall, several people injured',
+    'latitude': '-1.2321', 'longitude': '36.8780'
+}
+
+def report(client, headers, **overrides):
+    return client.post('/api/incidents/', data={**CRASH, **overrides}, headers=headers)
+
+def test_minhash_estimates_jaccard():
+    a = incident_shingles(CRASH['title'], CRASH['description'])
+    b = incident_shingles('Matatu crash Thika Road', 'matatu overturned near Garden City mall, people injured')
+    sig_a, sig_b = minhash(a), minhash(b)
+    estimate = sum(x == y for x, y in zip(sig_a, sig_b)) / NUM_PERM
+    assert abs(estimate - jaccard(a, b)) < 0.2
+    assert set(band_hashes(sig_a)) & set(band_hashes(sig_b))
+    assert band_hashes(sig_a) == band_hashes(minhash(set(a)))
+
+def test_report_returns_possible_duplicates(client, headers):
+    first = report(client, headers)
+    assert first.status_code == 201
+    assert first.json['possible_duplicates'] == []
+    assert IncidentLSHBand.query.filter_by(incident_id=first.json['id']).count() == 16
+
+    second = report(client, headers, title='Matatu crash, Thika Road',
+                    latitude='-1.2330', longitude='36.8785')
+    assert second.status_code == 201
+    duplicates = second.json['possible_duplicates']
+    assert [d['id'] for d in duplicates] == [first.json['id']]
+    assert duplicates[0]['distance_m'] < 150
+    assert duplicates[0]['similarity'] >= 0.5
+    assert second.json['duplicate_of'] is None
+
+def test_other_users_duplicates_are_only_counted(client, headers):
+    neighbour = User(username='neighbour', email='neighbour@example.com', role='user')
+    admin = User(username='admin', email='admin@example.com', role='admin')
+    db.session.add_all([neighbour, admin])
+    db.session.commit()
+    neighbour_headers = {'Authorization': f'Bearer {create_access_token(identity=neighbour.id)}'}
+    admin_headers = {'Authorization': f'Bearer {create_access_token(identity=admin.id)}'}
+
+    first = report(client, neighbour_headers)
+    second = report(client, headers, title='Matatu crash, Thika Road')
+    assert second.status_code == 201
+    assert second.json['possible_duplicates'] == []
+    assert second.json['possible_duplicate_count'] == 1
+
+    third = report(client, admin_headers)
+    assert third.json['possible_duplicate_count'] == 2
+    assert {d['id'] for d in third.json['possible_duplicates']} == {
+        first.json['id'], second.json['id']}
+
+def test_ignores_far_dissimilar_and_closed_incidents(client, headers):
+    first = report(client, headers)
+    # Same text across town
+    assert report(client, headers, latitude='-1.3000').json['possible_duplicates'] == []
+    # Different event at the same spot
+    assert report(client, headers, title='Burst water pipe',
+                  description='Water flooding the service lane').json['possible_duplicates'] == []
+
+    incident = db.session.get(IncidentReport, first.json['id'])
+    incident.status = 'resolved'
+    db.session.commit()
+    ids = [d['id'] for d in report(client, headers).json['possible_duplicates']]
+    assert first.json['id'] not in ids
+
+def test_time_window(app, headers):
+    old = IncidentReport(title=CRASH['title'], description=CRASH['description'],
+                         latitude=-1.2321, longitude=36.8780, user_id=1,
+                         created_at=datetime.utcnow() - timedelta(hours=3))
+    db.session.add(old)
+    db.session.flush()
+    from server.utils.dedup import index_incident
+    index_incident(old)
+    db.session.commit()
+
+    assert find_duplicates(CRASH['title'], CRASH['description'], -1.2321, 36.8780,
+                           window_minutes=60) == []
+    assert len(find_duplicates(CRASH['title'], CRASH['description'], -1.2321, 36.8780,
+                               window_minutes=240)) == 1
+
+def test_auto_link(app, client, headers):
+    app.config['DEDUP_AUTO_LINK'] = True
+    first = report(client, headers)
+    second = report(client, headers)
+    assert second.json['duplicate_of'] == first.json['id']
+
+def test_rebuild_command(app, client, headers):
+    report(client, headers)
+    IncidentLSHBand.query.delete()
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['dedup', 'rebuild', '--hours', '1'])
+    assert 'Indexed 1 incidents' in result.output
+    assert IncidentLSHBand.query.count() == 16
@@ -0,0 +1,131 @@
+import struct
+import zlib
+import numpy as np
+import pytest
+from datetime import date, datetime
+from flask import current_app
+from flask_jwt_extended import create_access_token
+from server import create_app
+from server.models import db, User, IncidentReport, HeatmapGrid
+from server.utils.heatmap import density, encode_png, grid_spec, rebuild, record_incident
+
+NAIROBI = (-1.2860, 36.8170)
+MOMBASA = (-4.0435, 39.6682)
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def users(app):
+    reporter = User(username='reporter', email='reporter@example.com', role='user')
+    admin = User(username='admin', email='admin@example.com', role='admin')
+    db.session.add_all([reporter, admin])
+    db.session.commit()
+    return reporter, admin
+
+def auth(user):
+    return {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+def add(user, position, day, category_id=None):
+    incident = IncidentReport(title='t', description='d', latitude=position[0], longitude=position[1],
+                              user_id=user.id, category_id=category_id,
+                              created_at=datetime.combine(day, datetime.min.time()))
+    db.session.add(incident)
+    db.session.commit()
+    record_incident(incident, grid_spec(current_app.config))
+    db.session.commit()
+    return incident
+
+def test_report_updates_grid(app, client, users):
+    reporter, admin = users
+    for _ in range(2):
+        response = client.post('/api/incidents/', headers=auth(reporter), data={
+            'title': 'Flooding', 'description': 'Road under water',
+            'latitude': str(NAIROBI[0]), 'longitude': str(NAIROBI[1])})
+        assert response.status_code == 201
+
+    grid = HeatmapGrid.query.one()
+    assert (grid.category_key, grid.total, grid.version) == (0, 2, 2)
+
+    spec = grid_spec(app.config)
+    response = client.get('/api/incidents/heatmap?format=array', headers=auth(admin))
+    assert response.status_code == 200
+    cell, _ = spec.cells([NAIROBI[0]], [NAIROBI[1]])
+    assert response.json['indices'] == [int(cell[0])]
+    assert response.json['counts'] == [2]
+    assert (response.json['rows'], response.json['cols']) == spec.shape
+
+def test_sums_days_and_filters_categories(app, client, users):
+    reporter, admin = users
+    add(reporter, NAIROBI, date(2026, 3, 1), category_id=1)
+    add(reporter, NAIROBI, date(2026, 3, 2), category_id=1)
+    add(reporter, MOMBASA, date(2026, 3, 2))
+    add(reporter, MOMBASA, date(2026, 3, 5), category_id=2)
+
+    spec = grid_spec(app.config)
+    counts, skipped = density(spec, date(2026, 3, 1), date(2026, 3, 2))
+    assert skipped == 0 and counts.sum() == 3 and counts.max() == 2
+
+    url = '/api/incidents/heatmap?format=array&start_date=2026-03-01&end_date=2026-03-31'
+    assert client.get(url, headers=auth(admin)).json['total'] == 4
+    assert client.get(url + '&category_id=1', headers=auth(admin)).json['total'] == 2
+    assert client.get(url + '&category_id=0,2', headers=auth(admin)).json['counts'] == [2]
+
+def test_png_overlay(app, client, users):
+    reporter, admin = users
+    add(reporter, NAIROBI, date(2026, 3, 1))
+    response = client.get('/api/incidents/heatmap?start_date=2026-03-01&end_date=2026-03-01',
+                          headers=auth(admin))
+    assert response.status_code == 200 and response.mimetype == 'image/png'
+    body = response.data
+    assert body[:8] == b'\x89PNG\r\n\x1a\n'
+    width, height = struct.unpack('>II', body[16:24])
+    spec = grid_spec(app.config)
+    assert (height, width) == spec.shape
+
+    idat_length = struct.unpack('>I', body[33:37])[0]
+    raw = np.frombuffer(zlib.decompress(body[41:41 + idat_length]), dtype=np.uint8)
+    pixels = raw.reshape(height, width * 4 + 1)[:, 1:].reshape(height, width, 4)
+    assert (pixels[..., 3] > 0).sum() == 1
+
+    etag = response.headers['ETag']
+    again = client.get('/api/incidents/heatmap?start_date=2026-03-01&end_date=2026-03-01',
+                       headers={**auth(admin), 'If-None-Match': etag})
+    assert again.status_code == 304
+
+def test_rebuild_matches_incremental(app, users):
+    reporter, _ = users
+    add(reporter, NAIROBI, date(2026, 3, 1), category_id=1)
+    add(reporter, NAIROBI, date(2026, 3, 1), category_id=1)
+    add(reporter, MOMBASA, date(2026, 3, 2))
+    # Outside the grid
+    add(reporter, (9.03, 38.74), date(2026, 3, 2))
+
+    spec = grid_spec(app.config)
+    before = density(spec, date(2026, 3, 1), date(2026, 3, 2))[0]
+    assert rebuild(spec) == 2
+    db.session.commit()
+    assert HeatmapGrid.query.count() == 2
+    assert np.array_equal(density(spec, date(2026, 3, 1), date(2026, 3, 2))[0], before)
+
+def test_png_encoder_dimensions():
+    body = encode_png(np.zeros((3, 5, 4), dtype=np.uint8))
+    assert struct.unpack('>II', body[16:24]) == (5, 3)
+    assert body.endswith(b'IEND\xaeB`\x82')
+
+def test_heatmap_access_and_validation(client, users):
+    reporter, admin = users
+    assert client.get('/api/incidents/heatmap', headers=auth(reporter)).status_code == 403
+    for query in ('format=svg', 'start_date=2026-13-01', 'start_date=2026-03-02&end_date=2026-03-01',
+                  'start_date=2020-01-01&end_date=2026-01-01', 'category_id=x'):
+        assert client.get(f'/api/incidents/heatmap?{query}', headers=auth(admin)).status_code == 400
@@ -0,0 +1,134 @@
+import json
+import pytest
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from server import create_app
+from server.models import (
+    db, User, IncidentCategory, IncidentComment, IncidentReport, IncidentArchiveSegment,
+    NotificationOutbox
+)
+from server.utils.incident_archive import archive_resolved, find_archived_incident
+
+OLD = datetime.utcnow() - timedelta(days=200)
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def users(app):
+    admin = User(username='admin', email='admin@example.com', role='admin')
+    reporter = User(username='reporter', email='reporter@example.com')
+    other = User(username='other', email='other@example.com')
+    db.session.add_all([admin, reporter, other])
+    db.session.commit()
+    return admin, reporter, other
+
+def headers(user):
+    return {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+def incident(user, status='resolved', resolved_at=OLD, **fields):
+    category = IncidentCategory.query.first() or IncidentCategory(name='Flood', color='#0000ff')
+    report = IncidentReport(title=fields.pop('title', 'Flooded road'), description='Water over the road',
+                            latitude=-1.29, longitude=36.82, user_id=user.id, category=category,
+                            status=status, resolved_at=resolved_at if status == 'resolved' else None,
+                            media_urls=json.dumps(['https://example.com/flood.jpg']),
+                            created_at=OLD - timedelta(days=1), **fields)
+    db.session.add(report)
+    db.session.commit()
+    return report
+
+def archive(segment_size=500):
+    return archive_resolved(datetime.utcnow() - timedelta(days=90), segment_size)
+
+def test_archive_moves_old_resolved_incidents(users):
+    admin, reporter, other = users
+    old = [incident(reporter, title=f'Old {i}') for i in range(5)]
+    recent = incident(reporter, resolved_at=datetime.utcnow())
+    open_ = incident(reporter, status='reported')
+    expected = old[2].to_dict()
+    db.session.add(IncidentComment(incident_id=old[2].id, user_id=admin.id, content='Drained'))
+    db.session.add(NotificationOutbox(user_id=reporter.id, channel='email', incident_id=old[2].id,
+                                      event='status_change', body='Resolved'))
+    db.session.commit()
+    old_ids = [report.id for report in old]
+
+    assert archive(segment_size=2) == (5, 3)
+    assert {report.id for report in IncidentReport.query} == {recent.id, open_.id}
+    assert IncidentComment.query.count() == 0
+    assert NotificationOutbox.query.one().incident_id is None
+    assert IncidentArchiveSegment.query.count() == 3
+
+    record = find_archived_incident(old_ids[2])
+    assert record['incident'] == json.loads(json.dumps(expected))
+    assert [comment['content'] for comment in record['comments']] == ['Drained']
+    assert find_archived_incident(recent.id) is None
+    assert archive() == (0, 0)
+
+def test_duplicates_keep_their_originals_live(users):
+    admin, reporter, other = users
+    original = incident(reporter)
+    duplicate = incident(reporter, status='reported', duplicate_of=original.id)
+    original_id = original.id
+
+    assert archive() == (0, 0)
+    duplicate.status = 'resolved'
+    duplicate.resolved_at = OLD
+    db.session.commit()
+    assert archive(segment_size=1) == (2, 2)
+    assert find_archived_incident(original_id)['incident']['id'] == original_id
+
+def test_get_incident_falls_back_to_the_archive(client, users):
+    admin, reporter, other = users
+    report = incident(reporter)
+    report_id = report.id
+    db.session.add(IncidentComment(incident_id=report_id, user_id=admin.id, content='Drained'))
+    db.session.commit()
+    expected = client.get(f'/api/incidents/{report_id}', headers=headers(reporter)).get_json()
+    archive()
+
+    response = client.get(f'/api/incidents/{report_id}', headers=headers(reporter))
+    assert response.status_code == 200
+    assert response.get_json() == expected
+    assert client.get(f'/api/incidents/{report_id}', headers=headers(other)).status_code == 403
+    assert client.get('/api/incidents/9999', headers=headers(admin)).status_code == 404
+
+    comments = client.get(f'/api/incidents/{report_id}/comments', headers=headers(admin)).get_json()
+    assert comments['total'] == 1
+    assert comments['comments'][0]['content'] == 'Drained'
+
+def test_export_includes_archived_incidents(client, users):
+    admin, reporter, other = users
+    archived = incident(reporter, title='Archived')
+    live = incident(reporter, status='reported', title='Live')
+    archived_id, live_id = archived.id, live.id
+    archive()
+
+    response = client.get('/api/admin/incidents/export', headers=headers(admin))
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line['id'] for line in lines] == [live_id, archived_id]
+
+    since = (datetime.utcnow() - timedelta(days=1)).date().isoformat()
+    response = client.get(f'/api/admin/incidents/export?since={since}', headers=headers(admin))
+    assert response.get_data(as_text=True) == ''
+    assert client.get('/api/admin/incidents/export?since=soon',
+                      headers=headers(admin)).status_code == 400
+    assert client.get('/api/admin/incidents/export', headers=headers(reporter)).status_code == 403
+
+def test_archive_command(app, users):
+    admin, reporter, other = users
+    incident(reporter)
+
+    result = app.test_cli_runner().invoke(args=['incidents', 'archive'])
+    assert 'Archived 1 incidents resolved more than 90 days ago in 1 segments.' in result.output
+    assert IncidentReport.query.count() == 0
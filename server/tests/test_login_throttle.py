@@ -0,0 +1,118 @@
+import pytest
+from sqlalchemy import event
+from server import create_app
+from server.models import db, User, UserActivity
+from server.utils.login_throttle import LoginThrottle
+from server.utils.rate_limit import MemoryStore, SharedMemoryStore
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    app.config['LOGIN_MAX_FAILURES'] = 3
+    app.config['LOGIN_IP_MAX_FAILURES'] = 5
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def user(app):
+    user = User(username='resident', email='resident@example.com')
+    user.set_password('Correct-horse1')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+@pytest.fixture
+def user_writes(app):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith('UPDATE USERS'):
+            statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(db.engine, 'before_cursor_execute', record)
+
+def _login(client, password, username='resident', ip='10.0.0.1'):
+    return client.post('/api/auth/login', json={'username': username, 'password': password},
+                       environ_base={'REMOTE_ADDR': ip})
+
+def test_failed_logins_do_not_write_until_lockout(client, user, user_writes):
+    for _ in range(2):
+        assert _login(client, 'wrong').status_code == 401
+    assert user_writes == []
+
+    response = _login(client, 'wrong')
+    assert response.status_code == 403
+    assert 'locked_until' in response.get_json()
+    assert len(user_writes) == 1
+    assert _login(client, 'Correct-horse1').status_code == 403  # Locked in the database
+
+def test_success_is_one_transaction_and_resets_failures(app, client, user):
+    commits = []
+
+    def record(session):
+        commits.append(session)
+
+    event.listen(db.session, 'after_commit', record)
+    try:
+        assert _login(client, 'wrong').status_code == 401
+        assert _login(client, 'wrong').status_code == 401
+        assert _login(client, 'Correct-horse1').status_code == 200
+    finally:
+        event.remove(db.session, 'after_commit', record)
+    assert len(commits) == 1
+    assert UserActivity.query.filter_by(user_id=user.id, activity_type='LOGIN').count() == 1
+
+    # The earlier failures were forgotten
+    assert _login(client, 'wrong').status_code == 401
+    assert _login(client, 'wrong').status_code == 401
+    assert db.session.get(User, user.id).account_locked_until is None
+
+def test_ip_is_blocked_across_usernames(client, user):
+    for i in range(5):
+        assert _login(client, 'wrong', username=f'guess{i}').status_code == 401
+    response = _login(client, 'Correct-horse1')
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert _login(client, 'Correct-horse1', ip='10.0.0.2').status_code == 200
+
+def test_ip_block_uses_forwarded_client_address(app, client, user):
+    app.config['RATELIMIT_PROXY_HOPS'] = 1
+
+    def via_proxy(password, username, forwarded_for):
+        return client.post('/api/auth/login', json={'username': username, 'password': password},
+                           environ_base={'REMOTE_ADDR': '10.0.0.254'},
+                           headers={'X-Forwarded-For': forwarded_for})
+
+    for i in range(5):
+        assert via_proxy('wrong', f'guess{i}', '203.0.113.7').status_code == 401
+    assert via_proxy('Correct-horse1', 'resident', '203.0.113.7').status_code == 429
+    # Other clients behind the same proxy are unaffected
+    assert via_proxy('Correct-horse1', 'resident', '198.51.100.2').status_code == 200
+
+def test_sliding_window_counts_decay():
+    store = MemoryStore()
+    assert store.hit('k', 60, now=0) == 1
+    assert store.hit('k', 60, now=30) == 2
+    # Half of the previous window still overlaps
+    assert store.hit('k', 60, 0, now=90) == pytest.approx(1.0)
+    assert store.hit('k', 60, 0, now=200) == 0
+    store.hit('k', 60, now=200)
+    store.reset('k', now=200)
+    assert store.hit('k', 60, 0, now=201) == 0
+
+def test_failures_are_shared_between_workers(tmp_path):
+    path = str(tmp_path / 'ratelimit')
+    first = LoginThrottle(SharedMemoryStore(path, slots=1024), max_failures=3)
+    second = LoginThrottle(SharedMemoryStore(path, slots=1024), max_failures=3)
+    assert not first.record_failure('Resident', '10.0.0.1', now=100)
+    assert not second.record_failure('resident', '10.0.0.2', now=101)
+    assert first.record_failure('resident ', '10.0.0.3', now=102)
@@ -0,0 +1,138 @@
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from server.utils.notification_pools import SMTPConnectionPool, SMSClient
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: one session per connection."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        server.sessions += 1
+        self.reply('220 stand-in ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 stand-in')
+            elif command.startswith('RCPT'):
+                if 'REFUSED' in command:
+                    self.reply('550 no such user')
+                else:
+                    self.reply('250 ok')
+            elif command == 'DATA':
+                self.reply('354 go ahead')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                server.delivered += 1
+                self.reply('250 queued')
+                if server.drop_after and server.delivered % server.drop_after == 0:
+                    return  # Hang up without QUIT
+            elif command == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 ok')
+
+
+class _SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.sessions = 0
+        self.delivered = 0
+        self.drop_after = 0
+
+
+@pytest.fixture
+def smtp_server():
+    server = _SMTPServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def pool(smtp_server):
+    pool = SMTPConnectionPool('127.0.0.1', smtp_server.server_address[1], max_size=2, timeout=5)
+    yield pool
+    pool.close()
+
+
+def _message(to='resident@example.com'):
+    return 'alerts@example.com', [to], 'Subject: Ajali!\r\n\r\nHello'
+
+
+def test_smtp_pool_reuses_one_session(pool, smtp_server):
+    for _ in range(3):
+        assert pool.send_many([_message(), _message()]) == [(True, None)] * 2
+    assert pool.connects == 1
+    assert smtp_server.sessions == 1
+    assert smtp_server.delivered == 6
+
+
+def test_smtp_pool_reconnects_after_server_hangs_up(pool, smtp_server):
+    smtp_server.drop_after = 2
+    results = pool.send_many([_message() for _ in range(5)])
+    assert all(ok for ok, _ in results)
+    assert smtp_server.delivered == 5
+    assert pool.connects >= 2
+
+
+def test_smtp_pool_refused_recipient_does_not_stop_batch(pool, smtp_server):
+    results = pool.send_many([_message(), _message('refused@example.com'), _message()])
+    assert [ok for ok, _ in results] == [True, False, True]
+    assert pool.connects == 1
+    assert smtp_server.delivered == 2
+
+
+def test_smtp_pool_replaces_expired_sessions(pool, smtp_server):
+    pool.send_many([_message()])
+    pool._idle[0].last_used -= pool.idle_timeout + 1
+    pool.send_many([_message()])
+    assert pool.connects == 2
+    assert len(pool._idle) == 1
+
+
+def test_sms_client_keeps_connection_alive():
+    connections = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            connections.append(self.client_address)
+            self.rfile.read(int(self.headers['Content-Length']))
+            body = b'{"sid": "SM1"}'
+            self.send_response(201)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = SMSClient('AC123', 'token', '+15550000000',
+                       base_url=f'http://127.0.0.1:{server.server_address[1]}', pool_size=1)
+    try:
+        assert all(client.send('+254700000001', 'Hello') for _ in range(3))
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+    assert len(connections) == 3
+    assert len(set(connections)) == 1
@@ -0,0 +1,157 @@
+import pytest
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from server import create_app
+from server.models import db, User, IncidentReport, NotificationOutbox
+from server.utils import outbox
+from server.utils.outbox import deliver_pending, enqueue_notification, quiet_hours_end
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def users(app):
+    reporter = User(username='reporter', email='reporter@example.com', phone_number='+254700000001',
+                    timezone='Africa/Nairobi')
+    admin = User(username='admin', email='admin@example.com', role='admin')
+    db.session.add_all([reporter, admin])
+    db.session.commit()
+    incidents = [IncidentReport(title=f'Incident {i}', description='d', latitude=-1.28,
+                                longitude=36.82, user_id=reporter.id) for i in range(5)]
+    db.session.add_all(incidents)
+    db.session.commit()
+    return reporter, admin
+
+@pytest.fixture
+def sent(monkeypatch):
+    sent = []
+    monkeypatch.setattr(outbox, 'send_email_batch', lambda emails: [
+        sent.append(('email', subject, body)) or True for _, subject, body in emails])
+    monkeypatch.setattr(outbox, 'send_sms_notification',
+                        lambda phone, body: sent.append(('sms', None, body)) or True)
+    return sent
+
+def auth(user):
+    return {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+def after_window():
+    return datetime.utcnow() + timedelta(minutes=6)
+
+def test_status_changes_coalesce(client, users, sent):
+    reporter, admin = users
+    for status in ('under investigation', 'resolved'):
+        response = client.patch('/api/incidents/1/status', json={'status': status}, headers=auth(admin))
+        assert response.status_code == 200
+    assert NotificationOutbox.query.count() == 4
+
+    # Nothing is sent until the coalescing window has passed
+    assert deliver_pending() == (0, 0)
+    assert deliver_pending(now=after_window()) == (2, 0)
+    assert sorted(channel for channel, _, _ in sent) == ['email', 'sms']
+    assert all('resolved' in body and 'under investigation' not in body for _, _, body in sent)
+    assert {m.status for m in NotificationOutbox.query.all()} == {'sent'}
+
+def test_batch_update_sends_one_digest(client, users, sent):
+    reporter, admin = users
+    response = client.patch('/api/incidents/batch/status', headers=auth(admin),
+                            json={'incident_ids': [1, 2, 3, 4, 5], 'status': 'resolved'})
+    assert response.status_code == 200
+    assert deliver_pending(now=after_window()) == (2, 0)
+
+    email = next(message for message in sent if message[0] == 'email')
+    assert email[1] == 'Ajali! 5 updates'
+    assert all(f'"Incident {i}" is now resolved' in email[2] for i in range(5))
+    sms = next(message for message in sent if message[0] == 'sms')
+    assert sms[2].startswith('Ajali! 5 updates: ')
+
+def test_status_change_through_incident_update_notifies(client, users):
+    reporter, admin = users
+    response = client.patch('/api/incidents/1', json={'status': 'resolved'}, headers=auth(admin))
+    assert response.status_code == 200
+    assert {(m.user_id, m.event) for m in NotificationOutbox.query.all()} == {
+        (reporter.id, 'status_change')}
+    # Edits that leave the status alone queue nothing
+    client.patch('/api/incidents/1', json={'status': 'resolved', 'priority': 'high'},
+                 headers=auth(admin))
+    assert NotificationOutbox.query.count() == 2
+
+def test_quiet_hours_defer_delivery(app, users, sent):
+    reporter, _ = users
+    reporter.quiet_hours_start, reporter.quiet_hours_end = '22:00', '07:00'
+    # 23:00 in Nairobi (UTC+3)
+    night = datetime(2026, 3, 1, 20, 0)
+    enqueue_notification(reporter.id, 'email', 'routine', subject='Routine').deliver_after = night
+    db.session.commit()
+
+    assert deliver_pending(now=night) == (0, 0)
+    message = NotificationOutbox.query.one()
+    assert message.deliver_after == datetime(2026, 3, 2, 4, 0)
+
+    # Urgent messages go out anyway, taking the deferred one with them
+    enqueue_notification(reporter.id, 'email', 'fire nearby', subject='Fire',
+                         urgent=True).deliver_after = night
+    db.session.commit()
+    assert deliver_pending(now=night) == (1, 0)
+    assert sent[0][1] == 'Ajali! 2 updates'
+
+def test_delivery_sends_outside_a_transaction(app, users, monkeypatch):
+    reporter, _ = users
+    enqueue_notification(reporter.id, 'email', 'hello', subject='Hi')
+    db.session.commit()
+    seen = []
+
+    def send(emails):
+        # The claim is committed: visible to other connections, nothing held open
+        with db.engine.connect() as connection:
+            seen.append((db.session().in_transaction(), connection.execute(
+                NotificationOutbox.__table__.select()).one().status))
+        return [False] * len(emails)
+
+    monkeypatch.setattr(outbox, 'send_email_batch', send)
+    assert deliver_pending() == (0, 1)
+    assert seen == [(False, 'sending')]
+    message = NotificationOutbox.query.one()
+    assert (message.status, message.attempts) == ('pending', 1)
+
+    # A claim whose worker died is picked up once its lease lapses
+    message.status = 'sending'
+    db.session.commit()
+    lapsed = datetime.utcnow() + timedelta(seconds=outbox.SENDING_LEASE_SECONDS + 60)
+    monkeypatch.setattr(outbox, 'send_email_batch', lambda emails: [True] * len(emails))
+    assert deliver_pending(now=message.deliver_after - timedelta(seconds=1)) == (0, 0)
+    assert deliver_pending(now=lapsed) == (1, 0)
+    assert NotificationOutbox.query.one().status == 'sent'
+
+def test_quiet_hours_end():
+    # Overnight window, in and out of it
+    assert quiet_hours_end(datetime(2026, 3, 1, 20, 0), 'Africa/Nairobi', '22:00', '07:00') \
+        == datetime(2026, 3, 2, 4, 0)
+    assert quiet_hours_end(datetime(2026, 3, 2, 2, 0), 'Africa/Nairobi', '22:00', '07:00') \
+        == datetime(2026, 3, 2, 4, 0)
+    assert quiet_hours_end(datetime(2026, 3, 2, 5, 0), 'Africa/Nairobi', '22:00', '07:00') is None
+    # Same-day window, bad settings
+    assert quiet_hours_end(datetime(2026, 3, 2, 12, 30), 'UTC', '12:00', '14:00') == datetime(2026, 3, 2, 14, 0)
+    assert quiet_hours_end(datetime(2026, 3, 2, 12, 30), 'Mars/Olympus', '12:00', '14:00') is None
+    assert quiet_hours_end(datetime(2026, 3, 2, 12, 30), 'UTC', None, '14:00') is None
+
+def test_quiet_hours_preferences(client, users):
+    reporter, _ = users
+    response = client.patch('/api/auth/notification-preferences', headers=auth(reporter),
+                            json={'quiet_hours_start': '22:30', 'quiet_hours_end': '06:00'})
+    assert response.status_code == 200
+    assert (response.json['quiet_hours_start'], response.json['quiet_hours_end']) == ('22:30', '06:00')
+    response = client.patch('/api/auth/notification-preferences', headers=auth(reporter),
+                            json={'quiet_hours_start': '25:00'})
+    assert response.status_code == 400
+    response = client.patch('/api/auth/profile', headers=auth(reporter), json={'timezone': 'Nowhere/City'})
+    assert response.status_code == 400
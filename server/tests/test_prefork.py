@@ -0,0 +1,77 @@
+import gc
+import os
+import random
+import sys
+import pytest
+from server import create_app
+from server.models import db, User
+from server.utils import lazy_import
+from server.utils.prefork import MemoryRecycler, after_fork, freeze_heap, private_memory, warm_app
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+def test_warm_app_loads_deferred_modules(app):
+    warm_app(app)
+    assert 'numpy' in sys.modules
+    assert all(proxy._module is not None for proxy in lazy_import._registry.values())
+
+def test_after_fork_replaces_pooled_connections(app):
+    db.session.add(User(username='resident', email='resident@example.com'))
+    db.session.commit()
+    engine = db.engine
+    pool = engine.pool
+    app.extensions['smtp_pool'] = object()
+
+    after_fork(app)
+    assert engine.pool is not pool
+    assert 'smtp_pool' not in app.extensions
+    assert User.query.count() == 1
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_forked_worker_uses_its_own_connections(tmp_path):
+    app = create_app('testing')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path}/fork.db'
+    app.extensions.pop('sqlalchemy')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username='resident', email='resident@example.com'))
+        db.session.commit()
+        db.session.remove()
+    freeze_heap()
+    try:
+        pid = os.fork()
+        if pid == 0:  # Worker: exit status 0 only if the query works
+            code = 1
+            try:
+                after_fork(app)
+                with app.app_context():
+                    code = 0 if User.query.count() == 1 else 1
+            finally:
+                os._exit(code)
+        _, status = os.waitpid(pid, 0)
+        assert os.waitstatus_to_exitcode(status) == 0
+    finally:
+        gc.unfreeze()
+
+def test_memory_recycler_checks_periodically_with_jitter():
+    readings = []
+
+    def reader():
+        readings.append(1)
+        return 600
+
+    recycler = MemoryRecycler(500, jitter=0.1, check_every=3, reader=reader, rng=random.Random(1))
+    assert 450 <= recycler.limit <= 550
+    assert [recycler.should_recycle() for _ in range(3)] == [False, False, True]
+    assert len(readings) == 1
+
+    assert not MemoryRecycler(0, reader=reader).should_recycle()
+    assert private_memory() > 0
@@ -0,0 +1,110 @@
+import os
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required
+from server.utils.rate_limit import (
+    Limit, MemoryStore, SharedMemoryStore, RateLimiter, parse_limits,
+    init_rate_limiting, rate_limit, rate_limit_exempt
+)
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(RATELIMIT_DEFAULT='3 per minute', JWT_SECRET_KEY='test')
+    JWTManager(app)
+
+    @app.route('/open')
+    def open_view():
+        return 'ok'
+
+    @app.route('/health')
+    @rate_limit_exempt
+    def health():
+        return 'ok'
+
+    @app.route('/report', methods=['POST'])
+    @jwt_required()
+    @rate_limit('2 per minute', key='user')
+    def report():
+        return 'created', 201
+
+    init_rate_limiting(app)
+    return app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def test_parse_limits():
+    assert parse_limits('100 per day; 10/minute, 5 per 10 seconds') == (
+        Limit(100, 86400), Limit(10, 60), Limit(5, 10)
+    )
+    with pytest.raises(ValueError):
+        parse_limits('lots per fortnight')
+
+@pytest.mark.parametrize('make_store', [
+    lambda tmp_path: MemoryStore(),
+    lambda tmp_path: SharedMemoryStore(os.path.join(tmp_path, 'buckets'), slots=64),
+])
+def test_token_bucket_refills(tmp_path, make_store):
+    store = make_store(tmp_path)
+    assert store.consume('k', rate=1.0, capacity=2, now=100.0)[0]
+    assert store.consume('k', rate=1.0, capacity=2, now=100.0)[0]
+    allowed, _, retry_after = store.consume('k', rate=1.0, capacity=2, now=100.5)
+    assert not allowed and retry_after == pytest.approx(0.5)
+    assert store.consume('k', rate=1.0, capacity=2, now=101.0)[0]
+    # Other keys have their own bucket
+    assert store.consume('other', rate=1.0, capacity=2, now=101.0)[0]
+
+def test_shared_store_is_shared_between_workers(tmp_path):
+    path = os.path.join(tmp_path, 'buckets')
+    store = SharedMemoryStore(path, slots=64)
+    limiter = RateLimiter(store)
+    limits = parse_limits('2 per hour')
+    assert limiter.check(limits, 'login', 'ip1') is None
+
+    pid = os.fork()
+    if pid == 0:
+        # Child sees the parent's bucket and takes the last token
+        child = RateLimiter(SharedMemoryStore(path, slots=64))
+        ok = child.check(limits, 'login', 'ip1') is None and child.check(limits, 'login', 'ip1') is not None
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert limiter.check(limits, 'login', 'ip1') is not None
+
+def test_shared_store_recycles_slots(tmp_path):
+    store = SharedMemoryStore(os.path.join(tmp_path, 'buckets'), slots=8)
+    for i in range(100):
+        assert store.consume(f'key{i}', rate=1.0, capacity=1, now=float(i))[0]
+    # The most recent key is still tracked
+    assert not store.consume('key99', rate=1.0, capacity=1, now=99.0)[0]
+
+def test_default_limit_per_ip(client):
+    for _ in range(3):
+        assert client.get('/open').status_code == 200
+    response = client.get('/open')
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert response.json['error'] == 'Too many requests'
+
+    assert client.get('/open', environ_base={'REMOTE_ADDR': '10.0.0.9'}).status_code == 200
+    for _ in range(5):
+        assert client.get('/health').status_code == 200
+
+def test_route_limit_per_user(app, client):
+    with app.app_context():
+        first = {'Authorization': f'Bearer {create_access_token(identity=1)}'}
+        second = {'Authorization': f'Bearer {create_access_token(identity=2)}'}
+
+    assert client.post('/report', headers=first).status_code == 201
+    assert client.post('/report', headers=first).status_code == 201
+    assert client.post('/report', headers=first).status_code == 429
+    # Same IP, different user, separate budget; the default limit does not apply
+    for _ in range(2):
+        assert client.post('/report', headers=second).status_code == 201
+
+def test_disabled_in_testing_config():
+    from server import create_app
+    app = create_app('testing')
+    assert 'rate_limiter' not in app.extensions
@@ -0,0 +1,107 @@
+import time
+import pytest
+from flask_jwt_extended import create_access_token
+from server import create_app
+from server.models import db, User
+from server.utils.auth_utils import blacklist_token, generate_token, is_token_blacklisted
+from server.utils.revocation import (BloomFilter, MemoryRevocationStore,
+                                     SharedMemoryRevocationStore, create_revocation_store)
+from server.utils.shm_table import key_hash
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def user(app):
+    user = User(username='resident', email='resident@example.com')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+def test_logout_revokes_only_that_token(client, user):
+    token = create_access_token(identity=user.id)
+    other = create_access_token(identity=user.id)
+    headers = {'Authorization': f'Bearer {token}'}
+
+    assert client.get('/api/subscriptions/', headers=headers).status_code == 200
+    assert client.post('/api/auth/logout', headers=headers).status_code == 200
+    assert client.get('/api/subscriptions/', headers=headers).status_code == 401
+    assert client.get('/api/subscriptions/',
+                      headers={'Authorization': f'Bearer {other}'}).status_code == 200
+
+def test_blacklist_token_is_keyed_and_expiring(app, user, monkeypatch):
+    monkeypatch.setenv('JWT_SECRET_KEY', 'test-secret')
+    token = generate_token(user.id)
+    assert not is_token_blacklisted(token)
+    blacklist_token(token)
+    assert is_token_blacklisted(token)
+    assert not is_token_blacklisted(generate_token(user.id, custom_claims={'jti': 'other'}))
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, error_rate=0.01)
+    keys = [key_hash(f'jti-{i}') for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(key_hash(f'other-{i}') in bloom for i in range(10000))
+    assert false_positives < 300
+
+def test_memory_store_forgets_expired_tokens():
+    store = MemoryRevocationStore(bloom_capacity=4)
+    now = time.time()
+    store.revoke('old', now - 1)
+    store.revoke('live', now + 60)
+    assert store.is_revoked('live')
+    assert not store.is_revoked('old')
+    assert not store.is_revoked('never')
+
+    for i in range(4):  # Past capacity: the filter is rebuilt without 'old'
+        store.revoke(f'jti-{i}', now + 60)
+    assert 'old' not in store._expires
+    assert key_hash('old') not in store.bloom
+    assert all(store.is_revoked(f'jti-{i}') for i in range(4))
+    assert store.is_revoked('live')
+
+def test_shared_store_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / 'revoked')
+    first = create_revocation_store(f'shm://{path}', slots=1024, bloom_capacity=1000)
+    second = SharedMemoryRevocationStore(path, slots=1024, bloom_capacity=1000)
+    first.revoke('jti-1', time.time() + 60)
+    second.revoke('jti-2', time.time() + 60)
+    assert second.is_revoked('jti-1')
+    assert first.is_revoked('jti-2')
+    assert not first.is_revoked('jti-3')
+
+    # A worker starting later, with a differently sized filter, rebuilds it
+    third = SharedMemoryRevocationStore(path, slots=1024, bloom_capacity=500)
+    assert third.is_revoked('jti-1') and third.is_revoked('jti-2')
+
+def test_shared_store_evicts_soonest_to_expire(tmp_path):
+    store = SharedMemoryRevocationStore(str(tmp_path / 'revoked'), slots=8, bloom_capacity=100)
+    now = time.time()
+    store.revoke('expired', now - 10)
+    for i in range(8):
+        store.revoke(f'jti-{i}', now + 60 + i)
+    assert not store.is_revoked('expired')
+    assert all(store.is_revoked(f'jti-{i}') for i in range(8))
+
+def test_shared_store_fails_closed_when_a_bucket_overflows(tmp_path):
+    store = SharedMemoryRevocationStore(str(tmp_path / 'revoked'), slots=8, bloom_capacity=100)
+    now = time.time()
+    jtis = [f'jti-{i}' for i in range(12)]  # One bucket of eight slots, all live
+    for jti in jtis:
+        store.revoke(jti, now + 60)
+    assert all(store.is_revoked(jti) for jti in jtis)
+    assert not store.is_revoked('never')
+    # Once the revocations that found no room have expired, misses are misses again
+    assert not store.is_revoked(jtis[-1], now=now + 61)
@@ -0,0 +1,125 @@
+import json
+import pytest
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from server import create_app
+from server.models import db, User, IncidentReport, IncidentCategory, IncidentComment
+from server.utils.serializers import (
+    incident_select, serialize_incident_rows, comment_select, serialize_comment_rows
+)
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def users(app):
+    reporter = User(username='reporter', email='reporter@example.com', role='user')
+    admin = User(username='admin', email='admin@example.com', role='admin')
+    db.session.add_all([reporter, admin])
+    db.session.commit()
+    return reporter, admin
+
+@pytest.fixture
+def incidents(app, users):
+    reporter, admin = users
+    category = IncidentCategory(name='Road', color='#ff0000')
+    db.session.add(category)
+    db.session.flush()
+
+    now = datetime.utcnow()
+    incidents = [
+        IncidentReport(title='Crash on Thika Road', description='Two cars', latitude=-1.2,
+                       longitude=36.8, user_id=reporter.id, category_id=category.id,
+                       assigned_to=admin.id, media_urls=json.dumps(['https://img/1.jpg']),
+                       created_at=now - timedelta(minutes=5)),
+        IncidentReport(title='Flooding', description='Water on the road', latitude=-4.0,
+                       longitude=39.6, user_id=admin.id, created_at=now,
+                       resolved_at=now)
+    ]
+    db.session.add_all(incidents)
+    db.session.commit()
+    return incidents
+
+def roundtrip(app, obj):
+    return json.loads(app.json.dumps(obj))
+
+def test_projected_rows_match_to_dict(app, incidents):
+    rows = db.session.execute(incident_select().order_by(IncidentReport.id)).all()
+    projected = serialize_incident_rows(rows)
+    expected = [incident.to_dict() for incident in incidents]
+
+    assert roundtrip(app, projected) == roundtrip(app, expected)
+    assert list(projected[0]) == list(expected[0])
+
+def test_projected_comments_match_to_dict(app, incidents, users):
+    comment = IncidentComment(incident_id=incidents[0].id, user_id=users[0].id, content='Seen it')
+    db.session.add(comment)
+    db.session.commit()
+
+    rows = db.session.execute(comment_select()).all()
+    assert roundtrip(app, serialize_comment_rows(rows)) == roundtrip(app, [comment.to_dict()])
+
+def test_json_provider_writes_iso_datetimes(app):
+    value = datetime(2025, 5, 9, 14, 51, 40, 389893)
+    assert json.loads(app.json.dumps({'at': value})) == {'at': value.isoformat()}
+    assert app.json.dumps({None: 1}) in ('{"null":1}', '{"null": 1}')
+
+def test_get_incidents_uses_projection(app, client, users, incidents):
+    reporter, admin = users
+    headers = {'Authorization': f'Bearer {create_access_token(identity=admin.id)}'}
+
+    response = client.get('/api/incidents/?per_page=1', headers=headers)
+    assert response.status_code == 200
+    assert response.json['total'] == 2
+    assert response.json['pages'] == 2
+    assert response.json['incidents'][0]['title'] == 'Flooding'
+
+    headers = {'Authorization': f'Bearer {create_access_token(identity=reporter.id)}'}
+    response = client.get('/api/incidents/', headers=headers)
+    assert response.json['total'] == 1
+    assert response.json['incidents'][0]['category']['name'] == 'Road'
+    assert response.json['incidents'][0]['assignee'] == 'admin'
+
+def test_get_incidents_rejects_bad_dates(client, users):
+    headers = {'Authorization': f'Bearer {create_access_token(identity=users[1].id)}'}
+    response = client.get('/api/incidents/?start_date=yesterday', headers=headers)
+    assert response.status_code == 400
+
+def test_pin_view_selects_only_pin_columns(app, client, users, incidents):
+    headers = {'Authorization': f'Bearer {create_access_token(identity=users[1].id)}'}
+
+    full = client.get('/api/incidents/', headers=headers)
+    pins = client.get('/api/incidents/?view=pin', headers=headers)
+    assert pins.status_code == 200
+    assert set(pins.json['incidents'][0]) == {'id', 'latitude', 'longitude', 'status', 'priority'}
+    assert len(pins.data) * 3 < len(full.data)
+
+    # No joins are needed for map pins
+    sql = str(incident_select(('id', 'latitude', 'longitude', 'status', 'priority')))
+    assert 'JOIN' not in sql
+    assert 'description' not in sql
+
+def test_fields_parameter(app, client, users, incidents):
+    headers = {'Authorization': f'Bearer {create_access_token(identity=users[1].id)}'}
+
+    response = client.get('/api/incidents/?fields=title,category_name', headers=headers)
+    assert response.status_code == 200
+    assert list(response.json['incidents'][1]) == ['id', 'title', 'category_name']
+    assert response.json['incidents'][1]['category_name'] == 'Road'
+
+    response = client.get('/api/incidents/?fields=title,password_hash', headers=headers)
+    assert response.status_code == 400
+    assert 'password_hash' in response.json['error']
+
+    response = client.get('/api/incidents/?view=everything', headers=headers)
+    assert response.status_code == 400
@@ -0,0 +1,70 @@
+import threading
+import pytest
+from sqlalchemy import text
+from server import create_app
+from server.models import db, IncidentCategory
+from server.utils.sqlite_utils import SQLiteWriteLock
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+def test_pragmas_are_applied(app):
+    with db.engine.connect() as conn:
+        assert conn.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert conn.execute(text('PRAGMA synchronous')).scalar() == 1  # NORMAL
+        assert conn.execute(text('PRAGMA busy_timeout')).scalar() == 5000
+
+def test_write_lock_held_until_commit(app):
+    lock = app.extensions['sqlite_write_lock']
+
+    db.session.add(IncidentCategory(name='Fire'))
+    db.session.flush()
+    assert db.session.info['sqlite_write_lock'] is lock
+
+    db.session.commit()
+    assert 'sqlite_write_lock' not in db.session.info
+    assert lock.acquire()
+    lock.release()
+
+def test_write_lock_released_on_rollback(app):
+    db.session.add(IncidentCategory(name='Flood'))
+    db.session.flush()
+    db.session.rollback()
+    assert 'sqlite_write_lock' not in db.session.info
+
+def test_write_lock_serializes_threads(tmp_path):
+    lock = SQLiteWriteLock(str(tmp_path / 'app.db.write-lock'), timeout=5)
+    events = []
+
+    def writer(name):
+        assert lock.acquire()
+        events.append(f'{name}-start')
+        events.append(f'{name}-end')
+        lock.release()
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every writer finished before the next one started
+    assert all(events[i].split('-')[0] == events[i + 1].split('-')[0]
+               for i in range(0, len(events), 2))
+
+def test_write_lock_times_out(tmp_path):
+    lock = SQLiteWriteLock(str(tmp_path / 'app.db.write-lock'), timeout=0.1)
+    assert lock.acquire()
+
+    result = []
+    thread = threading.Thread(target=lambda: result.append(lock.acquire()))
+    thread.start()
+    thread.join()
+    lock.release()
+    assert result == [False]
@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+from server.utils.import_profile import parse_importtime, profile_startup
+from server.utils.lazy_import import LazyModule
+
+# Generous, so a loaded CI machine passes; it still catches an SDK that
+# adds seconds to every worker's boot
+BOOT_BUDGET_SECONDS = 5.0
+DEFERRED = ('boto3', 'botocore', 'numpy', 'cloudinary', 'requests', 'twilio')
+
+def test_create_app_boots_under_budget():
+    profile = profile_startup('testing')
+    assert profile.boot_seconds < BOOT_BUDGET_SECONDS
+    assert any(row.name == 'server.app' for row in profile.modules)
+
+def test_heavy_sdks_are_not_imported_at_boot():
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    code = ("import sys; from server import create_app; create_app('testing'); "
+            f"print(','.join(m for m in {DEFERRED!r} if m in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                            cwd=root, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ''
+
+def test_parse_importtime_and_lazy_module():
+    output = ('import time: self [us] | cumulative | imported package\n'
+              'import time:       120 |        120 |     zlib\n'
+              'import time:        80 |        200 |   server.utils\n'
+              'import time:        10 |        210 | server\n')
+    rows = parse_importtime(output)
+    assert [(row.name, row.depth, row.cumulative_us) for row in rows] == [
+        ('zlib', 2, 120), ('server.utils', 1, 200), ('server', 0, 210)]
+
+    json = LazyModule('json')
+    assert 'not loaded' in repr(json)
+    assert json.loads('[1]') == [1]
+    assert 'not loaded' not in repr(json)
@@ -0,0 +1,135 @@
+import pytest
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from server import create_app
+from server.models import db, User, IncidentReport, IncidentStatusEvent, IncidentStatusRollup
+from server.utils.incident_archive import archive_resolved, find_archived_incident
+from server.utils.status_history import (
+    bucket_of, merged_rollups, percentiles, set_incident_status
+)
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def admin(app):
+    user = User(username='admin', email='admin@example.com', role='admin')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+@pytest.fixture
+def headers(admin):
+    return {'Authorization': f'Bearer {create_access_token(identity=admin.id)}'}
+
+def incident(user, hours_ago, category_id=None):
+    report = IncidentReport(title='Flooding', description='Road flooded', latitude=-1.28,
+                            longitude=36.82, user_id=user.id, category_id=category_id,
+                            status='reported',
+                            created_at=datetime.utcnow() - timedelta(hours=hours_ago))
+    db.session.add(report)
+    db.session.commit()
+    return report
+
+def test_histogram_percentiles_within_bucket_error():
+    import numpy as np
+    durations = np.arange(1, 10001) * 60.0
+    histogram = np.zeros(bucket_of(durations.max()) + 1, dtype=np.uint64)
+    for seconds in durations:
+        histogram[bucket_of(seconds)] += 1
+    estimates = percentiles(histogram, (50, 90, 99))
+    for q, estimate in estimates.items():
+        exact = np.percentile(durations, q)
+        assert abs(estimate - exact) / exact < 0.05
+
+def test_status_changes_are_recorded_and_rolled_up(client, headers, admin):
+    first = incident(admin, hours_ago=10)
+    second = incident(admin, hours_ago=2)
+
+    response = client.patch(f'/api/incidents/{first.id}/status',
+                            json={'status': 'under investigation'}, headers=headers)
+    assert response.status_code == 200
+    response = client.put(f'/api/admin/incidents/status/{first.id}',
+                          json={'status': 'resolved'}, headers=headers)
+    assert response.get_json()['resolved_at'] is not None
+    # Unchanged status: no new event
+    client.put(f'/api/admin/incidents/status/{first.id}', json={'status': 'resolved'},
+               headers=headers)
+    client.patch('/api/incidents/batch/status', headers=headers,
+                 json={'incident_ids': [second.id], 'status': 'resolved'})
+
+    history = client.get(f'/api/incidents/{first.id}/history', headers=headers).get_json()
+    assert [(e['from_status'], e['to_status']) for e in history['events']] == [
+        ('reported', 'under investigation'), ('under investigation', 'resolved')]
+    assert history['events'][0]['seconds_in_state'] == pytest.approx(10 * 3600, rel=0.01)
+    assert history['events'][1]['resolve_seconds'] == pytest.approx(10 * 3600, rel=0.01)
+
+    today = datetime.utcnow().date()
+    merged = merged_rollups(today - timedelta(days=1), today)
+    assert merged['resolve'][0] == 2
+    assert merged['in:reported'][0] == 2
+    assert merged['in:under investigation'][0] == 1
+
+    data = client.get('/api/admin/analytics/status-times?percentiles=50,100',
+                      headers=headers).get_json()
+    assert data['resolve']['count'] == 2
+    assert data['resolve']['mean_seconds'] == pytest.approx(6 * 3600, rel=0.01)
+    assert data['resolve']['percentiles']['p50'] == pytest.approx(2 * 3600, rel=0.05)
+    assert data['resolve']['percentiles']['p100'] == pytest.approx(10 * 3600, rel=0.05)
+    assert data['time_in_status']['reported']['count'] == 2
+    assert client.get('/api/admin/analytics/status-times?percentiles=150',
+                      headers=headers).status_code == 400
+
+def test_reopened_incident_counts_first_resolution_once(app, admin):
+    report = incident(admin, hours_ago=5)
+    now = datetime.utcnow()
+    for hours, status in ((4, 'resolved'), (3, 'reported'), (1, 'resolved')):
+        set_incident_status(report, status, admin.id, now - timedelta(hours=hours))
+    db.session.commit()
+
+    events = IncidentStatusEvent.query.order_by(IncidentStatusEvent.id).all()
+    assert [event.resolve_seconds is not None for event in events] == [True, False, False]
+    assert events[1].seconds_in_state == pytest.approx(3600)
+    assert events[2].seconds_in_state == pytest.approx(2 * 3600)
+    assert report.resolved_at == now - timedelta(hours=1)
+
+def test_rebuild_matches_incremental_rollups(app, admin):
+    for hours in (3, 30, 50):
+        set_incident_status(incident(admin, hours_ago=hours, category_id=None), 'resolved', admin.id)
+    db.session.commit()
+    before = {(r.day, r.category_key, r.metric): (r.count, r.total_seconds, r.histogram)
+              for r in IncidentStatusRollup.query}
+
+    result = app.test_cli_runner().invoke(args=['incidents', 'rebuild-status-rollups'])
+    assert 'Wrote 2 status rollups.' in result.output
+    after = {(r.day, r.category_key, r.metric): (r.count, r.total_seconds, r.histogram)
+             for r in IncidentStatusRollup.query}
+    assert after.keys() == before.keys()
+    for key, (count, total, histogram) in before.items():
+        assert after[key][0] == count
+        assert after[key][1] == pytest.approx(total)
+        assert after[key][2] == histogram
+
+def test_archived_incidents_keep_their_history(client, headers, admin):
+    report = incident(admin, hours_ago=24 * 200)
+    set_incident_status(report, 'resolved', admin.id,
+                        datetime.utcnow() - timedelta(days=120))
+    db.session.commit()
+    incident_id = report.id
+
+    assert archive_resolved(datetime.utcnow() - timedelta(days=90)) == (1, 1)
+    assert IncidentStatusEvent.query.count() == 0
+    record = find_archived_incident(incident_id)
+    assert [e['to_status'] for e in record['status_events']] == ['resolved']
+    history = client.get(f'/api/incidents/{incident_id}/history', headers=headers).get_json()
+    assert history['events'] == record['status_events']
@@ -0,0 +1,178 @@
+import pytest
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from server import create_app
+from server.models import (db, User, AlertSubscription, SubscriptionCell, IncidentReport,
+                           NotificationOutbox)
+from server.utils.geofence import match_subscriptions, polygon_reaches
+from server.utils.outbox import deliver_pending
+
+# Around Nairobi CBD
+CBD = (-1.2864, 36.8172)
+WESTLANDS_POLYGON = [[-1.255, 36.795], [-1.255, 36.815], [-1.275, 36.815], [-1.275, 36.795]]
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def users(app):
+    reporter = User(username='reporter', email='reporter@example.com')
+    resident = User(username='resident', email='resident@example.com', phone_number='+254700000001')
+    commuter = User(username='commuter', email='commuter@example.com', sms_notifications=False)
+    db.session.add_all([reporter, resident, commuter])
+    db.session.commit()
+    return reporter, resident, commuter
+
+def auth(user):
+    return {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+def subscribe(client, user, **area):
+    return client.post('/api/subscriptions/', json={'name': 'Home', **area}, headers=auth(user))
+
+def report(client, user, latitude, longitude, radius=0):
+    return client.post('/api/incidents/', headers=auth(user), data={
+        'title': 'Building fire', 'description': 'Smoke from a commercial building',
+        'latitude': str(latitude), 'longitude': str(longitude), 'affected_area_radius': str(radius)})
+
+def test_create_and_manage_subscriptions(client, users):
+    _, resident, commuter = users
+    response = subscribe(client, resident, latitude=CBD[0], longitude=CBD[1], radius_m=1000)
+    assert response.status_code == 201
+    assert response.json['kind'] == 'circle'
+    subscription_id = response.json['id']
+    assert SubscriptionCell.query.filter_by(subscription_id=subscription_id).count() >= 1
+
+    assert client.get('/api/subscriptions/', headers=auth(commuter)).json == []
+    assert client.patch(f'/api/subscriptions/{subscription_id}', json={'is_active': False},
+                        headers=auth(commuter)).status_code == 404
+    response = client.patch(f'/api/subscriptions/{subscription_id}', json={'polygon': WESTLANDS_POLYGON},
+                            headers=auth(resident))
+    assert response.json['kind'] == 'polygon' and response.json['radius_m'] is None
+
+    assert client.delete(f'/api/subscriptions/{subscription_id}', headers=auth(resident)).status_code == 200
+    assert SubscriptionCell.query.count() == 0
+
+def test_rejects_invalid_areas(client, users):
+    _, resident, _ = users
+    assert subscribe(client, resident, latitude=CBD[0], longitude=CBD[1]).status_code == 400
+    assert subscribe(client, resident, latitude=CBD[0], longitude=CBD[1], radius_m=-5).status_code == 400
+    assert subscribe(client, resident, polygon=[[0, 0], [1, 1]]).status_code == 400
+    # Far more cells than SUBSCRIPTION_MAX_CELLS
+    assert subscribe(client, resident, latitude=0, longitude=37, radius_m=500000).status_code == 400
+
+def test_incident_alerts_matching_subscribers(client, users):
+    reporter, resident, commuter = users
+    subscribe(client, resident, latitude=CBD[0], longitude=CBD[1], radius_m=1000)
+    subscribe(client, commuter, polygon=WESTLANDS_POLYGON)
+    # The reporter's own subscription does not alert them
+    subscribe(client, reporter, latitude=CBD[0], longitude=CBD[1], radius_m=1000)
+
+    assert report(client, reporter, -1.2870, 36.8180).status_code == 201
+    messages = NotificationOutbox.query.order_by(NotificationOutbox.id).all()
+    assert [(m.user_id, m.channel) for m in messages] == [(resident.id, 'email'), (resident.id, 'sms')]
+    assert all(m.status == 'pending' and m.event == 'incident_nearby' for m in messages)
+
+    # 2.5km from the polygon's edge: only reached with a large enough affected radius
+    NotificationOutbox.query.delete()
+    report(client, reporter, -1.2650, 36.8370)
+    assert NotificationOutbox.query.count() == 0
+    report(client, reporter, -1.2650, 36.8370, radius=3000)
+    assert {m.user_id for m in NotificationOutbox.query.all()} == {resident.id, commuter.id}
+
+def test_incident_alerts_commit_with_the_report(app, client, users, monkeypatch):
+    reporter, resident, _ = users
+    subscribe(client, resident, latitude=CBD[0], longitude=CBD[1], radius_m=1000)
+    import server.utils.geofence as geofence
+
+    # A matching failure is rolled back to its savepoint; the report still commits
+    def broken(*args):
+        db.session.execute(NotificationOutbox.__table__.insert(), [{
+            'user_id': resident.id, 'channel': 'email', 'event': 'incident_nearby', 'body': 'partial'}])
+        raise RuntimeError('matching failed')
+    monkeypatch.setattr(geofence, 'match_subscriptions', broken)
+    assert report(client, reporter, *CBD).status_code == 201
+    assert NotificationOutbox.query.count() == 0
+    monkeypatch.undo()
+
+    # Alerts are queued in the report's transaction: no commit, no report and no alerts
+    monkeypatch.setattr(db.session, 'commit', lambda: (_ for _ in ()).throw(RuntimeError('crash')))
+    assert report(client, reporter, *CBD).status_code == 500
+    monkeypatch.undo()
+    assert IncidentReport.query.count() == 1
+    assert NotificationOutbox.query.count() == 0
+
+def test_affected_radius_is_bounded(app, client, users):
+    reporter, resident, _ = users
+    admin = User(username='admin', email='admin@example.com', role='admin')
+    db.session.add(admin)
+    db.session.commit()
+    assert report(client, reporter, *CBD, radius=10_000_000).status_code == 400
+    assert report(client, reporter, *CBD, radius=-1).status_code == 400
+    assert report(client, reporter, *CBD, radius='far').status_code == 400
+    response = report(client, reporter, *CBD, radius=50000)
+    assert response.status_code == 201
+    assert client.patch(f"/api/incidents/{response.json['id']}", headers=auth(admin),
+                        json={'affected_area_radius': 10_000_000}).status_code == 400
+
+def test_large_areas_match_on_bounding_boxes(app, users):
+    _, resident, _ = users
+    subscription = AlertSubscription(user_id=resident.id, name='Mombasa', kind='circle',
+                                     center_latitude=-4.05, center_longitude=39.67, radius_m=1000,
+                                     min_latitude=-4.06, max_latitude=-4.04,
+                                     min_longitude=39.66, max_longitude=39.68)
+    db.session.add(subscription)
+    db.session.commit()
+    from server.utils.geofence import index_subscription
+    index_subscription(subscription, 0.02)
+    db.session.commit()
+    # ~430 km from Nairobi: tens of thousands of cells, far above the cap
+    matches = match_subscriptions(*CBD, 450000, 0.02, max_cells=2500)
+    assert [m.id for m in matches] == [subscription.id]
+    assert match_subscriptions(*CBD, 300000, 0.02, max_cells=2500) == []
+
+def test_match_exactness(app, users):
+    _, resident, _ = users
+    db.session.add(AlertSubscription(user_id=resident.id, name='a', kind='circle',
+                                     center_latitude=0.0, center_longitude=0.0, radius_m=1000,
+                                     min_latitude=-0.01, max_latitude=0.01,
+                                     min_longitude=-0.01, max_longitude=0.01))
+    db.session.commit()
+    from server.utils.geofence import index_subscription
+    index_subscription(AlertSubscription.query.one(), 0.02)
+    db.session.commit()
+    # Same grid cell but outside the circle
+    assert match_subscriptions(0.0095, 0.0095, 0, 0.02) == []
+    assert len(match_subscriptions(0.0095, 0.0095, 500, 0.02)) == 1
+    assert len(match_subscriptions(0.005, 0.0, 0, 0.02)) == 1
+
+    assert polygon_reaches(WESTLANDS_POLYGON, -1.265, 36.805, 0)
+    assert not polygon_reaches(WESTLANDS_POLYGON, -1.265, 36.830, 1000)
+    assert polygon_reaches(WESTLANDS_POLYGON, -1.265, 36.830, 2000)
+
+def test_deliver_pending(app, users, monkeypatch):
+    _, resident, _ = users
+    from server.utils.outbox import enqueue_notification
+    import server.utils.outbox as outbox
+    enqueue_notification(resident.id, 'email', 'hello', subject='Hi')
+    enqueue_notification(resident.id, 'sms', 'hello')
+    db.session.commit()
+
+    monkeypatch.setattr(outbox, 'send_email_batch', lambda emails: [True] * len(emails))
+    monkeypatch.setattr(outbox, 'send_sms_notification', lambda *args: False)
+    assert deliver_pending(max_attempts=2) == (1, 1)
+    # Retried after a backoff
+    assert deliver_pending(max_attempts=2) == (0, 0)
+    later = datetime.utcnow() + timedelta(minutes=5)
+    assert deliver_pending(max_attempts=2, now=later) == (0, 1)
+    statuses = {m.channel: (m.status, m.attempts) for m in NotificationOutbox.query.all()}
+    assert statuses == {'email': ('sent', 1), 'sms': ('failed', 2)}
@@ -0,0 +1,189 @@
+import struct
+import pytest
+from flask_jwt_extended import create_access_token
+from server import create_app
+from server.models import db, User, IncidentReport
+from server.utils.vector_tiles import TileCache, encode_layer, encode_tile, tile_bounds
+
+# Nairobi CBD at zoom 14
+TILE = (14, 9867, 8250)
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def admin(app):
+    admin = User(username='admin', email='admin@example.com', role='admin')
+    db.session.add(admin)
+    db.session.commit()
+    db.session.add_all([
+        IncidentReport(title='a', description='a', latitude=-1.2860, longitude=36.8170,
+                       user_id=admin.id, priority='high', category_id=3),
+        IncidentReport(title='b', description='b', latitude=-1.2840, longitude=36.8200,
+                       user_id=admin.id, status='resolved'),
+        IncidentReport(title='c', description='c', latitude=-4.0435, longitude=39.6682,
+                       user_id=admin.id),
+    ])
+    db.session.commit()
+    return admin
+
+def auth(user):
+    return {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+def _varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return result, pos
+
+def _fields(data):
+    pos = 0
+    while pos < len(data):
+        key, pos = _varint(data, pos)
+        field, wire = key >> 3, key & 7
+        if wire == 0:
+            value, pos = _varint(data, pos)
+        elif wire == 1:
+            value, pos = struct.unpack('<d', data[pos:pos + 8])[0], pos + 8
+        else:
+            length, pos = _varint(data, pos)
+            value, pos = data[pos:pos + length], pos + length
+        yield field, value
+
+def _packed(data):
+    values, pos = [], 0
+    while pos < len(data):
+        value, pos = _varint(data, pos)
+        values.append(value)
+    return values
+
+def _unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+def decode(tile):
+    """Minimal MVT decoder: {layer: [(id, x, y, properties)]}."""
+    layers = {}
+    for _, layer_bytes in _fields(tile):
+        name, features, keys, values, version = None, [], [], [], None
+        for field, value in _fields(layer_bytes):
+            if field == 1:
+                name = value.decode()
+            elif field == 2:
+                features.append(dict(_fields(value)))
+            elif field == 3:
+                keys.append(value.decode())
+            elif field == 4:
+                (kind, raw), = _fields(value)
+                values.append(raw.decode() if kind == 1 else raw)
+            elif field == 15:
+                version = value
+        assert version == 2
+        decoded = []
+        for feature in features:
+            tags = _packed(feature.get(2, b''))
+            command, x, y = _packed(feature[4])
+            assert command == 9 and feature[3] == 1
+            props = {keys[tags[i]]: values[tags[i + 1]] for i in range(0, len(tags), 2)}
+            decoded.append((feature.get(1), _unzigzag(x), _unzigzag(y), props))
+        layers[name] = decoded
+    return layers
+
+def test_encoder_roundtrip():
+    layer = encode_layer('points', [(7, 10, 4095, {'status': 'reported', 'n': 3, 'neg': -2}),
+                                    (None, -5, 0, {'status': 'reported', 'ok': True})])
+    assert decode(encode_tile([layer])) == {'points': [
+        # -2 is stored as a zigzag-encoded sint64
+        (7, 10, 4095, {'status': 'reported', 'n': 3, 'neg': 3}),
+        (None, -5, 0, {'status': 'reported', 'ok': 1}),
+    ]}
+
+def test_tile_bounds():
+    west, south, east, north = tile_bounds(*TILE)
+    assert west < 36.8170 < east and south < -1.2860 < north
+
+def test_incident_tile(client, admin):
+    response = client.get('/api/incidents/tiles/%d/%d/%d.mvt' % TILE, headers=auth(admin))
+    assert response.status_code == 200
+    assert response.mimetype == 'application/vnd.mapbox-vector-tile'
+    features = decode(response.data)['incidents']
+    assert len(features) == 2
+    props = {f[0]: f[3] for f in features}
+    assert props[1]['priority'] == 'high' and props[1]['category_id'] == 3
+    assert all(0 <= f[1] <= 4096 and 0 <= f[2] <= 4096 for f in features)
+
+    response = client.get('/api/incidents/tiles/%d/%d/%d.mvt?status=resolved' % TILE,
+                          headers=auth(admin))
+    assert [f[0] for f in decode(response.data)['incidents']] == [2]
+
+def test_low_zoom_tile_has_clusters(client, admin):
+    response = client.get('/api/incidents/tiles/0/0/0.mvt', headers=auth(admin))
+    clusters = decode(response.data)['clusters']
+    assert sum(f[3]['count'] for f in clusters) == 3
+
+def test_etag_and_invalidation(app, client, admin):
+    url = '/api/incidents/tiles/%d/%d/%d.mvt' % TILE
+    first = client.get(url, headers=auth(admin))
+    etag = first.headers['ETag']
+    assert client.get(url, headers={**auth(admin), 'If-None-Match': etag}).status_code == 304
+
+    # A write elsewhere keeps the tile cached; one inside it drops it
+    cache = app.extensions['tile_cache']
+    db.session.add(IncidentReport(title='d', description='d', latitude=0.5, longitude=35.3,
+                                  user_id=admin.id))
+    db.session.commit()
+    assert cache.get((*TILE, ('all',))) is not None
+
+    incident = db.session.get(IncidentReport, 1)
+    incident.priority = 'critical'
+    db.session.commit()
+    assert cache.get((*TILE, ('all',))) is None
+    second = client.get(url, headers=auth(admin))
+    assert second.headers['ETag'] != etag
+    assert {f[0]: f[3] for f in decode(second.data)['incidents']}[1]['priority'] == 'critical'
+
+def test_cache_drops_only_tiles_containing_the_point():
+    cache = TileCache(max_entries=10)
+    cache.put((*TILE, ()), b'tile', 'etag')
+    cache.put((0, 0, 0, ()), b'world', 'etag')
+    cache.invalidate_point(10.0, 10.0)
+    assert cache.get((*TILE, ())) is not None
+    assert cache.get((0, 0, 0, ())) is None
+
+def test_cache_drops_tiles_drawing_the_point_near_their_edge():
+    cache = TileCache(max_entries=10)
+    z, x, y = TILE
+    cache.put((*TILE, ()), b'tile', 'etag')
+    # Just west of the tile, inside its 64-unit buffer
+    west, _, _, north = tile_bounds(z, x - 0.01, y + 0.5)
+    cache.invalidate_point(north, west)
+    assert cache.get((*TILE, ())) is None
+
+    cache.put((*TILE, ()), b'tile', 'etag')
+    west, _, _, north = tile_bounds(z, x - 0.1, y + 0.5)
+    cache.invalidate_point(north, west)
+    assert cache.get((*TILE, ())) is not None
+
+    # A cluster tile draws clusters whose cell reaches into its buffer, so an
+    # incident a fifth of a tile west of it still changes it
+    cluster_tile = (10, x >> 4, y >> 4)
+    cache.put((*cluster_tile, ()), b'clusters', 'etag')
+    west, _, _, north = tile_bounds(10, cluster_tile[1] - 0.2, cluster_tile[2] + 0.5)
+    cache.invalidate_point(north, west)
+    assert cache.get((*cluster_tile, ())) is None
+
+def test_rejects_out_of_range_tiles(client, admin):
+    assert client.get('/api/incidents/tiles/2/4/0.mvt', headers=auth(admin)).status_code == 400
@@ -0,0 +1,472 @@
+"""Monthly partitions for the ``user_activities`` log.
+
+Every login, report and comment adds a row, and the activity pages only
+ever want the newest ones. The log is split by month of ``created_at`` so
+that recent pages read one small partition and old months can be dropped
+or archived whole, without a ``DELETE``:
+
+* PostgreSQL: ``user_activities`` becomes a declaratively partitioned table
+  (``PARTITION BY RANGE (created_at)``) with one ``user_activities_pYYYYMM``
+  partition per month, created ``ACTIVITY_PARTITION_PREMAKE_MONTHS`` ahead,
+  and a default partition for anything outside them.
+* SQLite: ``user_activities`` holds the current month, and
+  ``maintain_partitions`` renames it to ``user_activities_pYYYYMM`` once the
+  month is over and starts an empty one. Rows of the new month written
+  before the rotation ran are moved back to it.
+
+Both also get a ``user_activities_all`` view over every live partition.
+``flask activities maintain`` (run daily) converts an unpartitioned table,
+rotates or creates partitions and applies ``ACTIVITY_RETENTION_MONTHS``.
+Until it has run the table is used as a single partition.
+
+``activity_page`` pages through partitions newest first and stops once the
+page is full. Row counts of closed months (for the page total) are cached,
+so a request for recent activity only reads the latest partition.
+"""
+import functools
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+import sqlalchemy as sa
+from flask import current_app
+from sqlalchemy import event, func, insert, select, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from ..models import UserActivity
+
+TABLE = 'user_activities'
+VIEW = 'user_activities_all'
+PREFIX = 'user_activities_p'
+DEFAULT_PARTITION = 'user_activities_pdefault'
+ARCHIVE_PREFIX = 'user_activities_archive_'
+_ROTATING = 'user_activities_rotating'
+_UNPARTITIONED = 'user_activities_unpartitioned'
+_PARTITION_RE = re.compile(r'^user_activities_p(\d{4})(\d{2})$')
+COLUMNS = ('id', 'user_id', 'activity_type', 'description', 'ip_address', 'created_at')
+
+# start is inclusive, end exclusive; None where a bound is open
+Partition = namedtuple('Partition', 'name start end')
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{PREFIX}{month:%Y%m}'
+
+
+def parse_partition(name):
+    """The month a ``user_activities_pYYYYMM`` name covers, or None."""
+    match = _PARTITION_RE.match(name)
+    return datetime(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+@functools.lru_cache(maxsize=None)
+def partition_table(name):
+    """A Core table with the activity columns, for any partition."""
+    return sa.Table(
+        name, sa.MetaData(),
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('user_id', sa.Integer),
+        sa.Column('activity_type', sa.String(50)),
+        sa.Column('description', sa.Text),
+        sa.Column('ip_address', sa.String(45)),
+        sa.Column('created_at', sa.DateTime))
+
+
+def _dialect(executor):
+    """The dialect name for a Connection or a Session."""
+    dialect = getattr(executor, 'dialect', None) or executor.get_bind().dialect
+    return dialect.name
+
+
+def _table_names(executor, prefix):
+    if _dialect(executor) == 'postgresql':
+        query = ("SELECT relname FROM pg_class WHERE relkind IN ('r', 'p') "
+                 'AND pg_table_is_visible(oid) AND left(relname, :length) = :prefix')
+    else:
+        query = ("SELECT name FROM sqlite_master WHERE type = 'table' "
+                 'AND substr(name, 1, :length) = :prefix')
+    return list(executor.execute(text(query), {'length': len(prefix), 'prefix': prefix}).scalars())
+
+
+def is_partitioned(connection):
+    dialect = _dialect(connection)
+    if dialect == 'postgresql':
+        return connection.execute(text(
+            'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt '
+            'JOIN pg_class c ON c.oid = pt.partrelid '
+            'WHERE c.relname = :name AND pg_table_is_visible(c.oid))'), {'name': TABLE}).scalar()
+    if dialect == 'sqlite':
+        return connection.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'view' AND name = :name)"),
+            {'name': VIEW}).scalar() == 1
+    return False
+
+
+def list_partitions(connection, now=None):
+    """Live partitions holding rows up to ``now``, newest first.
+
+    An unpartitioned table, or a PostgreSQL default partition that holds
+    rows, is returned as the single partition ``user_activities``.
+    """
+    now = now or datetime.utcnow()
+    if not is_partitioned(connection):
+        return [Partition(TABLE, None, None)]
+    if _dialect(connection) == 'postgresql':
+        names = connection.execute(text(
+            'SELECT c.relname FROM pg_inherits i '
+            'JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent '
+            'WHERE p.relname = :name AND pg_table_is_visible(p.oid)'), {'name': TABLE}).scalars().all()
+        if DEFAULT_PARTITION in names and connection.execute(
+                text(f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION})')).scalar():
+            # Rows outside every month: only the parent sees them in order
+            return [Partition(TABLE, None, None)]
+        hot = []
+    else:
+        names = _table_names(connection, PREFIX)
+        # The current month, newer than every closed partition
+        hot = [Partition(TABLE, None, None)]
+    months = sorted((month for month in map(parse_partition, names)
+                     if month is not None and month <= now), reverse=True)
+    return hot + [Partition(partition_name(month), month, add_months(month, 1))
+                  for month in months]
+
+
+# -- Maintenance ---------------------------------------------------------
+
+def _sqlite_create(connection, name, index_month, autoincrement=False):
+    connection.execute(text(
+        f'CREATE TABLE {name} ('
+        f'id INTEGER PRIMARY KEY{" AUTOINCREMENT" if autoincrement else ""}, '
+        'user_id INTEGER NOT NULL REFERENCES users (id), '
+        'activity_type VARCHAR(50) NOT NULL, '
+        'description TEXT, '
+        'ip_address VARCHAR(45), '
+        'created_at DATETIME)'))
+    _sqlite_ensure_indexes(connection, name, partition_name(index_month))
+
+
+def _sqlite_indexes(connection, table):
+    return connection.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table "
+        "AND name NOT LIKE 'sqlite_autoindex_%'"), {'table': table}).scalars().all()
+
+
+def _sqlite_ensure_indexes(connection, table, index_prefix):
+    """Index a table under names derived from ``index_prefix``.
+
+    Index names are global in SQLite, so the current month's table names
+    its indexes after the partition it will be renamed to.
+    """
+    wanted = {f'ix_{index_prefix}_user_created': '(user_id, created_at)',
+              f'ix_{index_prefix}_created': '(created_at)'}
+    for name in _sqlite_indexes(connection, table):
+        if name not in wanted:
+            connection.execute(text(f'DROP INDEX {name}'))
+    for name, columns in wanted.items():
+        connection.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} {columns}'))
+
+
+def _sqlite_refresh_view(connection):
+    names = sorted((name for name in _table_names(connection, PREFIX) if parse_partition(name)),
+                   reverse=True)
+    columns = ', '.join(COLUMNS)
+    connection.execute(text(f'DROP VIEW IF EXISTS {VIEW}'))
+    connection.execute(text(f'CREATE VIEW {VIEW} AS ' + ' UNION ALL '.join(
+        f'SELECT {columns} FROM {name}' for name in [TABLE] + names)))
+
+
+def _sqlite_rotate(connection, now):
+    """Move closed months out of the current-month table."""
+    boundary = month_start(now)
+    hot = partition_table(TABLE)
+    partitioned = is_partitioned(connection)
+    if partitioned and not connection.execute(
+            select(hot.c.id).where(hot.c.created_at < boundary).limit(1)).first():
+        return []
+
+    max_id = connection.execute(select(func.max(hot.c.id))).scalar() or 0
+    # Renaming would rewrite the view to point at the renamed table
+    connection.execute(text(f'DROP VIEW IF EXISTS {VIEW}'))
+    connection.execute(text(f'ALTER TABLE {TABLE} RENAME TO {_ROTATING}'))
+    _sqlite_create(connection, TABLE, boundary, autoincrement=True)
+    # Carry on the id sequence, so ids stay unique across partitions
+    connection.execute(text('DELETE FROM sqlite_sequence WHERE name = :name'), {'name': TABLE})
+    connection.execute(text('INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)'),
+                       {'name': TABLE, 'seq': max_id})
+
+    rotating = partition_table(_ROTATING)
+    current = sa.or_(rotating.c.created_at >= boundary, rotating.c.created_at.is_(None))
+    connection.execute(insert(hot).from_select(
+        list(COLUMNS), select(*[rotating.c[name] for name in COLUMNS]).where(current)))
+    connection.execute(rotating.delete().where(current))
+
+    months = sorted(datetime.strptime(value, '%Y-%m') for value in connection.execute(
+        select(func.substr(rotating.c.created_at, 1, 7)).distinct()).scalars())
+    existing = set(_table_names(connection, PREFIX))
+    if len(months) == 1 and partition_name(months[0]) not in existing:
+        # The usual case: last month's table becomes its partition as is
+        name = partition_name(months[0])
+        connection.execute(text(f'ALTER TABLE {_ROTATING} RENAME TO {name}'))
+        _sqlite_ensure_indexes(connection, name, name)
+    else:
+        for name in _sqlite_indexes(connection, _ROTATING):
+            connection.execute(text(f'DROP INDEX {name}'))
+        for month in months:
+            name = partition_name(month)
+            if name not in existing:
+                _sqlite_create(connection, name, month)
+            connection.execute(insert(partition_table(name)).from_select(
+                list(COLUMNS), select(*[rotating.c[column] for column in COLUMNS]).where(
+                    rotating.c.created_at >= month,
+                    rotating.c.created_at < add_months(month, 1))))
+        connection.execute(text(f'DROP TABLE {_ROTATING}'))
+    _sqlite_refresh_view(connection)
+    return [partition_name(month) for month in months]
+
+
+def _pg_create_partition(connection, month):
+    """Create a month's partition, moving any of its rows out of the default one."""
+    name = partition_name(month)
+    bounds = {'start': month, 'end': add_months(month, 1)}
+    exists = connection.execute(text('SELECT to_regclass(:name) IS NOT NULL'),
+                                {'name': name}).scalar()
+    if exists:
+        return False
+    stray = connection.execute(text(
+        f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} '
+        'WHERE created_at >= :start AND created_at < :end)'), bounds).scalar()
+    if stray:
+        connection.execute(text(f'ALTER TABLE {TABLE} DETACH PARTITION {DEFAULT_PARTITION}'))
+    connection.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM ('{month:%Y-%m-%d}') "
+        f"TO ('{add_months(month, 1):%Y-%m-%d}')"))
+    if stray:
+        columns = ', '.join(COLUMNS)
+        connection.execute(text(
+            f'INSERT INTO {name} ({columns}) SELECT {columns} FROM {DEFAULT_PARTITION} '
+            'WHERE created_at >= :start AND created_at < :end'), bounds)
+        connection.execute(text(
+            f'DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= :start AND created_at < :end'),
+            bounds)
+        connection.execute(text(f'ALTER TABLE {TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT'))
+    return True
+
+
+def _pg_partition(connection, now, premake):
+    """Turn the plain table into a partitioned one, one partition per month."""
+    connection.execute(text(f'ALTER TABLE {TABLE} RENAME TO {_UNPARTITIONED}'))
+    connection.execute(text(
+        f'ALTER TABLE {_UNPARTITIONED} RENAME CONSTRAINT {TABLE}_pkey TO {_UNPARTITIONED}_pkey'))
+    connection.execute(text(f'ALTER SEQUENCE {TABLE}_id_seq OWNED BY NONE'))
+    # The partition key has to be part of the primary key
+    connection.execute(text(
+        f'CREATE TABLE {TABLE} ('
+        f"id INTEGER NOT NULL DEFAULT nextval('{TABLE}_id_seq'), "
+        'user_id INTEGER NOT NULL REFERENCES users (id), '
+        'activity_type VARCHAR(50) NOT NULL, '
+        'description TEXT, '
+        'ip_address VARCHAR(45), '
+        "created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'), "
+        'PRIMARY KEY (id, created_at)'
+        ') PARTITION BY RANGE (created_at)'))
+    connection.execute(text(f'ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id'))
+    connection.execute(text(f'CREATE INDEX ix_{TABLE}_user_created ON {TABLE} (user_id, created_at)'))
+    connection.execute(text(f'CREATE INDEX ix_{TABLE}_created ON {TABLE} (created_at)'))
+    connection.execute(text(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT'))
+
+    oldest = connection.execute(text(f'SELECT min(created_at) FROM {_UNPARTITIONED}')).scalar()
+    month = month_start(min(oldest or now, now))
+    while month <= add_months(month_start(now), premake):
+        _pg_create_partition(connection, month)
+        month = add_months(month, 1)
+    columns = ', '.join(COLUMNS)
+    connection.execute(text(
+        f'INSERT INTO {TABLE} ({columns}) SELECT id, user_id, activity_type, description, '
+        f"ip_address, COALESCE(created_at, now() AT TIME ZONE 'utc') FROM {_UNPARTITIONED}"))
+    connection.execute(text(f'DROP TABLE {_UNPARTITIONED}'))
+    connection.execute(text(f'CREATE OR REPLACE VIEW {VIEW} AS SELECT {columns} FROM {TABLE}'))
+
+
+def maintain_partitions(connection, now=None, premake=2):
+    """Partition the table if needed and add the partitions due by ``now``.
+
+    Returns the names of the partitions created. Runs in the caller's
+    transaction.
+    """
+    now = now or datetime.utcnow()
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        return _sqlite_rotate(connection, now)
+    if dialect != 'postgresql':
+        raise ValueError(f'Activity partitioning is not supported on {dialect}')
+    before = set(_table_names(connection, PREFIX))
+    if not is_partitioned(connection):
+        _pg_partition(connection, now, premake)
+    else:
+        for offset in range(premake + 1):
+            _pg_create_partition(connection, add_months(month_start(now), offset))
+    return sorted(set(_table_names(connection, PREFIX)) - before - {DEFAULT_PARTITION})
+
+
+def apply_retention(connection, months, archive=False, now=None):
+    """Drop (or archive) partitions older than ``months`` whole months.
+
+    Archived partitions are renamed to ``user_activities_archive_YYYYMM``
+    (or added to it, if that month was archived before) and no longer read
+    by the app. Returns the names of the partitions removed.
+    """
+    if not months or not is_partitioned(connection):
+        return []
+    cutoff = add_months(month_start(now or datetime.utcnow()), -months)
+    expired = sorted(name for name in _table_names(connection, PREFIX)
+                     if parse_partition(name) and parse_partition(name) < cutoff)
+    postgres = connection.dialect.name == 'postgresql'
+    archives = set(_table_names(connection, ARCHIVE_PREFIX)) if archive else set()
+    for name in expired:
+        if postgres:
+            connection.execute(text(f'ALTER TABLE {TABLE} DETACH PARTITION {name}'))
+        archived = ARCHIVE_PREFIX + name[len(PREFIX):]
+        if archived in archives:
+            # Archived before (and the month restored since): add to it
+            columns = ', '.join(COLUMNS)
+            connection.execute(text(
+                f'INSERT INTO {archived} ({columns}) SELECT {columns} FROM {name}'))
+            connection.execute(text(f'DROP TABLE {name}'))
+        elif archive:
+            if not postgres:
+                for index in _sqlite_indexes(connection, name):
+                    connection.execute(text(f'DROP INDEX {index}'))
+            connection.execute(text(f'ALTER TABLE {name} RENAME TO {archived}'))
+        else:
+            connection.execute(text(f'DROP TABLE {name}'))
+    if expired and not postgres:
+        _sqlite_refresh_view(connection)
+    return expired
+
+
+@event.listens_for(UserActivity.__table__, 'before_drop')
+def _drop_view(target, connection, **kw):
+    connection.execute(text(f'DROP VIEW IF EXISTS {VIEW}'))
+
+
+@event.listens_for(UserActivity.__table__, 'after_drop')
+def _drop_partitions(target, connection, **kw):
+    # PostgreSQL drops partitions with their table; SQLite's are separate
+    if connection.dialect.name == 'sqlite':
+        for name in _table_names(connection, PREFIX) + _table_names(connection, _ROTATING):
+            connection.execute(text(f'DROP TABLE {name}'))
+
+
+# -- Reading -------------------------------------------------------------
+
+class PartitionCache:
+    """The partition list and closed partitions' row counts, per process."""
+
+    def __init__(self, ttl=60, max_counts=10000):
+        self.ttl = ttl
+        self.max_counts = max_counts
+        self._lock = threading.Lock()
+        self._partitions = None
+        self._expires = 0.0
+        self._counts = OrderedDict()
+
+    def partitions(self, session, now=None):
+        with self._lock:
+            if self._partitions is not None and time.monotonic() < self._expires:
+                return self._partitions
+        partitions = list_partitions(session, now)
+        with self._lock:
+            self._partitions = partitions
+            self._expires = time.monotonic() + self.ttl
+        return partitions
+
+    def count(self, session, partition, user_id, closed):
+        key = (partition.name, user_id)
+        if closed:
+            with self._lock:
+                if key in self._counts:
+                    self._counts.move_to_end(key)
+                    return self._counts[key]
+        table = partition_table(partition.name)
+        query = select(func.count()).select_from(table)
+        if user_id is not None:
+            query = query.where(table.c.user_id == user_id)
+        count = session.execute(query).scalar()
+        if closed:
+            with self._lock:
+                self._counts[key] = count
+                while len(self._counts) > self.max_counts:
+                    self._counts.popitem(last=False)
+        return count
+
+    def invalidate(self):
+        with self._lock:
+            self._partitions = None
+            self._counts.clear()
+
+
+def _row_to_dict(row):
+    return {
+        'id': row['id'],
+        'user_id': row['user_id'],
+        'activity_type': row['activity_type'],
+        'description': row['description'],
+        'ip_address': row['ip_address'],
+        'created_at': row['created_at'].isoformat() if row['created_at'] else None
+    }
+
+
+def _page(session, cache, page, per_page, user_id):
+    partitions = cache.partitions(session)
+    counts = [cache.count(session, partition, user_id, closed=i > 0)
+              for i, partition in enumerate(partitions)]
+    offset = (page - 1) * per_page
+    rows = []
+    for partition, count in zip(partitions, counts):
+        if len(rows) >= per_page:
+            break
+        if offset >= count:
+            offset -= count
+            continue
+        table = partition_table(partition.name)
+        query = select(table).order_by(table.c.created_at.desc(), table.c.id.desc())
+        if user_id is not None:
+            query = query.where(table.c.user_id == user_id)
+        rows.extend(session.execute(
+            query.offset(offset).limit(per_page - len(rows))).mappings().all())
+        offset = 0
+    return [_row_to_dict(row) for row in rows], sum(counts)
+
+
+def activity_page(session, cache, page=1, per_page=10, user_id=None):
+    """One page of activities, newest first, and the total count.
+
+    Partitions are read newest first until the page is full; ``user_id``
+    limits it to one user's activities.
+    """
+    page = max(page, 1)
+    per_page = max(per_page, 1)
+    try:
+        return _page(session, cache, page, per_page, user_id)
+    except (OperationalError, ProgrammingError):
+        # A partition was rotated or dropped since the list was cached
+        session.rollback()
+        cache.invalidate()
+        return _page(session, cache, page, per_page, user_id)
+
+
+def get_partition_cache():
+    cache = current_app.extensions.get('activity_partitions')
+    if cache is None:
+        cache = current_app.extensions['activity_partitions'] = PartitionCache(
+            ttl=current_app.config.get('ACTIVITY_PARTITION_CACHE_SECONDS', 60))
+    return cache
@@ -0,0 +1,198 @@
+"""Priority-aware admission control for each worker process.
+
+Every request is classed as ``critical``, ``normal`` or ``low``. Views mark
+themselves with ``@criticality(...)``; otherwise reads (GET/HEAD) are
+``low`` and everything else is ``normal``. The controller tracks how many
+requests this worker has in flight and an EWMA of how long requests waited
+before a worker picked them up, and sheds lower classes first:
+
+* ``low`` is refused once in-flight work reaches half the worker's capacity
+  or queue latency passes ``ADMISSION_LOW_DELAY_MS``. When only the
+  in-flight limit is hit it first waits up to ``ADMISSION_DEFER_MS`` for a
+  slot to free up.
+* ``normal`` is refused near full capacity or past ``ADMISSION_NORMAL_DELAY_MS``.
+* ``critical`` is always admitted.
+
+Refused requests get a 503 with ``Retry-After``. Queue latency comes from
+the ASGI adapter's hand-off timestamp or a proxy's ``X-Request-Start``
+header (nginx: ``proxy_set_header X-Request-Start "t=${msec}";``).
+"""
+import math
+import threading
+import time
+from collections import Counter
+from flask import g, jsonify, request
+from .asgi_utils import QUEUED_AT_ENVIRON_KEY
+
+CRITICAL = 'critical'
+NORMAL = 'normal'
+LOW = 'low'
+LEVELS = (CRITICAL, NORMAL, LOW)
+
+
+def criticality(level):
+    """Declare how important a view is when the worker is overloaded."""
+    if level not in LEVELS:
+        raise ValueError(f'Unknown criticality: {level}')
+
+    def decorator(fn):
+        fn._criticality = level
+        return fn
+    return decorator
+
+
+def classify(view, method):
+    level = getattr(view, '_criticality', None)
+    if level is not None:
+        return level
+    return LOW if method in ('GET', 'HEAD') else NORMAL
+
+
+def parse_request_start(value, now):
+    """Seconds a request spent queued, from an ``X-Request-Start`` value.
+
+    Accepts ``t=<epoch>`` or a bare epoch in seconds, milliseconds or
+    microseconds. Returns None for values that cannot be trusted.
+    """
+    value = value.strip()
+    if value.startswith('t='):
+        value = value[2:]
+    try:
+        started = float(value)
+    except ValueError:
+        return None
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    delay = now - started
+    # Ignore clock skew between the proxy and this host
+    if delay < 0 or delay > 60:
+        return None
+    return delay
+
+
+def queue_delay(environ, now=None):
+    now = time.time() if now is None else now
+    queued_at = environ.get(QUEUED_AT_ENVIRON_KEY)
+    if queued_at is not None:
+        return max(0.0, now - queued_at)
+    header = environ.get('HTTP_X_REQUEST_START')
+    if header:
+        return parse_request_start(header, now)
+    return None
+
+
+class AdmissionController:
+    """Counts in-flight requests and decides which ones to admit."""
+
+    def __init__(self, max_inflight=32, low_delay=0.1, normal_delay=0.5,
+                 defer_timeout=0.05, low_fraction=0.5, normal_fraction=0.9,
+                 ewma_alpha=0.2):
+        self.max_inflight = max_inflight
+        self.inflight_limits = {
+            LOW: max(1, int(max_inflight * low_fraction)),
+            NORMAL: max(1, int(max_inflight * normal_fraction)),
+        }
+        self.delay_limits = {LOW: low_delay, NORMAL: normal_delay}
+        self.defer_timeout = defer_timeout
+        self.ewma_alpha = ewma_alpha
+
+        self.inflight = 0
+        self.queue_delay = 0.0
+        self.admitted = Counter()
+        self.rejected = Counter()
+        self._cond = threading.Condition()
+
+    def _over_inflight(self, level):
+        return self.inflight >= self.inflight_limits[level]
+
+    def _over_delay(self, level):
+        return self.queue_delay > self.delay_limits[level]
+
+    def try_admit(self, level, delay=None):
+        """Admit a request of ``level``; return False if it should be shed."""
+        with self._cond:
+            if delay is not None:
+                self.queue_delay += self.ewma_alpha * (delay - self.queue_delay)
+
+            if level != CRITICAL and (self._over_delay(level) or self._over_inflight(level)):
+                # A slot may free up shortly; waiting cannot fix a long queue
+                if level == LOW and self.defer_timeout and not self._over_delay(level):
+                    self._cond.wait_for(lambda: not self._over_inflight(level),
+                                        timeout=self.defer_timeout)
+                if self._over_delay(level) or self._over_inflight(level):
+                    self.rejected[level] += 1
+                    return False
+
+            self.inflight += 1
+            self.admitted[level] += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self.inflight -= 1
+            self._cond.notify()
+
+    def retry_after(self):
+        """Seconds clients should back off, growing with the queue."""
+        return max(1, int(math.ceil(self.queue_delay * 4)))
+
+    def stats(self):
+        with self._cond:
+            return {
+                'inflight': self.inflight,
+                'max_inflight': self.max_inflight,
+                'queue_delay_ms': round(self.queue_delay * 1000, 2),
+                'admitted': dict(self.admitted),
+                'rejected': dict(self.rejected),
+            }
+
+
+def service_unavailable(retry_after):
+    response = jsonify({'error': 'Server is overloaded, please retry shortly',
+                        'retry_after': retry_after})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def init_admission_control(app):
+    """Shed low-priority requests when this worker is overloaded.
+
+    Call this before other ``before_request`` hooks are registered so
+    refused requests do no further work.
+    """
+    if not app.config.get('ADMISSION_ENABLED', True):
+        return None
+
+    controller = AdmissionController(
+        max_inflight=app.config.get('ADMISSION_MAX_INFLIGHT', 32),
+        low_delay=app.config.get('ADMISSION_LOW_DELAY_MS', 100) / 1000,
+        normal_delay=app.config.get('ADMISSION_NORMAL_DELAY_MS', 500) / 1000,
+        defer_timeout=app.config.get('ADMISSION_DEFER_MS', 50) / 1000
+    )
+    app.extensions['admission_controller'] = controller
+
+    @app.before_request
+    def admit_request():
+        # CORS preflights are cheap and gate the requests that follow them
+        if request.method == 'OPTIONS':
+            return None
+        level = classify(app.view_functions.get(request.endpoint), request.method)
+        if not controller.try_admit(level, queue_delay(request.environ)):
+            return service_unavailable(controller.retry_after())
+        g.admission_level = level
+        return None
+
+    @app.teardown_request
+    def release_request(exc):
+        if g.pop('admission_level', None) is not None:
+            controller.release()
+
+    return controller
+
+
+def get_admission_stats(app):
+    controller = app.extensions.get('admission_controller')
+    return controller.stats() if controller else None
@@ -0,0 +1,191 @@
+import asyncio
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+# Bodies above this size spill from memory to a temporary file
+SPOOL_MAX_SIZE = 1024 * 1024
+
+# When a buffered request was handed to the thread pool, for queue-latency tracking
+QUEUED_AT_ENVIRON_KEY = 'ajali.queued_at'
+
+
+_TOO_LARGE_BODY = b'{"error": "Request body too large"}'
+
+
+class AsgiAdapter:
+    """Serve a WSGI application from an ASGI server.
+
+    Request bodies larger than ``max_body_size`` (by default the app's
+    MAX_CONTENT_LENGTH) get a 413 as soon as they cross it, instead of
+    being spooled in full before Flask can reject them.
+    """
+
+    def __init__(self, wsgi_app, max_threads=None, max_body_size=None):
+        self.wsgi_app = wsgi_app
+        self.max_threads = max_threads or 32
+        if max_body_size is None:
+            max_body_size = getattr(wsgi_app, 'config', {}).get('MAX_CONTENT_LENGTH')
+        self.max_body_size = max_body_size
+        self.executor = None
+
+    def _get_executor(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.max_threads, thread_name_prefix='asgi-wsgi')
+        return self.executor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self._get_executor()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.executor is not None:
+                    self.executor.shutdown(wait=True)
+                    self.executor = None
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        limit = self.max_body_size
+        if limit is not None and self._declared_length(scope) > limit:
+            await self._send_too_large(send)
+            return
+
+        with SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as body:
+            received = 0
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                chunk = message.get('body', b'')
+                received += len(chunk)
+                if limit is not None and received > limit:
+                    await self._send_too_large(send)
+                    return
+                body.write(chunk)
+                if not message.get('more_body'):
+                    break
+            content_length = body.tell()
+            body.seek(0)
+
+            loop = asyncio.get_running_loop()
+            environ = self._build_environ(scope, body, content_length)
+            environ[QUEUED_AT_ENVIRON_KEY] = time.time()
+            await loop.run_in_executor(
+                self._get_executor(), self._run_wsgi, environ, send, loop)
+
+    @staticmethod
+    def _declared_length(scope):
+        for name, value in scope.get('headers', []):
+            if name.lower() == b'content-length':
+                try:
+                    return int(value)
+                except ValueError:
+                    return 0
+        return 0
+
+    @staticmethod
+    async def _send_too_large(send):
+        await send({
+            'type': 'http.response.start',
+            'status': 413,
+            'headers': [(b'content-type', b'application/json'),
+                        (b'content-length', str(len(_TOO_LARGE_BODY)).encode('latin1')),
+                        (b'connection', b'close')]
+        })
+        await send({'type': 'http.response.body', 'body': _TOO_LARGE_BODY, 'more_body': False})
+
+    def _run_wsgi(self, environ, send, loop):
+        """Run the WSGI app in a worker thread, relaying output to the loop."""
+        def relay(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['start'] = {
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin1'), value.encode('latin1'))
+                            for name, value in headers]
+            }
+            return lambda data: relay({'type': 'http.response.body', 'body': data,
+                                       'more_body': True})
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in result:
+                if not chunk:
+                    continue
+                if not response.get('sent'):
+                    relay(response['start'])
+                    response['sent'] = True
+                relay({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+        if not response.get('sent'):
+            relay(response['start'])
+        relay({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    @staticmethod
+    def _build_environ(scope, body, content_length):
+        script_name = scope.get('root_path', '').encode('utf8').decode('latin1')
+        path_info = scope['path'].encode('utf8').decode('latin1')
+        if script_name and path_info.startswith(script_name):
+            path_info = path_info[len(script_name):]
+
+        server = scope.get('server') or ('localhost', 80)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': script_name,
+            'PATH_INFO': path_info,
+            'QUERY_STRING': scope['query_string'].decode('latin1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.input_terminated': True,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        if scope.get('client'):
+            environ['REMOTE_ADDR'] = scope['client'][0]
+
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin1')
+            value = value.decode('latin1')
+            if name == 'content-type':
+                key = 'CONTENT_TYPE'
+            elif name == 'content-length':
+                continue
+            else:
+                key = 'HTTP_' + name.upper().replace('-', '_')
+            if key in environ:
+                separator = '; ' if key == 'HTTP_COOKIE' else ','
+                value = environ[key] + separator + value
+            environ[key] = value
+
+        # The body is fully buffered, so chunked uploads get a real length too
+        environ['CONTENT_LENGTH'] = str(content_length)
+        return environ
+
@@ -2,11 +2,14 @@ from functools import wraps
 from flask import jsonify
 from flask_jwt_extended import get_jwt_identity
 from functools import wraps
-from flask import jsonify, request
+from flask import current_app, jsonify, request
 from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
 from ..models import User
+from .revocation import is_jti_revoked, revoke_jti
+import hashlib
 import jwt
 import os
+import time
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
 
@@ -40,13 +43,20 @@ def hash_password(password):
 def verify_password(password, hashed):
     return check_password_hash(hashed, password)
 
-blacklist = set()
+def _revocation_key(token):
+    """The token's jti (or a digest of tokens without one) and its expiry."""
+    payload = jwt.decode(token, options={'verify_signature': False, 'verify_exp': False})
+    jti = payload.get('jti') or 'sha256:' + hashlib.sha256(token.encode()).hexdigest()
+    expires_at = payload.get('exp') or time.time() + current_app.config[
+        'JWT_REFRESH_TOKEN_EXPIRES'].total_seconds()
+    return jti, expires_at
 
 def blacklist_token(token):
-    blacklist.add(token)
+    """Revoke a token until it expires (see utils/revocation.py)."""
+    revoke_jti(*_revocation_key(token))
 
 def is_token_blacklisted(token):
-    return token in blacklist
+    return is_jti_revoked(_revocation_key(token)[0])
 
 def admin_required(fn):
     @wraps(fn)
@@ -0,0 +1,259 @@
+"""Emergency broadcasts to every user who takes email or SMS notifications.
+
+A broadcast has one ``BroadcastJob`` per channel, run by ``flask broadcasts
+run``. Recipients are read ``BROADCAST_CHUNK_SIZE`` at a time in user id
+order with a keyset query on the ``ix_users_*_broadcast`` indexes, so
+memory use does not grow with the number of users. Sends are paced by a
+token bucket per provider (``BROADCAST_EMAIL_RATE``, ``BROADCAST_SMS_RATE``)
+held in the rate limiter's store; with an ``shm://`` or ``redis://`` store,
+every worker shares the one budget.
+
+The job's cursor (the last user id handled) and counts are committed after
+every chunk under a lease. When a worker dies its lease runs out and the
+next worker resumes the job from the cursor: recipients in the chunk that
+was in flight may get the message twice, nobody is skipped. Broadcasts are
+urgent, so quiet hours do not apply.
+"""
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, func, or_, and_
+from ..models import db, User, AlertSubscription, Broadcast, BroadcastJob
+from .rate_limit import get_shared_store, parse_limits
+from .notification_utils import send_email_batch, get_sms_client
+
+CHANNELS = ('email', 'sms')
+
+
+class ProviderThrottle:
+    """Waits until a provider's token buckets allow more sends."""
+
+    def __init__(self, store, key, limits, sleep=time.sleep):
+        self.store = store
+        self.key = key
+        # Shortest window first, so a rejection there charges no other bucket
+        self.limits = sorted(limits, key=lambda limit: limit.period)
+        self.burst = min((limit.amount for limit in self.limits), default=None)
+        self.sleep = sleep
+        self.waited = 0.0
+
+    def acquire(self, count):
+        """Take ``count`` tokens (at most ``burst``) from every bucket."""
+        while True:
+            retry_after = None
+            for limit in self.limits:
+                allowed, _, wait = self.store.consume(
+                    f'{self.key}:{limit.period}', limit.amount / limit.period, limit.amount, count)
+                if not allowed:
+                    retry_after = wait
+                    break
+            if retry_after is None:
+                return
+            self.waited += retry_after
+            self.sleep(retry_after)
+
+
+def recipients_query(broadcast, channel):
+    """Select (id, username, address) of the broadcast's recipients on a channel."""
+    if channel == 'email':
+        query = select(User.id, User.username, User.email).where(
+            User.email_notifications.is_(True))
+    else:
+        query = select(User.id, User.username, User.phone_number).where(
+            User.sms_notifications.is_(True), User.phone_number.isnot(None),
+            User.phone_number != '')
+    query = query.where(User.is_active.is_(True))
+    if broadcast.has_region:
+        query = query.where(select(AlertSubscription.id).where(
+            AlertSubscription.user_id == User.id, AlertSubscription.is_active.is_(True),
+            AlertSubscription.min_latitude <= broadcast.max_latitude,
+            AlertSubscription.max_latitude >= broadcast.min_latitude,
+            AlertSubscription.min_longitude <= broadcast.max_longitude,
+            AlertSubscription.max_longitude >= broadcast.min_longitude,
+        ).exists())
+    return query
+
+
+def recipient_chunk(broadcast, channel, after_id, limit):
+    """The next ``limit`` recipients with a user id above ``after_id``."""
+    return db.session.execute(
+        recipients_query(broadcast, channel).where(User.id > after_id)
+        .order_by(User.id).limit(limit)
+    ).all()
+
+
+def create_broadcast(created_by, title, message, channels=CHANNELS, sms_message=None,
+                     area=None, region_name=None):
+    """Add a broadcast and its channel jobs; the caller commits.
+
+    ``area`` is a ``parse_area`` result whose bounding box limits the
+    recipients to users subscribed to an overlapping area.
+    """
+    broadcast = Broadcast(created_by=created_by, title=title, message=message,
+                          sms_message=sms_message, region_name=region_name)
+    if area:
+        for key in ('min_latitude', 'max_latitude', 'min_longitude', 'max_longitude'):
+            setattr(broadcast, key, area[key])
+    db.session.add(broadcast)
+    db.session.flush()
+    for channel in channels:
+        total = db.session.execute(select(func.count()).select_from(
+            recipients_query(broadcast, channel).subquery())).scalar()
+        db.session.add(BroadcastJob(broadcast_id=broadcast.id, channel=channel, total=total))
+    return broadcast
+
+
+def cancel_broadcast(broadcast, now=None):
+    """Stop a broadcast's unfinished jobs; the caller commits."""
+    now = now or datetime.utcnow()
+    broadcast.cancelled_at = now
+    db.session.execute(
+        update(BroadcastJob)
+        .where(BroadcastJob.broadcast_id == broadcast.id,
+               BroadcastJob.status.in_(('pending', 'running')))
+        .values(status='cancelled', finished_at=now))
+
+
+def sms_text(broadcast, max_length=480):
+    text = broadcast.sms_message or f'Ajali! {broadcast.title}: {broadcast.message}'
+    if len(text) > max_length:
+        text = text[:max_length - 3].rstrip() + '...'
+    return text
+
+
+def _claimable(now):
+    return or_(BroadcastJob.status == 'pending',
+               and_(BroadcastJob.status == 'running', BroadcastJob.lease_until < now))
+
+
+def claim_job(lease_seconds, channel=None, now=None):
+    """Take a pending job, or one whose worker's lease ran out.
+
+    Returns ``(job, token)`` or None; the token must accompany progress.
+    """
+    now = now or datetime.utcnow()
+    query = select(BroadcastJob.broadcast_id, BroadcastJob.channel).where(_claimable(now))
+    if channel:
+        query = query.where(BroadcastJob.channel == channel)
+    candidates = db.session.execute(query.order_by(BroadcastJob.broadcast_id).limit(10)).all()
+    for broadcast_id, job_channel in candidates:
+        token = str(uuid.uuid4())
+        claimed = db.session.execute(
+            update(BroadcastJob)
+            .where(BroadcastJob.broadcast_id == broadcast_id, BroadcastJob.channel == job_channel,
+                   _claimable(now))
+            .values(status='running', claimed_by=token,
+                    lease_until=now + timedelta(seconds=lease_seconds),
+                    started_at=func.coalesce(BroadcastJob.started_at, now))
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(BroadcastJob, (broadcast_id, job_channel)), token
+    return None
+
+
+def _record_progress(job_key, token, cursor, sent, failed, lease_seconds, done):
+    """Save a chunk's progress; False if the job was cancelled or taken over."""
+    now = datetime.utcnow()
+    values = {'cursor': cursor, 'sent': BroadcastJob.sent + sent,
+              'failed': BroadcastJob.failed + failed,
+              'lease_until': now + timedelta(seconds=lease_seconds)}
+    if done:
+        values.update(status='done', finished_at=now, claimed_by=None)
+    updated = db.session.execute(
+        update(BroadcastJob)
+        .where(BroadcastJob.broadcast_id == job_key[0], BroadcastJob.channel == job_key[1],
+               BroadcastJob.status == 'running', BroadcastJob.claimed_by == token)
+        .values(**values)
+    ).rowcount
+    db.session.commit()
+    return bool(updated)
+
+
+def _email_sender(broadcast):
+    subject = f'Ajali! {broadcast.title}'
+    message = broadcast.message
+
+    def send(recipients):
+        return send_email_batch([
+            (email, subject, f'Hello {username},\n\n{message}\n\nStay safe,\nAjali! Team')
+            for _, username, email in recipients])
+    return send
+
+
+def _sms_sender(broadcast, executor, max_length):
+    client = get_sms_client()
+    text = sms_text(broadcast, max_length)
+
+    def send_one(phone_number):
+        try:
+            return client.send(phone_number, text)
+        except Exception:
+            return False
+
+    def send(recipients):
+        if client is None:
+            return [False] * len(recipients)
+        return list(executor.map(send_one, [phone for _, _, phone in recipients]))
+    return send
+
+
+def run_job(job, token, config, store, sleep=time.sleep):
+    """Send a claimed job to its remaining recipients.
+
+    Returns ``(sent, failed)``; stops early if the broadcast is cancelled or
+    another worker took the job over.
+    """
+    job_key = (job.broadcast_id, job.channel)
+    broadcast = job.broadcast
+    chunk_size = config.get('BROADCAST_CHUNK_SIZE', 500)
+    lease_seconds = config.get('BROADCAST_LEASE_SECONDS', 120)
+    throttle = ProviderThrottle(
+        store, f"{config.get('RATELIMIT_KEY_PREFIX', 'rl')}:provider:{job.channel}",
+        parse_limits(config.get(f'BROADCAST_{job.channel.upper()}_RATE')), sleep)
+    step = min(chunk_size, throttle.burst or chunk_size)
+    cursor = job.cursor
+    total_sent = total_failed = 0
+
+    with ThreadPoolExecutor(config.get('BROADCAST_SMS_CONCURRENCY', 16)) as executor:
+        if job.channel == 'email':
+            send = _email_sender(broadcast)
+        else:
+            send = _sms_sender(broadcast, executor, config.get('NOTIFICATION_SMS_MAX_LENGTH', 480))
+
+        while True:
+            recipients = recipient_chunk(broadcast, job_key[1], cursor, chunk_size)
+            sent = 0
+            for start in range(0, len(recipients), step):
+                piece = recipients[start:start + step]
+                throttle.acquire(len(piece))
+                try:
+                    results = send(piece)
+                except Exception:
+                    results = [False] * len(piece)
+                sent += sum(1 for ok in results if ok)
+            failed = len(recipients) - sent
+            total_sent += sent
+            total_failed += failed
+            if recipients:
+                cursor = recipients[-1][0]
+            done = len(recipients) < chunk_size
+            if not _record_progress(job_key, token, cursor, sent, failed, lease_seconds, done) \
+                    or done:
+                return total_sent, total_failed
+
+
+def run_pending(app, channel=None, sleep=time.sleep):
+    """Run claimable jobs until there are none; returns (jobs, sent, failed)."""
+    store = get_shared_store(app)
+    lease_seconds = app.config.get('BROADCAST_LEASE_SECONDS', 120)
+    jobs = total_sent = total_failed = 0
+    while True:
+        claimed = claim_job(lease_seconds, channel)
+        if claimed is None:
+            return jobs, total_sent, total_failed
+        sent, failed = run_job(*claimed, app.config, store, sleep)
+        jobs += 1
+        total_sent += sent
+        total_failed += failed
@@ -1,16 +1,37 @@
-import cloudinary
-import cloudinary.uploader
 from werkzeug.utils import secure_filename
 import os
-from flask import current_app
+import threading
+from flask import current_app, has_app_context
 
-# Configure Cloudinary
-cloudinary.config(
-    cloud_name=os.getenv('CLOUDINARY_CLOUD_NAME'),
-    api_key=os.getenv('CLOUDINARY_API_KEY'),
-    api_secret=os.getenv('CLOUDINARY_API_SECRET'),
-    secure=True
-)
+_cloudinary = None
+_cloudinary_lock = threading.Lock()
+
+def get_cloudinary():
+    """
+    Import and configure the Cloudinary SDK on first use.
+
+    The SDK is slow to import, so it is only loaded once a request actually
+    uploads, deletes or links a file. Credentials come from the app config,
+    falling back to the environment outside an app context.
+
+    Returns:
+        module: the configured ``cloudinary`` package
+    """
+    global _cloudinary
+    if _cloudinary is None:
+        with _cloudinary_lock:
+            if _cloudinary is None:
+                import cloudinary
+                import cloudinary.uploader
+                config = current_app.config if has_app_context() else {}
+                cloudinary.config(
+                    cloud_name=config.get('CLOUDINARY_CLOUD_NAME') or os.getenv('CLOUDINARY_CLOUD_NAME'),
+                    api_key=config.get('CLOUDINARY_API_KEY') or os.getenv('CLOUDINARY_API_KEY'),
+                    api_secret=config.get('CLOUDINARY_API_SECRET') or os.getenv('CLOUDINARY_API_SECRET'),
+                    secure=True
+                )
+                _cloudinary = cloudinary
+    return _cloudinary
 
 def allowed_file(filename):
     """Check if the file extension is allowed."""
@@ -53,7 +74,7 @@ def upload_file(file):
             resource_type = 'video' if extension in ['mp4', 'mov'] else 'image'
             
             # Upload to cloudinary
-            result = cloudinary.uploader.upload(
+            result = get_cloudinary().uploader.upload(
                 temp_path,
                 resource_type=resource_type,
                 folder="ajali_incidents/",
@@ -89,7 +110,7 @@ def delete_file(public_id, resource_type='image'):
         bool: True if deletion was successful, False otherwise
     """
     try:
-        result = cloudinary.uploader.destroy(public_id, resource_type=resource_type)
+        result = get_cloudinary().uploader.destroy(public_id, resource_type=resource_type)
         return result.get('result') == 'ok'
     except Exception as e:
         print(f"Error deleting file from Cloudinary: {str(e)}")
@@ -107,7 +128,7 @@ def get_file_url(public_id, resource_type='image'):
         str: URL of the file
     """
     try:
-        return cloudinary.CloudinaryImage(public_id).build_url()
+        return get_cloudinary().CloudinaryImage(public_id).build_url()
     except Exception as e:
         print(f"Error getting file URL from Cloudinary: {str(e)}")
         return None
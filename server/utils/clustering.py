@@ -0,0 +1,192 @@
+"""Hierarchical grid clustering of incidents for zoomed-out map views.
+
+Incident coordinates are projected to Web Mercator and binned into square
+cells of ``cell_px`` screen pixels at the deepest zoom level with NumPy.
+Each shallower level is built from the level below by halving the cell
+coordinates and summing the child clusters, the way supercluster builds
+its tree, so raw points are only touched once. Every level keeps a count,
+coordinate sums for the centroid and a per-priority breakdown.
+
+Built indexes are cached per filter combination and rebuilt when incidents
+change in this process or the TTL expires.
+"""
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import select
+from ..models import db, IncidentReport
+from .data_version import incident_data_version
+from .lazy_import import lazy_module
+
+np = lazy_module('numpy')
+
+PRIORITIES = ('low', 'medium', 'high', 'critical')
+_PRIORITY_INDEX = {name: i for i, name in enumerate(PRIORITIES)}
+_DEFAULT_PRIORITY = _PRIORITY_INDEX['medium']
+_MAX_LAT = 85.05112878
+
+
+def mercator(latitudes, longitudes):
+    """Project to unit Web Mercator coordinates in [0, 1)."""
+    lat = np.radians(np.clip(latitudes, -_MAX_LAT, _MAX_LAT))
+    x = (np.asarray(longitudes, dtype=np.float64) + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / np.pi) / 2.0
+    return np.clip(x, 0.0, np.nextafter(1.0, 0)), np.clip(y, 0.0, np.nextafter(1.0, 0))
+
+
+class ClusterLevel:
+    """Clusters at one zoom level, as parallel arrays."""
+
+    __slots__ = ('cx', 'cy', 'count', 'lat_sum', 'lon_sum', 'priorities', 'first_id')
+
+    def __init__(self, cx, cy, count, lat_sum, lon_sum, priorities, first_id):
+        self.cx = cx
+        self.cy = cy
+        self.count = count
+        self.lat_sum = lat_sum
+        self.lon_sum = lon_sum
+        self.priorities = priorities
+        self.first_id = first_id
+
+
+def _aggregate(cx, cy, count, lat_sum, lon_sum, priorities, first_id):
+    """Merge rows that share a cell, summing their statistics."""
+    keys = (cx.astype(np.int64) << 32) | cy.astype(np.int64)
+    unique, inverse = np.unique(keys, return_inverse=True)
+    n = len(unique)
+    merged_priorities = np.zeros((n, len(PRIORITIES)), dtype=np.int64)
+    np.add.at(merged_priorities, inverse, priorities)
+    merged_first = np.full(n, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(merged_first, inverse, first_id)
+    return ClusterLevel(
+        (unique >> 32).astype(np.int64),
+        (unique & 0xFFFFFFFF).astype(np.int64),
+        np.bincount(inverse, weights=count, minlength=n).astype(np.int64),
+        np.bincount(inverse, weights=lat_sum, minlength=n),
+        np.bincount(inverse, weights=lon_sum, minlength=n),
+        merged_priorities,
+        merged_first,
+    )
+
+
+class ClusterIndex:
+    """Clusters for every zoom level from 0 to ``max_zoom``."""
+
+    def __init__(self, ids, latitudes, longitudes, priorities, max_zoom=16, cell_px=64):
+        self.max_zoom = max_zoom
+        # Cells per tile edge; tiles are 256px
+        self.cells_per_tile = max(1, 256 // cell_px)
+        self.total = len(ids)
+        self.levels = [None] * (max_zoom + 1)
+
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        x, y = mercator(latitudes, longitudes)
+        scale = self._cells(max_zoom)
+        one_hot = np.zeros((len(ids), len(PRIORITIES)), dtype=np.int64)
+        one_hot[np.arange(len(ids)), np.asarray(priorities, dtype=np.int64)] = 1
+
+        level = _aggregate(
+            (x * scale).astype(np.int64), (y * scale).astype(np.int64),
+            np.ones(len(ids)), latitudes, longitudes, one_hot,
+            np.asarray(ids, dtype=np.int64)
+        )
+        self.levels[max_zoom] = level
+        for zoom in range(max_zoom - 1, -1, -1):
+            level = _aggregate(level.cx >> 1, level.cy >> 1, level.count, level.lat_sum,
+                               level.lon_sum, level.priorities, level.first_id)
+            self.levels[zoom] = level
+
+    def _cells(self, zoom):
+        return (1 << zoom) * self.cells_per_tile
+
+    def clusters(self, bbox, zoom):
+        """Clusters at ``zoom`` whose cell overlaps ``bbox`` (w, s, e, n)."""
+        zoom = max(0, min(int(zoom), self.max_zoom))
+        level = self.levels[zoom]
+        west, south, east, north = bbox
+        scale = self._cells(zoom)
+        (x0, x1), (y1, y0) = (
+            (np.array(v) * scale).astype(np.int64)
+            for v in mercator(np.array([south, north]), np.array([west, east]))
+        )
+        # Mercator y grows southwards, hence the swapped latitude bounds
+        mask = (level.cy >= y0) & (level.cy <= y1)
+        if west <= east:
+            mask &= (level.cx >= x0) & (level.cx <= x1)
+        else:  # bbox crosses the antimeridian
+            mask &= (level.cx >= x0) | (level.cx <= x1)
+
+        result = []
+        for i in np.flatnonzero(mask):
+            count = int(level.count[i])
+            cluster = {
+                'latitude': float(level.lat_sum[i] / count),
+                'longitude': float(level.lon_sum[i] / count),
+                'count': count,
+                'priorities': dict(zip(PRIORITIES, level.priorities[i].tolist())),
+                'cluster_id': f'{zoom}/{int(level.cx[i])}/{int(level.cy[i])}',
+            }
+            if count == 1:
+                cluster['id'] = int(level.first_id[i])
+            result.append(cluster)
+        return result
+
+
+def build_cluster_index(filters, max_zoom=16, cell_px=64):
+    """Query the filtered incidents' positions and build their index."""
+    rows = db.session.execute(
+        select(IncidentReport.id, IncidentReport.latitude, IncidentReport.longitude,
+               IncidentReport.priority).where(*filters)
+    ).all()
+    if rows:
+        ids, latitudes, longitudes, priorities = zip(*rows)
+    else:
+        ids, latitudes, longitudes, priorities = (), (), (), ()
+    return ClusterIndex(
+        ids, latitudes, longitudes,
+        [_PRIORITY_INDEX.get(p, _DEFAULT_PRIORITY) for p in priorities],
+        max_zoom=max_zoom, cell_px=cell_px
+    )
+
+
+class ClusterIndexCache:
+    """LRU of built indexes, keyed by filter combination."""
+
+    def __init__(self, max_entries=32, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        version = incident_data_version()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == version and now - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                return entry[2]
+
+        index = build()
+        with self._lock:
+            self._entries[key] = (version, now, index)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def parse_bbox(value):
+    """Parse ``west,south,east,north``; raises ValueError."""
+    parts = [float(part) for part in value.split(',')]
+    if len(parts) != 4:
+        raise ValueError('bbox must be west,south,east,north')
+    west, south, east, north = parts
+    if not (-180 <= west <= 180 and -180 <= east <= 180 and -90 <= south <= north <= 90):
+        raise ValueError('bbox is out of range')
+    return west, south, east, north
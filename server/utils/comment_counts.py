@@ -0,0 +1,54 @@
+"""Comment counters stored on the incident.
+
+``IncidentReport.comment_count`` and ``last_comment_at`` save listings a
+``COUNT`` per row against ``incident_comments`` and let them sort by most
+discussed or most recently active on an index. ``record_comment`` updates
+them in the transaction that adds the comment, with a relative
+``UPDATE`` so concurrent comments are all counted. Writes that bypass it
+(manual fixes, restores) are caught by ``repair_comment_counts``, run from
+``flask incidents repair-comment-counts``.
+"""
+from sqlalchemy import case, func, or_, select, update
+from ..models import db, IncidentReport, IncidentComment
+
+
+def record_comment(session, incident_id, created_at):
+    """Count a comment added at ``created_at``; runs in the caller's transaction."""
+    session.execute(
+        update(IncidentReport)
+        .where(IncidentReport.id == incident_id)
+        .values(comment_count=IncidentReport.comment_count + 1,
+                last_comment_at=case(
+                    (IncidentReport.last_comment_at > created_at, IncidentReport.last_comment_at),
+                    else_=created_at),
+                # A comment is not an edit of the incident
+                updated_at=IncidentReport.updated_at)
+        .execution_options(synchronize_session=False))
+
+
+def repair_comment_counts(batch_size=1000):
+    """Recount comments for incidents whose counters drifted.
+
+    Walks the table in id ranges of ``batch_size``, one commit each, and
+    returns the number of incidents corrected.
+    """
+    session = db.session
+    actual_count = select(func.count(IncidentComment.id)).where(
+        IncidentComment.incident_id == IncidentReport.id).scalar_subquery()
+    actual_last = select(func.max(IncidentComment.created_at)).where(
+        IncidentComment.incident_id == IncidentReport.id).scalar_subquery()
+    drifted = or_(IncidentReport.comment_count != actual_count,
+                  IncidentReport.last_comment_at.is_distinct_from(actual_last))
+
+    max_id = session.execute(select(func.max(IncidentReport.id))).scalar() or 0
+    repaired = 0
+    for start in range(0, max_id, batch_size):
+        result = session.execute(
+            update(IncidentReport)
+            .where(IncidentReport.id > start, IncidentReport.id <= start + batch_size, drifted)
+            .values(comment_count=actual_count, last_comment_at=actual_last,
+                    updated_at=IncidentReport.updated_at)
+            .execution_options(synchronize_session=False))
+        session.commit()
+        repaired += result.rowcount
+    return repaired
@@ -0,0 +1,295 @@
+"""Response compression WSGI middleware.
+
+Negotiates ``Accept-Encoding`` and compresses eligible responses with
+brotli (when the ``brotli`` package is installed) or gzip. Responses with a
+known length are compressed in one go; streamed responses without a
+``Content-Length`` are compressed chunk by chunk and flushed as they go,
+so clients see data as soon as the app yields it. Responses carrying a
+strong ETag and no ``no-store``/``private`` directive are cached
+precompressed, keyed by ETag and encoding.
+
+Compressed responses carry their own ETag (``"<etag>-<encoding>"``); the
+suffix is stripped from ``If-None-Match`` before the app sees it, so a
+client revalidating with the tag it received still gets a 304.
+"""
+import threading
+import zlib
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENCODED_ETAG_SUFFIXES = ('-gzip"', '-br"')
+
+COMPRESSIBLE_TYPES = {
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'application/geo+json',
+    'application/vnd.mapbox-vector-tile',
+    'image/svg+xml',
+}
+
+
+def parse_accept_encoding(header):
+    """Return a dict of coding -> q-value from an Accept-Encoding header."""
+    codings = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        codings[coding] = q
+    return codings
+
+
+def strip_encoded_etags(header):
+    """An If-None-Match value with our encoding suffixes removed from each tag."""
+    tags = []
+    for tag in header.split(','):
+        tag = tag.strip()
+        for suffix in ENCODED_ETAG_SUFFIXES:
+            if tag.endswith(suffix):
+                tag = tag[:-len(suffix)] + '"'
+                break
+        tags.append(tag)
+    return ', '.join(tags)
+
+
+class _Gzip:
+    name = 'gzip'
+
+    def __init__(self, level):
+        # wbits=31 selects the gzip container
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _Brotli:
+    name = 'br'
+
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class PrecompressedCache:
+    """Byte-bounded LRU of compressed bodies keyed by (ETag, encoding)."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+class CompressionMiddleware:
+    """Compress responses for clients that accept gzip or brotli."""
+
+    def __init__(self, app, min_size=500, gzip_level=6, brotli_quality=4,
+                 cache_max_bytes=8 * 1024 * 1024):
+        self.app = app
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache = PrecompressedCache(cache_max_bytes) if cache_max_bytes else None
+
+    def _negotiate(self, environ):
+        if environ.get('REQUEST_METHOD') == 'HEAD':
+            return None
+        codings = parse_accept_encoding(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        wildcard = codings.get('*', 0.0)
+        # On equal q-values prefer brotli, which compresses JSON better
+        candidates = (['br'] if brotli is not None else []) + ['gzip']
+        best, best_q = None, 0.0
+        for coding in candidates:
+            q = codings.get(coding, wildcard)
+            if q > best_q:
+                best, best_q = coding, q
+        return best
+
+    def _compressor(self, encoding):
+        if encoding == 'br':
+            return _Brotli(self.brotli_quality)
+        return _Gzip(self.gzip_level)
+
+    def _should_compress(self, status, headers):
+        code = int(status.split(' ', 1)[0])
+        if code < 200 or code in (204, 206, 304):
+            return False
+        if 'content-encoding' in headers:
+            return False
+        if 'no-transform' in headers.get('cache-control', ''):
+            return False
+        mimetype = headers.get('content-type', '').split(';')[0].strip().lower()
+        if not (mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES):
+            return False
+        length = headers.get('content-length')
+        if length is not None and int(length) < self.min_size:
+            return False
+        return True
+
+    @staticmethod
+    def _cache_key(headers, encoding):
+        etag = headers.get('etag')
+        cache_control = headers.get('cache-control', '')
+        if not etag or etag.startswith('W/') or 'no-store' in cache_control or 'private' in cache_control:
+            return None
+        return (etag, encoding)
+
+    @staticmethod
+    def _encoded_etag(etag, encoding):
+        # A compressed representation needs its own validator
+        return f'{etag[:-1]}-{encoding}"' if etag.endswith('"') else etag
+
+    def __call__(self, environ, start_response):
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            environ['HTTP_IF_NONE_MATCH'] = strip_encoded_etags(if_none_match)
+        encoding = self._negotiate(environ)
+        if encoding is None:
+            return self.app(environ, start_response)
+
+        response = {}
+        pending = []
+
+        def capture_start_response(status, headers, exc_info=None):
+            response['status'] = status
+            response['headers'] = headers
+            response['exc_info'] = exc_info
+            return pending.append
+
+        app_iter = self.app(environ, capture_start_response)
+        chunks = iter(app_iter)
+        if 'status' not in response:
+            # start_response may be deferred until the first chunk is produced
+            first = next(chunks, None)
+            if first is not None:
+                pending.append(first)
+
+        status = response['status']
+        headers = response['headers']
+        header_map = {name.lower(): value for name, value in headers}
+        if not self._should_compress(status, header_map):
+            if status.startswith('304') and 'etag' in header_map:
+                # Revalidated: hand back the tag of the representation the client holds
+                headers = [(name, self._encoded_etag(value, encoding) if name.lower() == 'etag'
+                            else value) for name, value in headers]
+            start_response(status, headers, response['exc_info'])
+            return self._passthrough(pending, chunks, app_iter)
+
+        headers = [(name, value) for name, value in headers
+                   if name.lower() not in ('content-length', 'vary', 'etag')]
+        vary = header_map.get('vary')
+        headers.append(('Vary', f'{vary}, Accept-Encoding' if vary else 'Accept-Encoding'))
+        headers.append(('Content-Encoding', encoding))
+        if 'etag' in header_map:
+            headers.append(('ETag', self._encoded_etag(header_map['etag'], encoding)))
+
+        if 'content-length' not in header_map:
+            start_response(status, headers, response['exc_info'])
+            return self._stream(pending, chunks, app_iter, encoding)
+
+        cache_key = self.cache and self._cache_key(header_map, encoding)
+        body = self.cache.get(cache_key) if cache_key else None
+        if body is None:
+            try:
+                compressor = self._compressor(encoding)
+                parts = [compressor.compress(chunk) for chunk in pending]
+                parts.extend(compressor.compress(chunk) for chunk in chunks)
+                parts.append(compressor.finish())
+                body = b''.join(parts)
+            finally:
+                if hasattr(app_iter, 'close'):
+                    app_iter.close()
+            if cache_key:
+                self.cache.put(cache_key, body)
+        elif hasattr(app_iter, 'close'):
+            app_iter.close()
+
+        headers.append(('Content-Length', str(len(body))))
+        start_response(status, headers, response['exc_info'])
+        return [body]
+
+    @staticmethod
+    def _passthrough(pending, chunks, app_iter):
+        try:
+            yield from pending
+            yield from chunks
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+
+    def _stream(self, pending, chunks, app_iter, encoding):
+        compressor = self._compressor(encoding)
+        try:
+            for source in (pending, chunks):
+                for chunk in source:
+                    if not chunk:
+                        continue
+                    data = compressor.compress(chunk) + compressor.flush()
+                    if data:
+                        yield data
+            yield compressor.finish()
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+
+
+def init_compression(app):
+    """Wrap the app's WSGI callable with response compression."""
+    if not app.config.get('COMPRESS_ENABLED', True):
+        return app
+    app.wsgi_app = CompressionMiddleware(
+        app.wsgi_app,
+        min_size=app.config.get('COMPRESS_MIN_SIZE', 500),
+        gzip_level=app.config.get('COMPRESS_GZIP_LEVEL', 6),
+        brotli_quality=app.config.get('COMPRESS_BROTLI_QUALITY', 4),
+        cache_max_bytes=app.config.get('COMPRESS_CACHE_MAX_BYTES', 8 * 1024 * 1024)
+    )
+    return app
@@ -0,0 +1,80 @@
+"""A per-process counter bumped whenever incident writes are committed.
+
+Caches of derived incident data (map clusters, tiles) compare the version
+they were built at with the current one instead of re-querying, and
+``on_incidents_committed`` callbacks receive the positions that changed.
+Changes are published after commit, so a cache cannot be refilled from
+data that is about to be rolled back or is not yet visible. Writes made
+by other worker processes are not seen, so such caches also expire after
+a short TTL.
+"""
+import threading
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import object_session
+from ..models import IncidentReport
+from .db_routing import RoutingSession
+
+_lock = threading.Lock()
+_version = 0
+_listeners = []
+
+_SESSION_KEY = 'changed_incident_points'
+
+
+def incident_data_version():
+    return _version
+
+
+def on_incidents_committed(callback):
+    """Call ``callback(points)`` with the (lat, lon) pairs touched by each commit."""
+    _listeners.append(callback)
+    return callback
+
+
+def _publish(points):
+    global _version
+    with _lock:
+        _version += 1
+    for callback in _listeners:
+        callback(points)
+
+
+def _record_change(mapper, connection, target):
+    points = {(target.latitude, target.longitude)}
+    state = inspect(target)
+    lat_history = state.attrs.latitude.history
+    lon_history = state.attrs.longitude.history
+    if lat_history.deleted or lon_history.deleted:
+        # Moved: the old position's caches are stale too
+        points.add((lat_history.deleted[0] if lat_history.deleted else target.latitude,
+                    lon_history.deleted[0] if lon_history.deleted else target.longitude))
+
+    session = object_session(target)
+    if session is None:
+        _publish(points)
+    else:
+        record_changed_points(session, points)
+
+
+def record_changed_points(session, points):
+    """Publish ``points`` when ``session`` commits.
+
+    For bulk statements, which the mapper events do not see.
+    """
+    session.info.setdefault(_SESSION_KEY, set()).update(points)
+
+
+def _after_commit(session):
+    points = session.info.pop(_SESSION_KEY, None)
+    if points:
+        _publish(points)
+
+
+def _after_rollback(session):
+    session.info.pop(_SESSION_KEY, None)
+
+
+for _name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(IncidentReport, _name, _record_change)
+event.listen(RoutingSession, 'after_commit', _after_commit)
+event.listen(RoutingSession, 'after_rollback', _after_rollback)
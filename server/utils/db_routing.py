@@ -0,0 +1,120 @@
+import logging
+import threading
+import time
+from functools import wraps
+from flask import g, request, current_app, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.sql.expression import UpdateBase
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND_KEY = 'replica'
+
+_health_lock = threading.Lock()
+_replica_health = {}  # engine id -> (healthy, checked_at)
+
+
+def _mark_replica(engine, healthy):
+    with _health_lock:
+        _replica_health[id(engine)] = (healthy, time.monotonic())
+
+
+def _on_replica_error(context):
+    """Take the replica out of rotation as soon as it drops connections."""
+    if context.is_disconnect:
+        logger.warning("Read replica disconnected, falling back to primary")
+        _mark_replica(context.engine, False)
+
+
+def _replica_is_healthy(engine, interval):
+    """Check replica reachability, at most once per ``interval`` seconds."""
+    with _health_lock:
+        state = _replica_health.get(id(engine))
+    if state is not None and time.monotonic() - state[1] < interval:
+        return state[0]
+
+    if state is None:
+        event.listen(engine, 'handle_error', _on_replica_error)
+    try:
+        with engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+        healthy = True
+    except Exception as e:
+        logger.warning(f"Read replica health check failed: {str(e)}")
+        healthy = False
+    _mark_replica(engine, healthy)
+    return healthy
+
+
+class RoutingSession(Session):
+    """Session that sends reads from read-only views to the replica engine.
+
+    Writes, flushes and anything outside a view marked with ``read_only``
+    keep using the primary. If no replica is configured, or it fails its
+    health check, reads fall back to the primary as well.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or engine is not self._db.engines.get(None):
+            return engine
+        if self._flushing or isinstance(clause, UpdateBase) or not _reads_from_replica():
+            return engine
+
+        replica = self._db.engines.get(REPLICA_BIND_KEY)
+        if replica is None:
+            return engine
+        interval = current_app.config.get('DB_REPLICA_HEALTH_INTERVAL', 5)
+        if not _replica_is_healthy(replica, interval):
+            return engine
+        return replica
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _pin_to_primary(session, flush_context):
+    """Once a request has written, the rest of it reads from the primary."""
+    if has_request_context():
+        g.db_use_primary = True
+        g.db_wrote = True
+
+
+def _reads_from_replica():
+    if not has_request_context():
+        return False
+    return g.get('db_read_only', False) and not g.get('db_use_primary', False)
+
+
+def read_only(fn):
+    """Mark a view as safe to serve from the read replica."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def init_db_routing(app):
+    """Register the read-your-writes stickiness hooks."""
+    cookie_name = app.config.get('DB_PRIMARY_COOKIE', 'db_primary')
+
+    @app.before_request
+    def use_primary_after_recent_write():
+        # A client that wrote moments ago must see its own write, which the
+        # replica may not have replayed yet
+        if request.cookies.get(cookie_name):
+            g.db_use_primary = True
+
+    @app.after_request
+    def mark_recent_write(response):
+        if g.get('db_wrote') and REPLICA_BIND_KEY in app.config.get('SQLALCHEMY_BINDS', {}):
+            response.set_cookie(
+                cookie_name, '1',
+                max_age=app.config.get('DB_REPLICA_STICKY_SECONDS', 5),
+                httponly=True,
+                samesite='Lax',
+                secure=app.config.get('SESSION_COOKIE_SECURE', False)
+            )
+        return response
+
+    return app
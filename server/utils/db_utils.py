@@ -0,0 +1,132 @@
+import logging
+import threading
+import time
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+
+class PoolWaitStats:
+    """Thread-safe counters describing how long checkouts waited on a pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.waited = 0
+            self.slow = 0
+            self.timeouts = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+
+    def record(self, elapsed, slow_threshold, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            # Anything under a millisecond is an idle connection handed straight back
+            if elapsed >= 0.001:
+                self.waited += 1
+            if elapsed >= slow_threshold:
+                self.slow += 1
+            self.total_wait += elapsed
+            self.max_wait = max(self.max_wait, elapsed)
+
+    def to_dict(self):
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                'checkouts': self.checkouts,
+                'waited': self.waited,
+                'slow': self.slow,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': round(self.total_wait / attempts * 1000, 3) if attempts else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 3)
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection.
+
+    SQLAlchemy only emits pool events once a connection has been handed out,
+    so the wait itself has to be timed around ``_do_get``.
+    """
+
+    slow_checkout_threshold = 0.1
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            elapsed = time.perf_counter() - start
+            self.wait_stats.record(elapsed, self.slow_checkout_threshold, timed_out=True)
+            logger.error("DB pool checkout failed after %.1fms (%s)", elapsed * 1000, self.status())
+            raise
+        elapsed = time.perf_counter() - start
+        self.wait_stats.record(elapsed, self.slow_checkout_threshold)
+        if elapsed >= self.slow_checkout_threshold:
+            logger.warning("Slow DB pool checkout: waited %.1fms (%s)", elapsed * 1000, self.status())
+        return conn
+
+
+def _instrument_options(options, threshold):
+    """Return a copy of engine options that uses the instrumented pool."""
+    options = dict(options)
+    # Only pools configured for queueing can wait; leave SQLite defaults alone
+    if 'pool_size' in options or 'max_overflow' in options:
+        pool_class = type('InstrumentedQueuePool', (InstrumentedQueuePool,),
+                          {'slow_checkout_threshold': threshold})
+        options.setdefault('poolclass', pool_class)
+    return options
+
+
+def configure_engine_options(app):
+    """Apply pool instrumentation to the primary and bind engine options.
+
+    Must run before ``db.init_app`` because Flask-SQLAlchemy builds the
+    engines from config at that point.
+    """
+    if not app.config.get('DB_POOL_INSTRUMENTATION'):
+        return
+    threshold = app.config.get('DB_POOL_WAIT_WARN_MS', 100) / 1000.0
+
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = _instrument_options(
+        app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}), threshold)
+
+    binds = {}
+    for key, bind in app.config.get('SQLALCHEMY_BINDS', {}).items():
+        if isinstance(bind, dict):
+            bind = _instrument_options(bind, threshold)
+        binds[key] = bind
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+
+def get_pool_stats(db):
+    """Describe the state of every engine pool for the current app."""
+    stats = {}
+    for key, engine in db.engines.items():
+        pool = engine.pool
+        entry = {
+            'name': key or 'primary',
+            'pool_class': type(pool).__name__,
+            'status': pool.status()
+        }
+        if isinstance(pool, QueuePool):
+            entry.update({
+                'size': pool.size(),
+                'checked_out': pool.checkedout(),
+                'overflow': pool.overflow()
+            })
+        if isinstance(pool, InstrumentedQueuePool):
+            entry['wait'] = pool.wait_stats.to_dict()
+        stats[entry['name']] = entry
+    return stats
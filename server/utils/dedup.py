@@ -0,0 +1,236 @@
+"""Near-duplicate incident detection with MinHash/LSH.
+
+Each report's title and description are reduced to a set of word
+shingles, summarised by a MinHash signature and split into bands. The band
+hashes are stored in ``incident_lsh_bands`` alongside the report's time
+and position, so finding candidates for a new report is one indexed
+``band_hash IN (...)`` lookup restricted to a time window and bounding
+box. Candidates are then checked exactly: distance by haversine and text
+similarity by Jaccard over the shingle sets.
+
+With 16 bands of 4 rows, two reports with Jaccard similarity 0.5 share a
+band about 65% of the time and at 0.8 over 99% of the time.
+"""
+import hashlib
+import math
+import re
+import struct
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete
+from ..models import db, IncidentReport, IncidentLSHBand
+
+NUM_BANDS = 16
+ROWS_PER_BAND = 4
+NUM_PERM = NUM_BANDS * ROWS_PER_BAND
+CLOSED_STATUSES = ('resolved', 'rejected')
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_WORD_RE = re.compile(r'[a-z0-9]+')
+_STOPWORDS = frozenset(
+    'a an and at by for from in is it near of on or the there this to was were with'.split()
+)
+
+
+def _permutations():
+    # Fixed seeds so signatures stay comparable across processes and restarts
+    params = []
+    for i in range(NUM_PERM):
+        digest = hashlib.sha256(f'ajali-minhash-{i}'.encode()).digest()
+        a, b = struct.unpack('<QQ', digest[:16])
+        params.append((a % (_MERSENNE_PRIME - 1) + 1, b % _MERSENNE_PRIME))
+    return params
+
+
+_PERMUTATIONS = _permutations()
+
+
+def shingles(text):
+    """Word unigrams and bigrams of ``text``, ignoring case and stopwords."""
+    words = [w for w in _WORD_RE.findall((text or '').lower()) if w not in _STOPWORDS]
+    result = set(words)
+    result.update(f'{a} {b}' for a, b in zip(words, words[1:]))
+    return result
+
+
+def incident_shingles(title, description):
+    return shingles(f'{title or ""} {description or ""}')
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def minhash(shingle_set):
+    """MinHash signature of a shingle set as a list of NUM_PERM ints."""
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=4).digest(), 'little')
+              for s in shingle_set]
+    if not hashes:
+        return [_MAX_HASH] * NUM_PERM
+    return [min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in _PERMUTATIONS]
+
+
+def band_hashes(signature):
+    """One signed 64-bit hash per band, suitable for a BIGINT column."""
+    result = []
+    for band in range(NUM_BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(struct.pack(f'<I{ROWS_PER_BAND}I', band, *rows),
+                                 digest_size=8).digest()
+        result.append(struct.unpack('<q', digest)[0])
+    return result
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * 6371000 * math.asin(math.sqrt(a))
+
+
+def _bounding_box(lat, lon, radius_m):
+    dlat = radius_m / 111320.0
+    dlon = radius_m / (111320.0 * max(math.cos(math.radians(lat)), 0.01))
+    return lat - dlat, lat + dlat, lon - dlon, lon + dlon
+
+
+def find_duplicates(title, description, latitude, longitude, created_at=None,
+                    radius_m=500, window_minutes=60, min_similarity=0.5,
+                    limit=5, exclude_id=None, shingle_set=None):
+    """Open incidents near in space and time whose text is similar.
+
+    Returns a list of dicts (most similar first) with the candidate's id,
+    title, status, distance in metres, minutes apart and similarity.
+    """
+    created_at = created_at or datetime.utcnow()
+    shingle_set = shingle_set if shingle_set is not None else incident_shingles(title, description)
+    if not shingle_set:
+        return []
+
+    window = timedelta(minutes=window_minutes)
+    min_lat, max_lat, min_lon, max_lon = _bounding_box(latitude, longitude, radius_m)
+    candidate_ids = (
+        select(IncidentLSHBand.incident_id)
+        .where(IncidentLSHBand.band_hash.in_(band_hashes(minhash(shingle_set))),
+               IncidentLSHBand.created_at.between(created_at - window, created_at + window),
+               IncidentLSHBand.latitude.between(min_lat, max_lat),
+               IncidentLSHBand.longitude.between(min_lon, max_lon))
+        .distinct()
+    )
+    stmt = select(
+        IncidentReport.id, IncidentReport.title, IncidentReport.description,
+        IncidentReport.status, IncidentReport.latitude, IncidentReport.longitude,
+        IncidentReport.created_at, IncidentReport.user_id
+    ).where(
+        IncidentReport.id.in_(candidate_ids),
+        IncidentReport.status.notin_(CLOSED_STATUSES)
+    )
+    if exclude_id is not None:
+        stmt = stmt.where(IncidentReport.id != exclude_id)
+
+    matches = []
+    for row in db.session.execute(stmt):
+        distance = haversine_m(latitude, longitude, row.latitude, row.longitude)
+        if distance > radius_m:
+            continue
+        similarity = jaccard(shingle_set, incident_shingles(row.title, row.description))
+        if similarity < min_similarity:
+            continue
+        matches.append({
+            'id': row.id,
+            'title': row.title,
+            'status': row.status,
+            'user_id': row.user_id,
+            'distance_m': round(distance, 1),
+            'minutes_apart': round(abs((created_at - row.created_at).total_seconds()) / 60, 1),
+            'similarity': round(similarity, 3),
+        })
+    matches.sort(key=lambda match: (-match['similarity'], match['distance_m']))
+    return matches[:limit]
+
+
+def visible_duplicates(matches, user):
+    """The matches a user may see: all for admins, otherwise only their own
+    incidents (they cannot read anyone else's)."""
+    if user is not None and user.role == 'admin':
+        return matches
+    user_id = user.id if user is not None else None
+    return [match for match in matches if match['user_id'] == user_id]
+
+
+def index_incident(incident, shingle_set=None):
+    """Add the incident's band hashes to the session (the caller commits)."""
+    shingle_set = (shingle_set if shingle_set is not None
+                   else incident_shingles(incident.title, incident.description))
+    created_at = incident.created_at or datetime.utcnow()
+    db.session.add_all([
+        IncidentLSHBand(band_hash=band_hash, incident_id=incident.id, created_at=created_at,
+                        latitude=incident.latitude, longitude=incident.longitude)
+        for band_hash in band_hashes(minhash(shingle_set))
+    ])
+
+
+def prune_index(older_than):
+    """Delete band rows for incidents created before ``older_than``."""
+    result = db.session.execute(
+        delete(IncidentLSHBand).where(IncidentLSHBand.created_at < older_than)
+    )
+    return result.rowcount
+
+
+def rebuild_index(since, batch_size=1000):
+    """Re-index every incident created since ``since``; returns the count."""
+    db.session.execute(delete(IncidentLSHBand).where(IncidentLSHBand.created_at >= since))
+    count = 0
+    last_id = 0
+    while True:
+        batch = db.session.execute(
+            select(IncidentReport)
+            .where(IncidentReport.created_at >= since, IncidentReport.id > last_id)
+            .order_by(IncidentReport.id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not batch:
+            break
+        for incident in batch:
+            index_incident(incident)
+        count += len(batch)
+        last_id = batch[-1].id
+        db.session.commit()
+        db.session.expunge_all()
+    db.session.commit()
+    return count
+
+
+def check_new_incident(incident, config, logger=None):
+    """Find duplicates of a not-yet-saved incident and optionally link it.
+
+    Returns ``(matches, shingle_set)``; pass the shingles on to
+    ``index_incident`` once the incident has an id. A failed lookup is
+    logged and treated as no matches so it never blocks a report.
+    """
+    shingle_set = incident_shingles(incident.title, incident.description)
+    try:
+        matches = find_duplicates(
+            incident.title, incident.description, incident.latitude, incident.longitude,
+            created_at=incident.created_at,
+            radius_m=config.get('DEDUP_RADIUS_M', 500),
+            window_minutes=config.get('DEDUP_WINDOW_MINUTES', 60),
+            min_similarity=config.get('DEDUP_MIN_SIMILARITY', 0.5),
+            shingle_set=shingle_set
+        )
+    except Exception as e:
+        db.session.rollback()
+        if logger is not None:
+            logger.warning(f'Duplicate lookup failed: {e}')
+        return [], shingle_set
+
+    if (matches and config.get('DEDUP_AUTO_LINK', False)
+            and matches[0]['similarity'] >= config.get('DEDUP_AUTO_LINK_SIMILARITY', 0.8)):
+        incident.duplicate_of = matches[0]['id']
+    return matches, shingle_set
@@ -0,0 +1,301 @@
+"""Area subscriptions and matching incidents against them.
+
+Every subscription is indexed by the fixed-size lat/lon grid cells its
+bounding box covers (``subscription_cells``). To match an incident, the
+cells under its affected area are looked up through that table's primary
+key, so only subscriptions near the incident are read however many exist;
+the candidates are then tested exactly (circle distance, or
+point-in-polygon plus distance to the edges) with NumPy. An affected area
+covering more than ``max_cells`` cells is matched on the subscriptions'
+bounding boxes instead, so a huge radius never builds a huge cell list.
+"""
+import json
+import math
+from sqlalchemy import select, delete, insert
+from ..models import db, User, AlertSubscription, SubscriptionCell
+from .outbox import enqueue_many
+from .lazy_import import lazy_module
+
+np = lazy_module('numpy')
+
+EARTH_RADIUS_M = 6371000.0
+METRES_PER_DEGREE = 111320.0
+_COL_BITS = 20
+
+
+def bounding_box(latitude, longitude, radius_m):
+    """(min_lat, max_lat, min_lon, max_lon) around a circle."""
+    dlat = radius_m / METRES_PER_DEGREE
+    dlon = radius_m / (METRES_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    return (max(-90.0, latitude - dlat), min(90.0, latitude + dlat),
+            max(-180.0, longitude - dlon), min(180.0, longitude + dlon))
+
+
+def cells_for_bbox(min_lat, max_lat, min_lon, max_lon, cell_deg):
+    """Keys of the grid cells overlapping a bounding box."""
+    row0, row1 = (int(math.floor((v + 90.0) / cell_deg)) for v in (min_lat, max_lat))
+    col0, col1 = (int(math.floor((v + 180.0) / cell_deg)) for v in (min_lon, max_lon))
+    return [(row << _COL_BITS) | col
+            for row in range(row0, row1 + 1) for col in range(col0, col1 + 1)]
+
+
+def count_cells(min_lat, max_lat, min_lon, max_lon, cell_deg):
+    rows = math.floor((max_lat + 90.0) / cell_deg) - math.floor((min_lat + 90.0) / cell_deg) + 1
+    cols = math.floor((max_lon + 180.0) / cell_deg) - math.floor((min_lon + 180.0) / cell_deg) + 1
+    return rows * cols
+
+
+def parse_affected_radius(value, max_m):
+    """Validate an incident's ``affected_area_radius`` in metres; raises ValueError."""
+    if value is None or value == '':
+        return 0.0
+    try:
+        radius_m = float(value)
+    except (TypeError, ValueError):
+        raise ValueError('affected_area_radius must be a number of metres')
+    if not 0 <= radius_m <= max_m:
+        raise ValueError(f'affected_area_radius must be between 0 and {max_m:g} metres')
+    return radius_m
+
+
+def parse_area(data, max_polygon_points=200):
+    """Validate a subscription area from a request payload.
+
+    Accepts ``latitude``, ``longitude`` and ``radius_m`` for a circle, or
+    ``polygon`` as a list of [lat, lon] pairs. Returns the model column
+    values; raises ValueError.
+    """
+    if data.get('polygon') is not None:
+        points = data['polygon']
+        if not isinstance(points, list) or not 3 <= len(points) <= max_polygon_points:
+            raise ValueError(f'polygon needs between 3 and {max_polygon_points} [lat, lon] points')
+        try:
+            points = [[float(lat), float(lon)] for lat, lon in points]
+        except (TypeError, ValueError):
+            raise ValueError('polygon points must be [lat, lon] pairs')
+        if not all(-90 <= lat <= 90 and -180 <= lon <= 180 for lat, lon in points):
+            raise ValueError('polygon point out of range')
+        lats, lons = [p[0] for p in points], [p[1] for p in points]
+        return {
+            'kind': 'polygon', 'polygon': json.dumps(points),
+            'center_latitude': None, 'center_longitude': None, 'radius_m': None,
+            'min_latitude': min(lats), 'max_latitude': max(lats),
+            'min_longitude': min(lons), 'max_longitude': max(lons),
+        }
+
+    try:
+        latitude = float(data['latitude'])
+        longitude = float(data['longitude'])
+        radius_m = float(data['radius_m'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('latitude, longitude and radius_m (or polygon) are required')
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError('latitude/longitude out of range')
+    if radius_m <= 0:
+        raise ValueError('radius_m must be positive')
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_m)
+    return {
+        'kind': 'circle', 'polygon': None,
+        'center_latitude': latitude, 'center_longitude': longitude, 'radius_m': radius_m,
+        'min_latitude': min_lat, 'max_latitude': max_lat,
+        'min_longitude': min_lon, 'max_longitude': max_lon,
+    }
+
+
+def index_subscription(subscription, cell_deg):
+    """Replace a flushed subscription's cell rows; the caller commits."""
+    db.session.execute(delete(SubscriptionCell).where(
+        SubscriptionCell.subscription_id == subscription.id))
+    cells = cells_for_bbox(subscription.min_latitude, subscription.max_latitude,
+                           subscription.min_longitude, subscription.max_longitude, cell_deg)
+    db.session.execute(insert(SubscriptionCell),
+                       [{'cell': cell, 'subscription_id': subscription.id} for cell in cells])
+    return len(cells)
+
+
+def reindex_all(cell_deg, batch_size=1000):
+    """Rebuild every subscription's cells, e.g. after changing the cell size."""
+    db.session.execute(delete(SubscriptionCell))
+    last_id, total = 0, 0
+    while True:
+        batch = db.session.execute(
+            select(AlertSubscription.id, AlertSubscription.min_latitude,
+                   AlertSubscription.max_latitude, AlertSubscription.min_longitude,
+                   AlertSubscription.max_longitude)
+            .where(AlertSubscription.id > last_id)
+            .order_by(AlertSubscription.id).limit(batch_size)
+        ).all()
+        if not batch:
+            return total
+        rows = [{'cell': cell, 'subscription_id': row.id}
+                for row in batch for cell in cells_for_bbox(*row[1:], cell_deg)]
+        db.session.execute(insert(SubscriptionCell), rows)
+        total += len(batch)
+        last_id = batch[-1].id
+
+
+def _haversine(lat1, lon1, lat2, lon2):
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    a = (np.sin((phi2 - phi1) / 2) ** 2
+         + np.cos(phi1) * np.cos(phi2) * np.sin(np.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def polygons_reach(polygons, latitude, longitude, radius_m):
+    """For each polygon (a list of [lat, lon] vertices), whether it contains
+    the point or passes within ``radius_m`` of it.
+
+    All polygons' edges are tested in one set of array operations and
+    reduced per polygon.
+    """
+    sizes = np.fromiter((len(points) for points in polygons), dtype=np.int64, count=len(polygons))
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    vertices = np.array([vertex for points in polygons for vertex in points],
+                        dtype=np.float64).reshape(-1, 2)
+
+    # Local equirectangular projection in metres, centred on the point
+    y = (vertices[:, 0] - latitude) * METRES_PER_DEGREE
+    x = (vertices[:, 1] - longitude) * METRES_PER_DEGREE * math.cos(math.radians(latitude))
+    following = np.arange(len(x)) + 1
+    following[starts + sizes - 1] = starts
+    x2, y2 = x[following], y[following]
+
+    # Ray casting along +x from the origin
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_at = x - y * (x2 - x) / (y2 - y)
+    crosses = ((y > 0) != (y2 > 0)) & (x_at > 0)
+    inside = np.add.reduceat(crosses.astype(np.int64), starts) % 2 == 1
+    if radius_m <= 0:
+        return inside
+
+    # Distance from the origin to each edge
+    dx, dy = x2 - x, y2 - y
+    length2 = dx * dx + dy * dy
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.clip(np.where(length2 > 0, -(x * dx + y * dy) / length2, 0.0), 0.0, 1.0)
+    distance = np.hypot(x + t * dx, y + t * dy)
+    return inside | (np.minimum.reduceat(distance, starts) <= radius_m)
+
+
+def polygon_reaches(points, latitude, longitude, radius_m):
+    """Whether a polygon contains the point or passes within ``radius_m`` of it."""
+    return bool(polygons_reach([points], latitude, longitude, radius_m)[0])
+
+
+def match_subscriptions(latitude, longitude, radius_m, cell_deg, max_cells=2500):
+    """Active subscriptions whose area overlaps the circle around an incident.
+
+    Returns a list of (subscription_id, user_id, name).
+    """
+    radius_m = max(radius_m or 0.0, 0.0)
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_m)
+    table = AlertSubscription.__table__
+    if count_cells(min_lat, max_lat, min_lon, max_lon, cell_deg) <= max_cells:
+        cells = cells_for_bbox(min_lat, max_lat, min_lon, max_lon, cell_deg)
+        candidate_ids = select(SubscriptionCell.subscription_id).where(SubscriptionCell.cell.in_(cells))
+    else:
+        # Too many cells to list: scan for overlapping bounding boxes instead
+        candidate_ids = select(table.c.id).where(
+            table.c.min_latitude <= max_lat, table.c.max_latitude >= min_lat,
+            table.c.min_longitude <= max_lon, table.c.max_longitude >= min_lon)
+    # Only the columns the geometry tests need; polygons and names are
+    # fetched for the few rows that get that far
+    rows = db.session.execute(
+        select(table.c.id, table.c.center_latitude, table.c.center_longitude, table.c.radius_m,
+               table.c.min_latitude, table.c.max_latitude,
+               table.c.min_longitude, table.c.max_longitude)
+        .where(table.c.id.in_(candidate_ids), table.c.is_active.is_(True))
+    ).all()
+    if not rows:
+        return []
+
+    columns = np.array([tuple(row) for row in rows], dtype=np.float64)
+    ids = columns[:, 0].astype(np.int64)
+    center_lat, center_lon, radius = columns[:, 1], columns[:, 2], columns[:, 3]
+    # Sharing a grid cell does not mean the bounding boxes overlap
+    overlaps = ((columns[:, 4] <= max_lat) & (columns[:, 5] >= min_lat)
+                & (columns[:, 6] <= max_lon) & (columns[:, 7] >= min_lon))
+    is_circle = ~np.isnan(radius)  # polygons have no radius
+    matched = np.zeros(len(rows), dtype=bool)
+
+    circles = np.flatnonzero(overlaps & is_circle)
+    if len(circles):
+        distance = _haversine(latitude, longitude, center_lat[circles], center_lon[circles])
+        matched[circles[distance <= radius[circles] + radius_m]] = True
+
+    polygon_rows = np.flatnonzero(overlaps & ~is_circle)
+    if len(polygon_rows):
+        polygons = dict(db.session.execute(
+            select(table.c.id, table.c.polygon).where(table.c.id.in_(ids[polygon_rows].tolist()))
+        ).all())
+        reached = polygons_reach([json.loads(polygons[i]) for i in ids[polygon_rows].tolist()],
+                                 latitude, longitude, radius_m)
+        matched[polygon_rows[reached]] = True
+
+    if not matched.any():
+        return []
+    return db.session.execute(
+        select(table.c.id, table.c.user_id, table.c.name)
+        .where(table.c.id.in_(ids[matched].tolist())).order_by(table.c.id)
+    ).all()
+
+
+def enqueue_incident_alerts(incident, config, logger=None):
+    """Queue alerts for every subscriber whose area the incident touches.
+
+    Users are alerted once per incident whatever the number of matching
+    subscriptions, on the channels they have enabled; the reporter is
+    skipped. Runs in a savepoint of the caller's transaction, so the
+    alerts commit with the incident; a failure is logged and rolled back
+    to the savepoint, never failing the report itself. Returns the number
+    of users alerted; the caller commits.
+    """
+    try:
+        with db.session.begin_nested():
+            return _enqueue_incident_alerts(incident, config)
+    except Exception as e:
+        if logger is not None:
+            logger.warning(f'Subscription matching failed: {e}')
+        return 0
+
+
+def _enqueue_incident_alerts(incident, config):
+    matches = match_subscriptions(incident.latitude, incident.longitude,
+                                  incident.affected_area_radius,
+                                  config.get('SUBSCRIPTION_CELL_DEG', 0.02),
+                                  config.get('SUBSCRIPTION_MAX_CELLS', 2500))
+    areas = {}
+    for _, user_id, name in matches:
+        if user_id != incident.user_id:
+            areas.setdefault(user_id, name)
+    if not areas:
+        return 0
+
+    link = f"{config.get('FRONTEND_URL', 'http://localhost:5173')}/incidents/{incident.id}"
+    messages = []
+    users = db.session.execute(
+        select(User.id, User.email_notifications, User.sms_notifications, User.phone_number)
+        .where(User.id.in_(list(areas)), User.is_active.is_(True))
+    ).all()
+    # Critical incidents are sent even during the user's quiet hours
+    urgent = incident.priority == 'critical'
+    for user in users:
+        area = areas[user.id]
+        summary = f'{incident.title} near {area}'[:255]
+        if user.email_notifications:
+            messages.append({
+                'user_id': user.id, 'channel': 'email', 'event': 'incident_nearby',
+                'incident_id': incident.id, 'summary': summary, 'urgent': urgent,
+                'subject': f'Ajali! Alert near {area}: {incident.title}',
+                'body': f'A new incident was reported near "{area}": {incident.title}\n\n'
+                        f'{incident.description}\n\nView it at: {link}',
+            })
+        if user.sms_notifications and user.phone_number:
+            messages.append({
+                'user_id': user.id, 'channel': 'sms', 'event': 'incident_nearby',
+                'incident_id': incident.id, 'summary': summary, 'urgent': urgent,
+                'subject': None,
+                'body': f"Ajali! Alert near {area}: {incident.title}. {link}",
+            })
+    enqueue_many(messages)
+    return len(users)
@@ -0,0 +1,268 @@
+"""Precomputed incident density grids for heatmaps.
+
+The configured bounding box is cut into square cells of ``cell_deg``
+degrees (row 0 is the northern edge). One ``HeatmapGrid`` row per day and
+category holds the incident count of every cell as a compressed uint32
+array; reporting an incident adds one to its cell, and a date range is
+served by summing the day grids with NumPy instead of scanning incidents.
+
+Updates are optimistic read-modify-writes on the row's ``version``, so
+concurrent reports in the same day and category retry rather than lose
+counts. Grids are only ever added to on creation; ``flask heatmap
+rebuild`` recomputes them from the incidents table after edits, deletes
+or a change of grid settings.
+"""
+import functools
+import math
+import struct
+import zlib
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete
+from sqlalchemy.exc import IntegrityError
+from ..models import db, HeatmapGrid, IncidentReport
+from .lazy_import import lazy_module
+
+np = lazy_module('numpy')
+
+UNCATEGORIZED = 0
+_DTYPE = '<u4'  # Little-endian uint32, whatever the host's byte order
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Colour stops for the PNG ramp: (position, (r, g, b, a))
+_RAMP = (
+    (0.0, (65, 105, 225, 96)),
+    (0.5, (255, 215, 0, 176)),
+    (1.0, (220, 20, 60, 235)),
+)
+
+
+class HeatmapSpec(namedtuple('HeatmapSpec', 'west south east north cell_deg')):
+    """Grid geometry: a bbox and the cell size in degrees."""
+
+    __slots__ = ()
+
+    @property
+    def rows(self):
+        return max(1, math.ceil(round((self.north - self.south) / self.cell_deg, 6)))
+
+    @property
+    def cols(self):
+        return max(1, math.ceil(round((self.east - self.west) / self.cell_deg, 6)))
+
+    @property
+    def shape(self):
+        return self.rows, self.cols
+
+    def cells(self, latitudes, longitudes):
+        """Flat cell indices for positions, and a mask of those inside the grid."""
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        row = np.floor((self.north - latitudes) / self.cell_deg).astype(np.int64)
+        col = np.floor((longitudes - self.west) / self.cell_deg).astype(np.int64)
+        inside = (row >= 0) & (row < self.rows) & (col >= 0) & (col < self.cols)
+        return row * self.cols + col, inside
+
+
+def grid_spec(config):
+    """The ``HeatmapSpec`` for an app config."""
+    west, south, east, north = (float(v) for v in config.get('HEATMAP_BBOX', '33.9,-4.7,41.9,5.0').split(','))
+    cell_deg = float(config.get('HEATMAP_CELL_DEG', 0.02))
+    if not (west < east and south < north and cell_deg > 0):
+        raise ValueError('HEATMAP_BBOX must be west,south,east,north with a positive HEATMAP_CELL_DEG')
+    return HeatmapSpec(west, south, east, north, cell_deg)
+
+
+def encode_counts(counts):
+    return zlib.compress(np.ascontiguousarray(counts, dtype=_DTYPE).tobytes(), 1)
+
+
+def decode_counts(grid, spec):
+    """A writable (rows, cols) array for a stored grid, or None if the grid
+    was built with different settings."""
+    if (grid.rows, grid.cols) != spec.shape:
+        return None
+    return np.frombuffer(zlib.decompress(grid.counts), dtype=_DTYPE).reshape(spec.shape).copy()
+
+
+def category_key(category_id):
+    return category_id or UNCATEGORIZED
+
+
+def record_incident(incident, spec, attempts=5):
+    """Add one incident to its day/category grid; flushes but does not commit.
+
+    Returns False when the incident is outside the grid or the stored grid
+    has a different shape (a rebuild is due).
+    """
+    cell, inside = spec.cells([incident.latitude], [incident.longitude])
+    if not inside[0]:
+        return False
+    cell = int(cell[0])
+    day = (incident.created_at or datetime.utcnow()).date()
+    key = category_key(incident.category_id)
+
+    for _ in range(attempts):
+        grid = db.session.execute(
+            select(HeatmapGrid).where(HeatmapGrid.day == day, HeatmapGrid.category_key == key)
+            .execution_options(populate_existing=True)
+        ).scalar_one_or_none()
+
+        if grid is None:
+            counts = np.zeros(spec.rows * spec.cols, dtype=_DTYPE)
+            counts[cell] = 1
+            try:
+                with db.session.begin_nested():
+                    db.session.add(HeatmapGrid(day=day, category_key=key, rows=spec.rows,
+                                               cols=spec.cols, counts=encode_counts(counts), total=1))
+                return True
+            except IntegrityError:
+                continue  # Another worker created it first
+
+        counts = decode_counts(grid, spec)
+        if counts is None:
+            return False
+        counts.flat[cell] += 1
+        result = db.session.execute(
+            update(HeatmapGrid)
+            .where(HeatmapGrid.id == grid.id, HeatmapGrid.version == grid.version)
+            .values(counts=encode_counts(counts), total=HeatmapGrid.total + 1,
+                    version=HeatmapGrid.version + 1, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            return True
+    raise RuntimeError(f'Heatmap grid for {day} kept changing underneath the update')
+
+
+def add_incident_to_heatmap(incident, config, logger=None):
+    """Record a just-created incident and commit.
+
+    Failures are logged and rolled back: the incident is already saved and
+    a later ``flask heatmap rebuild`` will count it.
+    """
+    try:
+        record_incident(incident, grid_spec(config))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        if logger is not None:
+            logger.warning(f'Heatmap update failed: {e}')
+
+
+def density(spec, start, end, category_keys=None):
+    """Summed counts, as a (rows, cols) uint32 array, for days in [start, end].
+
+    Grids stored with a different shape are skipped; the second return
+    value is how many there were.
+    """
+    stmt = select(HeatmapGrid.rows, HeatmapGrid.cols, HeatmapGrid.counts).where(
+        HeatmapGrid.day.between(start, end))
+    if category_keys is not None:
+        stmt = stmt.where(HeatmapGrid.category_key.in_(category_keys))
+
+    total = np.zeros(spec.shape, dtype=np.uint64)
+    skipped = 0
+    for rows, cols, blob in db.session.execute(stmt):
+        if (rows, cols) != spec.shape:
+            skipped += 1
+            continue
+        total += np.frombuffer(zlib.decompress(blob), dtype=_DTYPE).reshape(spec.shape)
+    return np.minimum(total, np.iinfo(np.uint32).max).astype(np.uint32), skipped
+
+
+def rebuild(spec, since=None, batch_size=10000):
+    """Recompute grids from incidents created on or after ``since`` (a date).
+
+    Existing grids from that day on are replaced. Returns the number of
+    grids written; the caller commits.
+    """
+    cleanup = delete(HeatmapGrid)
+    stmt = select(IncidentReport.created_at, IncidentReport.category_id,
+                  IncidentReport.latitude, IncidentReport.longitude).where(
+        IncidentReport.created_at.isnot(None))
+    if since is not None:
+        cleanup = cleanup.where(HeatmapGrid.day >= since)
+        stmt = stmt.where(IncidentReport.created_at >= datetime.combine(since, datetime.min.time()))
+    db.session.execute(cleanup)
+
+    days, keys, cells = [], [], []
+    for batch in db.session.execute(stmt.execution_options(yield_per=batch_size)).partitions():
+        created, categories, latitudes, longitudes = zip(*batch)
+        batch_cells, inside = spec.cells(latitudes, longitudes)
+        days.append(np.array([c.toordinal() for c in created], dtype=np.int64)[inside])
+        keys.append(np.array([category_key(c) for c in categories], dtype=np.int64)[inside])
+        cells.append(batch_cells[inside])
+    if not cells:
+        return 0
+    days, keys, cells = np.concatenate(days), np.concatenate(keys), np.concatenate(cells)
+
+    # One bincount per (day, category) group
+    order = np.lexsort((keys, days))
+    days, keys, cells = days[order], keys[order], cells[order]
+    bounds = np.flatnonzero((np.diff(days) != 0) | (np.diff(keys) != 0)) + 1
+    size = spec.rows * spec.cols
+    written = 0
+    for group in np.split(np.arange(len(cells)), bounds):
+        if not len(group):
+            continue
+        counts = np.bincount(cells[group], minlength=size)
+        db.session.add(HeatmapGrid(
+            day=datetime.fromordinal(int(days[group[0]])).date(),
+            category_key=int(keys[group[0]]), rows=spec.rows, cols=spec.cols,
+            counts=encode_counts(counts), total=len(group)))
+        written += 1
+        if written % 100 == 0:
+            db.session.flush()
+    return written
+
+
+def sparse_payload(counts):
+    """Non-zero cells as parallel flat-index and count lists."""
+    flat = counts.ravel()
+    indices = np.flatnonzero(flat)
+    return {'indices': indices.tolist(), 'counts': flat[indices].tolist()}
+
+
+@functools.lru_cache(maxsize=None)
+def _ramp_table():
+    positions = [stop for stop, _ in _RAMP]
+    t = np.linspace(0.0, 1.0, 256)
+    table = np.stack([np.interp(t, positions, [color[channel] for _, color in _RAMP])
+                      for channel in range(4)], axis=1)
+    return np.round(table).astype(np.uint8)
+
+
+def render_rgba(counts):
+    """Colour a count grid on a log scale; empty cells are transparent."""
+    peak = int(counts.max()) if counts.size else 0
+    rgba = np.zeros(counts.shape + (4,), dtype=np.uint8)
+    if peak == 0:
+        return rgba
+    scaled = np.log1p(counts.astype(np.float64)) / math.log1p(peak)
+    rgba[...] = _ramp_table()[np.round(scaled * 255).astype(np.uint8)]
+    rgba[counts == 0] = 0
+    return rgba
+
+
+def _png_chunk(tag, data):
+    return (struct.pack('>I', len(data)) + tag + data
+            + struct.pack('>I', zlib.crc32(tag + data) & 0xFFFFFFFF))
+
+
+def encode_png(rgba):
+    """Encode an (h, w, 4) uint8 array as an RGBA PNG."""
+    height, width = rgba.shape[:2]
+    # Each scanline starts with filter type 0 (None)
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(height, width * 4)
+    return (_PNG_SIGNATURE
+            + _png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+            + _png_chunk(b'IDAT', zlib.compress(raw.tobytes(), 6))
+            + _png_chunk(b'IEND', b''))
+
+
+def default_range(today=None, days=30):
+    """The last ``days`` days, ending today (UTC)."""
+    end = today or datetime.utcnow().date()
+    return end - timedelta(days=days - 1), end
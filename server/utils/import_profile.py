@@ -0,0 +1,52 @@
+"""Where the app's boot time goes, from ``python -X importtime``.
+
+Each worker pays the full import cost of every route and utility module on
+a cold start or a gunicorn reload. ``profile_startup`` boots the app in a
+fresh interpreter, so nothing already imported by the caller hides the
+cost, and returns the wall time of ``create_app()`` and the per-module
+import times. ``flask import-time`` prints the report.
+"""
+import os
+import subprocess
+import sys
+from collections import namedtuple
+
+ModuleTime = namedtuple('ModuleTime', 'name depth self_us cumulative_us')
+StartupProfile = namedtuple('StartupProfile', 'boot_seconds import_us modules')
+
+_BOOT = ('import time; started = time.perf_counter(); '
+         'from server import create_app; create_app({config!r}); '
+         'print(time.perf_counter() - started)')
+
+
+def parse_importtime(output):
+    """ModuleTime rows from ``-X importtime`` output, in import order."""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # The header line
+        name = fields[2][1:]
+        # Each level of nesting indents the name by two more spaces
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        rows.append(ModuleTime(name.strip(), depth, int(fields[0]), int(fields[1])))
+    return rows
+
+
+def profile_startup(config_name='testing', python=None, timeout=120):
+    """Boot the app in a new interpreter and time it."""
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [root, env.get('PYTHONPATH')]))
+    result = subprocess.run(
+        [python or sys.executable, '-X', 'importtime', '-c', _BOOT.format(config=config_name)],
+        capture_output=True, text=True, cwd=root, env=env, timeout=timeout)
+    if result.returncode != 0:
+        raise RuntimeError(f'App failed to boot:\n{result.stderr[-2000:]}')
+    modules = parse_importtime(result.stderr)
+    return StartupProfile(
+        boot_seconds=float(result.stdout.strip().splitlines()[-1]),
+        import_us=sum(row.cumulative_us for row in modules if row.depth == 0),
+        modules=modules)
@@ -0,0 +1,213 @@
+"""Cold storage for incidents resolved long ago.
+
+Old resolved incidents are rarely read but still take space in
+``incident_reports`` and every index on it. ``flask incidents archive``
+moves incidents resolved more than ``INCIDENT_ARCHIVE_AFTER_DAYS`` ago,
+``INCIDENT_ARCHIVE_SEGMENT_SIZE`` at a time, into
+``IncidentArchiveSegment`` rows: each holds the incidents' ``to_dict()``,
+comments and status history as zlib-compressed JSON lines, and is written
+in the same transaction that deletes the incidents, their comments,
+status events and dedup bands.
+
+Segments keep the first/last incident id and creation time they cover;
+that sparse index is all a lookup needs to find the one or two segments
+that can hold an incident. ``find_archived_incident`` is what
+``get_incident`` falls back to on a miss, and keeps recently decoded
+segments in a per-process LRU. Segments are never modified, so the cache
+needs no invalidation.
+
+Incidents another live incident points to (``duplicate_of``) stay until
+that one is archived too. Heatmap grids and status rollups keep counting
+archived incidents, but a full ``flask heatmap rebuild`` or ``flask
+incidents rebuild-status-rollups`` only sees the live tables.
+"""
+import threading
+import zlib
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import delete, exists, or_, select, update
+from sqlalchemy.orm import aliased
+from ..models import (
+    db, IncidentReport, IncidentComment, IncidentLSHBand, IncidentArchiveSegment,
+    IncidentStatusEvent, NotificationOutbox
+)
+from .data_version import record_changed_points
+from .serializers import comment_select, incident_select, serialize_incident_rows
+
+
+def encode_segment(records):
+    dumps = current_app.json.dumps
+    return zlib.compress('\n'.join(dumps(record) for record in records).encode(), 6)
+
+
+def decode_segment(data):
+    loads = current_app.json.loads
+    return [loads(line) for line in zlib.decompress(data).decode().split('\n')]
+
+
+def _archivable(incident, before):
+    return (incident.status == 'resolved') & (incident.resolved_at < before)
+
+
+def _without_outside_references(session, ids):
+    """Leave out incidents still pointed to by ones outside the batch."""
+    batch = set(ids)
+    while batch:
+        referenced = set(session.execute(
+            select(IncidentReport.duplicate_of).where(
+                IncidentReport.duplicate_of.in_(batch), IncidentReport.id.not_in(batch))
+        ).scalars())
+        if not referenced:
+            break
+        batch -= referenced
+    return sorted(batch)
+
+
+def _write_segment(session, ids):
+    rows = session.execute(
+        incident_select().where(IncidentReport.id.in_(ids)).order_by(IncidentReport.id)).all()
+    incidents = serialize_incident_rows(rows)
+    comments = defaultdict(list)
+    for row in session.execute(
+            comment_select().where(IncidentComment.incident_id.in_(ids))
+            .order_by(IncidentComment.created_at, IncidentComment.id)):
+        comments[row.incident_id].append(dict(row._mapping))
+    status_events = defaultdict(list)
+    for event in session.execute(
+            select(IncidentStatusEvent).where(IncidentStatusEvent.incident_id.in_(ids))
+            .order_by(IncidentStatusEvent.id)).scalars():
+        status_events[event.incident_id].append(event.to_dict())
+
+    created = [incident['created_at'] for incident in incidents if incident['created_at']]
+    session.add(IncidentArchiveSegment(
+        first_id=incidents[0]['id'],
+        last_id=incidents[-1]['id'],
+        first_created_at=min(created, default=None),
+        last_created_at=max(created, default=None),
+        count=len(incidents),
+        data=encode_segment({'incident': incident, 'comments': comments[incident['id']],
+                             'status_events': status_events[incident['id']]}
+                            for incident in incidents)))
+
+    options = {'synchronize_session': False}
+    session.execute(delete(IncidentComment).where(IncidentComment.incident_id.in_(ids))
+                    .execution_options(**options))
+    session.execute(delete(IncidentStatusEvent).where(IncidentStatusEvent.incident_id.in_(ids))
+                    .execution_options(**options))
+    session.execute(delete(IncidentLSHBand).where(IncidentLSHBand.incident_id.in_(ids))
+                    .execution_options(**options))
+    session.execute(update(NotificationOutbox).where(NotificationOutbox.incident_id.in_(ids))
+                    .values(incident_id=None).execution_options(**options))
+    session.execute(delete(IncidentReport).where(IncidentReport.id.in_(ids))
+                    .execution_options(**options))
+    # Cached clusters and tiles may still show them
+    record_changed_points(session, {
+        (incident['location']['latitude'], incident['location']['longitude'])
+        for incident in incidents})
+
+
+def archive_resolved(before, segment_size=500):
+    """Archive incidents resolved before ``before``, one segment per commit.
+
+    Newest ids go first, so duplicates leave before the incidents they
+    point to. Returns (incidents archived, segments written).
+    """
+    session = db.session
+    referrer = aliased(IncidentReport)
+    candidates = select(IncidentReport.id).where(
+        _archivable(IncidentReport, before),
+        ~exists().where(referrer.duplicate_of == IncidentReport.id,
+                        or_(referrer.resolved_at.is_(None), ~_archivable(referrer, before))))
+    archived = segments = 0
+    cursor = None
+    while True:
+        stmt = candidates if cursor is None else candidates.where(IncidentReport.id < cursor)
+        ids = session.execute(
+            stmt.order_by(IncidentReport.id.desc()).limit(segment_size)).scalars().all()
+        if not ids:
+            break
+        cursor = ids[-1]
+        ids = _without_outside_references(session, ids)
+        if not ids:
+            continue
+        _write_segment(session, ids)
+        session.commit()
+        archived += len(ids)
+        segments += 1
+    return archived, segments
+
+
+class SegmentCache:
+    """Decoded segments, by id, least recently used dropped first."""
+
+    def __init__(self, max_segments=32):
+        self.max_segments = max_segments
+        self._lock = threading.Lock()
+        self._segments = OrderedDict()
+
+    def get(self, session, segment_id):
+        with self._lock:
+            if segment_id in self._segments:
+                self._segments.move_to_end(segment_id)
+                return self._segments[segment_id]
+        data = session.execute(select(IncidentArchiveSegment.data)
+                               .where(IncidentArchiveSegment.id == segment_id)).scalar()
+        records = {record['incident']['id']: record for record in decode_segment(data)}
+        with self._lock:
+            self._segments[segment_id] = records
+            while len(self._segments) > self.max_segments:
+                self._segments.popitem(last=False)
+        return records
+
+
+def get_segment_cache():
+    cache = current_app.extensions.get('incident_archive')
+    if cache is None:
+        cache = current_app.extensions['incident_archive'] = SegmentCache(
+            current_app.config.get('INCIDENT_ARCHIVE_CACHED_SEGMENTS', 32))
+    return cache
+
+
+def find_archived_incident(incident_id):
+    """The archived ``{'incident': ..., 'comments': [...], 'status_events': [...]}``
+    record, or None."""
+    session = db.session
+    segment_ids = session.execute(
+        select(IncidentArchiveSegment.id).where(
+            IncidentArchiveSegment.first_id <= incident_id,
+            IncidentArchiveSegment.last_id >= incident_id)
+        .order_by(IncidentArchiveSegment.id.desc())).scalars().all()
+    cache = get_segment_cache()
+    for segment_id in segment_ids:
+        record = cache.get(session, segment_id).get(incident_id)
+        if record is not None:
+            return record
+    return None
+
+
+def _created_at(incident):
+    return datetime.fromisoformat(incident['created_at']) if incident['created_at'] else None
+
+
+def iter_archived_incidents(since=None, until=None):
+    """Yield archived incident dicts created in [since, until), segment by segment.
+
+    Segments are decoded one at a time and not cached.
+    """
+    session = db.session
+    stmt = select(IncidentArchiveSegment.id).order_by(IncidentArchiveSegment.first_id)
+    if since is not None:
+        stmt = stmt.where(IncidentArchiveSegment.last_created_at >= since)
+    if until is not None:
+        stmt = stmt.where(IncidentArchiveSegment.first_created_at < until)
+    for segment_id in session.execute(stmt).scalars().all():
+        data = session.execute(select(IncidentArchiveSegment.data)
+                               .where(IncidentArchiveSegment.id == segment_id)).scalar()
+        for record in decode_segment(data):
+            created_at = _created_at(record['incident'])
+            if since is not None and (created_at is None or created_at < since):
+                continue
+            if until is not None and (created_at is None or created_at >= until):
+                continue
+            yield record['incident']
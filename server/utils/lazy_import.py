@@ -0,0 +1,56 @@
+"""Modules imported on first use instead of when the app loads.
+
+Every worker imports every route module at boot, so an SDK imported at
+module level is paid for on each cold start and reload even if no request
+ever needs it. ``lazy_module('numpy')`` stands in for the module and
+imports it the first time one of its attributes is read.
+
+A preloading server calls ``load_all()`` in the master instead, so the
+modules are imported once and their pages shared by every forked worker.
+"""
+import importlib
+import threading
+
+_registry = {}
+
+
+class LazyModule:
+    """A module proxy that imports the real module on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        value = getattr(self._load(), attr)
+        # Later lookups of the attribute skip __getattr__
+        setattr(self, attr, value)
+        return value
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f'<lazy module {self._name!r} ({state})>'
+
+
+def lazy_module(name):
+    proxy = _registry.get(name)
+    if proxy is None:
+        proxy = _registry.setdefault(name, LazyModule(name))
+    return proxy
+
+
+def load_all():
+    """Import every module handed out by ``lazy_module``; returns their names."""
+    for proxy in list(_registry.values()):
+        proxy._load()
+    return sorted(_registry)
@@ -0,0 +1,65 @@
+"""Failed-login counting that stays out of the users table.
+
+Failures are counted in sliding windows of ``LOGIN_FAILURE_WINDOW``
+seconds, per username and per client IP, in the rate limiter's store
+(shared by all workers with ``shm://`` or ``redis://``). A bad password
+writes nothing to the database: the account is only locked, with one
+write, once its username reaches ``LOGIN_MAX_FAILURES``. An IP with
+``LOGIN_IP_MAX_FAILURES`` failures is refused before any lookup, so a
+credential-stuffing run against many accounts costs neither row locks nor
+password hashing.
+"""
+import math
+import time
+from flask import current_app
+from .rate_limit import get_shared_store
+
+
+class LoginThrottle:
+    """Sliding-window failure counters per username and IP."""
+
+    def __init__(self, store, max_failures=5, ip_max_failures=50, window=900, prefix='rl'):
+        self.store = store
+        self.max_failures = max_failures
+        self.ip_max_failures = ip_max_failures
+        self.window = window
+        self.prefix = prefix
+
+    def _user_key(self, username):
+        return f'{self.prefix}:login:user:{(username or "").strip().lower()}'
+
+    def _ip_key(self, ip):
+        return f'{self.prefix}:login:ip:{ip}'
+
+    def ip_retry_after(self, ip, now=None):
+        """Seconds until ``ip`` may try again, or None if it is not blocked."""
+        now = time.time() if now is None else now
+        if self.store.hit(self._ip_key(ip), self.window, 0, now) < self.ip_max_failures:
+            return None
+        # The estimate decays as the window slides; at the latest it has
+        # dropped below the limit once the current window has passed
+        return max(1, math.ceil(self.window - now % self.window))
+
+    def record_failure(self, username, ip, now=None):
+        """Count a failure; returns True once the username should be locked."""
+        now = time.time() if now is None else now
+        self.store.hit(self._ip_key(ip), self.window, 1, now)
+        return self.store.hit(self._user_key(username), self.window, 1, now) >= self.max_failures
+
+    def reset(self, username, now=None):
+        """Forget a username's failures (after a login or a lockout)."""
+        self.store.reset(self._user_key(username), now)
+
+
+def get_login_throttle():
+    """The app's login throttle, created on first use."""
+    throttle = current_app.extensions.get('login_throttle')
+    if throttle is None:
+        config = current_app.config
+        throttle = current_app.extensions['login_throttle'] = LoginThrottle(
+            get_shared_store(current_app),
+            max_failures=config.get('LOGIN_MAX_FAILURES', 5),
+            ip_max_failures=config.get('LOGIN_IP_MAX_FAILURES', 50),
+            window=config.get('LOGIN_FAILURE_WINDOW', 900),
+            prefix=config.get('RATELIMIT_KEY_PREFIX', 'rl'))
+    return throttle
@@ -0,0 +1,216 @@
+"""Long-lived connections to the email and SMS providers.
+
+``SMTPConnectionPool`` keeps up to ``max_size`` authenticated SMTP
+sessions open between sends instead of paying for TCP, STARTTLS and
+AUTH on every message. Idle sessions are checked with NOOP before reuse
+once they have been idle for ``check_after`` seconds, closed after
+``idle_timeout`` or ``max_messages``, and a session that drops mid-send is
+replaced and the message retried once. ``send_many`` pushes a whole batch
+through one session.
+
+``SMSClient`` talks to the Twilio Messages REST API over a keep-alive
+``requests`` session whose connection pool is bounded by ``pool_size``,
+rather than building a new Twilio ``Client`` (and HTTP session) per SMS.
+urllib3 discards pooled connections the server has closed before reusing
+them and retries failures to connect; a POST that fails after being sent
+is not retried, so a message is never sent twice.
+"""
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+
+# Errors that leave the SMTP session unusable
+_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError,
+                      smtplib.SMTPHeloError, ConnectionError, TimeoutError, OSError)
+# Errors about one message; the session can carry on after RSET
+_MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused,
+                   smtplib.SMTPDataError, smtplib.SMTPNotSupportedError)
+
+
+class _PooledSMTP:
+    __slots__ = ('smtp', 'last_used', 'sent')
+
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+        self.sent = 0
+
+
+class SMTPConnectionPool:
+    """A bounded pool of authenticated SMTP sessions."""
+
+    def __init__(self, host, port, use_tls=False, use_ssl=False, username=None, password=None,
+                 max_size=4, timeout=10, idle_timeout=60, check_after=15, max_messages=500):
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.use_ssl = use_ssl
+        self.username = username
+        self.password = password
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self.max_messages = max_messages
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self.connects = 0
+
+    def _connect(self):
+        cls = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        smtp = cls(self.host, self.port, timeout=self.timeout)
+        try:
+            smtp.ehlo()
+            if self.use_tls and not self.use_ssl:
+                smtp.starttls()
+                smtp.ehlo()
+            if self.username and self.password:
+                smtp.login(self.username, self.password)
+        except Exception:
+            _close(smtp)
+            raise
+        self.connects += 1
+        return _PooledSMTP(smtp)
+
+    def _usable(self, pooled):
+        idle = time.monotonic() - pooled.last_used
+        if idle > self.idle_timeout or pooled.sent >= self.max_messages:
+            return False
+        if idle > self.check_after:
+            try:
+                return pooled.smtp.noop()[0] == 250
+            except _CONNECTION_ERRORS + (smtplib.SMTPException,):
+                return False
+        return True
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    pooled = self._idle.pop() if self._idle else None
+                if pooled is None:
+                    return self._connect()
+                if self._usable(pooled):
+                    return pooled
+                _close(pooled.smtp)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, pooled):
+        if pooled is not None:
+            pooled.last_used = time.monotonic()
+            with self._lock:
+                self._idle.append(pooled)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a session; it goes back to the pool unless the block raises."""
+        pooled = self._acquire()
+        try:
+            yield pooled
+        except Exception:
+            _close(pooled.smtp)
+            self._slots.release()
+            raise
+        self._release(pooled)
+
+    def send_many(self, messages):
+        """Send ``(sender, recipients, data)`` messages over one session.
+
+        Returns a list of ``(ok, error)`` per message. A refused message
+        does not stop the batch; a dropped session is replaced and the
+        message retried once.
+        """
+        results = []
+        try:
+            pooled = self._acquire()
+        except Exception as e:
+            return [(False, str(e))] * len(messages)
+
+        try:
+            for sender, recipients, data in messages:
+                for attempt in range(2):
+                    if pooled is None or pooled.sent >= self.max_messages:
+                        if pooled is not None:
+                            _close(pooled.smtp)
+                            pooled = None
+                        try:
+                            pooled = self._connect()
+                        except Exception as e:
+                            results.append((False, str(e)))
+                            break
+                    try:
+                        pooled.smtp.sendmail(sender, recipients, data)
+                        pooled.sent += 1
+                        results.append((True, None))
+                        break
+                    except _MESSAGE_ERRORS as e:
+                        try:
+                            pooled.smtp.rset()
+                        except _CONNECTION_ERRORS + (smtplib.SMTPException,):
+                            _close(pooled.smtp)
+                            pooled = None
+                        results.append((False, str(e)))
+                        break
+                    except _CONNECTION_ERRORS as e:
+                        _close(pooled.smtp)
+                        pooled = None
+                        if attempt:
+                            results.append((False, str(e)))
+        finally:
+            self._release(pooled)
+        return results
+
+    def close(self):
+        """Close every idle session."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            _close(pooled.smtp)
+
+
+def _close(smtp):
+    try:
+        smtp.quit()
+    except Exception:
+        try:
+            smtp.close()
+        except Exception:
+            pass
+
+
+class SMSClient:
+    """Send SMS through the Twilio Messages API on pooled connections."""
+
+    def __init__(self, account_sid, auth_token, from_number, base_url='https://api.twilio.com',
+                 pool_size=10, timeout=10):
+        # Imported here so workers that never send SMS do not load requests
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.from_number = from_number
+        self.timeout = timeout
+        self.url = f"{base_url.rstrip('/')}/2010-04-01/Accounts/{account_sid}/Messages.json"
+        self.session = requests.Session()
+        self.session.auth = (account_sid, auth_token)
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, pool_block=True,
+            # Only failures to connect: nothing has been sent yet
+            max_retries=Retry(total=2, connect=2, read=0, status=0, other=0, backoff_factor=0.1))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def send(self, to, body):
+        """Send one SMS; returns True if the provider accepted it."""
+        response = self.session.post(
+            self.url, data={'To': to, 'From': self.from_number, 'Body': body}, timeout=self.timeout)
+        return response.status_code in (200, 201)
+
+    def close(self):
+        self.session.close()
@@ -1,20 +1,90 @@
-from flask_mail import Message
+from flask import current_app
+from flask_mail import Message, sanitize_address, sanitize_addresses
 from ..extensions import mail, db
 from ..models import User
+from .notification_pools import SMTPConnectionPool, SMSClient
 import os
-from twilio.rest import Client
+
+def get_smtp_pool():
+    """The app's SMTP connection pool, created on first use."""
+    pool = current_app.extensions.get('smtp_pool')
+    if pool is None:
+        config = current_app.config
+        pool = current_app.extensions['smtp_pool'] = SMTPConnectionPool(
+            config.get('MAIL_SERVER'), config.get('MAIL_PORT', 25),
+            use_tls=config.get('MAIL_USE_TLS', False), use_ssl=config.get('MAIL_USE_SSL', False),
+            username=config.get('MAIL_USERNAME'), password=config.get('MAIL_PASSWORD'),
+            max_size=config.get('MAIL_POOL_SIZE', 4),
+            timeout=config.get('NOTIFICATION_TIMEOUT', 10),
+            idle_timeout=config.get('MAIL_POOL_IDLE_TIMEOUT', 60),
+            max_messages=config.get('MAIL_POOL_MAX_MESSAGES', 500))
+    return pool
+
+def get_sms_client():
+    """The app's pooled Twilio client, or None without credentials."""
+    client = current_app.extensions.get('sms_client')
+    if client is None:
+        config = current_app.config
+        account_sid = config.get('TWILIO_ACCOUNT_SID') or os.getenv('TWILIO_ACCOUNT_SID')
+        auth_token = config.get('TWILIO_AUTH_TOKEN') or os.getenv('TWILIO_AUTH_TOKEN')
+        from_number = config.get('TWILIO_PHONE_NUMBER') or os.getenv('TWILIO_PHONE_NUMBER')
+        if not all([account_sid, auth_token, from_number]):
+            return None
+        client = current_app.extensions['sms_client'] = SMSClient(
+            account_sid, auth_token, from_number,
+            base_url=config.get('TWILIO_API_BASE', 'https://api.twilio.com'),
+            pool_size=config.get('SMS_POOL_SIZE', 10),
+            timeout=config.get('NOTIFICATION_TIMEOUT', 10))
+    return client
+
+def send_email_batch(emails):
+    """Send ``(recipient, subject, body)`` emails over one pooled SMTP session.
+
+    Returns a list of booleans, one per email.
+    """
+    messages = []
+    for user_email, subject, body in emails:
+        msg = Message(subject, sender=os.getenv('MAIL_DEFAULT_SENDER'), recipients=[user_email])
+        msg.body = body
+        messages.append(msg)
+
+    if mail.suppress:
+        # Testing/suppressed mode: let Flask-Mail record them
+        results = []
+        for msg in messages:
+            try:
+                mail.send(msg)
+                results.append(True)
+            except Exception as e:
+                print(f"Error sending email: {str(e)}")
+                results.append(False)
+        return results
+
+    envelopes, valid = [], []
+    for msg in messages:
+        sender = msg.sender or current_app.config.get('MAIL_DEFAULT_SENDER')
+        if not sender or msg.has_bad_headers():
+            valid.append(False)
+            continue
+        msg.sender = sender
+        envelopes.append((sanitize_address(sender), list(sanitize_addresses(msg.send_to)),
+                          msg.as_bytes()))
+        valid.append(True)
+
+    sent = iter(get_smtp_pool().send_many(envelopes))
+    results = []
+    for ok in valid:
+        if ok:
+            ok, error = next(sent)
+            if error:
+                print(f"Error sending email: {error}")
+        results.append(ok)
+    return results
 
 def send_email_notification(user_email, subject, body):
     """Send email notification to user."""
     try:
-        msg = Message(
-            subject,
-            sender=os.getenv('MAIL_DEFAULT_SENDER'),
-            recipients=[user_email]
-        )
-        msg.body = body
-        mail.send(msg)
-        return True
+        return send_email_batch([(user_email, subject, body)])[0]
     except Exception as e:
         print(f"Error sending email: {str(e)}")
         return False
@@ -22,61 +92,68 @@ def send_email_notification(user_email, subject, body):
 def send_sms_notification(phone_number, message):
     """Send SMS notification using Twilio."""
     try:
-        account_sid = os.getenv('TWILIO_ACCOUNT_SID')
-        auth_token = os.getenv('TWILIO_AUTH_TOKEN')
-        from_number = os.getenv('TWILIO_PHONE_NUMBER')
-
-        if not all([account_sid, auth_token, from_number]):
+        client = get_sms_client()
+        if client is None:
             print("Twilio credentials not configured")
             return False
-
-        client = Client(account_sid, auth_token)
-        client.messages.create(
-            body=message,
-            from_=from_number,
-            to=phone_number
-        )
-        return True
+        return client.send(phone_number, message)
     except Exception as e:
         print(f"Error sending SMS: {str(e)}")
         return False
 
-def notify_status_change(incident_id, new_status):
-    """Notify user when incident status changes."""
-    from models import IncidentReport
-    
+def notify_status_change(incident_id, new_status, commit=True):
+    """Queue email/SMS updates for the reporter when an incident's status changes.
+
+    Messages wait NOTIFICATION_COALESCE_SECONDS in the outbox so that quick
+    successive changes reach the user as one digest.
+    """
+    from ..models import IncidentReport
+    from .outbox import enqueue_notification
+
     try:
-        incident = IncidentReport.query.get(incident_id)
+        incident = db.session.get(IncidentReport, incident_id)
         if not incident:
             return False
 
-        user = User.query.get(incident.user_id)
+        user = db.session.get(User, incident.user_id)
         if not user:
             return False
 
+        config = current_app.config
+        delay = config.get('NOTIFICATION_COALESCE_SECONDS', 300)
+        link = f"{config.get('FRONTEND_URL', 'http://localhost:5173')}/incidents/{incident_id}"
+        summary = f'"{incident.title}" is now {new_status}'
+        queued = False
+
         # Email notification
-        subject = f"Incident Status Update - {incident.title}"
-        body = f"""
+        if user.email_notifications:
+            subject = f"Incident Status Update - {incident.title}"
+            body = f"""
         Hello {user.username},
 
         The status of your incident report "{incident.title}" has been updated to: {new_status}
 
-        You can view the details at: http://localhost:5173/incidents/{incident_id}
+        You can view the details at: {link}
 
         Best regards,
         Ajali! Team
         """
-        email_sent = send_email_notification(user.email, subject, body)
+            enqueue_notification(user.id, 'email', body, subject=subject, event='status_change',
+                                 incident_id=incident_id, summary=summary, delay=delay)
+            queued = True
 
         # SMS notification (if phone number is available)
-        if hasattr(user, 'phone_number') and user.phone_number:
+        if user.sms_notifications and user.phone_number:
             message = f"Ajali! Alert: Your incident '{incident.title}' status has been updated to {new_status}."
-            sms_sent = send_sms_notification(user.phone_number, message)
-        else:
-            sms_sent = False
+            enqueue_notification(user.id, 'sms', message, event='status_change',
+                                 incident_id=incident_id, summary=summary, delay=delay)
+            queued = True
 
-        return email_sent or sms_sent
+        if commit:
+            db.session.commit()
+        return queued
 
     except Exception as e:
+        db.session.rollback()
         print(f"Error in notification process: {str(e)}")
         return False
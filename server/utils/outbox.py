@@ -0,0 +1,238 @@
+"""The notification outbox: messages are queued in the database and sent
+by ``flask notifications deliver`` rather than inline in the request.
+
+Queueing is part of the caller's transaction, so a message exists exactly
+when the change it describes was committed, and slow or failing providers
+never hold up an API response.
+
+Delivery coalesces: once the oldest pending message for a user and
+channel is due, everything pending for that pair goes out as a single
+digest, with repeated status changes of one incident collapsed to the
+latest. Messages queued with a ``delay`` (status changes use
+``NOTIFICATION_COALESCE_SECONDS``) wait for follow-up events to merge
+with. Deliveries that fall in the user's quiet hours, in their own
+timezone, are held until the quiet hours end unless a message is urgent.
+
+Sending happens outside any transaction: a worker claims its batch (marks
+it ``sending`` with a lease) and commits, sends, then records the results
+in a second short transaction. A worker that dies mid-batch leaves its
+claim to lapse after ``SENDING_LEASE_SECONDS``, when the messages are
+claimed again; a digest may then go out twice, but is never lost.
+"""
+from datetime import datetime, timedelta
+import pytz
+from sqlalchemy import and_, or_, select, insert
+from ..models import db, User, NotificationOutbox
+from .notification_utils import send_email_batch, send_sms_notification
+
+RETRY_BASE_SECONDS = 30
+SENDING_LEASE_SECONDS = 300
+
+
+def _claimable(now):
+    """Pending messages, and ones whose sender's lease has lapsed."""
+    return or_(NotificationOutbox.status == 'pending',
+               and_(NotificationOutbox.status == 'sending', NotificationOutbox.deliver_after <= now))
+
+
+def enqueue_notification(user_id, channel, body, subject=None, event='general', incident_id=None,
+                         summary=None, delay=0, urgent=False):
+    """Queue one message for delivery in ``delay`` seconds; the caller commits."""
+    message = NotificationOutbox(
+        user_id=user_id, channel=channel, subject=subject, body=body, event=event,
+        incident_id=incident_id, summary=summary, urgent=urgent,
+        deliver_after=datetime.utcnow() + timedelta(seconds=delay))
+    db.session.add(message)
+    return message
+
+
+def enqueue_many(messages):
+    """Queue message dicts (the model's columns) in one statement; the
+    caller commits."""
+    if messages:
+        db.session.execute(insert(NotificationOutbox), messages)
+    return len(messages)
+
+
+def parse_clock(value):
+    """Parse 'HH:MM'; raises ValueError."""
+    return datetime.strptime(value, '%H:%M').time()
+
+
+def quiet_hours_end(now, timezone, start, end):
+    """When the quiet hours around ``now`` (naive UTC) end, as naive UTC,
+    or None if it is not quiet hours. ``start``/``end`` are 'HH:MM' local
+    times; an end before the start spans midnight.
+    """
+    if not start or not end:
+        return None
+    try:
+        tz = pytz.timezone(timezone or 'UTC')
+        start, end = parse_clock(start), parse_clock(end)
+    except (pytz.UnknownTimeZoneError, ValueError):
+        return None
+    if start == end:
+        return None
+
+    local = pytz.utc.localize(now).astimezone(tz)
+    clock = local.time().replace(tzinfo=None)
+    if start < end:
+        quiet = start <= clock < end
+        end_day = local.date()
+    else:
+        quiet = clock >= start or clock < end
+        end_day = local.date() + timedelta(days=1 if clock >= start else 0)
+    if not quiet:
+        return None
+    local_end = tz.localize(datetime.combine(end_day, end))
+    return local_end.astimezone(pytz.utc).replace(tzinfo=None)
+
+
+def render_digest(channel, username, messages, sms_max_length=480):
+    """(subject, body) for a batch of one user's messages on one channel."""
+    latest = {}
+    for message in messages:
+        if message.event == 'status_change' and message.incident_id:
+            key = ('status_change', message.incident_id)
+            latest.pop(key, None)  # Keep ordering by the latest change
+        else:
+            key = ('message', message.id)
+        latest[key] = message
+    items = list(latest.values())
+
+    if len(items) == 1:
+        return items[0].subject, items[0].body
+
+    lines = [item.summary or item.subject or item.body for item in items]
+    if channel == 'sms':
+        body = f'Ajali! {len(lines)} updates: ' + '; '.join(lines)
+        if len(body) > sms_max_length:
+            body = body[:sms_max_length - 3].rstrip() + '...'
+        return None, body
+
+    body = (f'Hello {username},\n\nHere is what happened since our last message:\n\n'
+            + '\n'.join(f'- {line}' for line in lines)
+            + '\n\nBest regards,\nAjali! Team')
+    return f'Ajali! {len(lines)} updates', body
+
+
+def _claim_group(user, channel, now, sms_max_length):
+    """Claim one user's pending messages on a channel and render their digest.
+
+    Claimed messages are marked ``sending`` until the lease runs out.
+    Returns ``(messages, subject, body)``, or None when another worker has
+    them or they were deferred (quiet hours) or dropped (inactive user).
+    """
+    messages = db.session.execute(
+        select(NotificationOutbox)
+        .where(NotificationOutbox.user_id == user.id, NotificationOutbox.channel == channel,
+               _claimable(now))
+        .order_by(NotificationOutbox.created_at, NotificationOutbox.id)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+    if not messages:
+        return None
+
+    if not user.is_active:
+        for message in messages:
+            message.status = 'failed'
+            message.last_error = 'recipient is inactive'
+        return None
+
+    urgent = any(message.urgent and message.deliver_after <= now for message in messages)
+    quiet_until = quiet_hours_end(now, user.timezone, user.quiet_hours_start, user.quiet_hours_end)
+    if quiet_until and not urgent:
+        for message in messages:
+            message.deliver_after = max(message.deliver_after, quiet_until)
+        return None
+
+    subject, body = render_digest(channel, user.username, messages, sms_max_length)
+    lease = now + timedelta(seconds=SENDING_LEASE_SECONDS)
+    for message in messages:
+        message.status = 'sending'
+        message.deliver_after = lease
+    return messages, subject, body
+
+
+def _record_result(messages, ok, error, now, max_attempts):
+    for message in messages:
+        message.attempts += 1
+        if ok:
+            message.status = 'sent'
+            message.sent_at = now
+            message.last_error = None
+        else:
+            message.last_error = error
+            if message.attempts >= max_attempts:
+                message.status = 'failed'
+            else:
+                message.status = 'pending'
+                message.deliver_after = now + timedelta(
+                    seconds=RETRY_BASE_SECONDS * 2 ** (message.attempts - 1))
+
+
+def deliver_pending(batch_size=100, max_attempts=5, sms_max_length=480, now=None):
+    """Deliver up to ``batch_size`` due (user, channel) digests and commit.
+
+    The batch is claimed and committed before anything is sent, so no
+    transaction (or row lock) is held across the providers' network calls.
+    The batch's emails go out over one pooled SMTP session. Failed sends
+    are retried with exponential backoff and marked ``failed`` after
+    ``max_attempts``. Returns (sent, failed).
+    """
+    now = now or datetime.utcnow()
+    due = db.session.execute(
+        select(NotificationOutbox.user_id, NotificationOutbox.channel)
+        .where(_claimable(now), NotificationOutbox.deliver_after <= now)
+        .group_by(NotificationOutbox.user_id, NotificationOutbox.channel)
+        .order_by(db.func.min(NotificationOutbox.deliver_after))
+        .limit(batch_size)
+    ).all()
+
+    # (message ids, address, subject, body) per digest, read before the commit
+    emails, texts = [], []
+    for user_id, channel in due:
+        user = db.session.get(User, user_id)
+        if user is None:
+            continue
+        claimed = _claim_group(user, channel, now, sms_max_length)
+        if claimed is None:
+            continue
+        messages, subject, body = claimed
+        if channel not in ('email', 'sms'):
+            _record_result(messages, False, f'unknown channel {channel}', now, max_attempts)
+            continue
+        address = user.email if channel == 'email' else user.phone_number
+        (emails if channel == 'email' else texts).append(
+            ([message.id for message in messages], address, subject, body))
+    db.session.commit()
+
+    results = [(ids, False) for ids, address, _, _ in emails if not address]
+    emails = [email for email in emails if email[1]]
+    if emails:
+        try:
+            oks = send_email_batch([(address, subject or 'Ajali! Alert', body)
+                                    for _, address, subject, body in emails])
+        except Exception:
+            oks = [False] * len(emails)
+        results.extend((ids, ok) for (ids, _, _, _), ok in zip(emails, oks))
+    for ids, address, _, body in texts:
+        try:
+            ok = bool(address) and send_sms_notification(address, body)
+        except Exception:
+            ok = False
+        results.append((ids, ok))
+    if not results:
+        return 0, 0
+
+    messages = {message.id: message for message in db.session.execute(
+        select(NotificationOutbox).where(
+            NotificationOutbox.id.in_([i for ids, _ in results for i in ids]))).scalars()}
+    sent = failed = 0
+    for ids, ok in results:
+        _record_result([messages[i] for i in ids if i in messages], ok,
+                       None if ok else 'delivery failed', now, max_attempts)
+        sent += bool(ok)
+        failed += not ok
+    db.session.commit()
+    return sent, failed
@@ -0,0 +1,124 @@
+"""Running the app in forked worker processes (gunicorn with ``preload_app``).
+
+The master imports and builds the app once; workers are forked from it and
+share its memory copy-on-write until they write to a page. Three things
+keep those pages shared and the workers healthy:
+
+* ``warm_app`` does, in the master, the one-time work every worker would
+  otherwise repeat after fork: importing the SDKs deferred by
+  ``lazy_module``, configuring the ORM mappers, compiling the URL map and
+  building lookup tables.
+* ``freeze_heap`` moves everything allocated so far into the collector's
+  permanent generation (``gc.freeze``). CPython's collector writes to the
+  header of every object it examines, so without this the first
+  collection in each worker copies most of the master's heap.
+* ``after_fork`` drops the connections inherited from the master: pooled
+  database connections and provider sessions must not be shared between
+  processes.
+
+``MemoryRecycler`` tells a worker to exit once the memory private to it
+passes a limit, jittered per worker so they do not all restart together.
+"""
+import gc
+import importlib
+import os
+import random
+import time
+from sqlalchemy.orm import configure_mappers
+from .lazy_import import load_all
+
+# Per-process provider sessions (see notification_utils)
+_PER_PROCESS_EXTENSIONS = ('smtp_pool', 'sms_client')
+# Imported for workers that send SMS or upload media, so they share the pages
+_PRELOAD_MODULES = ('requests', 'urllib3')
+
+
+def warm_app(app):
+    """Do the app's one-time lazy work now; returns the seconds it took."""
+    from .cloudinary_utils import get_cloudinary
+    from .heatmap import _ramp_table
+
+    started = time.perf_counter()
+    load_all()
+    for name in _PRELOAD_MODULES:
+        importlib.import_module(name)
+    with app.app_context():
+        configure_mappers()
+        get_cloudinary()
+        _ramp_table()
+        # Building the matcher happens on the first request otherwise
+        app.url_map.bind('localhost').match('/')
+    return time.perf_counter() - started
+
+
+_collected = False
+
+
+def freeze_heap():
+    """Exempt the objects allocated so far from garbage collection."""
+    global _collected
+    if not _collected:
+        # Free what is already garbage rather than freezing it
+        gc.collect()
+        _collected = True
+    gc.freeze()
+
+
+def after_fork(app):
+    """Reset per-process state inherited from the master; call in each worker."""
+    with app.app_context():
+        db = app.extensions['sqlalchemy']
+        for engine in db.engines.values():
+            # close=False: the connections still belong to the master
+            engine.dispose(close=False)
+    for key in _PER_PROCESS_EXTENSIONS:
+        app.extensions.pop(key, None)
+
+
+def private_memory():
+    """Bytes of memory private to this process (USS), or RSS where unknown.
+
+    Pages still shared with the master do not count, so a worker is only
+    recycled for memory it has itself dirtied.
+    """
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            total = 0
+            for line in f:
+                if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                    total += int(line.split()[1]) * 1024
+            return total
+    except OSError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        # Peak rather than current; kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+
+class MemoryRecycler:
+    """Decides when a worker has grown past its memory limit.
+
+    The limit is drawn once per worker from ``limit * (1 ± jitter)``, and
+    memory is only read every ``check_every`` requests.
+    """
+
+    def __init__(self, limit_bytes, jitter=0.1, check_every=100, reader=private_memory,
+                 rng=random):
+        self.limit = int(limit_bytes * (1 + rng.uniform(-jitter, jitter))) if limit_bytes else 0
+        self.check_every = max(1, check_every)
+        self.reader = reader
+        self.requests = 0
+
+    def should_recycle(self):
+        """Count a request; True if the worker should exit after it."""
+        if not self.limit:
+            return False
+        self.requests += 1
+        if self.requests % self.check_every:
+            return False
+        return self.reader() > self.limit
@@ -0,0 +1,362 @@
+"""Token-bucket rate limiting with pluggable shared state.
+
+Limits are written the way ``RATELIMIT_DEFAULT`` already is, e.g.
+``"100 per day"``, ``"10/minute"`` or ``"5 per minute; 50 per day"``. Each
+limit becomes a token bucket holding ``amount`` tokens that refills at
+``amount / period`` tokens per second, so short bursts are allowed and a
+sustained flood is held to the average rate.
+
+Bucket state lives in the store named by ``RATELIMIT_STORAGE_URL``:
+
+* ``memory://`` - a dict in this process (one budget per worker)
+* ``shm://[/path]`` - a memory-mapped table shared by every worker on the
+  host (see ``shm_table``)
+* ``redis://...`` - Redis or a compatible server, shared across hosts. The
+  check-and-decrement runs as a single Lua script so it stays atomic.
+
+Views opt in with ``@rate_limit``; everything else falls under the default
+per-IP limit unless marked ``@rate_limit_exempt``. The stores also keep
+sliding-window counters (``hit``/``reset``) for counting events such as
+failed logins.
+"""
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+from flask import current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity
+from .shm_table import SharedSlotTable
+
+Limit = namedtuple('Limit', ['amount', 'period'])
+
+_PERIODS = {
+    'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400,
+    'sec': 1, 'min': 60, 's': 1, 'm': 60, 'h': 3600, 'd': 86400,
+}
+_LIMIT_RE = re.compile(r'^\s*(\d+)\s*(?:per|/)\s*(\d+)?\s*([a-z]+?)s?\s*$', re.IGNORECASE)
+
+
+def parse_limits(value):
+    """Parse ``"10 per minute; 100/day"`` into a tuple of Limits."""
+    if isinstance(value, (list, tuple)):
+        return tuple(limit for item in value for limit in parse_limits(item))
+    limits = []
+    for part in re.split(r'[;,]', value or ''):
+        if not part.strip():
+            continue
+        match = _LIMIT_RE.match(part)
+        unit = match and match.group(3).lower()
+        if not match or unit not in _PERIODS:
+            raise ValueError(f'Invalid rate limit: {part.strip()!r}')
+        multiple = int(match.group(2) or 1)
+        limits.append(Limit(int(match.group(1)), multiple * _PERIODS[unit]))
+    return tuple(limits)
+
+
+def _take_token(rate, capacity, cost, now):
+    """Build the check-and-decrement step applied to one bucket's state."""
+    def step(state):
+        if state is None:
+            tokens, updated = capacity, now
+        else:
+            tokens, updated = state[0], state[1]
+            tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+        if tokens >= cost:
+            tokens -= cost
+            return (True, tokens, 0.0), (tokens, now, 0.0)
+        return (False, tokens, (cost - tokens) / rate), (tokens, now, 0.0)
+    return step
+
+
+def _count_in_window(window, amount, now):
+    """Build the step adding ``amount`` to a sliding-window counter.
+
+    The state is the current fixed window's start and count plus the
+    previous window's count; the estimate weights the previous count by how
+    much of it still overlaps the sliding window.
+    """
+    def step(state):
+        start = math.floor(now / window) * window
+        current = previous = 0.0
+        if state is not None:
+            if state[0] == start:
+                current, previous = state[1], state[2]
+            elif state[0] == start - window:
+                previous = state[1]
+        current += amount
+        estimate = previous * (1 - (now - start) / window) + current
+        return estimate, (start, current, previous)
+    return step
+
+
+class MemoryStore:
+    """Bucket state in a bounded dict, private to this process."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def update(self, key, fn, now):
+        with self._lock:
+            result, values = fn(self._entries.get(key))
+            if values is None:
+                self._entries.pop(key, None)
+            else:
+                self._entries[key] = values
+                self._entries.move_to_end(key)
+                if len(self._entries) > self.max_keys:
+                    self._entries.popitem(last=False)
+            return result
+
+    def consume(self, key, rate, capacity, cost=1, now=None):
+        """Take ``cost`` tokens; return ``(allowed, remaining, retry_after)``."""
+        now = time.time() if now is None else now
+        return self.update(key, _take_token(rate, capacity, cost, now), now)
+
+    def hit(self, key, window, amount=1, now=None):
+        """Add ``amount`` to a sliding-window counter; return the window's count."""
+        now = time.time() if now is None else now
+        return self.update(key, _count_in_window(window, amount, now), now)
+
+    def reset(self, key, now=None):
+        self.update(key, lambda state: (None, None), time.time() if now is None else now)
+
+
+class SharedMemoryStore(MemoryStore):
+    """Bucket state in a memory-mapped file shared by all local workers."""
+
+    def __init__(self, path, slots=65536):
+        self.table = SharedSlotTable(path, slots=slots)
+
+    def update(self, key, fn, now):
+        return self.table.update(key, fn, now)
+
+
+_TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local updated = tonumber(state[2])
+if tokens == nil then
+    tokens = capacity
+    updated = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens), tostring(retry_after)}
+"""
+
+
+_SLIDING_WINDOW_LUA = """
+local window = tonumber(ARGV[1])
+local amount = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local start = math.floor(now / window) * window
+local state = redis.call('HMGET', KEYS[1], 'start', 'current', 'previous')
+local current = 0
+local previous = 0
+if tonumber(state[1]) == start then
+    current = tonumber(state[2])
+    previous = tonumber(state[3])
+elseif tonumber(state[1]) == start - window then
+    previous = tonumber(state[2])
+end
+current = current + amount
+redis.call('HSET', KEYS[1], 'start', start, 'current', current, 'previous', previous)
+redis.call('EXPIRE', KEYS[1], math.ceil(window * 2))
+return tostring(previous * (1 - (now - start) / window) + current)
+"""
+
+
+class RedisStore:
+    """Bucket state in Redis, checked and decremented by one Lua script."""
+
+    def __init__(self, url, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self._script = client.register_script(_TOKEN_BUCKET_LUA)
+        self._window_script = client.register_script(_SLIDING_WINDOW_LUA)
+
+    def consume(self, key, rate, capacity, cost=1, now=None):
+        now = time.time() if now is None else now
+        allowed, tokens, retry_after = self._script(keys=[key], args=[rate, capacity, cost, now])
+        return bool(allowed), float(tokens), float(retry_after)
+
+    def hit(self, key, window, amount=1, now=None):
+        now = time.time() if now is None else now
+        return float(self._window_script(keys=[key], args=[window, amount, now]))
+
+    def reset(self, key, now=None):
+        self.client.delete(key)
+
+
+def create_store(url, shm_slots=65536):
+    """Create the bucket store named by a RATELIMIT_STORAGE_URL."""
+    scheme, _, rest = (url or 'memory://').partition('://')
+    if scheme == 'memory':
+        return MemoryStore()
+    if scheme == 'shm':
+        path = rest or os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else '/tmp',
+                                    'ajali-ratelimit')
+        return SharedMemoryStore(path, slots=shm_slots)
+    if scheme in ('redis', 'rediss', 'unix'):
+        return RedisStore(url)
+    raise ValueError(f'Unsupported rate limit storage: {url}')
+
+
+def get_shared_store(app):
+    """The rate limiter's store, or one like it when rate limiting is off.
+
+    For other per-client state (login failures, provider send rates) that
+    should be shared the same way as the request limits.
+    """
+    limiter = app.extensions.get('rate_limiter')
+    if limiter is not None:
+        return limiter.store
+    store = app.extensions.get('shared_store')
+    if store is None:
+        store = app.extensions['shared_store'] = create_store(
+            app.config.get('RATELIMIT_STORAGE_URL'),
+            shm_slots=app.config.get('RATELIMIT_SHM_SLOTS', 65536))
+    return store
+
+
+def client_ip(proxy_hops=None):
+    """The requesting client's address.
+
+    Behind ``proxy_hops`` trusted reverse proxies (default
+    RATELIMIT_PROXY_HOPS) it is taken from X-Forwarded-For, otherwise
+    every client would share the proxy's address.
+    """
+    if proxy_hops is None:
+        limiter = current_app.extensions.get('rate_limiter')
+        proxy_hops = (limiter.proxy_hops if limiter is not None
+                      else current_app.config.get('RATELIMIT_PROXY_HOPS', 0))
+    if proxy_hops:
+        forwarded = request.headers.get('X-Forwarded-For', '').split(',')
+        if len(forwarded) >= proxy_hops:
+            return forwarded[-proxy_hops].strip()
+    return request.remote_addr or 'unknown'
+
+
+class RateLimiter:
+    """Applies parsed limits to a key against the configured store."""
+
+    def __init__(self, store, default_limits=(), key_prefix='rl', proxy_hops=0):
+        self.store = store
+        self.default_limits = default_limits
+        self.key_prefix = key_prefix
+        # Number of trusted reverse proxies that append to X-Forwarded-For
+        self.proxy_hops = proxy_hops
+
+    def client_ip(self):
+        return client_ip(self.proxy_hops)
+
+    def client_key(self, kind):
+        if kind == 'user':
+            identity = get_jwt_identity()
+            if identity is not None:
+                return f'u{identity}'
+        return f'ip{self.client_ip()}'
+
+    def check(self, limits, scope, key, cost=1):
+        """Consume from every limit; return None or the seconds to wait.
+
+        All limits are charged even after one rejects, so a client cannot
+        dodge the longer window by hammering until the shorter one trips.
+        """
+        retry_after = None
+        for limit in limits:
+            allowed, _, wait = self.store.consume(
+                f'{self.key_prefix}:{scope}:{key}:{limit.period}',
+                limit.amount / limit.period, limit.amount, cost
+            )
+            if not allowed:
+                retry_after = max(retry_after or 0.0, wait)
+        return retry_after
+
+
+def too_many_requests(retry_after):
+    """The 429 response, with a Retry-After clients can back off on."""
+    seconds = max(1, int(math.ceil(retry_after)))
+    response = jsonify({'error': 'Too many requests', 'retry_after': seconds})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(seconds)
+    return response
+
+
+def rate_limit(limits, key='ip', scope=None, cost=1):
+    """Limit a view per client IP (``key='ip'``) or per JWT user (``'user'``).
+
+    Place it below ``@jwt_required()`` when keying by user so the identity
+    is available. ``scope`` defaults to the endpoint name; views sharing a
+    scope share a budget.
+    """
+    parsed = parse_limits(limits)
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            limiter = current_app.extensions.get('rate_limiter')
+            if limiter is not None:
+                retry_after = limiter.check(parsed, scope or request.endpoint,
+                                            limiter.client_key(key), cost)
+                if retry_after is not None:
+                    return too_many_requests(retry_after)
+            return fn(*args, **kwargs)
+        wrapper._rate_limited = True
+        return wrapper
+    return decorator
+
+
+def rate_limit_exempt(fn):
+    """Exclude a view from the default limit."""
+    fn._rate_limited = True
+    return fn
+
+
+def init_rate_limiting(app):
+    """Create the app's limiter and enforce the default per-IP limit."""
+    if not app.config.get('RATELIMIT_ENABLED', True):
+        return None
+
+    limiter = RateLimiter(
+        create_store(app.config.get('RATELIMIT_STORAGE_URL'),
+                     shm_slots=app.config.get('RATELIMIT_SHM_SLOTS', 65536)),
+        default_limits=parse_limits(app.config.get('RATELIMIT_DEFAULT')),
+        key_prefix=app.config.get('RATELIMIT_KEY_PREFIX', 'rl'),
+        proxy_hops=app.config.get('RATELIMIT_PROXY_HOPS', 0)
+    )
+    app.extensions['rate_limiter'] = limiter
+
+    @app.before_request
+    def apply_default_rate_limit():
+        if not limiter.default_limits or request.method == 'OPTIONS':
+            return None
+        view = app.view_functions.get(request.endpoint)
+        if view is None or getattr(view, '_rate_limited', False):
+            return None
+        retry_after = limiter.check(limiter.default_limits, 'default', limiter.client_key('ip'))
+        if retry_after is not None:
+            return too_many_requests(retry_after)
+        return None
+
+    return limiter
@@ -0,0 +1,293 @@
+"""Revoked JWTs, shared between workers and forgotten once they expire.
+
+Tokens are revoked by ``jti`` until their own expiry. The store is named by
+``JWT_REVOCATION_STORAGE_URL``, like the rate limiter's:
+
+* ``memory://`` - a dict in this process (revocations are per worker)
+* ``shm://[/path]`` - a ``SharedSlotTable`` shared by every worker on the
+  host. Entries are stamped with their expiry and only expired ones are
+  recycled. A revocation that finds its bucket full of live entries stays
+  in the filter alone, and until it expires every filter hit missing from
+  the table counts as revoked: the store fails closed, at the cost of
+  rejecting the odd false-positive token, rather than drop a revocation.
+* ``redis://...`` - keys with a TTL, shared across hosts
+
+Every check goes through a Bloom filter first, so a token that was never
+revoked (nearly all of them) is answered without touching the store. With
+``shm://`` the filter lives in shared memory next to the table. With
+Redis each process keeps its own filter and pulls revocations made
+elsewhere every ``JWT_REVOCATION_SYNC_SECONDS``, so a token revoked on
+another host can still pass for that long. Filters are rebuilt from the
+live entries once they hold ``JWT_REVOCATION_BLOOM_CAPACITY`` insertions,
+which drops expired tokens from them.
+"""
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from flask import current_app
+from .shm_table import SharedSlotTable, SlotTableFull, key_hash
+
+try:
+    import fcntl
+except ImportError:  # Windows: locking only covers threads in this process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def bloom_layout(capacity, error_rate=0.001):
+    """(bytes, hash count) for a filter holding ``capacity`` keys."""
+    bits = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+    nbytes = (bits + 7) // 8
+    return nbytes, max(1, round(nbytes * 8 / capacity * math.log(2)))
+
+
+class BloomFilter:
+    """A Bloom filter over 64-bit key hashes, in a bytearray or a shared buffer."""
+
+    def __init__(self, capacity, error_rate=0.001, buffer=None):
+        self.capacity = capacity
+        nbytes, self.hashes = bloom_layout(capacity, error_rate)
+        self.size = nbytes * 8
+        self.bits = bytearray(nbytes) if buffer is None else buffer
+        self.inserted = 0
+
+    def _positions(self, h):
+        # Double hashing: the halves of a 64-bit hash give k probe positions
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def _set(self, bits, h):
+        for position in self._positions(h):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def add(self, h):
+        self._set(self.bits, h)
+        self.inserted += 1
+
+    def __contains__(self, h):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(h))
+
+    def load(self, hashes):
+        """Replace the contents with ``hashes``.
+
+        The new bits are built aside and copied in one go; a key present
+        before and after is never seen as missing by a concurrent reader.
+        """
+        bits = bytearray(self.size // 8)
+        count = 0
+        for h in hashes:
+            self._set(bits, h)
+            count += 1
+        self.bits[:] = bits
+        self.inserted = count
+
+
+class MemoryRevocationStore:
+    """Revocations in a dict, private to this process."""
+
+    def __init__(self, bloom_capacity=100000):
+        self.bloom = BloomFilter(bloom_capacity)
+        self._expires = {}
+        self._lock = threading.Lock()
+
+    def revoke(self, jti, expires_at):
+        with self._lock:
+            self._expires[jti] = expires_at
+            if self.bloom.inserted < self.bloom.capacity:
+                self.bloom.add(key_hash(jti))
+                return
+            now = time.time()
+            self._expires = {key: exp for key, exp in self._expires.items() if exp > now}
+            self.bloom.load(key_hash(key) for key in self._expires)
+
+    def is_revoked(self, jti, now=None):
+        if key_hash(jti) not in self.bloom:
+            return False
+        expires_at = self._expires.get(jti)
+        return expires_at is not None and expires_at > (time.time() if now is None else now)
+
+
+class SharedMemoryRevocationStore:
+    """Revocations in a memory-mapped table and filter shared by local workers."""
+
+    # Header: insertions since the filter was last rebuilt, and the expiry of
+    # the last revocation that found no room in the table
+    _HEADER = struct.Struct('<Qd')
+
+    def __init__(self, path, slots=65536, bloom_capacity=100000):
+        self.table = SharedSlotTable(path, slots=slots)
+        size = self._HEADER.size + bloom_layout(bloom_capacity)[0]
+        self._fd = os.open(path + '.bloom', os.O_RDWR | os.O_CREAT, 0o600)
+        self._lock = threading.Lock()
+        with self._locked():
+            fresh = os.fstat(self._fd).st_size != size
+            if fresh:
+                # New file, or one sized by a differently configured app
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+            self._mm = mmap.mmap(self._fd, size)
+            self.bloom = BloomFilter(bloom_capacity,
+                                     buffer=memoryview(self._mm)[self._HEADER.size:])
+            if fresh:
+                # The table may already hold live revocations
+                self._rebuild()
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def _rebuild(self):
+        now = time.time()
+        self.bloom.load(h for h, values in self.table.items() if values[0] > now)
+        self._HEADER.pack_into(self._mm, 0, self.bloom.inserted, 0.0)
+
+    def revoke(self, jti, expires_at):
+        now = time.time()
+        try:
+            # The slot's timestamp is the expiry, so only expired entries are recycled
+            self.table.update(jti, lambda values: (None, (expires_at, 0.0, 0.0)), expires_at,
+                              recycle_before=now)
+            stored = True
+        except SlotTableFull:
+            stored = False
+        with self._locked():
+            inserted, overflow_until = self._HEADER.unpack_from(self._mm, 0)
+            if not stored:
+                logger.warning(
+                    'Token revocation table is full; failing closed until %s', expires_at)
+                overflow_until = max(overflow_until, expires_at)
+            if inserted >= self.bloom.capacity and overflow_until <= now:
+                # Safe only while the table holds every live revocation
+                self._rebuild()
+            else:
+                self.bloom.add(key_hash(jti))
+                self._HEADER.pack_into(self._mm, 0, inserted + 1, overflow_until)
+
+    def is_revoked(self, jti, now=None):
+        if key_hash(jti) not in self.bloom:
+            return False
+        now = time.time() if now is None else now
+        values = self.table.get(jti)
+        if values is not None:
+            return values[0] > now
+        # Not in the table: revoked if it may be one that found no room there
+        return self._HEADER.unpack_from(self._mm, 0)[1] > now
+
+
+class RedisRevocationStore:
+    """Revocations as expiring Redis keys.
+
+    Two sorted sets let other processes fill their filters: ``:live`` holds
+    every revoked jti scored by its expiry (for a full reload) and
+    ``:recent`` the last few minutes' revocations scored by when they were
+    made (for the periodic sync).
+    """
+
+    RECENT_SECONDS = 600
+
+    def __init__(self, url, client=None, prefix='revoked', bloom_capacity=100000,
+                 sync_seconds=2.0):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.bloom = BloomFilter(bloom_capacity)
+        self.sync_seconds = sync_seconds
+        self._synced_at = None
+        self._lock = threading.Lock()
+
+    def revoke(self, jti, expires_at):
+        now = time.time()
+        pipe = self.client.pipeline()
+        pipe.set(f'{self.prefix}:{jti}', 1, ex=max(1, int(math.ceil(expires_at - now))))
+        pipe.zadd(f'{self.prefix}:live', {jti: expires_at})
+        pipe.zremrangebyscore(f'{self.prefix}:live', '-inf', now)
+        pipe.zadd(f'{self.prefix}:recent', {jti: now})
+        pipe.zremrangebyscore(f'{self.prefix}:recent', '-inf', now - self.RECENT_SECONDS)
+        pipe.execute()
+        with self._lock:
+            self.bloom.add(key_hash(jti))
+
+    def sync(self, now=None):
+        """Add revocations made by other processes to the local filter."""
+        now = time.time() if now is None else now
+        with self._lock:
+            synced_at = self._synced_at
+            if synced_at is not None and now - synced_at < self.sync_seconds:
+                return
+            self._synced_at = now
+        full = (synced_at is None or now - synced_at > self.RECENT_SECONDS
+                or self.bloom.inserted >= self.bloom.capacity)
+        if full:
+            jtis = self.client.zrangebyscore(f'{self.prefix}:live', now, '+inf')
+        else:
+            # Overlap the last sync a little for revocations made as it ran
+            jtis = self.client.zrangebyscore(f'{self.prefix}:recent', synced_at - 1, '+inf')
+        hashes = [key_hash(jti.decode() if isinstance(jti, bytes) else jti) for jti in jtis]
+        with self._lock:
+            if full:
+                self.bloom.load(hashes)
+            else:
+                for h in hashes:
+                    self.bloom.add(h)
+
+    def is_revoked(self, jti, now=None):
+        self.sync(now)
+        if key_hash(jti) not in self.bloom:
+            return False
+        return bool(self.client.exists(f'{self.prefix}:{jti}'))
+
+
+def create_revocation_store(url, slots=65536, bloom_capacity=100000, sync_seconds=2.0,
+                            prefix='revoked'):
+    """Create the store named by a JWT_REVOCATION_STORAGE_URL."""
+    scheme, _, rest = (url or 'memory://').partition('://')
+    if scheme == 'memory':
+        return MemoryRevocationStore(bloom_capacity)
+    if scheme == 'shm':
+        path = rest or os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else '/tmp',
+                                    'ajali-revoked')
+        return SharedMemoryRevocationStore(path, slots=slots, bloom_capacity=bloom_capacity)
+    if scheme in ('redis', 'rediss', 'unix'):
+        return RedisRevocationStore(url, prefix=prefix, bloom_capacity=bloom_capacity,
+                                    sync_seconds=sync_seconds)
+    raise ValueError(f'Unsupported token revocation storage: {url}')
+
+
+def init_token_revocation(app):
+    """Create the app's revocation store."""
+    config = app.config
+    store = create_revocation_store(
+        config.get('JWT_REVOCATION_STORAGE_URL'),
+        slots=config.get('JWT_REVOCATION_SLOTS', 65536),
+        bloom_capacity=config.get('JWT_REVOCATION_BLOOM_CAPACITY', 100000),
+        sync_seconds=config.get('JWT_REVOCATION_SYNC_SECONDS', 2.0),
+        prefix=f"{config.get('RATELIMIT_KEY_PREFIX', 'rl')}:revoked")
+    app.extensions['token_revocations'] = store
+    return store
+
+
+def revoke_jti(jti, expires_at):
+    """Revoke a token id until ``expires_at`` (a Unix timestamp)."""
+    current_app.extensions['token_revocations'].revoke(jti, expires_at)
+
+
+def is_jti_revoked(jti):
+    return current_app.extensions['token_revocations'].is_revoked(jti)
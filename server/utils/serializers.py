@@ -0,0 +1,201 @@
+"""Column-projected serializers for listing endpoints.
+
+Listings used to load full ORM objects and call ``to_dict()`` on each, which
+also lazy-loads the category, reporter and assignee per row. These helpers
+select just the columns a payload needs, join the related tables once, and
+build the dicts straight from the result tuples. Datetimes are left as-is
+for the JSON provider to encode.
+"""
+import json
+import math
+from collections import namedtuple
+from sqlalchemy import select, func
+from sqlalchemy.orm import aliased
+from ..models import IncidentReport, IncidentCategory, IncidentComment, User
+
+Field = namedtuple('Field', ['columns', 'build', 'joins'])
+
+_reporter = aliased(User, name='reporter')
+_assignee = aliased(User, name='assignee')
+
+_JOINS = {
+    'category': (IncidentCategory, IncidentReport.category_id == IncidentCategory.id),
+    'reporter': (_reporter, IncidentReport.user_id == _reporter.id),
+    'assignee': (_assignee, IncidentReport.assigned_to == _assignee.id),
+}
+
+
+def _column(column, label, joins=()):
+    """A field that is a single column, returned unchanged."""
+    return Field([column.label(label)], lambda row: row[label], frozenset(joins))
+
+
+def _media_urls(value):
+    if not value or value == '[]':
+        return []
+    try:
+        return json.loads(value)
+    except ValueError:
+        return []
+
+
+def _build_category(row):
+    if row['category_id'] is None:
+        return None
+    return {
+        'id': row['category_id'],
+        'name': row['category_name'],
+        'description': row['category_description'],
+        'icon': row['category_icon'],
+        'color': row['category_color'],
+        'created_at': row['category_created_at']
+    }
+
+
+INCIDENT_FIELDS = {
+    'id': _column(IncidentReport.id, 'id'),
+    'title': _column(IncidentReport.title, 'title'),
+    'description': _column(IncidentReport.description, 'description'),
+    'status': _column(IncidentReport.status, 'status'),
+    'priority': _column(IncidentReport.priority, 'priority'),
+    'category': Field(
+        [IncidentCategory.id.label('category_id'),
+         IncidentCategory.name.label('category_name'),
+         IncidentCategory.description.label('category_description'),
+         IncidentCategory.icon.label('category_icon'),
+         IncidentCategory.color.label('category_color'),
+         IncidentCategory.created_at.label('category_created_at')],
+        _build_category,
+        frozenset(['category'])
+    ),
+    'location': Field(
+        [IncidentReport.latitude.label('latitude'),
+         IncidentReport.longitude.label('longitude'),
+         IncidentReport.address.label('address'),
+         IncidentReport.affected_area_radius.label('affected_area_radius')],
+        lambda row: {
+            'latitude': row['latitude'],
+            'longitude': row['longitude'],
+            'address': row['address'],
+            'affected_area_radius': row['affected_area_radius']
+        },
+        frozenset()
+    ),
+    'media_urls': Field([IncidentReport.media_urls.label('media_urls')],
+                        lambda row: _media_urls(row['media_urls']), frozenset()),
+    'resolution_notes': _column(IncidentReport.resolution_notes, 'resolution_notes'),
+    'assigned_to': _column(IncidentReport.assigned_to, 'assigned_to'),
+    'assignee': _column(_assignee.username, 'assignee_username', ['assignee']),
+    'user_id': _column(IncidentReport.user_id, 'user_id'),
+    'reporter_username': _column(_reporter.username, 'reporter_username', ['reporter']),
+    'reporter_email': _column(_reporter.email, 'reporter_email', ['reporter']),
+    'created_at': _column(IncidentReport.created_at, 'created_at'),
+    'updated_at': _column(IncidentReport.updated_at, 'updated_at'),
+    'resolved_at': _column(IncidentReport.resolved_at, 'resolved_at'),
+    'duplicate_of': _column(IncidentReport.duplicate_of, 'duplicate_of'),
+    'comment_count': _column(IncidentReport.comment_count, 'comment_count'),
+    'last_comment_at': _column(IncidentReport.last_comment_at, 'last_comment_at'),
+}
+
+# Same keys, in the same order, as IncidentReport.to_dict()
+INCIDENT_DEFAULT_FIELDS = tuple(INCIDENT_FIELDS)
+
+# Flat fields for compact payloads; not part of the full representation
+INCIDENT_FIELDS.update({
+    'latitude': _column(IncidentReport.latitude, 'latitude'),
+    'longitude': _column(IncidentReport.longitude, 'longitude'),
+    'address': _column(IncidentReport.address, 'address'),
+    'category_id': _column(IncidentReport.category_id, 'incident_category_id'),
+    'category_name': _column(IncidentCategory.name, 'category_name', ['category']),
+})
+
+INCIDENT_VIEWS = {
+    # Map markers
+    'pin': ('id', 'latitude', 'longitude', 'status', 'priority'),
+    # List and popup cards
+    'card': ('id', 'title', 'status', 'priority', 'category_name', 'address',
+             'latitude', 'longitude', 'reporter_username', 'created_at', 'comment_count'),
+    'full': INCIDENT_DEFAULT_FIELDS,
+}
+
+
+def resolve_incident_fields(fields=None, view=None):
+    """Resolve ``fields=`` / ``view=`` query parameters to a field tuple.
+
+    Explicit fields win over a view; ``id`` is always included. Raises
+    ValueError for unknown names.
+    """
+    if fields:
+        names = [name.strip() for name in fields.split(',') if name.strip()]
+        unknown = [name for name in names if name not in INCIDENT_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}. "
+                             f"Valid fields: {', '.join(INCIDENT_FIELDS)}")
+        if 'id' not in names:
+            names.insert(0, 'id')
+        return tuple(dict.fromkeys(names))
+
+    if view:
+        if view not in INCIDENT_VIEWS:
+            raise ValueError(f"Unknown view: {view}. "
+                             f"Valid views: {', '.join(INCIDENT_VIEWS)}")
+        return INCIDENT_VIEWS[view]
+
+    return INCIDENT_DEFAULT_FIELDS
+
+
+def incident_select(fields=INCIDENT_DEFAULT_FIELDS):
+    """Build a SELECT over only the columns and joins ``fields`` need."""
+    columns = {}
+    joins = set()
+    for name in fields:
+        field = INCIDENT_FIELDS[name]
+        for column in field.columns:
+            columns[column.key] = column
+        joins |= field.joins
+
+    stmt = select(*columns.values()).select_from(IncidentReport)
+    for name in ('category', 'reporter', 'assignee'):
+        if name in joins:
+            target, onclause = _JOINS[name]
+            stmt = stmt.outerjoin(target, onclause)
+    return stmt
+
+
+def serialize_incident_rows(rows, fields=INCIDENT_DEFAULT_FIELDS):
+    """Turn rows from ``incident_select`` into incident dicts."""
+    builders = [(name, INCIDENT_FIELDS[name].build) for name in fields]
+    return [{name: build(row) for name, build in builders}
+            for row in (r._mapping for r in rows)]
+
+
+def comment_select():
+    """Select the columns of IncidentComment.to_dict()."""
+    return select(*IncidentComment.__table__.columns)
+
+
+def serialize_comment_rows(rows):
+    return [dict(row._mapping) for row in rows]
+
+
+def paginate_select(session, stmt, count_stmt, page, per_page, total=None):
+    """Run a projected SELECT one page at a time.
+
+    Mirrors ``Query.paginate(error_out=False)``: out-of-range arguments fall
+    back to page 1 and 20 items per page. A ``total`` already known (such
+    as a stored counter) replaces running ``count_stmt``.
+    """
+    if page is None or page < 1:
+        page = 1
+    if per_page is None or per_page < 1:
+        per_page = 20
+
+    if total is None:
+        total = session.execute(count_stmt).scalar() or 0
+    rows = session.execute(stmt.limit(per_page).offset((page - 1) * per_page)).all()
+    return rows, total, int(math.ceil(total / per_page)) if total else 0
+
+
+def count_of(column):
+    """Shorthand for ``SELECT count(column)``."""
+    return select(func.count(column))
@@ -0,0 +1,150 @@
+"""Fixed-size hash table in a memory-mapped file, shared by worker processes.
+
+Each slot holds a 64-bit key hash, a last-touched timestamp and three float
+values. Keys hash to a bucket of eight slots; when a bucket is full the
+least recently touched slot is recycled, so the table never grows. Callers
+that must not lose live entries pass ``recycle_before`` instead: only slots
+touched before it are recycled, and a bucket with none raises
+``SlotTableFull``. Updates
+are atomic per bucket: a thread lock guards threads inside one process and
+an ``fcntl`` record lock on a stripe of the file guards other processes.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: locking only covers threads in this process
+    fcntl = None
+
+_MAGIC = b'AJSLOT01'
+_HEADER = struct.Struct('<8sII')
+_SLOT = struct.Struct('<Qdddd')
+BUCKET_SIZE = 8
+
+
+class SlotTableFull(Exception):
+    """Every slot in the key's bucket is in use and none may be recycled."""
+
+
+def key_hash(key):
+    """Hash a string key to a non-zero 64-bit integer (zero marks free slots)."""
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') or 1
+
+
+class SharedSlotTable:
+    """Bounded key -> (v0, v1, v2) table usable across forked workers."""
+
+    def __init__(self, path, slots=65536, stripes=64):
+        self.path = path
+        self.buckets = max(1, slots // BUCKET_SIZE)
+        self.stripes = max(1, min(stripes, self.buckets))
+        self._size = _HEADER.size + self.buckets * BUCKET_SIZE * _SLOT.size
+        self._thread_locks = [threading.Lock() for _ in range(self.stripes)]
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._lock_file()
+        try:
+            header = os.pread(self._fd, _HEADER.size, 0)
+            expected = _HEADER.pack(_MAGIC, self.buckets, BUCKET_SIZE)
+            if header != expected or os.fstat(self._fd).st_size != self._size:
+                # New file, or one laid out by a differently configured app
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, self._size)
+                os.pwrite(self._fd, expected, 0)
+        finally:
+            self._unlock_file()
+        self._mm = mmap.mmap(self._fd, self._size)
+
+    def _lock_file(self):
+        if fcntl is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+
+    def _unlock_file(self):
+        if fcntl is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _locked(self, stripe):
+        # Record locks belong to the process, so threads need their own lock
+        with self._thread_locks[stripe]:
+            if fcntl is None:
+                yield
+                return
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, stripe)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, stripe)
+
+    def update(self, key, fn, now, recycle_before=None):
+        """Atomically apply ``fn`` to the values stored for ``key``.
+
+        ``fn`` receives the current ``(v0, v1, v2)`` tuple, or None when the
+        key is absent, and returns ``(result, new_values)``. Returning None
+        for ``new_values`` deletes the entry. ``update`` returns ``result``.
+
+        With ``recycle_before``, a new key only takes a free slot or one
+        last touched before that time; ``SlotTableFull`` is raised, before
+        ``fn`` runs, if the bucket has neither.
+        """
+        h = key_hash(key)
+        bucket = h % self.buckets
+        base = _HEADER.size + bucket * BUCKET_SIZE * _SLOT.size
+        mm = self._mm
+
+        with self._locked(bucket % self.stripes):
+            target = None
+            values = None
+            free = None
+            oldest, oldest_touched = None, None
+            for i in range(BUCKET_SIZE):
+                offset = base + i * _SLOT.size
+                slot_key, touched, v0, v1, v2 = _SLOT.unpack_from(mm, offset)
+                if slot_key == h:
+                    target, values = offset, (v0, v1, v2)
+                    break
+                if slot_key == 0:
+                    if free is None:
+                        free = offset
+                elif oldest is None or touched < oldest_touched:
+                    oldest, oldest_touched = offset, touched
+            if target is None:
+                target = free if free is not None else oldest
+                if (free is None and recycle_before is not None
+                        and oldest_touched >= recycle_before):
+                    raise SlotTableFull(f'No recyclable slot for {key!r}')
+
+            result, new_values = fn(values)
+            if new_values is None:
+                if values is not None:
+                    _SLOT.pack_into(mm, target, 0, 0.0, 0.0, 0.0, 0.0)
+            else:
+                _SLOT.pack_into(mm, target, h, now, *new_values)
+            return result
+
+    def get(self, key):
+        """Return the values stored for ``key`` without locking, or None."""
+        h = key_hash(key)
+        base = _HEADER.size + (h % self.buckets) * BUCKET_SIZE * _SLOT.size
+        for i in range(BUCKET_SIZE):
+            slot_key, _, v0, v1, v2 = _SLOT.unpack_from(self._mm, base + i * _SLOT.size)
+            if slot_key == h:
+                return (v0, v1, v2)
+        return None
+
+    def items(self):
+        """Yield ``(key hash, (v0, v1, v2))`` for every occupied slot, without locking."""
+        for offset in range(_HEADER.size, self._size, _SLOT.size):
+            slot_key, _, v0, v1, v2 = _SLOT.unpack_from(self._mm, offset)
+            if slot_key:
+                yield slot_key, (v0, v1, v2)
+
+    def close(self):
+        self._mm.close()
+        os.close(self._fd)
@@ -0,0 +1,162 @@
+import logging
+import os
+import threading
+import time
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from .db_routing import RoutingSession
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads within one process are serialized
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def _sqlite_file(engine):
+    """Return the database file path, or None for in-memory databases."""
+    if engine.dialect.name != 'sqlite':
+        return None
+    database = engine.url.database
+    if not database or database == ':memory:' or database.startswith('file::memory:'):
+        return None
+    return database
+
+
+def apply_sqlite_pragmas(engine, config):
+    """Tune every new connection of a file-backed SQLite engine.
+
+    WAL lets readers proceed while one writer commits, and busy_timeout makes
+    a blocked writer wait instead of failing with "database is locked".
+    """
+    pragmas = [
+        ('journal_mode', config.get('SQLITE_JOURNAL_MODE', 'WAL')),
+        ('synchronous', config.get('SQLITE_SYNCHRONOUS', 'NORMAL')),
+        ('busy_timeout', int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))),
+        ('mmap_size', int(config.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))),
+        # Negative cache_size is in KiB rather than pages
+        ('cache_size', -int(config.get('SQLITE_CACHE_SIZE_KB', 20000))),
+        ('temp_store', 'MEMORY'),
+    ]
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+
+class SQLiteWriteLock:
+    """Serialize writers across threads and worker processes.
+
+    SQLite allows a single writer at a time; with many gunicorn workers the
+    losers spin on busy_timeout and eventually fail. Queueing writers on an
+    flock'd side file instead lets them take turns in order, while readers
+    stay untouched thanks to WAL.
+    """
+
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._thread_lock = threading.Lock()
+        self._fd = None
+        self._fd_pid = None
+
+    def _lock_fd(self):
+        # A descriptor inherited across fork() shares its lock with the parent,
+        # so every worker process opens its own
+        if self._fd is None or self._fd_pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._fd_pid = os.getpid()
+        return self._fd
+
+    def acquire(self):
+        """Take the lock, returning False if it could not be had in time."""
+        deadline = time.monotonic() + self.timeout
+        if not self._thread_lock.acquire(timeout=self.timeout):
+            return False
+        if fcntl is None:
+            return True
+
+        fd = self._lock_fd()
+        delay = 0.001
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    self._thread_lock.release()
+                    return False
+                time.sleep(delay)
+                delay = min(delay * 2, 0.05)
+
+    def release(self):
+        if fcntl is not None and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+
+def _write_lock_for(session):
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('sqlite_write_lock')
+
+
+def _acquire_write_lock(session):
+    if session.info.get('sqlite_write_lock'):
+        return
+    lock = _write_lock_for(session)
+    if lock is None:
+        return
+    if lock.acquire():
+        session.info['sqlite_write_lock'] = lock
+    else:
+        # Fall back to SQLite's own busy handling rather than failing outright
+        logger.warning("Timed out waiting for the SQLite write lock")
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _lock_before_flush(session, flush_context, instances):
+    _acquire_write_lock(session)
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _lock_before_bulk_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _acquire_write_lock(orm_execute_state.session)
+
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def _unlock_after_transaction(session, transaction):
+    if transaction.parent is not None:
+        return
+    lock = session.info.pop('sqlite_write_lock', None)
+    if lock is not None:
+        lock.release()
+
+
+def init_sqlite(app, db):
+    """Apply the SQLite engine profile and write lock to file-backed engines."""
+    if not app.config.get('SQLITE_PRAGMAS_ENABLED', True):
+        return app
+
+    with app.app_context():
+        engines = dict(db.engines)
+
+    for key, engine in engines.items():
+        if _sqlite_file(engine) is None:
+            continue
+        apply_sqlite_pragmas(engine, app.config)
+
+        # All models live on the primary, so that is the only place writes go
+        if key is None and app.config.get('SQLITE_WRITE_LOCK', True):
+            app.extensions['sqlite_write_lock'] = SQLiteWriteLock(
+                _sqlite_file(engine) + '.write-lock',
+                timeout=app.config.get('SQLITE_WRITE_LOCK_TIMEOUT', 30)
+            )
+    return app
@@ -0,0 +1,258 @@
+"""Incident status history and time-to-resolution rollups.
+
+Every status change goes through ``set_incident_status``, which appends an
+``IncidentStatusEvent`` in the caller's transaction. The event carries the
+durations it closes: how long the incident sat in the status it is
+leaving, and, on its first move to resolved, how long it took to resolve.
+
+Those durations are also added to one ``IncidentStatusRollup`` row per
+day, category and metric, holding a count, a sum and a histogram of
+log-spaced buckets (eight per doubling, from one second to about two
+years, so any percentile read back is within about 5% of the true value).
+Dashboards merge a date range of histograms with NumPy instead of
+rescanning the history, and archiving incidents leaves the rollups alone.
+
+Rollup updates are optimistic read-modify-writes on ``version``, like the
+heatmap grids, inside a savepoint: if one fails the status change still
+commits and ``flask incidents rebuild-status-rollups`` recomputes the
+rollups from the events.
+"""
+import math
+import zlib
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from ..models import db, IncidentStatusEvent, IncidentStatusRollup
+from .heatmap import category_key
+from .lazy_import import lazy_module
+
+np = lazy_module('numpy')
+
+RESOLVED = 'resolved'
+RESOLVE_METRIC = 'resolve'
+_DTYPE = '<u4'
+_STEPS_PER_DOUBLING = 8
+_MAX_DOUBLINGS = 26  # 2**26 seconds is a little over two years
+BUCKETS = _STEPS_PER_DOUBLING * _MAX_DOUBLINGS + 1
+
+
+def state_metric(status):
+    return f'in:{status}'
+
+
+def bucket_of(seconds):
+    """Histogram bucket for a duration: 0 is under a second, bucket i >= 1
+    covers [2**((i-1)/8), 2**(i/8)) seconds; the last one is open-ended."""
+    if seconds < 1:
+        return 0
+    return min(BUCKETS - 1, 1 + int(math.log2(seconds) * _STEPS_PER_DOUBLING))
+
+
+def bucket_values():
+    """A representative duration per bucket (its geometric midpoint)."""
+    values = np.exp2((np.arange(BUCKETS) - 0.5) / _STEPS_PER_DOUBLING)
+    values[0] = 0.0
+    return values
+
+
+def encode_histogram(counts):
+    return zlib.compress(np.ascontiguousarray(counts, dtype=_DTYPE).tobytes(), 1)
+
+
+def decode_histogram(blob):
+    return np.frombuffer(zlib.decompress(blob), dtype=_DTYPE)
+
+
+def _entered_at(session, incident):
+    """When the incident entered its current status, or None if unknown."""
+    entered = session.execute(
+        select(IncidentStatusEvent.created_at)
+        .where(IncidentStatusEvent.incident_id == incident.id)
+        .order_by(IncidentStatusEvent.id.desc()).limit(1)
+    ).scalar()
+    if entered is None and incident.status == 'reported':
+        # No history yet: still in the status it was reported with
+        entered = incident.created_at
+    return entered
+
+
+def record_reported(incident, changed_by=None):
+    """Append the event for a newly reported incident (before its first flush)."""
+    db.session.add(IncidentStatusEvent(
+        incident=incident, from_status=None, to_status=incident.status,
+        changed_by=changed_by, category_key=category_key(incident.category_id),
+        created_at=incident.created_at or datetime.utcnow()))
+
+
+def set_incident_status(incident, status, changed_by=None, now=None):
+    """Move an incident to ``status`` and record the transition.
+
+    Sets ``resolved_at`` when it becomes resolved. Returns the new event,
+    or None if the incident already had that status; the caller commits.
+    """
+    if incident.status == status:
+        return None
+    session = db.session
+    now = now or datetime.utcnow()
+
+    entered = _entered_at(session, incident)
+    event = IncidentStatusEvent(
+        incident_id=incident.id, from_status=incident.status, to_status=status,
+        changed_by=changed_by, category_key=category_key(incident.category_id), created_at=now,
+        seconds_in_state=max(0.0, (now - entered).total_seconds()) if entered else None)
+    if status == RESOLVED:
+        if incident.resolved_at is None and incident.created_at is not None:
+            event.resolve_seconds = max(0.0, (now - incident.created_at).total_seconds())
+        incident.resolved_at = now
+    incident.status = status
+    session.add(event)
+
+    if current_app.config.get('STATUS_ROLLUPS_ENABLED', True):
+        try:
+            with session.begin_nested():
+                record_event(event)
+        except Exception as e:
+            current_app.logger.warning(f'Status rollup update failed: {e}')
+    return event
+
+
+def event_durations(event):
+    """The (metric, seconds) pairs an event adds to the rollups."""
+    durations = []
+    if event.from_status is not None and event.seconds_in_state is not None:
+        durations.append((state_metric(event.from_status), event.seconds_in_state))
+    if event.resolve_seconds is not None:
+        durations.append((RESOLVE_METRIC, event.resolve_seconds))
+    return durations
+
+
+def record_event(event, attempts=5):
+    """Add an event's durations to its day's rollups; flushes but does not commit."""
+    for metric, seconds in event_durations(event):
+        _add_duration(event.created_at.date(), event.category_key, metric, seconds, attempts)
+
+
+def _add_duration(day, key, metric, seconds, attempts):
+    bucket = bucket_of(seconds)
+    for _ in range(attempts):
+        rollup = db.session.execute(
+            select(IncidentStatusRollup).where(
+                IncidentStatusRollup.day == day, IncidentStatusRollup.category_key == key,
+                IncidentStatusRollup.metric == metric)
+            .execution_options(populate_existing=True)
+        ).scalar_one_or_none()
+
+        if rollup is None:
+            counts = np.zeros(BUCKETS, dtype=_DTYPE)
+            counts[bucket] = 1
+            try:
+                with db.session.begin_nested():
+                    db.session.add(IncidentStatusRollup(
+                        day=day, category_key=key, metric=metric, count=1,
+                        total_seconds=seconds, histogram=encode_histogram(counts)))
+                return
+            except IntegrityError:
+                continue  # Another worker created it first
+
+        counts = decode_histogram(rollup.histogram).copy()
+        counts[bucket] += 1
+        result = db.session.execute(
+            update(IncidentStatusRollup)
+            .where(IncidentStatusRollup.id == rollup.id,
+                   IncidentStatusRollup.version == rollup.version)
+            .values(histogram=encode_histogram(counts), count=IncidentStatusRollup.count + 1,
+                    total_seconds=IncidentStatusRollup.total_seconds + seconds,
+                    version=IncidentStatusRollup.version + 1, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            return
+    raise RuntimeError(f'Status rollup {metric} for {day} kept changing underneath the update')
+
+
+def merged_rollups(start, end, category_keys=None):
+    """Rollups for days in [start, end] merged per metric.
+
+    Returns ``{metric: (count, total_seconds, histogram)}``.
+    """
+    stmt = select(IncidentStatusRollup.metric, IncidentStatusRollup.count,
+                  IncidentStatusRollup.total_seconds, IncidentStatusRollup.histogram).where(
+        IncidentStatusRollup.day.between(start, end))
+    if category_keys is not None:
+        stmt = stmt.where(IncidentStatusRollup.category_key.in_(category_keys))
+
+    merged = {}
+    for metric, count, total, blob in db.session.execute(stmt):
+        previous = merged.get(metric)
+        histogram = decode_histogram(blob).astype(np.uint64)
+        if previous is not None:
+            count, total, histogram = (count + previous[0], total + previous[1],
+                                       histogram + previous[2])
+        merged[metric] = (count, total, histogram)
+    return merged
+
+
+def percentiles(histogram, quantiles):
+    """Approximate durations in seconds at each percentile in ``quantiles``."""
+    cumulative = np.cumsum(histogram)
+    total = int(cumulative[-1]) if len(cumulative) else 0
+    if not total:
+        return {q: None for q in quantiles}
+    values = bucket_values()
+    result = {}
+    for q in quantiles:
+        rank = max(1, math.ceil(q / 100 * total))
+        result[q] = float(values[int(np.searchsorted(cumulative, rank))])
+    return result
+
+
+def summarize(merged, quantiles=(50, 90, 99)):
+    """JSON-ready count, mean and percentiles per metric."""
+    summary = {}
+    for metric, (count, total, histogram) in sorted(merged.items()):
+        summary[metric] = {
+            'count': int(count),
+            'mean_seconds': total / count if count else None,
+            'percentiles': {f'p{q:g}': value
+                            for q, value in percentiles(histogram, quantiles).items()},
+        }
+    return summary
+
+
+def rebuild_rollups(since=None, batch_size=10000):
+    """Recompute rollups from events on or after ``since`` (a date).
+
+    Existing rollups from that day on are replaced. Returns the number of
+    rollups written; the caller commits.
+    """
+    cleanup = delete(IncidentStatusRollup)
+    stmt = select(IncidentStatusEvent).order_by(IncidentStatusEvent.id)
+    if since is not None:
+        cleanup = cleanup.where(IncidentStatusRollup.day >= since)
+        stmt = stmt.where(IncidentStatusEvent.created_at >= datetime.combine(since, datetime.min.time()))
+    db.session.execute(cleanup)
+
+    groups = {}
+    for event in db.session.execute(stmt.execution_options(yield_per=batch_size)).scalars():
+        for metric, seconds in event_durations(event):
+            group_key = (event.created_at.date(), event.category_key, metric)
+            group = groups.get(group_key)
+            if group is None:
+                group = groups[group_key] = [0, 0.0, np.zeros(BUCKETS, dtype=_DTYPE)]
+            group[0] += 1
+            group[1] += seconds
+            group[2][bucket_of(seconds)] += 1
+
+    db.session.add_all(
+        IncidentStatusRollup(day=day, category_key=key, metric=metric, count=count,
+                             total_seconds=total, histogram=encode_histogram(counts))
+        for (day, key, metric), (count, total, counts) in groups.items())
+    return len(groups)
+
+
+def status_history(incident_id):
+    """An incident's events, oldest first, as dicts."""
+    return [event.to_dict() for event in db.session.execute(
+        select(IncidentStatusEvent).where(IncidentStatusEvent.incident_id == incident_id)
+        .order_by(IncidentStatusEvent.id)).scalars()]
@@ -0,0 +1,291 @@
+"""Mapbox Vector Tile encoding and a per-tile cache for incident layers.
+
+The MVT format is a small protobuf schema; tiles here only carry point
+features, so the encoder is written out by hand rather than pulling in a
+protobuf or tiling dependency. See
+https://github.com/mapbox/vector-tile-spec/tree/master/2.1.
+
+``TileCache`` keeps encoded tiles per (z, x, y, filter key). Inserting,
+moving, updating or deleting an incident drops, once committed, the
+cached tiles that draw it at its old and new position at every zoom
+level: those whose buffered bounds contain the point and, at cluster
+zooms, those that show the grid cell of its cluster. A TTL bounds how
+stale tiles can get from writes made by other worker processes.
+"""
+import hashlib
+import math
+import struct
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from sqlalchemy import select
+from ..models import db, IncidentReport
+from .clustering import mercator
+from .data_version import on_incidents_committed
+from .lazy_import import lazy_module
+
+np = lazy_module('numpy')
+
+EXTENT = 4096
+MAX_ZOOM = 22
+
+_GEOM_POINT = 1
+_CMD_MOVE_TO = 1
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _key(field, wire_type):
+    return _varint((field << 3) | wire_type)
+
+
+def _bytes_field(field, payload):
+    return _key(field, 2) + _varint(len(payload)) + payload
+
+
+def _uint_field(field, value):
+    return _key(field, 0) + _varint(value)
+
+
+def _packed_field(field, values):
+    return _bytes_field(field, b''.join(_varint(v) for v in values))
+
+
+def _encode_value(value):
+    if isinstance(value, bool):
+        return _uint_field(7, int(value))
+    if isinstance(value, int):
+        if value >= 0:
+            return _uint_field(5, value)
+        return _uint_field(6, _zigzag(value))
+    if isinstance(value, float):
+        return _key(3, 1) + struct.pack('<d', value)
+    return _bytes_field(1, str(value).encode('utf-8'))
+
+
+def encode_layer(name, features, extent=EXTENT):
+    """Encode one layer of point features.
+
+    ``features`` yields ``(id, x, y, properties)`` with ``x``/``y`` in tile
+    coordinates (0..extent) and ``id`` possibly None.
+    """
+    keys, values = {}, {}
+    encoded = []
+    for feature_id, x, y, properties in features:
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value), value), len(values)))
+        body = b''
+        if feature_id is not None:
+            body += _uint_field(1, feature_id)
+        if tags:
+            body += _packed_field(2, tags)
+        body += _uint_field(3, _GEOM_POINT)
+        body += _packed_field(4, [(_CMD_MOVE_TO & 0x7) | (1 << 3), _zigzag(x), _zigzag(y)])
+        encoded.append(_bytes_field(2, body))
+
+    layer = _uint_field(15, 2) + _bytes_field(1, name.encode('utf-8'))
+    layer += b''.join(encoded)
+    layer += b''.join(_bytes_field(3, key.encode('utf-8')) for key in keys)
+    layer += b''.join(_bytes_field(4, _encode_value(value)) for _, value in values)
+    layer += _uint_field(5, extent)
+    return layer
+
+
+def encode_tile(layers):
+    """Combine layers from ``encode_layer`` into a tile."""
+    return b''.join(_bytes_field(3, layer) for layer in layers)
+
+
+def tile_bounds(z, x, y):
+    """(west, south, east, north) of a tile in degrees."""
+    n = 1 << z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)
+
+
+TILE_BUFFER = 64
+
+
+def buffered_bounds(z, x, y, buffer=TILE_BUFFER, extent=EXTENT):
+    """Tile bounds grown by ``buffer`` tile units, so edge symbols render."""
+    margin = buffer / extent
+    n = 1 << z
+    west, _, _, north = tile_bounds(z, x - margin, max(0.0, y - margin))
+    _, south, east, _ = tile_bounds(z, x + margin, min(n - 1.0, y + margin))
+    return max(-180.0, west), south, min(180.0, east), north
+
+
+def to_tile_coords(z, x, y, latitudes, longitudes, extent=EXTENT):
+    """Project positions to integer coordinates within tile (z, x, y)."""
+    mx, my = mercator(np.asarray(latitudes, dtype=np.float64),
+                      np.asarray(longitudes, dtype=np.float64))
+    n = 1 << z
+    px = np.round((mx * n - x) * extent).astype(np.int64)
+    py = np.round((my * n - y) * extent).astype(np.int64)
+    return px, py
+
+
+def tile_etag(body):
+    return hashlib.blake2b(body, digest_size=12).hexdigest()
+
+
+def incident_layer(z, x, y, filters, extent=EXTENT):
+    """The ``incidents`` layer: one point per incident in the tile."""
+    west, south, east, north = buffered_bounds(z, x, y, extent=extent)
+    rows = db.session.execute(
+        select(IncidentReport.id, IncidentReport.latitude, IncidentReport.longitude,
+               IncidentReport.status, IncidentReport.priority, IncidentReport.category_id,
+               IncidentReport.created_at)
+        .where(*filters,
+               IncidentReport.latitude.between(south, north),
+               IncidentReport.longitude.between(west, east))
+    ).all()
+    if not rows:
+        return encode_layer('incidents', [], extent)
+    px, py = to_tile_coords(z, x, y, [r.latitude for r in rows], [r.longitude for r in rows], extent)
+    features = (
+        (row.id, int(px[i]), int(py[i]), {
+            'status': row.status,
+            'priority': row.priority,
+            'category_id': row.category_id,
+            'created_at': int(row.created_at.timestamp()) if row.created_at else None,
+        })
+        for i, row in enumerate(rows)
+    )
+    return encode_layer('incidents', features, extent)
+
+
+def cluster_layer(z, x, y, index, extent=EXTENT):
+    """The ``clusters`` layer, from a ``ClusterIndex`` built for the same filters."""
+    clusters = index.clusters(buffered_bounds(z, x, y, extent=extent), z)
+    if not clusters:
+        return encode_layer('clusters', [], extent)
+    px, py = to_tile_coords(z, x, y, [c['latitude'] for c in clusters],
+                            [c['longitude'] for c in clusters], extent)
+    features = (
+        (cluster.get('id'), int(px[i]), int(py[i]), {'count': cluster['count'], **cluster['priorities']})
+        for i, cluster in enumerate(clusters)
+    )
+    return encode_layer('clusters', features, extent)
+
+
+class TileCache:
+    """LRU of encoded tiles, dropped when incidents inside them change.
+
+    ``cluster_max_zoom``, ``cluster_index_max_zoom`` and ``cluster_cell_px``
+    describe the cluster tiles (``MVT_CLUSTER_MAX_ZOOM``, ``CLUSTER_MAX_ZOOM``
+    and ``CLUSTER_CELL_PX``), so a change drops every tile showing the
+    cluster it belongs to.
+    """
+
+    def __init__(self, max_entries=2048, ttl=60, max_zoom=MAX_ZOOM, cluster_max_zoom=11,
+                 cluster_index_max_zoom=16, cluster_cell_px=64):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_zoom = max_zoom
+        self.cluster_max_zoom = cluster_max_zoom
+        self.cluster_index_max_zoom = cluster_index_max_zoom
+        self.cells_per_tile = max(1, 256 // cluster_cell_px)
+        self._entries = OrderedDict()
+        self._by_tile = {}
+        self._lock = threading.Lock()
+        _caches.add(self)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] >= self.ttl:
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def put(self, key, body, etag):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic(), body, etag)
+            self._by_tile.setdefault(key[:3], set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        keys = self._by_tile.get(key[:3])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_tile[key[:3]]
+
+    def _tiles_over(self, z, west, north, east, south):
+        """Tiles at ``z`` whose buffered bounds overlap a box in unit Mercator coordinates."""
+        n = 1 << z
+        margin = TILE_BUFFER / EXTENT
+        x0, x1 = max(0, math.ceil(west * n - 1 - margin)), min(n - 1, math.floor(east * n + margin))
+        y0, y1 = max(0, math.ceil(north * n - 1 - margin)), min(n - 1, math.floor(south * n + margin))
+        return [(z, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+    def invalidate_point(self, latitude, longitude):
+        """Drop every cached tile, at any zoom, that may draw this point.
+
+        That is every tile whose buffered bounds contain it and, up to
+        ``cluster_max_zoom``, every tile whose buffered bounds overlap the
+        cell of the point's cluster, which the cluster layer draws at the
+        cluster's centroid.
+        """
+        if latitude is None or longitude is None:
+            return
+        mx, my = mercator(np.array([latitude]), np.array([longitude]))
+        mx, my = float(mx[0]), float(my[0])
+        with self._lock:
+            if not self._by_tile:
+                return
+            for z in range(self.max_zoom + 1):
+                tiles = self._tiles_over(z, mx, my, mx, my)
+                if z <= self.cluster_max_zoom:
+                    cells = (1 << min(z, self.cluster_index_max_zoom)) * self.cells_per_tile
+                    cx, cy = math.floor(mx * cells), math.floor(my * cells)
+                    tiles += self._tiles_over(z, cx / cells, cy / cells,
+                                              (cx + 1) / cells, (cy + 1) / cells)
+                for tile in set(tiles):
+                    for key in list(self._by_tile.get(tile, ())):
+                        self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_tile.clear()
+
+
+_caches = weakref.WeakSet()
+
+
+@on_incidents_committed
+def _invalidate_tiles(points):
+    for cache in list(_caches):
+        for latitude, longitude in points:
+            cache.invalidate_point(latitude, longitude)
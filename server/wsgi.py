@@ -0,0 +1,15 @@
+"""WSGI entry point for gunicorn.
+
+Run from the repository root with the bundled settings::
+
+    gunicorn -c server/gunicorn.conf.py server.wsgi:app
+
+``gunicorn.conf.py`` preloads this module in the master, so the app is
+built and warmed once and every worker is forked with it already in
+memory (see ``utils/prefork.py``).
+"""
+from .app import create_app
+from .utils.prefork import warm_app
+
+app = create_app()
+warm_app(app)